@@ -1,140 +1,245 @@
-import pandas as pd
+import argparse
+import sys
+
 import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
+from theodoi import bat_dau
+
+# Bieudo.py [biểu đồ...]: vẽ các biểu đồ được chọn (mặc định cả bảy, theo thứ tự trong BIEU_DO).
+# Dữ liệu, khối tổng hợp và bảng tương quan chỉ được nạp khi có biểu đồ cần đến (bar_chart chỉ cần
+# khối tổng hợp đã lưu, không đọc lại dữ liệu); seaborn chỉ được import ở box_plot, histogram_grid
+# và heatmap.
+# Bieudo.py --headless [nguồn...] [-o thư mục] [--format png svg] [--workers N]: tạo báo cáo biểu đồ
+# song song cho từng vùng, không cần màn hình (xem baocaobieudo.py)
 
 # Đọc dữ liệu từ file CSV
 # Giả sử file 'Crop_production_in_India_ok.csv' đã được cung cấp
 # Nếu cần, thay thế đường dẫn file phù hợp
-data = pd.read_csv('Crop_production_in_India_ok.csv')
+FILE_DU_LIEU = 'Crop_production_in_India_ok.csv'
+
+_da_nap = {}
+
+
+# Dữ liệu đã làm sạch (ép kiểu số, loại các giá trị sản lượng/diện tích không dương), đọc lần đầu khi cần
+def du_lieu():
+    if 'data' not in _da_nap:
+        from docdulieu import load_and_clean_data
+        _da_nap['data'] = load_and_clean_data(FILE_DU_LIEU, bao_cao=True)
+    return _da_nap['data']
+
+
+# Khối tổng hợp Crop × Season × Crop_Year cho các biểu đồ cột/đường/tròn (dùng lại dữ liệu nếu đã đọc)
+def khoi_tong_hop():
+    if 'khoi' not in _da_nap:
+        from khoitonghop import nap_khoi
+        gd = bat_dau('nap_khoi')
+        _da_nap['khoi'] = nap_khoi(FILE_DU_LIEU, _da_nap.get('data'))
+        gd.ket_thuc()
+    return _da_nap['khoi']
+
 
-# Làm sạch dữ liệu: Loại bỏ các giá trị sản lượng âm
-data = data[data['Production'] >= 0]
+# Bảng đồng mômen theo nhóm: ma trận tương quan và các đường hồi quy lấy từ đây, không duyệt lại dữ liệu
+def bang_tuong_quan():
+    if 'tuong_quan' not in _da_nap:
+        from tuongquan import nap_tuong_quan
+        gd = bat_dau('nap_tuong_quan')
+        _da_nap['tuong_quan'] = nap_tuong_quan(FILE_DU_LIEU, _da_nap.get('data'))
+        gd.ket_thuc()
+    return _da_nap['tuong_quan']
 
-# Chuyển đổi các cột số sang kiểu float
-numeric_cols = ['Area', 'Temperature', 'Humidity', 'Wind_Speed', 'Production']
-data[numeric_cols] = data[numeric_cols].apply(pd.to_numeric, errors='coerce')
+
+# Mỗi biểu đồ là một giai đoạn khi bật theo dõi (theodoi.py); với biểu đồ mở cửa sổ, giai đoạn
+# kết thúc trước plt.show() để không tính thời gian người dùng xem biểu đồ
 
 # Thiết lập kiểu biểu đồ
 # plt.style.use('seaborn')  # Sử dụng kiểu seaborn cho giao diện đẹp
 
 # 1. Biểu đồ cột: Sản lượng trung bình theo cây trồng và mùa vụ
-plt.figure(figsize=(12, 6))
-avg_production = data.groupby(['Season', 'Crop'])['Production'].mean().unstack()
-avg_production.plot(kind='bar', stacked=False, colormap='Set2')
-plt.title('Average Production by Crop and Season', fontsize=14)
-plt.xlabel('Season', fontsize=12)
-plt.ylabel('Average Production (tons)', fontsize=12)
-plt.legend(title='Crop')
-plt.tight_layout()
-plt.savefig('bar_chart.png')
-plt.close()
+def bar_chart():
+    khoi = khoi_tong_hop()
+    gd = bat_dau('bar_chart')
+    plt.figure(figsize=(12, 6))
+    avg_production = khoi.tong_hop(['Season', 'Crop'], 'Production', 'mean')
+    avg_production.plot(kind='bar', stacked=False, colormap='Set2')
+    plt.title('Average Production by Crop and Season', fontsize=14)
+    plt.xlabel('Season', fontsize=12)
+    plt.ylabel('Average Production (tons)', fontsize=12)
+    plt.legend(title='Crop')
+    plt.tight_layout()
+    plt.savefig('bar_chart.png')
+    plt.close()
+    gd.ket_thuc()
+
 
 # 2. Biểu đồ đường: Xu hướng sản lượng theo thời gian
-plt.figure(figsize=(12, 6))
-yearly_production = data.groupby(['Crop_Year', 'Crop'])['Production'].mean().unstack()
-yearly_production.plot(kind='line', marker='o', colormap='Set1')
-plt.title('Production Trends by Crop (1990–2024)', fontsize=14)
-plt.xlabel('Year', fontsize=12)
-plt.ylabel('Average Production (tons)', fontsize=12)
-plt.legend(title='Crop')
-plt.tight_layout()
-plt.savefig('line_chart.png')
-plt.close()
+def line_chart():
+    khoi = khoi_tong_hop()
+    gd = bat_dau('line_chart')
+    plt.figure(figsize=(12, 6))
+    yearly_production = khoi.tong_hop(['Crop_Year', 'Crop'], 'Production', 'mean')
+    yearly_production.plot(kind='line', marker='o', colormap='Set1')
+    plt.title('Production Trends by Crop (1990–2024)', fontsize=14)
+    plt.xlabel('Year', fontsize=12)
+    plt.ylabel('Average Production (tons)', fontsize=12)
+    plt.legend(title='Crop')
+    plt.tight_layout()
+    plt.savefig('line_chart.png')
+    plt.close()
+    gd.ket_thuc()
+
 
 # 3. Biểu đồ hộp: Phân phối sản lượng theo cây trồng
-plt.figure(figsize=(10, 6))
-sns.boxplot(x='Crop', y='Production', data=data, palette='Set3')
-plt.title('Production Distribution by Crop', fontsize=14)
-plt.xlabel('Crop', fontsize=12)
-plt.ylabel('Production (tons)', fontsize=12)
-plt.tight_layout()
-plt.savefig('box_plot.png')
-plt.close()
+def box_plot():
+    import seaborn as sns
+    data = du_lieu()
+    gd = bat_dau('box_plot', so_dong=len(data))
+    plt.figure(figsize=(10, 6))
+    sns.boxplot(x='Crop', y='Production', data=data, palette='Set3')
+    plt.title('Production Distribution by Crop', fontsize=14)
+    plt.xlabel('Crop', fontsize=12)
+    plt.ylabel('Production (tons)', fontsize=12)
+    plt.tight_layout()
+    plt.savefig('box_plot.png')
+    plt.close()
+    gd.ket_thuc()
+
 
 # 4. Biểu đồ phân tán: Sản lượng vs Nhiệt độ và Độ ẩm
+def regplot_grid():
+    from vedulieulon import NGUONG_DIEM, dai_tu_hoi_quy, ve_dai_hoi_quy, ve_hoi_quy
+    data = du_lieu()
+    tuong_quan = bang_tuong_quan()
+
+    # Các biến đầu vào cần phân tích
+    features = ['Area', 'Temperature', 'Humidity', 'Wind_Speed']
+
+    # Thiết lập kích thước hình vẽ
+    gd = bat_dau('regplot_grid', so_dong=len(data))
+    plt.figure(figsize=(10, 6))
+    # Hệ số hồi quy Production theo từng biến (toàn bộ dữ liệu) tính sẵn từ bảng tương quan
+    hoi_quy = tuong_quan.hoi_quy('Production', features)
+
+    # Vẽ từng biểu đồ scatter có kèm đường hồi quy
+    for i, feature in enumerate(features, 1):
+        plt.subplot(2, 2, i)
+        if len(data) > NGUONG_DIEM:
+            # Dữ liệu lớn: mật độ + mẫu phân tầng + đường hồi quy tính trên toàn bộ dữ liệu
+            ve_hoi_quy(plt.gca(), data[feature], data['Production'], color='orange', line_color='red',
+                       hoi_quy=hoi_quy.loc[feature])
+        else:
+            plt.scatter(data[feature], data['Production'], alpha=0.5, color='orange')
+            ve_dai_hoi_quy(plt.gca(), dai_tu_hoi_quy(hoi_quy.loc[feature], data[feature].min(),
+                                                     data[feature].max()), 'red')
+        plt.title(f'Production vs {feature}')
+        plt.xlabel(feature)
+        plt.ylabel('Production')
+
+    plt.tight_layout()
+    gd.ket_thuc()
+    plt.show()
 
-# Các biến đầu vào cần phân tích
-features = ['Area', 'Temperature', 'Humidity', 'Wind_Speed']
 
-# Thiết lập kích thước hình vẽ
-plt.figure(figsize=(10, 6))
+# 5 biểu đồ histogram
+def histogram_grid():
+    import seaborn as sns
+    df = du_lieu()
 
-# Vẽ từng biểu đồ scatter có kèm đường hồi quy
-for i, feature in enumerate(features, 1):
-    plt.subplot(2, 2, i)
-    sns.regplot(data=data, x=feature, y='Production',
-                scatter_kws={'alpha': 0.5 ,'color': 'orange'},
-                line_kws={'color': 'red'})
-    plt.title(f'Production vs {feature}')
-    plt.xlabel(feature)
-    plt.ylabel('Production')
+    # Các biến liên tục để vẽ histogram
+    features = ['Production', 'Area', 'Temperature', 'Humidity', 'Wind_Speed']
 
-plt.tight_layout()
-plt.show()
+    # Cấu hình kiểu seaborn
+    sns.set(style="whitegrid")
 
-# 5 biểu đồ histogram
+    # Vẽ histogram cho từng biến
+    gd = bat_dau('histogram_grid', so_dong=len(df))
+    plt.figure(figsize=(8, 6))
 
-# Đọc dữ liệu
-df = pd.read_csv("Crop_production_in_India_ok.csv")
+    for i, feature in enumerate(features, 1):
+        plt.subplot(3, 2, i)
+        sns.histplot(df[feature], kde=True, color='#5DADE2', bins=30)
+        plt.title(f'Distribution of {feature}', fontsize=14)
+        plt.xlabel(feature)
+        plt.ylabel('Frequency')
 
-# Các biến liên tục để vẽ histogram
-features = ['Production','Area', 'Temperature', 'Humidity', 'Wind_Speed']
+    plt.tight_layout()
+    gd.ket_thuc()
+    plt.show()
 
-# Cấu hình kiểu seaborn
-sns.set(style="whitegrid")
 
-# Vẽ histogram cho từng biến
-plt.figure(figsize=(8, 6))
+# 6 biểu đồ tròn
+def pie_chart():
+    khoi = khoi_tong_hop()
+    # Tính tổng sản lượng theo từng loại cây trồng
+    gd = bat_dau('pie_chart')
+    crop_production = khoi.tong_hop('Crop', 'Production', 'sum').sort_values(ascending=False)
+
+    # Chọn top 8 cây trồng lớn nhất, nhóm phần còn lại vào "Others"
+    top_n = 8
+    top_crops = crop_production[:top_n]
+    others = crop_production[top_n:].sum()
+    top_crops['Others'] = others
+
+    # Vẽ biểu đồ tròn
+    plt.figure(figsize=(10, 10))
+    plt.pie(
+        top_crops,
+        labels=top_crops.index,
+        autopct='%1.1f%%',
+        startangle=140,
+        colors=plt.cm.Paired.colors  # bảng màu đẹp
+    )
+    plt.title('Tỷ lệ sản lượng theo loại cây trồng (Crop)', fontsize=14)
+    plt.axis('equal')  # hình tròn đúng tỷ lệ
+    gd.ket_thuc()
+    plt.show()
 
-for i, feature in enumerate(features, 1):
-    plt.subplot(3, 2, i)
-    sns.histplot(df[feature], kde=True, color='#5DADE2', bins=30)
-    plt.title(f'Distribution of {feature}', fontsize=14)
-    plt.xlabel(feature)
-    plt.ylabel('Frequency')
 
-plt.tight_layout()
-plt.show()
-# 6 biểu đồ tròn
-# Tính tổng sản lượng theo từng loại cây trồng
-crop_production = data.groupby('Crop')['Production'].sum().sort_values(ascending=False)
-
-# Chọn top 8 cây trồng lớn nhất, nhóm phần còn lại vào "Others"
-top_n = 8
-top_crops = crop_production[:top_n]
-others = crop_production[top_n:].sum()
-top_crops['Others'] = others
-
-# Vẽ biểu đồ tròn
-plt.figure(figsize=(10, 10))
-plt.pie(
-    top_crops,
-    labels=top_crops.index,
-    autopct='%1.1f%%',
-    startangle=140,
-    colors=plt.cm.Paired.colors  # bảng màu đẹp
-)
-plt.title('Tỷ lệ sản lượng theo loại cây trồng (Crop)', fontsize=14)
-plt.axis('equal')  # hình tròn đúng tỷ lệ
-plt.show()
 # 7 heatmap
-# Chọn các cột số để tính tương quan
-numeric_cols = ['Production', 'Area', 'Temperature', 'Humidity', 'Wind_Speed']
-
-# Tính ma trận tương quan
-corr_matrix = data[numeric_cols].corr()
-
-# Vẽ heatmap
-plt.figure(figsize=(8, 6))
-sns.heatmap(
-    corr_matrix,
-    annot=True,        # Hiển thị giá trị số trên từng ô
-    cmap='coolwarm',   # Bảng màu từ lạnh → nóng
-    fmt='.2f',
-    linewidths=0.5,
-    square=True
-)
-plt.title('Biểu đồ Heatmap tương quan giữa các biến', fontsize=14)
-plt.tight_layout()
-plt.show()
+def heatmap():
+    import seaborn as sns
+    tuong_quan = bang_tuong_quan()
+    # Chọn các cột số để tính tương quan
+    numeric_cols = ['Production', 'Area', 'Temperature', 'Humidity', 'Wind_Speed']
+
+    # Ma trận tương quan (lấy từ bảng đồng mômen đã tính)
+    gd = bat_dau('heatmap')
+    corr_matrix = tuong_quan.tuong_quan().loc[numeric_cols, numeric_cols]
+
+    # Vẽ heatmap
+    plt.figure(figsize=(8, 6))
+    sns.heatmap(
+        corr_matrix,
+        annot=True,        # Hiển thị giá trị số trên từng ô
+        cmap='coolwarm',   # Bảng màu từ lạnh → nóng
+        fmt='.2f',
+        linewidths=0.5,
+        square=True
+    )
+    plt.title('Biểu đồ Heatmap tương quan giữa các biến', fontsize=14)
+    plt.tight_layout()
+    gd.ket_thuc()
+    plt.show()
+
+
+BIEU_DO = {'bar_chart': bar_chart, 'line_chart': line_chart, 'box_plot': box_plot, 'regplot_grid': regplot_grid,
+           'histogram_grid': histogram_grid, 'pie_chart': pie_chart, 'heatmap': heatmap}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if '--headless' in argv:
+        from baocaobieudo import main as bao_cao
+        bao_cao([a for a in argv if a != '--headless'])
+        return
+    parser = argparse.ArgumentParser(description="Vẽ biểu đồ dữ liệu sản lượng cây trồng")
+    parser.add_argument('bieu_do', nargs='*', metavar='BIEU_DO',
+                        help=f"các biểu đồ cần vẽ (mặc định: tất cả): {', '.join(BIEU_DO)}")
+    args = parser.parse_args(argv)
+    khong_ro = [t for t in args.bieu_do if t not in BIEU_DO]
+    if khong_ro:
+        parser.error(f"biểu đồ không hợp lệ: {', '.join(khong_ro)}")
+    for ten in args.bieu_do or BIEU_DO:
+        BIEU_DO[ten]()
+
+
+if __name__ == "__main__":
+    main()
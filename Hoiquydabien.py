@@ -1,53 +1,84 @@
-import pandas as pd
-import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import r2_score, mean_squared_error
-import matplotlib.pyplot as plt
-
-
-# Hàm đọc và làm sạch dữ liệu
-def load_and_clean_data(file_path):
-    df = pd.read_csv(file_path)
-    df = df.dropna()
-
-    # Đảm bảo kiểu dữ liệu số
-    num_cols = ['Production', 'Area', 'Temperature', 'Humidity', 'Wind_Speed', 'Crop_Year']
-    for col in num_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-        df = df[df[col].notna() & (df[col] > 0)]
-
-    return df
-
-def main():
-    file_path = 'Crop_production_in_India_ok.csv'
-    df = load_and_clean_data(file_path)
-
-    # Mã hóa one-hot các cột phân loại
-    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
-    df_encoded = pd.get_dummies(df, columns=categorical_cols, drop_first=True)
-
-    # Tách dữ liệu đầu vào và đầu ra
-    X = df_encoded.drop(columns=['Production'])
-    y = df_encoded['Production']
-
-    # Lưu danh sách cột đã mã hóa để dự đoán
-    encoded_columns = X.columns
+import sys
+from goimohinh import ma_bam_du_lieu, nap_hoac_huan_luyen
+from khoangdubao import MUC, nap_hoac_tao
+from theodoi import bat_dau, giai_doan
+
+# Các thư viện nặng được import trong hàm cần đến: scipy khi huấn luyện, sklearn chỉ ở chế độ trong bộ nhớ,
+# matplotlib chỉ khi vẽ biểu đồ (chay.py train --out-of-core không nạp sklearn/matplotlib)
+
+FILE_GOI = 'mo_hinh_da_bien.bundle.json'
+
+
+def huan_luyen(file_path, out_of_core=False):
+    from hoiquy_tangdan import MoHinhTuyenTinh, file_phuong_trinh, huan_luyen_ngoai_bo_nho, luu_phuong_trinh
+    if out_of_core:
+        # Huấn luyện ngoài bộ nhớ: đọc theo khối, cộng dồn X^T X / X^T y, không tạo bảng one-hot
+        with giai_doan('huan_luyen_ngoai_bo_nho') as gd:
+            model, train_eq, test_eq = huan_luyen_ngoai_bo_nho(file_path, test_size=0.2, seed=42)
+            gd.dat(so_dong=train_eq.n + test_eq.n)
+        # Lưu hệ phương trình chuẩn để capnhat.py chỉ cần cộng thêm phần dữ liệu mới
+        luu_phuong_trinh(file_phuong_trinh(file_path), train_eq, test_eq, ma_bam_du_lieu(file_path),
+                         {'test_size': 0.2, 'seed': 42})
+        ket_qua_train, ket_qua_test = train_eq.danh_gia(model), test_eq.danh_gia(model)
+        metrics = {'train_r2': ket_qua_train['r2'], 'train_mse': ket_qua_train['mse'],
+                   'test_r2': ket_qua_test['r2'], 'test_mse': ket_qua_test['mse']}
+        return model, train_eq.encoder, metrics
+
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import r2_score, mean_squared_error
+    from docdulieu import load_and_clean_data
+    from mahoa import CategoricalEncoder
+    df = load_and_clean_data(file_path, bao_cao=True)
+
+    # Mã hóa các cột phân loại thành ma trận thưa (không tạo bảng one-hot dạng đặc)
+    with giai_doan('ma_hoa', so_dong=len(df)):
+        categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+        numeric_cols = [c for c in df.columns if c not in categorical_cols and c != 'Production']
+        encoder = CategoricalEncoder(numeric_cols, categorical_cols).fit(df)
+
+        # Tách dữ liệu đầu vào và đầu ra
+        X = encoder.transform(df)
+        y = df['Production'].to_numpy()
 
     # Chia dữ liệu train/test
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    with giai_doan('chia_train_test', so_dong=len(y)):
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-    # Huấn luyện mô hình
-    model = LinearRegression()
-    model.fit(X_train, y_train)
+    # Huấn luyện mô hình (bình phương tối thiểu, giải chính xác trên ma trận thưa)
+    with giai_doan('fit', so_dong=len(y_train)):
+        model = MoHinhTuyenTinh().fit(X_train, y_train, feature_names=encoder.feature_names_)
 
     # Đánh giá mô hình
-    y_train_pred = model.predict(X_train)
-    y_test_pred = model.predict(X_test)
-    train_r2 = r2_score(y_train, y_train_pred)
-    test_r2 = r2_score(y_test, y_test_pred)
-    train_mse = mean_squared_error(y_train, y_train_pred)
-    test_mse = mean_squared_error(y_test, y_test_pred)
+    with giai_doan('danh_gia', so_dong=len(y)):
+        y_train_pred = model.predict(X_train)
+        y_test_pred = model.predict(X_test)
+        metrics = {'train_r2': r2_score(y_train, y_train_pred),
+                   'test_r2': r2_score(y_test, y_test_pred),
+                   'train_mse': mean_squared_error(y_train, y_train_pred),
+                   'test_mse': mean_squared_error(y_test, y_test_pred)}
+    return model, encoder, metrics
+
+
+# Khởi động từ gói mô hình đã lưu, chỉ huấn luyện lại khi dữ liệu hoặc chế độ huấn luyện thay đổi;
+# trả về (gói, đã huấn luyện lại hay chưa)
+def nap_mo_hinh(file_path, out_of_core=False):
+    cau_hinh = {'out_of_core': out_of_core, 'test_size': 0.2, 'seed': 42}
+    with giai_doan('nap_mo_hinh') as gd:
+        goi, da_huan_luyen = nap_hoac_huan_luyen(FILE_GOI, file_path, lambda: huan_luyen(file_path, out_of_core),
+                                                 cau_hinh=cau_hinh)
+        gd.dat(da_huan_luyen=da_huan_luyen)
+    return goi, da_huan_luyen
+
+
+def main(out_of_core=False):
+    file_path = 'Crop_production_in_India_ok.csv'
+
+    goi, da_huan_luyen = nap_mo_hinh(file_path, out_of_core)
+    if not da_huan_luyen:
+        print(f"Dùng mô hình đã lưu trong {FILE_GOI} ({goi.thoi_diem})")
+    model, encoder = goi.mo_hinh(), goi.encoder()
+    train_r2, test_r2 = goi.metrics['train_r2'], goi.metrics['test_r2']
+    train_mse, test_mse = goi.metrics['train_mse'], goi.metrics['test_mse']
 
     print("\n=== Kết quả mô hình ===")
     print(f"Train R-squared: {train_r2:.4f}")
@@ -70,48 +101,61 @@ def main():
             'Season': input("Mùa vụ (Season): ").strip().title()
         }
 
-        user_df = pd.DataFrame([user_input])
-        user_df_encoded = pd.get_dummies(user_df)
+        with giai_doan('du_bao', so_dong=1):
+            # Mã hóa theo đúng danh sách nhãn lúc huấn luyện (nhãn lạ coi như nhóm gốc)
+            user_encoded = encoder.transform_one(user_input)
 
-        # Thêm các cột còn thiếu
-        for col in encoded_columns:
-            if col not in user_df_encoded.columns:
-                user_df_encoded[col] = 0
-
-        # Sắp xếp đúng thứ tự cột
-        user_df_encoded = user_df_encoded[encoded_columns]
-
-        # Dự đoán
-        prediction = model.predict(user_df_encoded)[0]
+            # Dự đoán
+            prediction = model.predict(user_encoded.reshape(1, -1))[0]
         print(f"\n🔮 Dự đoán sản lượng: {prediction:.2f} tấn")
 
+        # Khoảng dự báo từ các bản sao bootstrap (dựng lần đầu rồi lưu cạnh gói mô hình)
+        with giai_doan('khoang_du_bao', so_dong=1):
+            khoang, _ = nap_hoac_tao(FILE_GOI, file_path, goi)
+            thap, cao = khoang.khoang(user_encoded, prediction)
+        print(f"   Khoảng dự báo {MUC:.0%}: {thap:.2f} .. {cao:.2f} tấn")
+
     except Exception as e:
         print(f"\n❌ Lỗi khi nhập dữ liệu: {e}")
 
     # =====================
-    # Biểu đồ
+    # Biểu đồ (cần dữ liệu trong bộ nhớ, bỏ qua ở chế độ ngoài bộ nhớ)
     # =====================
+    if out_of_core:
+        return
+    import matplotlib.pyplot as plt
+    from sklearn.model_selection import train_test_split
+    from docdulieu import load_and_clean_data
+    from vedulieulon import ve_phan_tan
+    # Chỉ đọc các cột cần vẽ; chia train/test giống lúc huấn luyện (cùng random_state)
+    df = load_and_clean_data(file_path, columns=['Crop_Year', 'Area', 'Production'])
+    area_train, area_test, y_train, y_test = train_test_split(
+        df['Area'].to_numpy(), df['Production'].to_numpy(), test_size=0.2, random_state=42)
+    gd = bat_dau('ve_bieu_do', so_dong=len(df), bieu_do='plot_area_vs_production.png')
     plt.figure(figsize=(10, 6))
-    plt.scatter(X_train['Area'], y_train, alpha=0.4, label='Train')
-    plt.scatter(X_test['Area'], y_test, alpha=0.4, label='Test')
+    ve_phan_tan(plt.gca(), area_train, y_train, color='C0', alpha=0.4, label='Train')
+    ve_phan_tan(plt.gca(), area_test, y_test, color='C1', alpha=0.4, label='Test')
     plt.xlabel("Diện tích (ha)")
     plt.ylabel("Sản lượng (tấn)")
     plt.title("Biểu đồ: Diện tích vs Sản lượng")
     plt.legend()
     plt.savefig("plot_area_vs_production.png")
+    gd.ket_thuc()
     print("✅ Biểu đồ đã lưu: plot_area_vs_production.png")
 
     # Biểu đồ sản lượng theo năm
+    gd = bat_dau('ve_bieu_do', so_dong=len(df), bieu_do='plot_crop_year_vs_production.png')
     plt.figure(figsize=(10, 6))
-    plt.plot(df['Crop_Year'], df['Production'], 'o', alpha=0.3)
+    ve_phan_tan(plt.gca(), df['Crop_Year'], df['Production'], alpha=0.3)
     plt.xlabel("Năm trồng")
     plt.ylabel("Sản lượng")
     plt.title("Biểu đồ: Crop_Year vs Production")
     plt.savefig("plot_crop_year_vs_production.png")
+    gd.ket_thuc()
     print("✅ Biểu đồ đã lưu: plot_crop_year_vs_production.png")
 
 # =======================
 # Gọi hàm main
 # =======================
 if __name__ == "__main__":
-    main()
+    main(out_of_core="--out-of-core" in sys.argv)
@@ -1,20 +1,29 @@
-import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import r2_score, mean_squared_error
-import matplotlib.pyplot as plt
+from docdulieu import load_and_clean_data
+from goimohinh import nap_hoac_huan_luyen
+from khoangdubao import MUC, nap_hoac_tao
+from theodoi import bat_dau, giai_doan
 
+FILE_GOI = 'mo_hinh_don_bien.bundle.json'
 
-# Hàm đọc và làm sạch dữ liệu
-def load_and_clean_data(file_path):
-    df = pd.read_csv(file_path)
-    df = df.dropna()
-    df['Production'] = pd.to_numeric(df['Production'], errors='coerce')
-    df['Area'] = pd.to_numeric(df['Area'], errors='coerce')
-    df = df[df['Production'] > 0]
-    df = df[df['Area'] > 0]
-    return df
+
+# Huấn luyện và đánh giá mô hình; trả về (mô hình, bộ mã hóa, chỉ số) để lưu vào gói
+def huan_luyen(X_train, X_test, y_train, y_test):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.metrics import r2_score, mean_squared_error
+    from mahoa import CategoricalEncoder
+    with giai_doan('fit', so_dong=len(y_train)):
+        model = LinearRegression()
+        model.fit(X_train, y_train)
+
+    with giai_doan('danh_gia', so_dong=len(y_train) + len(y_test)):
+        y_train_pred = model.predict(X_train)
+        y_test_pred = model.predict(X_test)
+        metrics = {'train_r2': r2_score(y_train, y_train_pred),
+                   'train_mse': mean_squared_error(y_train, y_train_pred),
+                   'test_r2': r2_score(y_test, y_test_pred),
+                   'test_mse': mean_squared_error(y_test, y_test_pred)}
+    return model, CategoricalEncoder.from_categories(['Area'], {}), metrics
 
 
 # Hàm chính
@@ -22,29 +31,31 @@ def main():
     # Đường dẫn đến file CSV (giả sử trong cùng thư mục)
     file_path = 'Crop_production_in_India_ok.csv'
 
-    # Tải và làm sạch dữ liệu
-    df = load_and_clean_data(file_path)
+    # Tải và làm sạch dữ liệu (chỉ cần Area và Production)
+    df = load_and_clean_data(file_path, columns=['Area', 'Production'], bao_cao=True)
 
     # Chuẩn bị dữ liệu cho hồi quy
     X = df[['Area']].values  # Biến độc lập (diện tích)
     y = df['Production'].values  # Biến phụ thuộc (sản lượng)
 
     # Chia dữ liệu thành tập huấn luyện và tập kiểm tra (80% train, 20% test)
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    # Tạo và huấn luyện mô hình hồi quy tuyến tính
-    model = LinearRegression()
-    model.fit(X_train, y_train)
-
-    # Dự đoán trên tập huấn luyện và tập kiểm tra
-    y_train_pred = model.predict(X_train)
-    y_test_pred = model.predict(X_test)
-
-    # Tính toán chỉ số đánh giá
-    train_r2 = r2_score(y_train, y_train_pred)
-    train_mse = mean_squared_error(y_train, y_train_pred)
-    test_r2 = r2_score(y_test, y_test_pred)
-    test_mse = mean_squared_error(y_test, y_test_pred)
+    from sklearn.model_selection import train_test_split
+    with giai_doan('chia_train_test', so_dong=len(y)):
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Dùng mô hình đã lưu nếu dữ liệu không đổi, nếu không thì huấn luyện lại và lưu gói mới
+    with giai_doan('nap_mo_hinh') as gd:
+        goi, da_huan_luyen = nap_hoac_huan_luyen(
+            FILE_GOI, file_path, lambda: huan_luyen(X_train, X_test, y_train, y_test),
+            cau_hinh={'test_size': 0.2, 'random_state': 42})
+        gd.dat(da_huan_luyen=da_huan_luyen)
+    if not da_huan_luyen:
+        print(f"Dùng mô hình đã lưu trong {FILE_GOI} ({goi.thoi_diem})")
+    model = goi.mo_hinh()
+
+    # Chỉ số đánh giá lưu cùng mô hình
+    train_r2, train_mse = goi.metrics['train_r2'], goi.metrics['train_mse']
+    test_r2, test_mse = goi.metrics['test_r2'], goi.metrics['test_mse']
 
     # In kết quả phân tích
     print("=== Kết Quả Phân Tích Hồi Quy ===")
@@ -63,14 +74,23 @@ def main():
             # Dự đoán sản lượng
             predicted_production = model.coef_[0] * user_area + model.intercept_
             print(f"Dự đoán sản lượng cho {user_area} hectares: {predicted_production:.2f} tonnes")
+            # Khoảng dự báo từ các bản sao bootstrap (dựng lần đầu rồi lưu cạnh gói mô hình)
+            khoang, _ = nap_hoac_tao(FILE_GOI, file_path, goi)
+            thap, cao = khoang.khoang([user_area], predicted_production)
+            print(f"Khoảng dự báo {MUC:.0%}: {thap:.2f} .. {cao:.2f} tonnes")
     except ValueError:
         print("Vui lòng nhập một số hợp lệ.")
 
     # Vẽ biểu đồ
+    # (nhiều điểm thì tự chuyển sang vẽ mật độ; đường hồi quy chỉ cần hai đầu mút)
+    import matplotlib.pyplot as plt
+    from vedulieulon import ve_phan_tan
+    gd = bat_dau('ve_bieu_do', so_dong=len(y), bieu_do='regression_user_input_plot.png')
     plt.figure(figsize=(10, 6))
-    plt.scatter(X_train, y_train, color='blue', alpha=0.5, label='Train data')
-    plt.scatter(X_test, y_test, color='green', alpha=0.5, label='Test data')
-    plt.plot(X_train, y_train_pred, color='red',
+    ve_phan_tan(plt.gca(), X_train.ravel(), y_train, color='blue', alpha=0.5, label='Train data')
+    ve_phan_tan(plt.gca(), X_test.ravel(), y_test, color='green', alpha=0.5, label='Test data')
+    dau_mut = np.array([[X_train.min()], [X_train.max()]])
+    plt.plot(dau_mut, model.predict(dau_mut), color='red',
              label=f'Regression Line (y = {model.coef_[0]:.4f}x + {model.intercept_:.4f})')
     plt.xlabel('Area (hectares)')
     plt.ylabel('Production (tonnes)')
@@ -78,6 +98,7 @@ def main():
     plt.legend()
     plt.savefig('regression_user_input_plot.png')
     plt.close()
+    gd.ket_thuc()
 
     print("Biểu đồ đã được lưu: regression_user_input_plot.png")
 
@@ -0,0 +1,366 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')  # không cần màn hình, vẽ được trong tiến trình con
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.cbook import boxplot_stats
+from matplotlib.figure import Figure
+
+from theodoi import giai_doan
+from vedulieulon import NGUONG_DIEM, dai_tu_hoi_quy, luoi_mat_do, mau_phan_tang, ve_dai_hoi_quy, ve_luoi
+
+# Tạo báo cáo biểu đồ không cần giao diện (headless) cho một hoặc nhiều file dữ liệu (mỗi file
+# một vùng). Mỗi biểu đồ được mô tả bởi một spec gồm hàm tổng hợp (tính dữ liệu nhỏ cần để vẽ từ
+# bảng dữ liệu) và hàm vẽ (chỉ dùng dữ liệu đã tổng hợp). Hai giai đoạn đều chạy song song:
+#   1. tổng hợp: mỗi vùng một việc (đọc dữ liệu một lần, tính mọi tổng hợp còn thiếu);
+#   2. vẽ: mỗi cặp (vùng, biểu đồ) một việc, backend Agg, ghi PNG/SVG.
+# Tổng hợp được lưu đệm theo mã băm dữ liệu + phiên bản spec, ảnh được lưu đệm theo khóa tổng hợp
+# + định dạng, nên chạy lại chỉ làm những biểu đồ có dữ liệu hoặc spec thay đổi.
+
+COT_SO = ['Production', 'Area', 'Temperature', 'Humidity', 'Wind_Speed']
+DAC_TRUNG = ['Area', 'Temperature', 'Humidity', 'Wind_Speed']
+THU_MUC_DEM = '.cache'
+
+
+# === Hàm tổng hợp: (df, khối tổng hợp, bảng tương quan) -> dữ liệu nhỏ, pickle được ===
+def _th_cot(df, khoi, tq):
+    return khoi.tong_hop(['Season', 'Crop'], 'Production', 'mean')
+
+
+def _th_duong(df, khoi, tq):
+    return khoi.tong_hop(['Crop_Year', 'Crop'], 'Production', 'mean')
+
+
+def _th_hop(df, khoi, tq):
+    # Thống kê hộp (tứ phân vị, râu 1.5 IQR) của từng loại cây; điểm ngoại lai giữ tối đa 500
+    ket_qua = []
+    for crop, nhom in df.groupby('Crop', observed=True)['Production']:
+        stats = boxplot_stats(nhom.to_numpy(dtype=np.float64), labels=[crop])[0]
+        if len(stats['fliers']) > 500:
+            stats['fliers'] = stats['fliers'][mau_phan_tang(stats['fliers'], 500)]
+        ket_qua.append(stats)
+    return ket_qua
+
+
+def _th_hoi_quy(df, khoi, tq):
+    y = df['Production'].to_numpy(dtype=np.float64)
+    hoi_quy = tq.hoi_quy('Production', DAC_TRUNG)
+    ket_qua = {}
+    for f in DAC_TRUNG:
+        x = df[f].to_numpy(dtype=np.float64)
+        muc = {'dai': dai_tu_hoi_quy(hoi_quy.loc[f], x.min(), x.max())}
+        if len(x) > NGUONG_DIEM:
+            muc['luoi'], muc['khoang'] = luoi_mat_do(x, y)
+            chon = mau_phan_tang(x)
+        else:
+            chon = slice(None)
+        muc['x'], muc['y'] = x[chon], y[chon]
+        ket_qua[f] = muc
+    return ket_qua
+
+
+def _th_histogram(df, khoi, tq):
+    from scipy.stats import gaussian_kde
+    ket_qua = {}
+    for f in COT_SO:
+        x = df[f].to_numpy(dtype=np.float64)
+        dem, bien = np.histogram(x, bins=30)
+        # Đường KDE ước lượng trên mẫu (tối đa 5000 điểm) rồi đổi sang thang số đếm
+        mau = x[mau_phan_tang(x, 5000)] if len(x) > 5000 else x
+        xs = np.linspace(bien[0], bien[-1], 200)
+        kde = gaussian_kde(mau)(xs) * len(x) * (bien[1] - bien[0])
+        ket_qua[f] = (dem, bien, xs, kde)
+    return ket_qua
+
+
+def _th_tron(df, khoi, tq):
+    return khoi.tong_hop('Crop', 'Production', 'sum').sort_values(ascending=False)
+
+
+def _th_nhiet(df, khoi, tq):
+    return tq.tuong_quan().loc[COT_SO, COT_SO]
+
+
+# Hệ số tương quan Production với từng đặc trưng trong mỗi nhóm: theo Crop, Season, khoảng 5 năm
+def _th_tuong_quan_nhom(df, khoi, tq):
+    return {ten: tq.hoi_quy('Production', DAC_TRUNG, theo=theo, khoang_nam=5)['r'].unstack()[DAC_TRUNG]
+            for ten, theo in (('Crop', 'Crop'), ('Season', 'Season'), ('Khoảng năm', 'Crop_Year'))}
+
+
+# === Hàm vẽ: (Figure, dữ liệu tổng hợp) ===
+def _ve_cot(fig, du_lieu):
+    ax = fig.add_subplot(111)
+    du_lieu.plot(kind='bar', stacked=False, colormap='Set2', ax=ax)
+    ax.set_title('Average Production by Crop and Season', fontsize=14)
+    ax.set_xlabel('Season', fontsize=12)
+    ax.set_ylabel('Average Production (tons)', fontsize=12)
+    ax.legend(title='Crop')
+
+
+def _ve_duong(fig, du_lieu):
+    ax = fig.add_subplot(111)
+    du_lieu.plot(kind='line', marker='o', colormap='Set1', ax=ax)
+    ax.set_title(f'Production Trends by Crop ({du_lieu.index.min()}–{du_lieu.index.max()})', fontsize=14)
+    ax.set_xlabel('Year', fontsize=12)
+    ax.set_ylabel('Average Production (tons)', fontsize=12)
+    ax.legend(title='Crop')
+
+
+def _ve_hop(fig, du_lieu):
+    ax = fig.add_subplot(111)
+    hop = ax.bxp(du_lieu, patch_artist=True)
+    mau = matplotlib.colormaps['Set3'].colors
+    for i, patch in enumerate(hop['boxes']):
+        patch.set_facecolor(mau[i % len(mau)])
+    ax.set_title('Production Distribution by Crop', fontsize=14)
+    ax.set_xlabel('Crop', fontsize=12)
+    ax.set_ylabel('Production (tons)', fontsize=12)
+
+
+def _ve_hoi_quy(fig, du_lieu):
+    for i, (f, muc) in enumerate(du_lieu.items(), 1):
+        ax = fig.add_subplot(2, 2, i)
+        if 'luoi' in muc:
+            ve_luoi(ax, muc['luoi'], muc['khoang'], color='orange')
+            ax.scatter(muc['x'], muc['y'], s=4, color='orange', alpha=0.5)
+        else:
+            ax.scatter(muc['x'], muc['y'], color='orange', alpha=0.5)
+        ve_dai_hoi_quy(ax, muc['dai'], 'red')
+        ax.set_title(f'Production vs {f}')
+        ax.set_xlabel(f)
+        ax.set_ylabel('Production')
+
+
+def _ve_histogram(fig, du_lieu):
+    for i, (f, (dem, bien, xs, kde)) in enumerate(du_lieu.items(), 1):
+        ax = fig.add_subplot(3, 2, i)
+        ax.stairs(dem, bien, fill=True, color='#5DADE2', alpha=0.6)
+        ax.plot(xs, kde, color='#5DADE2')
+        ax.set_title(f'Distribution of {f}', fontsize=14)
+        ax.set_xlabel(f)
+        ax.set_ylabel('Frequency')
+
+
+def _ve_tron(fig, du_lieu, top_n=8):
+    ax = fig.add_subplot(111)
+    top = du_lieu[:top_n].copy()
+    if len(du_lieu) > top_n:
+        top['Others'] = du_lieu[top_n:].sum()
+    ax.pie(top, labels=top.index, autopct='%1.1f%%', startangle=140, colors=matplotlib.colormaps['Paired'].colors)
+    ax.set_title('Tỷ lệ sản lượng theo loại cây trồng (Crop)', fontsize=14)
+    ax.axis('equal')
+
+
+def _ve_nhiet(fig, du_lieu):
+    import seaborn as sns
+    ax = fig.add_subplot(111)
+    sns.heatmap(du_lieu, annot=True, cmap='coolwarm', fmt='.2f', linewidths=0.5, square=True, ax=ax)
+    ax.set_title('Biểu đồ Heatmap tương quan giữa các biến', fontsize=14)
+
+
+def _ve_tuong_quan_nhom(fig, du_lieu):
+    import seaborn as sns
+    for i, (ten, bang) in enumerate(du_lieu.items(), 1):
+        ax = fig.add_subplot(1, len(du_lieu), i)
+        sns.heatmap(bang, annot=True, cmap='coolwarm', fmt='.2f', vmin=-1, vmax=1, linewidths=0.5,
+                    cbar=i == len(du_lieu), ax=ax)
+        ax.set_title(f'Tương quan với Production theo {ten}', fontsize=12)
+        ax.set_ylabel('')
+
+
+# Danh sách biểu đồ của báo cáo (cùng bộ biểu đồ với Bieudo.py). Tăng 'phien_ban' khi đổi cách
+# tổng hợp hoặc cách vẽ để biểu đồ đó được làm lại.
+BIEU_DO = [
+    {'ten': 'bar_chart', 'tong_hop': _th_cot, 've': _ve_cot, 'kich_thuoc': (12, 6), 'phien_ban': 1},
+    {'ten': 'line_chart', 'tong_hop': _th_duong, 've': _ve_duong, 'kich_thuoc': (12, 6), 'phien_ban': 1},
+    {'ten': 'box_plot', 'tong_hop': _th_hop, 've': _ve_hop, 'kich_thuoc': (10, 6), 'phien_ban': 1},
+    {'ten': 'regplot_grid', 'tong_hop': _th_hoi_quy, 've': _ve_hoi_quy, 'kich_thuoc': (10, 6), 'phien_ban': 2},
+    {'ten': 'histogram_grid', 'tong_hop': _th_histogram, 've': _ve_histogram, 'kich_thuoc': (8, 6), 'phien_ban': 1},
+    {'ten': 'pie_chart', 'tong_hop': _th_tron, 've': _ve_tron, 'kich_thuoc': (10, 10), 'phien_ban': 1},
+    {'ten': 'heatmap', 'tong_hop': _th_nhiet, 've': _ve_nhiet, 'kich_thuoc': (8, 6), 'phien_ban': 2},
+    {'ten': 'corr_by_group', 'tong_hop': _th_tuong_quan_nhom, 've': _ve_tuong_quan_nhom, 'kich_thuoc': (18, 6),
+     'phien_ban': 1},
+]
+SPEC = {s['ten']: s for s in BIEU_DO}
+
+
+# Khóa vùng của một file: đường dẫn tương đối so với thư mục gốc chung goc (mặc định thư mục chứa file),
+# bỏ đuôi, dùng '/' làm dấu phân cách (north/data.csv và south/data.csv là hai vùng khác nhau)
+def ten_vung(file_path, goc=None):
+    goc = os.path.dirname(os.path.abspath(file_path)) if goc is None else goc
+    tuong_doi = os.path.relpath(os.path.abspath(file_path), goc)
+    return os.path.splitext(tuong_doi)[0].replace(os.sep, '/')
+
+
+# {file: khóa vùng} của các file, tính theo thư mục gốc chung; báo lỗi nếu hai file cùng khóa (ví dụ
+# data.csv và data.txt cùng thư mục) vì chúng sẽ ghi đè bộ đệm, ảnh và mục chỉ mục của nhau
+def ten_cac_vung(files):
+    goc = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files]) if files else None
+    vung = {f: ten_vung(f, goc) for f in files}
+    theo_khoa = {}
+    for f, k in vung.items():
+        theo_khoa.setdefault(k, []).append(f)
+    trung = {k: fs for k, fs in theo_khoa.items() if len(fs) > 1}
+    if trung:
+        raise ValueError(f"Các file trùng khóa vùng: {trung}")
+    return vung
+
+
+def _khoa(*phan):
+    return hashlib.blake2b('|'.join(str(p) for p in phan).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _file_dem(thu_muc_ra, vung, ten):
+    return os.path.join(thu_muc_ra, THU_MUC_DEM, vung, f'{ten}.pkl')
+
+
+def _doc_dem(path):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def _ghi_dem(path, noi_dung):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tam = path + '.tmp'
+    with open(tam, 'wb') as f:
+        pickle.dump(noi_dung, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tam, path)
+
+
+# Giai đoạn 1 (tiến trình con): tổng hợp các biểu đồ của một vùng. Chỉ đọc dữ liệu khi có
+# biểu đồ mà tổng hợp đã lưu không khớp mã băm dữ liệu. Trả về {tên biểu đồ: khóa tổng hợp}.
+def _tong_hop_vung(viec):
+    file_path, vung, thu_muc_ra, ten_bieu_do = viec
+    from goimohinh import ma_bam_du_lieu
+    ma_bam = ma_bam_du_lieu(file_path)
+    khoa, can_tinh = {}, []
+    for ten in ten_bieu_do:
+        khoa[ten] = _khoa(ma_bam, ten, SPEC[ten]['phien_ban'])
+        dem = _doc_dem(_file_dem(thu_muc_ra, vung, ten))
+        if dem is None or dem['khoa'] != khoa[ten]:
+            can_tinh.append(ten)
+    if can_tinh:
+        from docdulieu import load_and_clean_data
+        from khoitonghop import nap_khoi
+        from tuongquan import nap_tuong_quan
+        df = load_and_clean_data(file_path)
+        khoi = nap_khoi(file_path, df)
+        tq = nap_tuong_quan(file_path, df)
+        for ten in can_tinh:
+            with giai_doan('tong_hop_bieu_do', bieu_do=ten, vung=vung, so_dong=len(df)):
+                du_lieu = SPEC[ten]['tong_hop'](df, khoi, tq)
+            _ghi_dem(_file_dem(thu_muc_ra, vung, ten), {'khoa': khoa[ten], 'du_lieu': du_lieu})
+    return vung, khoa, can_tinh
+
+
+# Giai đoạn 2 (tiến trình con): vẽ một biểu đồ của một vùng từ dữ liệu tổng hợp đã lưu
+def _ve_bieu_do(viec):
+    thu_muc_ra, vung, ten, dinh_dang = viec
+    spec = SPEC[ten]
+    dem = _doc_dem(_file_dem(thu_muc_ra, vung, ten))
+    files = []
+    with giai_doan('ve_bieu_do', bieu_do=ten, vung=vung):
+        fig = Figure(figsize=spec['kich_thuoc'])
+        FigureCanvasAgg(fig)
+        spec['ve'](fig, dem['du_lieu'])
+        fig.tight_layout()
+        for d in dinh_dang:
+            path = os.path.join(thu_muc_ra, vung, f'{ten}.{d}')
+            fig.savefig(path, format=d)
+            files.append(os.path.relpath(path, thu_muc_ra))
+    return vung, ten, files
+
+
+def _ghi_chi_muc(thu_muc_ra, chi_muc):
+    with open(os.path.join(thu_muc_ra, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(chi_muc, f, ensure_ascii=False, indent=2)
+    dong = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8"><title>Báo cáo biểu đồ</title></head><body>']
+    for vung, muc in sorted(chi_muc['vung'].items()):
+        dong.append(f'<h2>{html.escape(vung)}</h2>')
+        for ten, bd in muc.items():
+            anh = next((p for p in bd['files'] if p.endswith('.png')), bd['files'][0])
+            dong.append(f'<figure style="display:inline-block"><a href="{html.escape(anh)}">'
+                        f'<img src="{html.escape(anh)}" width="360"></a>'
+                        f'<figcaption>{html.escape(ten)}</figcaption></figure>')
+    dong.append('</body></html>')
+    with open(os.path.join(thu_muc_ra, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(dong))
+
+
+# Tạo báo cáo cho các file dữ liệu (file, thư mục, glob hoặc danh sách). Trả về chỉ mục báo cáo.
+def tao_bao_cao(nguon, thu_muc_ra='bao_cao_bieu_do', dinh_dang=('png',), bieu_do=None, so_tien_trinh=None):
+    from lamsach import liet_ke_file
+    files = liet_ke_file(nguon)
+    vung_cua = ten_cac_vung(files)
+    ten_bieu_do = list(bieu_do or SPEC)
+    for ten in ten_bieu_do:
+        if ten not in SPEC:
+            raise ValueError(f"Không có biểu đồ {ten!r}; có: {list(SPEC)}")
+    dinh_dang = tuple(dinh_dang)
+    start = time.perf_counter()
+
+    path_chi_muc = os.path.join(thu_muc_ra, 'index.json')
+    try:
+        with open(path_chi_muc, encoding='utf-8') as f:
+            cu = json.load(f)['vung']
+    except (OSError, ValueError, KeyError):
+        cu = {}
+
+    with ProcessPoolExecutor(max_workers=so_tien_trinh) as pool:
+        viec = [(f, vung_cua[f], thu_muc_ra, ten_bieu_do) for f in files]
+        tong_hop = list(pool.map(_tong_hop_vung, viec))
+
+        # Chỉ vẽ lại khi khóa tổng hợp hoặc định dạng đổi, hoặc file ảnh bị mất
+        chi_muc = {'vung': {}}
+        can_ve = []
+        for vung, khoa, _ in tong_hop:
+            os.makedirs(os.path.join(thu_muc_ra, vung), exist_ok=True)
+            chi_muc['vung'][vung] = {}
+            for ten in ten_bieu_do:
+                truoc = cu.get(vung, {}).get(ten)
+                khoa_anh = _khoa(khoa[ten], dinh_dang)
+                if (truoc is not None and truoc['khoa'] == khoa_anh
+                        and all(os.path.exists(os.path.join(thu_muc_ra, p)) for p in truoc['files'])):
+                    chi_muc['vung'][vung][ten] = truoc
+                else:
+                    chi_muc['vung'][vung][ten] = {'khoa': khoa_anh, 'files': []}
+                    can_ve.append((thu_muc_ra, vung, ten, dinh_dang))
+        for vung, ten, files_anh in pool.map(_ve_bieu_do, can_ve):
+            chi_muc['vung'][vung][ten]['files'] = files_anh
+
+    chi_muc['so_bieu_do'] = len(files) * len(ten_bieu_do)
+    chi_muc['so_bieu_do_ve_lai'] = len(can_ve)
+    chi_muc['thoi_gian'] = round(time.perf_counter() - start, 3)
+    _ghi_chi_muc(thu_muc_ra, chi_muc)
+    return chi_muc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tạo báo cáo biểu đồ (không cần giao diện) cho từng vùng")
+    parser.add_argument('nguon', nargs='*', default=['Crop_production_in_India_ok.csv'],
+                        help="file, thư mục hoặc mẫu glob của các file dữ liệu đã làm sạch (mỗi file một vùng)")
+    parser.add_argument('-o', '--out', default='bao_cao_bieu_do', help="thư mục ghi ảnh và index.html/index.json")
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg'], help="định dạng ảnh")
+    parser.add_argument('--charts', nargs='+', choices=list(SPEC), help="chỉ vẽ các biểu đồ này")
+    parser.add_argument('--workers', type=int, default=None, help="số tiến trình (mặc định: số lõi CPU)")
+    args = parser.parse_args(argv)
+
+    chi_muc = tao_bao_cao(args.nguon, args.out, args.format, args.charts, args.workers)
+    print(f"{len(chi_muc['vung'])} vùng, {chi_muc['so_bieu_do']} biểu đồ "
+          f"({chi_muc['so_bieu_do_ve_lai']} vẽ lại) trong {chi_muc['thoi_gian']} giây -> "
+          f"{os.path.join(args.out, 'index.html')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Bộ đệm dạng cột cho bảng dữ liệu đã làm sạch: mỗi cột là một file .npy có kiểu cố định
+# (Crop/Season lưu mã số nguyên kèm danh sách nhãn, Crop_Year int16, các đại lượng float32/float64),
+# kèm schema.json ghi kiểu dữ liệu, số dòng và mã băm nội dung của file CSV nguồn.
+# Khi đọc, các cột được ánh xạ bộ nhớ (memory-mapped) và chỉ mở những cột cần dùng.
+# Dòng mới nối vào cuối file CSV được nối vào bộ đệm tại chỗ (noi_cache): chỉ ghi thêm dữ liệu
+# và sửa kích thước trong tiêu đề .npy; mã băm được nối chuỗi theo từng đoạn (băm đoạn mới rồi
+# băm cùng mã băm cũ) nên chi phí tỷ lệ với phần thêm vào, không với cả file.
+
+PHIEN_BAN = 1
+KIEU_COT = {'Crop_Year': 'int16',
+            'Area': 'float64',
+            'Temperature': 'float32',
+            'Humidity': 'float32',
+            'Wind_Speed': 'float32',
+            'Production': 'float64'}
+COT_PHAN_LOAI = ['Season', 'Crop']
+KIEU_MA = 'int16'
+
+
+def thu_muc_cache(csv_path):
+    return csv_path + '.cache'
+
+
+def _schema_path(csv_path):
+    return os.path.join(thu_muc_cache(csv_path), 'schema.json')
+
+
+def _cot_path(csv_path, col):
+    return os.path.join(thu_muc_cache(csv_path), f'{col}.npy')
+
+
+# Mã băm nội dung file, hoặc đoạn byte [start, end) (đọc theo khối, không nạp cả file vào bộ nhớ)
+def bam_file(path, kich_thuoc_khoi=1 << 24, start=0, end=None):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        con_lai = (os.path.getsize(path) if end is None else end) - start
+        while con_lai > 0:
+            khoi = f.read(min(kich_thuoc_khoi, con_lai))
+            if not khoi:
+                break
+            h.update(khoi)
+            con_lai -= len(khoi)
+    return h.hexdigest()
+
+
+# Mã băm sau khi nối thêm một đoạn có mã băm ma_bam_doan vào file có mã băm ma_bam_truoc
+def noi_ma_bam(ma_bam_truoc, ma_bam_doan):
+    return hashlib.blake2b(f'{ma_bam_truoc}+{ma_bam_doan}'.encode('ascii'), digest_size=16).hexdigest()
+
+
+# Mã băm theo cách đã ghi trong schema: cả file, hoặc nối chuỗi theo các đoạn (vị trí kết thúc từng đoạn)
+def _bam_nguon(csv_path, nguon):
+    doan = nguon.get('doan')
+    if not doan:
+        return bam_file(csv_path)
+    ma_bam = bam_file(csv_path, end=doan[0])
+    for start, end in zip(doan, doan[1:]):
+        ma_bam = noi_ma_bam(ma_bam, bam_file(csv_path, start=start, end=end))
+    return ma_bam
+
+
+def dem_dong(path, kich_thuoc_khoi=1 << 24):
+    so_dong = 0
+    cuoi = b'\n'
+    with open(path, 'rb') as f:
+        for khoi in iter(lambda: f.read(kich_thuoc_khoi), b''):
+            so_dong += khoi.count(b'\n')
+            cuoi = khoi[-1:]
+    # Không tính dòng tiêu đề; dòng cuối có thể không có ký tự xuống dòng
+    return so_dong - 1 + (cuoi != b'\n')
+
+
+def doc_schema(csv_path):
+    try:
+        with open(_schema_path(csv_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _ghi_schema(csv_path, schema):
+    tam = _schema_path(csv_path) + '.tmp'
+    with open(tam, 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+    os.replace(tam, _schema_path(csv_path))
+
+
+# Bộ đệm còn khớp với file CSV không: so kích thước và thời điểm sửa, nếu chỉ thời điểm
+# sửa khác (file được chép lại, touch...) thì so mã băm nội dung
+def cache_moi(csv_path):
+    schema = doc_schema(csv_path)
+    if schema is None or schema.get('phien_ban') != PHIEN_BAN or not os.path.exists(csv_path):
+        return False
+    st = os.stat(csv_path)
+    nguon = schema['nguon']
+    if st.st_size != nguon['size']:
+        return False
+    if st.st_mtime_ns == nguon['mtime_ns']:
+        return True
+    if _bam_nguon(csv_path, nguon) != nguon['hash']:
+        return False
+    nguon['mtime_ns'] = st.st_mtime_ns
+    _ghi_schema(csv_path, schema)
+    return True
+
+
+# Ghi bộ đệm cho file CSV (đã làm sạch). so_dong nếu biết trước (ví dụ từ pipeline) thì khỏi đếm lại.
+def ghi_cache(csv_path, so_dong=None, chunksize=500_000):
+    os.makedirs(thu_muc_cache(csv_path), exist_ok=True)
+    if os.path.exists(_schema_path(csv_path)):
+        os.remove(_schema_path(csv_path))
+    st = os.stat(csv_path)
+    if so_dong is None:
+        so_dong = dem_dong(csv_path)
+
+    cot = list(pd.read_csv(csv_path, nrows=0).columns)
+    kieu = {c: KIEU_MA if c in COT_PHAN_LOAI else KIEU_COT.get(c, 'float64') for c in cot}
+    mang = {c: np.lib.format.open_memmap(_cot_path(csv_path, c), mode='w+', dtype=kieu[c], shape=(so_dong,))
+            for c in cot}
+    nhan = {c: {} for c in cot if c in COT_PHAN_LOAI}
+
+    vi_tri = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype={c: str for c in nhan}):
+        ket_thuc = vi_tri + len(chunk)
+        if ket_thuc > so_dong:
+            raise ValueError(f"{csv_path} có nhiều hơn {so_dong} dòng")
+        for c in cot:
+            if c in nhan:
+                # Mã hóa theo nhãn của khối rồi đổi sang mã chung (theo thứ tự gặp lần đầu)
+                cat = pd.Categorical(chunk[c])
+                ma_chung = np.array([nhan[c].setdefault(v, len(nhan[c])) for v in cat.categories], dtype=kieu[c])
+                mang[c][vi_tri:ket_thuc] = ma_chung[cat.codes]
+            else:
+                mang[c][vi_tri:ket_thuc] = chunk[c].to_numpy(dtype=kieu[c])
+        vi_tri = ket_thuc
+    if vi_tri != so_dong:
+        raise ValueError(f"{csv_path} có {vi_tri} dòng, không phải {so_dong}")
+
+    # Sắp xếp lại nhãn theo thứ tự chữ cái (giống thứ tự của pandas/get_dummies)
+    schema_cot = []
+    for c in cot:
+        muc = {'ten': c, 'dtype': kieu[c]}
+        if c in nhan:
+            categories = sorted(nhan[c])
+            doi_ma = np.empty(len(categories), dtype=kieu[c])
+            doi_ma[[nhan[c][v] for v in categories]] = np.arange(len(categories))
+            mang[c][:] = doi_ma[mang[c]]
+            muc['categories'] = categories
+        mang[c].flush()
+        schema_cot.append(muc)
+    del mang
+
+    _ghi_schema(csv_path, {'phien_ban': PHIEN_BAN,
+                           'so_dong': so_dong,
+                           'nguon': {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': bam_file(csv_path)},
+                           'cot': schema_cot})
+    return doc_schema(csv_path)
+
+
+# Nối mang vào cuối file .npy một chiều tại chỗ: ghi dữ liệu rồi sửa kích thước trong tiêu đề
+# (numpy chừa sẵn chỗ cho kích thước tăng). Trả về False nếu tiêu đề không đủ chỗ.
+def _noi_npy(path, mang):
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            do_dai_truong = 2
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            do_dai_truong = 4
+        offset = f.tell()
+        if fortran_order or len(shape) != 1 or dtype != mang.dtype:
+            raise ValueError(f"{path} không phải mảng một chiều kiểu {mang.dtype}")
+        tieu_de = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+                        'shape': (shape[0] + len(mang),)})
+        cho = offset - np.lib.format.MAGIC_LEN - do_dai_truong
+        if len(tieu_de) + 1 > cho:
+            return False
+        f.seek(offset + shape[0] * dtype.itemsize)
+        f.write(np.ascontiguousarray(mang).tobytes())
+        f.truncate()
+        f.seek(np.lib.format.MAGIC_LEN + do_dai_truong)
+        f.write((tieu_de.ljust(cho - 1) + '\n').encode('latin1'))
+    return True
+
+
+# Nối bộ đệm sau khi các dòng df (đã làm sạch) được ghi thêm vào cuối file CSV. schema là schema
+# trước khi nối (lúc bộ đệm còn khớp). Chi phí tỷ lệ với số dòng mới; chỉ khi có nhãn Crop/Season
+# mới thì cột mã của nhãn đó được đổi mã lại (giữ danh sách nhãn theo thứ tự chữ cái).
+def noi_cache(csv_path, schema, df):
+    nguon = schema['nguon']
+    st = os.stat(csv_path)
+    ma_bam_doan = bam_file(csv_path, start=nguon['size'])
+    for muc in schema['cot']:
+        c, path = muc['ten'], _cot_path(csv_path, muc['ten'])
+        if 'categories' in muc:
+            nhan = df[c].astype(str).to_numpy()
+            gop = sorted(set(muc['categories']) | set(np.unique(nhan).tolist()))
+            if gop != muc['categories']:
+                cu = np.load(path, mmap_mode='r+')
+                cu[:] = np.searchsorted(gop, muc['categories']).astype(muc['dtype'])[cu]
+                cu.flush()
+                del cu
+                muc['categories'] = gop
+            values = np.searchsorted(gop, nhan).astype(muc['dtype'])
+        else:
+            values = df[c].to_numpy(dtype=muc['dtype'])
+        if not _noi_npy(path, values):
+            np.save(path, np.concatenate([np.load(path), values]))
+
+    schema['so_dong'] += len(df)
+    schema['nguon'] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                       'hash': noi_ma_bam(nguon['hash'], ma_bam_doan),
+                       'doan': nguon.get('doan', [nguon['size']]) + [st.st_size]}
+    _ghi_schema(csv_path, schema)
+    return doc_schema(csv_path)
+
+
+# Đọc các cột dạng mảng numpy ánh xạ bộ nhớ (không sao chép); Crop/Season trả về mã số nguyên,
+# danh sách nhãn nằm trong schema. Trả về (None, None) nếu bộ đệm không còn khớp với file CSV.
+def doc_cot(csv_path, columns=None):
+    if not cache_moi(csv_path):
+        return None, None
+    schema = doc_schema(csv_path)
+    cot = [m['ten'] for m in schema['cot']]
+    for c in columns or []:
+        if c not in cot:
+            raise KeyError(f"Cột {c} không có trong bộ đệm của {csv_path}")
+    return {c: np.load(_cot_path(csv_path, c), mmap_mode='r') for c in (columns or cot)}, schema
+
+
+# Đọc bảng dữ liệu: dùng bộ đệm nếu còn khớp, nếu không thì tạo lại bộ đệm (hoặc đọc CSV nếu tao_cache=False)
+def doc_bang(csv_path, columns=None, tao_cache=True):
+    mang, schema = doc_cot(csv_path, columns)
+    if mang is None:
+        if not tao_cache:
+            return pd.read_csv(csv_path, usecols=columns)[columns] if columns else pd.read_csv(csv_path)
+        ghi_cache(csv_path)
+        mang, schema = doc_cot(csv_path, columns)
+    nhan = {m['ten']: m['categories'] for m in schema['cot'] if 'categories' in m}
+    return pd.DataFrame({c: pd.Categorical.from_codes(a, categories=nhan[c]) if c in nhan else np.asarray(a)
+                         for c, a in mang.items()})
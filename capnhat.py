@@ -0,0 +1,270 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from bodem import cache_moi, doc_schema, noi_cache, thu_muc_cache
+from goimohinh import GoiMoHinh
+from hoiquy_tangdan import (chuan_bi_doc, file_phuong_trinh, huan_luyen_ngoai_bo_nho, luu_phuong_trinh,
+                            nap_phuong_trinh, _tich_luy_khoi)
+from khoitonghop import KhoiTongHop, file_khoi
+from kiemtra import file_cach_ly, luu_bam_dong, nap_bam_dong
+from lamsach import KICH_THUOC_KHOI_MB, chay_pipeline, gop_phan_vung, liet_ke_file
+from phanvung import noi_phan_vung
+from thongke import StreamingStats, file_thong_ke_mo_ta
+from tuongquan import BangTuongQuan, file_tuong_quan
+
+# Nạp thêm dữ liệu (vụ/năm mới) mà không chạy lại toàn bộ: chỉ làm sạch phần mới của các file nguồn
+# (phần nối thêm vào cuối file đã làm sạch lần trước, hoặc cả file nguồn mới), nối vào file đã làm
+# sạch và bộ đệm dạng cột, rồi gộp phần mới vào các trạng thái gộp được đã lưu theo mã băm dữ liệu:
+# khối tổng hợp, thống kê mô tả, hệ phương trình chuẩn train/test của mô hình tuyến tính (và gói
+# mô hình của Hoiquydabien.py --out-of-core giải từ đó). Dòng mới được chia train/test theo khóa
+# nội dung dòng như khi huấn luyện lại từ đầu.
+# Chi phí tỷ lệ với lượng dữ liệu mới; trạng thái nào không khớp dữ liệu cũ thì bỏ qua (tính lại khi dùng).
+# Dòng mới trùng nhau hoặc trùng dòng đã có (so mã băm dòng lưu cạnh bộ đệm, kiemtra.file_bam_dong) bị
+# bỏ như khi làm sạch lại từ đầu. Hàng rào ngoại lai tính trên thống kê của dữ liệu đã có gộp với dữ liệu
+# mới, nhưng chỉ áp cho dòng mới: dòng cũ không bị xét lại, nên kết quả chỉ trùng với chạy lại
+# lamsachdulieu.py khi hàng rào dịch chuyển không làm đổi kết luận ngoại lai của dòng cũ nào.
+# Dòng bị loại nối vào file cách ly.
+# Vị trí đã xử lý của từng file nguồn lưu trong <file sạch>.cache/nap_them.json (lamsachdulieu.py ghi mốc).
+
+FILE_NGUON = 'Crop_production_in_India.csv'
+FILE_SACH = 'Crop_production_in_India_ok.csv'
+FILE_GOI = 'mo_hinh_da_bien.bundle.json'  # gói của Hoiquydabien.py ở chế độ --out-of-core
+CAU_HINH_GOI = {'out_of_core': True, 'test_size': 0.2, 'seed': 42}
+PHIEN_BAN = 1
+SO_BYTE_DUOI = 4096  # đoạn đầu/cuối phần đã xử lý dùng để phát hiện file nguồn bị sửa (không chỉ nối thêm)
+
+
+def file_trang_thai(csv_sach):
+    return os.path.join(thu_muc_cache(csv_sach), 'nap_them.json')
+
+
+def _bam_doan(path, tu, den):
+    with open(path, 'rb') as f:
+        f.seek(tu)
+        return hashlib.blake2b(f.read(den - tu), digest_size=16).hexdigest()
+
+
+def doc_trang_thai(csv_sach):
+    try:
+        with open(file_trang_thai(csv_sach), encoding='utf-8') as f:
+            trang_thai = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return trang_thai if trang_thai.get('phien_ban') == PHIEN_BAN else None
+
+
+def _ghi_trang_thai(csv_sach, trang_thai):
+    os.makedirs(thu_muc_cache(csv_sach), exist_ok=True)
+    tam = file_trang_thai(csv_sach) + '.tmp'
+    with open(tam, 'w', encoding='utf-8') as f:
+        json.dump(trang_thai, f, ensure_ascii=False, indent=2)
+    os.replace(tam, file_trang_thai(csv_sach))
+
+
+def _moc(path, vi_tri):
+    return {'vi_tri': vi_tri, 'dau': _bam_doan(path, 0, min(vi_tri, SO_BYTE_DUOI)),
+            'duoi': _bam_doan(path, max(vi_tri - SO_BYTE_DUOI, 0), vi_tri)}
+
+
+# Ghi mốc sau khi làm sạch toàn bộ: các file nguồn đã được xử lý đến hết
+def ghi_moc(csv_sach, nguon=FILE_NGUON):
+    _ghi_trang_thai(csv_sach, {'phien_ban': PHIEN_BAN,
+                               'nguon': {os.path.normpath(p): _moc(p, os.path.getsize(p)) for p in liet_ke_file(nguon)},
+                               'lich_su': []})
+
+
+# Đoạn byte mới [tu, den) của một file nguồn; den dừng ở cuối dòng hoàn chỉnh cuối cùng
+# (dòng đang ghi dở được để lại cho lần sau)
+def _doan_moi(path, moc):
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        tu = len(f.readline()) if moc is None else moc['vi_tri']
+        if moc is not None and (size < tu or _moc(path, tu) != moc):
+            raise ValueError(f"{path} đã bị sửa hoặc cắt bớt (không chỉ nối thêm), cần chạy lại lamsachdulieu.py")
+        den = size
+        while den > tu:
+            f.seek(max(den - 65536, tu))
+            buf = f.read(den - max(den - 65536, tu))
+            cuoi = buf.rfind(b'\n')
+            if cuoi >= 0:
+                den = max(den - 65536, tu) + cuoi + 1
+                break
+            den = max(den - 65536, tu)
+    return tu, den
+
+
+def _noi_phan_vung(files, dich):
+    with open(dich, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        thieu_xuong_dong = f.read(1) != b'\n'
+    with open(dich, 'ab') as out:
+        if thieu_xuong_dong:
+            out.write(b'\n')
+        for path in files:
+            with open(path, 'rb') as f:
+                f.readline()
+                shutil.copyfileobj(f, out)
+
+
+# Trạng thái đã lưu chỉ được cập nhật nếu nó tương ứng đúng dữ liệu trước khi nối
+def _cap_nhat_khoi(csv_sach, khoi_moi, ma_bam_cu, ma_bam_moi):
+    try:
+        khoi = KhoiTongHop.load(file_khoi(csv_sach))
+    except (OSError, ValueError, KeyError):
+        return False
+    if khoi.ma_bam != ma_bam_cu:
+        return False
+    khoi.merge(khoi_moi).save(file_khoi(csv_sach), ma_bam=ma_bam_moi)
+    return True
+
+
+def _cap_nhat_tuong_quan(csv_sach, df_moi, ma_bam_cu, ma_bam_moi):
+    try:
+        bang = BangTuongQuan.load(file_tuong_quan(csv_sach))
+    except (OSError, ValueError, KeyError):
+        return False
+    if bang.ma_bam != ma_bam_cu:
+        return False
+    bang.update(df_moi).save(file_tuong_quan(csv_sach), ma_bam=ma_bam_moi)
+    return True
+
+
+def _thong_ke_cu(csv_sach, ma_bam_cu):
+    try:
+        stats, ma_bam = StreamingStats.load(file_thong_ke_mo_ta(csv_sach))
+    except (OSError, ValueError, KeyError, EOFError):
+        return None
+    return stats if ma_bam == ma_bam_cu else None
+
+
+# Hệ phương trình chuẩn train/test sau khi nối: cộng phần của các dòng [n_cu, n_moi) vào trạng thái
+# đã lưu, hoặc tính từ đầu (một lần) nếu chưa có trạng thái khớp. Trả về (train, test, có tính từ đầu không).
+def _cap_nhat_phuong_trinh(csv_sach, n_cu, n_moi, ma_bam_cu, test_size, seed):
+    encoder, _ = chuan_bi_doc(csv_sach)
+    try:
+        train, test, meta = nap_phuong_trinh(file_phuong_trinh(csv_sach))
+        khop = meta['ma_bam'] == ma_bam_cu and meta['cau_hinh'] == {'test_size': test_size, 'seed': seed}
+    except (OSError, ValueError, KeyError):
+        khop = False
+    if not khop:
+        _, train, test = huan_luyen_ngoai_bo_nho(csv_sach, test_size=test_size, seed=seed)
+        return train, test, True
+    if train.feature_names != list(encoder.feature_names_):
+        train, test = train.doi_ma_hoa(encoder), test.doi_ma_hoa(encoder)
+    tr, te = _tich_luy_khoi((('cache', csv_sach, n_cu, n_moi), encoder, test_size, seed))
+    return train.merge(tr), test.merge(te), False
+
+
+# Nạp phần mới của các file nguồn (mặc định file nguồn gốc) vào file đã làm sạch và các trạng thái.
+# Trả về dict tóm tắt lần nạp.
+def cap_nhat(nguon=FILE_NGUON, csv_sach=FILE_SACH, goi=FILE_GOI, so_tien_trinh=None,
+             kich_thuoc_khoi_mb=KICH_THUOC_KHOI_MB):
+    start = time.perf_counter()
+    trang_thai = doc_trang_thai(csv_sach)
+    if trang_thai is None:
+        raise ValueError(f"Chưa có mốc nạp dữ liệu của {csv_sach}, cần chạy lamsachdulieu.py trước")
+    if trang_thai.get('dang_nap') is not None:
+        raise ValueError(f"Lần nạp trước vào {csv_sach} bị gián đoạn giữa chừng, cần chạy lại lamsachdulieu.py")
+    if not cache_moi(csv_sach):
+        raise ValueError(f"Bộ đệm của {csv_sach} không khớp với file, cần chạy lại lamsachdulieu.py")
+    schema = doc_schema(csv_sach)
+    n_cu, ma_bam_cu = schema['so_dong'], schema['nguon']['hash']
+    bam_cu = nap_bam_dong(csv_sach, ma_bam_cu)
+    if bam_cu is None:
+        raise ValueError(f"Chưa có mã băm dòng khớp với {csv_sach}, cần chạy lại lamsachdulieu.py")
+
+    files = liet_ke_file(nguon)
+    doan = {p: _doan_moi(p, trang_thai['nguon'].get(os.path.normpath(p))) for p in files}
+    doan = {p: d for p, d in doan.items() if d[1] > d[0]}
+    tom_tat = {'so_dong_vao': 0, 'so_dong_ra': 0, 'so_dong': n_cu, 'file': sorted(doan)}
+    if not doan:
+        return tom_tat
+
+    thu_muc_phan_vung = os.path.join(thu_muc_cache(csv_sach), 'nap_them_parts')
+    stats_cu = _thong_ke_cu(csv_sach, ma_bam_cu)
+    ket_qua = chay_pipeline(list(doan), thu_muc_phan_vung, kich_thuoc_khoi_mb, so_tien_trinh, doan=doan,
+                            bam_cu=bam_cu, stats_nen=stats_cu)
+    tom_tat.update(so_dong_vao=ket_qua.so_dong_vao, so_dong_ra=ket_qua.so_dong_ra,
+                   cach_ly=ket_qua.tom_tat_cach_ly())
+    if ket_qua.files_cach_ly:
+        if os.path.exists(file_cach_ly(csv_sach)):
+            _noi_phan_vung(ket_qua.files_cach_ly, file_cach_ly(csv_sach))
+        else:
+            gop_phan_vung(ket_qua.files_cach_ly, file_cach_ly(csv_sach))
+    if ket_qua.so_dong_ra > 0:
+        # Đánh dấu đang nối: nếu dừng giữa chừng, lần sau không nối trùng mà báo cần làm lại từ đầu
+        trang_thai['dang_nap'] = {'size': schema['nguon']['size']}
+        _ghi_trang_thai(csv_sach, trang_thai)
+        _noi_phan_vung(ket_qua.files, csv_sach)
+        df_moi = pd.concat([pd.read_csv(f) for f in ket_qua.files], ignore_index=True)
+        schema = noi_cache(csv_sach, schema, df_moi)
+        ma_bam_moi = schema['nguon']['hash']
+        tom_tat['so_dong'] = schema['so_dong']
+
+        tom_tat['khoi'] = _cap_nhat_khoi(csv_sach, ket_qua.khoi, ma_bam_cu, ma_bam_moi)
+        tom_tat['tuong_quan'] = _cap_nhat_tuong_quan(csv_sach, df_moi, ma_bam_cu, ma_bam_moi)
+        tom_tat['thong_ke'] = stats_cu is not None
+        tom_tat['phan_vung'] = noi_phan_vung(csv_sach, df_moi, ma_bam_cu, ma_bam_moi)
+        if stats_cu is not None:
+            stats_cu.merge(ket_qua.stats).save(file_thong_ke_mo_ta(csv_sach), ma_bam_moi)
+        train, test, tu_dau = _cap_nhat_phuong_trinh(csv_sach, n_cu, schema['so_dong'], ma_bam_cu,
+                                                     CAU_HINH_GOI['test_size'], CAU_HINH_GOI['seed'])
+        luu_phuong_trinh(file_phuong_trinh(csv_sach), train, test, ma_bam_moi,
+                         {'test_size': CAU_HINH_GOI['test_size'], 'seed': CAU_HINH_GOI['seed']})
+        model = train.solve()
+        ket_qua_train, ket_qua_test = train.danh_gia(model), test.danh_gia(model)
+        metrics = {'train_r2': ket_qua_train['r2'], 'train_mse': ket_qua_train['mse'],
+                   'test_r2': ket_qua_test['r2'], 'test_mse': ket_qua_test['mse']}
+        GoiMoHinh.tu_mo_hinh(model, train.encoder, ma_bam_moi, metrics, CAU_HINH_GOI).save(goi)
+        tom_tat.update(mo_hinh_tu_dau=tu_dau, metrics=metrics)
+    # Lưu cả mã băm của dòng mới bị cách ly vì ngoại lai (như lượt làm sạch từ đầu)
+    luu_bam_dong(csv_sach, ket_qua.bam, schema['nguon']['hash'])
+    shutil.rmtree(thu_muc_phan_vung, ignore_errors=True)
+
+    trang_thai.pop('dang_nap', None)
+    for p, (_, den) in doan.items():
+        trang_thai['nguon'][os.path.normpath(p)] = _moc(p, den)
+    tom_tat['thoi_gian'] = time.perf_counter() - start
+    trang_thai['lich_su'].append({'thoi_diem': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                                  **{k: tom_tat[k] for k in ('file', 'so_dong_vao', 'so_dong_ra', 'so_dong', 'thoi_gian')}})
+    _ghi_trang_thai(csv_sach, trang_thai)
+    return tom_tat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nạp thêm dữ liệu mới (nối vào cuối file nguồn hoặc file mới) "
+                                                 "mà không làm sạch và huấn luyện lại toàn bộ")
+    parser.add_argument('nguon', nargs='*', default=[FILE_NGUON],
+                        help="file nguồn (phần nối thêm từ lần trước) hoặc file mới, thư mục, mẫu glob")
+    parser.add_argument('--sach', default=FILE_SACH, help="file dữ liệu đã làm sạch cần cập nhật")
+    parser.add_argument('--goi', default=FILE_GOI, help="file gói mô hình cập nhật từ hệ phương trình chuẩn")
+    parser.add_argument('--workers', type=int, default=None, help="số tiến trình (mặc định: số lõi CPU)")
+    args = parser.parse_args(argv)
+
+    tom_tat = cap_nhat(args.nguon, args.sach, args.goi, args.workers)
+    if not tom_tat['so_dong_vao']:
+        print("Không có dữ liệu mới")
+        return
+    print(f"Đã nạp {tom_tat['so_dong_vao']} dòng -> {tom_tat['so_dong_ra']} dòng hợp lệ từ {', '.join(tom_tat['file'])} "
+          f"({tom_tat['cach_ly']}); {args.sach} có {tom_tat['so_dong']} dòng ({tom_tat['thoi_gian']:.3f} giây)")
+    if tom_tat['so_dong_ra']:
+        for ten, ok in (('khối tổng hợp', tom_tat['khoi']), ('bảng tương quan', tom_tat['tuong_quan']),
+                        ('thống kê mô tả', tom_tat['thong_ke'])):
+            if not ok:
+                print(f"  {ten}: không có trạng thái khớp dữ liệu cũ, sẽ tính lại khi dùng")
+        if tom_tat['phan_vung'] is False:
+            print("  phân vùng: không khớp dữ liệu cũ, bỏ qua khi đọc cho tới khi ghi lại (phanvung.py)")
+        if tom_tat['mo_hinh_tu_dau']:
+            print("  hệ phương trình chuẩn: chưa có trạng thái khớp dữ liệu cũ, đã tính từ đầu")
+        print(f"  mô hình ({args.goi}): Train R² {tom_tat['metrics']['train_r2']:.4f}, "
+              f"Test R² {tom_tat['metrics']['test_r2']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
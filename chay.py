@@ -0,0 +1,219 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Điểm vào chung: python chay.py <lệnh> [tham số...]
+#   clean    làm sạch dữ liệu gốc, ghi bộ đệm dạng cột/phân vùng (lamsachdulieu.py)
+#   stats    bảng thống kê mô tả các cột số (thongke.py)
+#   train    nạp hoặc huấn luyện mô hình đa biến (Hoiquydabien.py), --nhom: họ mô hình theo nhóm (mohinhnhom.py)
+#   predict  dự báo một bản ghi từ gói mô hình đã lưu, kèm khoảng dự báo nếu có (dichvudubao.py, khoangdubao.py)
+#   chart    vẽ các biểu đồ được chọn (Bieudo.py), --headless: báo cáo biểu đồ không cần màn hình
+#   gui      ứng dụng Tkinter (demosanpham.py)
+#   khoi-dong  đo thời gian khởi động nguội của từng lệnh
+# Module này chỉ import thư viện chuẩn; mỗi lệnh import module của nó khi được gọi, nên predict chỉ
+# cần numpy (không nạp pandas/sklearn/matplotlib), chart bar_chart không nạp seaborn, v.v.
+
+FILE_DU_LIEU = 'Crop_production_in_India_ok.csv'
+FILE_GOI = 'mo_hinh_da_bien.bundle.json'  # gói của Hoiquydabien.py
+THU_VIEN_NANG = ('pandas', 'scipy', 'sklearn', 'matplotlib', 'seaborn')
+SO_LAN_DO = 5
+
+# Module mà mỗi lệnh import trước khi bắt đầu làm việc; gui lấy các import ở đầu demosanpham.py
+# (phần chạy trước khi dựng cửa sổ) vì import chính module đó sẽ mở cửa sổ
+NAP = {
+    'clean': ['lamsachdulieu'],
+    'stats': ['thongke'],
+    'train': ['Hoiquydabien'],
+    'predict': ['dichvudubao', 'goimohinh', 'khoangdubao'],
+    'chart': ['Bieudo'],
+    'gui': None,
+}
+
+
+def _clean(argv):
+    from lamsachdulieu import main
+    main(argv)
+
+
+def _stats(argv):
+    parser = argparse.ArgumentParser(prog='chay.py stats', description="Thống kê mô tả các cột số")
+    parser.add_argument('file', nargs='?', default=FILE_DU_LIEU)
+    args = parser.parse_args(argv)
+    from thongke import nap_thong_ke_mo_ta
+    print(nap_thong_ke_mo_ta(args.file).descriptive().to_string(index=False))
+
+
+def _train(argv):
+    parser = argparse.ArgumentParser(prog='chay.py train', description="Nạp hoặc huấn luyện mô hình dự báo")
+    parser.add_argument('file', nargs='?', default=FILE_DU_LIEU)
+    parser.add_argument('--out-of-core', action='store_true', help="huấn luyện theo khối, không cần sklearn")
+    parser.add_argument('--nhom', action='store_true',
+                        help="huấn luyện họ mô hình theo nhóm; các tham số còn lại chuyển cho mohinhnhom.py")
+    args, con_lai = parser.parse_known_args(argv)
+    if args.nhom:
+        from mohinhnhom import main
+        main([args.file] + con_lai)
+        return
+    if con_lai:
+        parser.error(f"tham số không hợp lệ: {' '.join(con_lai)}")
+    from Hoiquydabien import FILE_GOI as file_goi, nap_mo_hinh
+    goi, da_huan_luyen = nap_mo_hinh(args.file, args.out_of_core)
+    print(f"{'Đã huấn luyện lại' if da_huan_luyen else 'Dùng mô hình đã lưu'}: {file_goi} ({goi.thoi_diem})")
+    for k in ('train_r2', 'test_r2', 'train_mse', 'test_mse'):
+        print(f"{k}: {goi.metrics[k]:.4f}")
+
+
+def _doc_gia_tri(s):
+    c, _, v = s.partition('=')
+    if not c or not v:
+        raise argparse.ArgumentTypeError(f"Giá trị phải có dạng cot=gia_tri, không phải {s!r}")
+    return c, v
+
+
+def _predict(argv):
+    parser = argparse.ArgumentParser(prog='chay.py predict', description="Dự báo sản lượng từ gói mô hình đã lưu")
+    parser.add_argument('gia_tri', type=_doc_gia_tri, nargs='+', metavar='COT=GIA_TRI',
+                        help="ví dụ Crop_Year=2000 Area=100 Temperature=30 Humidity=60 Wind_Speed=10 "
+                             "Crop=Rice Season=Kharif")
+    parser.add_argument('--model', default=FILE_GOI,
+                        help="gói mô hình (JSON) hoặc họ mô hình theo nhóm (.npz, xem mohinhnhom.py)")
+    parser.add_argument('--file', default=FILE_DU_LIEU,
+                        help="dữ liệu dùng để dựng khoảng dự báo nếu chưa có bản lưu khớp với gói")
+    parser.add_argument('--khong-khoang', action='store_true', help="chỉ in giá trị dự báo")
+    args = parser.parse_args(argv)
+
+    from dichvudubao import BoDuBao, nap_bo_du_bao
+    record = dict(args.gia_tri)
+    if args.model.endswith('.npz'):
+        print(f"Dự báo sản lượng: {nap_bo_du_bao(args.model).du_bao_mot(record):.2f} tấn")
+        return
+    from goimohinh import GoiMoHinh
+    goi = GoiMoHinh.load(args.model)
+    y = BoDuBao.tu_goi(goi).du_bao_mot(record)
+    print(f"Dự báo sản lượng: {y:.2f} tấn")
+    if args.khong_khoang:
+        return
+    # Bản lưu cạnh gói thường đã có (Hoiquydabien.py/demosanpham.py dựng lần đầu); chỉ khi thiếu
+    # hoặc lệch gói mới phải đọc dữ liệu để dựng lại
+    from khoangdubao import MUC, nap_hoac_tao
+    khoang, _ = nap_hoac_tao(args.model, args.file, goi)
+    thap, cao = khoang.khoang(record, y)
+    print(f"Khoảng dự báo {MUC:.0%}: {thap:.2f} .. {cao:.2f} tấn")
+
+
+def _chart(argv):
+    if '--headless' in argv:
+        # Báo cáo không cần màn hình không đi qua Bieudo.py để khỏi nạp pyplot
+        from baocaobieudo import main
+        main([a for a in argv if a != '--headless'])
+        return
+    from Bieudo import main
+    main(argv)
+
+
+def _gui(argv):
+    from demosanpham import main
+    main()
+
+
+LENH = {'clean': _clean, 'stats': _stats, 'train': _train, 'predict': _predict, 'chart': _chart, 'gui': _gui}
+
+
+# Tên các module được import ở cấp cao nhất của một file nguồn (không chạy file)
+def _import_dau_file(path):
+    with open(path, encoding='utf-8') as f:
+        cay = ast.parse(f.read(), path)
+    ten = []
+    for nut in cay.body:
+        if isinstance(nut, ast.Import):
+            ten += [a.name for a in nut.names]
+        elif isinstance(nut, ast.ImportFrom) and nut.module and not nut.level:
+            ten.append(nut.module)
+    return ten
+
+
+def module_cua_lenh(lenh):
+    if NAP[lenh] is not None:
+        return NAP[lenh]
+    return _import_dau_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'demosanpham.py'))
+
+
+# Chạy trong tiến trình con của khoi-dong: import các module của lệnh rồi báo thời gian import
+# và các thư viện nặng bị nạp theo
+def _chi_nap(lenh):
+    import importlib
+    start = time.perf_counter()
+    for m in module_cua_lenh(lenh):
+        importlib.import_module(m)
+    thoi_gian = time.perf_counter() - start
+    print(json.dumps({'import_ms': thoi_gian * 1000,
+                      'thu_vien': [t for t in THU_VIEN_NANG if t in sys.modules]}))
+
+
+# Đo khởi động nguội: mỗi lần là một tiến trình Python mới (tính cả thời gian khởi động trình thông dịch);
+# dòng "python" là mốc của trình thông dịch trống
+def do_khoi_dong(cac_lenh, so_lan=SO_LAN_DO):
+    env = dict(os.environ, MPLBACKEND='Agg')
+    env.pop('THEODOI', None)
+    ket_qua = {}
+    for lenh in ['python'] + list(cac_lenh):
+        lenh_con = [sys.executable, '-c', 'pass'] if lenh == 'python' else \
+            [sys.executable, os.path.abspath(__file__), '--chi-nap', lenh]
+        tong, nap = [], []
+        for _ in range(so_lan):
+            start = time.perf_counter()
+            ra = subprocess.run(lenh_con, env=env, capture_output=True, text=True, check=True).stdout
+            tong.append((time.perf_counter() - start) * 1000)
+            if lenh != 'python':
+                bao_cao = json.loads(ra.strip().splitlines()[-1])
+                nap.append(bao_cao['import_ms'])
+        tong.sort()
+        nap.sort()
+        ket_qua[lenh] = {'min_ms': tong[0], 'trung_vi_ms': tong[len(tong) // 2],
+                         'import_ms': nap[len(nap) // 2] if nap else 0.0,
+                         'thu_vien': [] if lenh == 'python' else bao_cao['thu_vien']}
+    return ket_qua
+
+
+def _khoi_dong(argv):
+    parser = argparse.ArgumentParser(prog='chay.py khoi-dong', description="Đo thời gian khởi động nguội của các lệnh")
+    parser.add_argument('lenh', nargs='*', metavar='LENH',
+                        help=f"các lệnh cần đo (mặc định: tất cả): {', '.join(NAP)}")
+    parser.add_argument('-n', '--so-lan', type=int, default=SO_LAN_DO, help="số lần chạy mỗi lệnh")
+    parser.add_argument('-o', '--out', help="ghi kết quả ra file JSON")
+    args = parser.parse_args(argv)
+    khong_ro = [t for t in args.lenh if t not in NAP]
+    if khong_ro:
+        parser.error(f"lệnh không hợp lệ: {', '.join(khong_ro)}")
+    ket_qua = do_khoi_dong(args.lenh or list(NAP), args.so_lan)
+    print(f"{'lệnh':<10} {'min (ms)':>9} {'trung vị':>9} {'import':>9}  thư viện nặng")
+    for lenh, r in ket_qua.items():
+        print(f"{lenh:<10} {r['min_ms']:9.0f} {r['trung_vi_ms']:9.0f} {r['import_ms']:9.0f}  "
+              f"{', '.join(r['thu_vien']) or '-'}")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(ket_qua, f, indent=2, ensure_ascii=False)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ['--chi-nap']:
+        _chi_nap(argv[1])
+        return
+    parser = argparse.ArgumentParser(description="Phân tích và dự báo sản lượng cây trồng",
+                                     epilog="Dùng 'chay.py <lệnh> --help' để xem tham số của từng lệnh.")
+    parser.add_argument('lenh', choices=list(LENH) + ['khoi-dong'])
+    parser.add_argument('tham_so', nargs=argparse.REMAINDER, help="tham số của lệnh")
+    args = parser.parse_args(argv[:1])
+    if args.lenh == 'khoi-dong':
+        _khoi_dong(argv[1:])
+    else:
+        LENH[args.lenh](argv[1:])
+
+
+if __name__ == "__main__":
+    main()
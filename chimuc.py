@@ -0,0 +1,140 @@
+import bisect
+import re
+
+import numpy as np
+import pandas as pd
+
+# Chỉ mục tìm kiếm cho tab "Tra cứu": các dòng được sắp theo ô (loại cây, năm) một lần khi
+# dựng chỉ mục, mỗi ô là một đoạn liên tiếp trong mảng hoán vị (danh sách đảo - posting list).
+# Truy vấn chỉ so khớp trên danh sách nhãn (vài loại cây, vài chục năm) để chọn các ô, rồi
+# kết quả là nối các đoạn của những ô đó: đếm số dòng và lấy một trang không phụ thuộc số dòng.
+
+# "1995-2000" hoặc "1995..2000": tìm theo khoảng năm
+MAU_KHOANG_NAM = re.compile(r'^\s*(\d{1,4})\s*(?:-|\.\.)\s*(\d{1,4})\s*$')
+
+
+def _chuan_hoa(s):
+    return str(s).strip().lower()
+
+
+class KetQuaTimKiem:
+    # o: các ô được chọn (chỉ số phẳng cây * số năm + năm), theo thứ tự tăng dần
+    def __init__(self, chi_muc, o):
+        self.chi_muc = chi_muc
+        dau, cuoi = chi_muc.offsets[o], chi_muc.offsets[o + 1]
+        co = cuoi > dau
+        self.dau = dau[co]
+        self.tich_luy = np.concatenate([[0], np.cumsum(cuoi[co] - dau[co])])
+
+    def __len__(self):
+        return int(self.tich_luy[-1])
+
+    # Chỉ số dòng (theo vị trí trong bảng) của các kết quả thứ [start, stop)
+    def lay(self, start, stop):
+        stop = min(stop, len(self))
+        if start >= stop:
+            return np.empty(0, dtype=np.int64)
+        i = int(np.searchsorted(self.tich_luy, start, side='right')) - 1
+        phan = []
+        while start < stop:
+            trong_doan = start - self.tich_luy[i]
+            n = min(stop, self.tich_luy[i + 1]) - start
+            bat_dau = self.dau[i] + trong_doan
+            phan.append(self.chi_muc.perm[bat_dau:bat_dau + n])
+            start += n
+            i += 1
+        return np.concatenate(phan).astype(np.int64)
+
+
+class ChiMucTimKiem:
+    def __init__(self, crop, year):
+        crop = pd.Series(crop)
+        if isinstance(crop.dtype, pd.CategoricalDtype):
+            self.nhan_cay = [str(v) for v in crop.cat.categories]
+            ma_cay = crop.cat.codes.to_numpy().astype(np.int64)
+        else:
+            ma_cay, nhan = pd.factorize(crop, sort=True)
+            self.nhan_cay = [str(v) for v in nhan]
+        year = np.asarray(year)
+        if year.dtype.kind in 'iu' and len(year):
+            # Năm là số nguyên trong một khoảng nhỏ: đếm thay cho sắp xếp
+            lech = year.astype(np.int64) - int(year.min())
+            co = np.bincount(lech) > 0
+            self.nam = np.flatnonzero(co) + int(year.min())
+            ma_nam = (np.cumsum(co) - 1)[lech]
+        else:
+            self.nam, ma_nam = np.unique(year, return_inverse=True)
+            ma_nam = ma_nam.ravel()
+
+        # Chỉ mục tiền tố: tên đã chuẩn hóa (chữ thường) sắp xếp kèm mã loại cây
+        self._ten = [_chuan_hoa(v) for v in self.nhan_cay]
+        self._tien_to = sorted((t, i) for i, t in enumerate(self._ten))
+        self._khoa_tien_to = [t for t, _ in self._tien_to]
+        self._chuoi_nam = [str(v) for v in self.nam]
+
+        # Sắp các dòng theo ô (cây, năm); offsets[o]..offsets[o+1] là các dòng của ô o
+        so_nam = len(self.nam)
+        khoa = ma_cay * so_nam + ma_nam
+        if (ma_cay < 0).any():
+            raise ValueError("Cột loại cây có giá trị khuyết")
+        so_o = len(self.nhan_cay) * so_nam
+        # Khóa 16 bit thì numpy dùng radix sort (sắp xếp ổn định, tuyến tính theo số dòng)
+        if so_o <= np.iinfo(np.uint16).max:
+            khoa = khoa.astype(np.uint16)
+        kieu = np.int32 if len(khoa) < 2 ** 31 else np.int64
+        self.perm = np.argsort(khoa, kind='stable').astype(kieu)
+        dem = np.bincount(khoa, minlength=so_o)
+        self.offsets = np.concatenate([[0], np.cumsum(dem)])
+
+    @classmethod
+    def tu_bang(cls, df, cot_cay='Crop', cot_nam='Crop_Year'):
+        return cls(df[cot_cay], df[cot_nam].to_numpy())
+
+    def __len__(self):
+        return len(self.perm)
+
+    # Các hàm so khớp trả về mặt nạ trên danh sách nhãn (loại cây hoặc năm)
+    def cay_chua(self, chuoi):
+        chuoi = _chuan_hoa(chuoi)
+        return np.array([chuoi in t for t in self._ten], dtype=bool)
+
+    def cay_tien_to(self, chuoi):
+        chuoi = _chuan_hoa(chuoi)
+        mask = np.zeros(len(self.nhan_cay), dtype=bool)
+        i = bisect.bisect_left(self._khoa_tien_to, chuoi)
+        while i < len(self._tien_to) and self._khoa_tien_to[i].startswith(chuoi):
+            mask[self._tien_to[i][1]] = True
+            i += 1
+        return mask
+
+    def nam_chua(self, chuoi):
+        chuoi = chuoi.strip()
+        return np.array([chuoi in s for s in self._chuoi_nam], dtype=bool)
+
+    def nam_khoang(self, tu, den):
+        mask = np.zeros(len(self.nam), dtype=bool)
+        mask[np.searchsorted(self.nam, tu, side='left'):np.searchsorted(self.nam, den, side='right')] = True
+        return mask
+
+    # Kết quả gồm các ô có (loại cây thuộc cay) VÀ (năm thuộc nam); None nghĩa là không lọc
+    def chon(self, cay=None, nam=None, hoac=False):
+        so_cay, so_nam = len(self.nhan_cay), len(self.nam)
+        m_cay = np.ones(so_cay, dtype=bool) if cay is None else cay
+        m_nam = np.ones(so_nam, dtype=bool) if nam is None else nam
+        if hoac:
+            o = m_cay[:, None] | m_nam[None, :]
+        else:
+            o = m_cay[:, None] & m_nam[None, :]
+        return KetQuaTimKiem(self, np.flatnonzero(o))
+
+    # Truy vấn của ô tìm kiếm: rỗng -> tất cả, "a-b" -> khoảng năm, còn lại -> tên cây chứa
+    # chuỗi HOẶC năm chứa chuỗi (giống tìm kiếm cũ, không phân biệt hoa thường)
+    def tim(self, truy_van):
+        truy_van = truy_van.strip()
+        if not truy_van:
+            return self.chon()
+        khop = MAU_KHOANG_NAM.match(truy_van)
+        if khop:
+            tu, den = sorted(int(v) for v in khop.groups())
+            return self.chon(nam=self.nam_khoang(tu, den))
+        return self.chon(self.cay_chua(truy_van), self.nam_chua(truy_van), hoac=True)
@@ -1,44 +1,92 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
+import base64
+import io
 import time
-import numpy as np
-import joblib
-
-# === Đọc và xử lý dữ liệu ===
-df = pd.read_csv("Crop_production_in_India_ok.csv")
-print(f"Số lượng bản ghi ban đầu: {len(df)}")
-df.dropna(inplace=True)
-df = df[df['Production'] >= 0]  # Loại bỏ giá trị âm trong Production
-print(f"Số lượng bản ghi sau khi làm sạch: {len(df)}")
-df['Crop'] = df['Crop'].str.strip().str.title()
-df['Season'] = df['Season'].str.strip().str.title()
-
-# Mã hóa one-hot
-df_encoded = pd.get_dummies(df, columns=['Crop', 'Season'], drop_first=True)
-X = df_encoded.drop(columns=['Production'])
-y = df_encoded['Production']
-
-encoded_columns = X.columns  # Lưu danh sách cột đã mã hóa
-print(f"Encoded columns: {encoded_columns.tolist()}")
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-model = LinearRegression()
-start = time.time()
-model.fit(X_train, y_train)
-train_time = round(time.time() - start, 4)
-
-# Đánh giá mô hình
-train_r2 = model.score(X_train, y_train)
-test_r2 = model.score(X_test, y_test)
-print(f"Train R-squared: {train_r2:.4f}")
-print(f"Test R-squared: {test_r2:.4f}")
-
-# Lưu mô hình
-joblib.dump(model, 'linear_regression_model.pkl')
+from dichvudubao import BoDuBao, FILE_GOI
+from goimohinh import nap_hoac_huan_luyen
+from khoangdubao import MUC, nap_hoac_tao
+from tacvu import BoChayTacVu
+from theodoi import giai_doan, su_kien, theo_doi
+
+# Trước khi cửa sổ hiện chỉ import tkinter và numpy; pandas, sklearn, matplotlib... được import trong
+# các hàm chạy nền (nạp dữ liệu, huấn luyện, vẽ biểu đồ) nên không làm chậm lúc khởi động
+
+# Khi bật theo dõi (THEODOI=vet.json, xem theodoi.py): thời điểm khởi động, các bước nạp nền và
+# mỗi lần gọi callback đều được ghi vào file vết
+su_kien("da_import")
+
+FILE_DU_LIEU = "Crop_production_in_India_ok.csv"
+
+# Dữ liệu, khối tổng hợp, chỉ mục và mô hình được nạp nền sau khi cửa sổ đã hiện
+df = None
+khoi = None
+chi_muc = None
+encoder = None
+bo_du_bao = None
+khoang = None
+
+
+def huan_luyen(df):
+    from sklearn.model_selection import train_test_split
+    from hoiquy_tangdan import MoHinhTuyenTinh
+    from mahoa import CategoricalEncoder
+    # Mã hóa one-hot dạng thưa, bộ mã hóa giữ danh sách nhãn để dùng lại khi dự báo
+    with giai_doan("ma_hoa", so_dong=len(df)):
+        encoder = CategoricalEncoder(['Crop_Year', 'Area', 'Temperature', 'Humidity', 'Wind_Speed'], ['Crop', 'Season']).fit(df)
+        X = encoder.transform(df)
+        y = df['Production'].to_numpy()
+
+    encoded_columns = encoder.feature_names_  # Lưu danh sách cột đã mã hóa
+    print(f"Encoded columns: {encoded_columns}")
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = MoHinhTuyenTinh()
+    start = time.time()
+    with giai_doan("fit", so_dong=len(y_train)):
+        model.fit(X_train, y_train, feature_names=encoded_columns)
+    train_time = round(time.time() - start, 4)
+
+    # Đánh giá mô hình
+    metrics = {'train_r2': model.score(X_train, y_train),
+               'test_r2': model.score(X_test, y_test),
+               'train_time': train_time}
+    return model, encoder, metrics
+
+
+# === Đọc và xử lý dữ liệu (chạy nền) ===
+@theo_doi()
+def nap_du_lieu(token, tien_do):
+    # (bỏ dòng khuyết, loại Production/Area không dương, chuẩn hóa tên Crop/Season)
+    tien_do(5, "Đang đọc dữ liệu...")
+    from docdulieu import load_and_clean_data
+    from khoitonghop import nap_khoi
+    from chimuc import ChiMucTimKiem
+    df = load_and_clean_data(FILE_DU_LIEU, bao_cao=True)
+    print(f"Số lượng bản ghi sau khi làm sạch: {len(df)}")
+    # Khối tổng hợp Crop × Season × Crop_Year: biểu đồ và phân tích chỉ tính trên các ô của khối
+    tien_do(40, "Đang nạp khối tổng hợp...")
+    with giai_doan("nap_khoi", so_dong=len(df)):
+        khoi = nap_khoi(FILE_DU_LIEU, df)
+    # Chỉ mục tra cứu theo loại cây / năm (dựng một lần)
+    tien_do(55, "Đang dựng chỉ mục tra cứu...")
+    with giai_doan("dung_chi_muc", so_dong=len(df)):
+        chi_muc = ChiMucTimKiem.tu_bang(df)
+    # Khởi động từ gói mô hình đã lưu, chỉ huấn luyện lại khi dữ liệu thay đổi
+    tien_do(70, "Đang nạp mô hình...")
+    with giai_doan("nap_mo_hinh") as gd:
+        goi, da_huan_luyen = nap_hoac_huan_luyen(FILE_GOI, FILE_DU_LIEU, lambda: huan_luyen(df),
+                                                 cau_hinh={'test_size': 0.2, 'random_state': 42})
+        gd.dat(da_huan_luyen=da_huan_luyen)
+    print("Đã huấn luyện lại mô hình" if da_huan_luyen else f"Dùng mô hình đã lưu ({goi.thoi_diem})")
+    print(f"Train R-squared: {goi.metrics['train_r2']:.4f}")
+    print(f"Test R-squared: {goi.metrics['test_r2']:.4f}")
+    # Khoảng dự báo bootstrap: dựng một lần cho mỗi gói rồi lưu cạnh gói; trong luồng nền nên không
+    # mở thêm tiến trình con
+    tien_do(85, "Đang nạp khoảng dự báo...")
+    with giai_doan("nap_khoang_du_bao") as gd:
+        khoang, da_tao = nap_hoac_tao(FILE_GOI, FILE_DU_LIEU, goi, so_tien_trinh=1)
+        gd.dat(da_tao=da_tao)
+    return df, khoi, chi_muc, goi, khoang
 
 # === Giao diện Tkinter ===
 root = tk.Tk()
@@ -58,9 +106,40 @@ for tab, title in zip(tabs, tab_titles):
 tab_control.pack(expand=1, fill="both")
 tab1, tab2, tab3, tab4, tab5 = tabs
 
+# === Thanh trạng thái: tiến độ tác vụ nền và nút huỷ ===
+status_frame = tk.Frame(root)
+status_frame.pack(fill=tk.X, side=tk.BOTTOM)
+status_label = tk.Label(status_frame, text="", anchor="w")
+status_label.pack(side=tk.LEFT, padx=10)
+tk.Button(status_frame, text="Huỷ", command=lambda: bo_chay.huy_tat_ca()).pack(side=tk.RIGHT, padx=10, pady=2)
+status_bar = ttk.Progressbar(status_frame, mode="determinate", maximum=100, length=200)
+status_bar.pack(side=tk.RIGHT, padx=10)
+
+bo_chay = BoChayTacVu(root)
+
+def bao_tien_do(phan_tram, thong_diep=""):
+    status_bar["value"] = phan_tram
+    if thong_diep:
+        status_label.config(text=thong_diep)
+
+def ket_thuc_tac_vu(thong_diep=None):
+    if bo_chay.so_dang_chay == 0:
+        status_bar["value"] = 0
+        status_label.config(text=thong_diep or ("Sẵn sàng" if df is not None else "Chưa nạp dữ liệu"))
+
+def bao_loi(e):
+    ket_thuc_tac_vu()
+    messagebox.showerror("Lỗi", str(e))
+
+def chua_san_sang():
+    if df is None:
+        messagebox.showinfo("Đang nạp", "Dữ liệu và mô hình đang được nạp, vui lòng đợi.")
+        return True
+    return False
+
 # === TAB 1: Nhập liệu ===
 tk.Label(tab1, text="Loại cây trồng:").grid(row=0, column=0, padx=10, pady=10, sticky="e")
-crop_cb = ttk.Combobox(tab1, values=sorted(df["Crop"].unique()), width=30)
+crop_cb = ttk.Combobox(tab1, values=[], width=30)
 crop_cb.grid(row=0, column=1, padx=10, pady=10)
 
 tk.Label(tab1, text="Năm trồng (Crop_Year):").grid(row=1, column=0, padx=10, pady=10, sticky="e")
@@ -68,7 +147,7 @@ year_entry = ttk.Entry(tab1, width=33)
 year_entry.grid(row=1, column=1, padx=10, pady=10)
 
 tk.Label(tab1, text="Mùa vụ:").grid(row=2, column=0, padx=10, pady=10, sticky="e")
-season_cb = ttk.Combobox(tab1, values=sorted(df["Season"].unique()), width=30)
+season_cb = ttk.Combobox(tab1, values=[], width=30)
 season_cb.grid(row=2, column=1, padx=10, pady=10)
 
 tk.Label(tab1, text="Diện tích (ha):").grid(row=3, column=0, padx=10, pady=10, sticky="e")
@@ -90,7 +169,10 @@ wind_entry.grid(row=6, column=1, padx=10, pady=10)
 result_label = tk.Label(tab2, text="", font=("Segoe UI", 12, "bold"))
 result_label.pack(pady=20)
 
+@theo_doi()
 def du_bao():
+    if chua_san_sang():
+        return
     try:
         crop_year = int(year_entry.get())
         area = float(area_entry.get())
@@ -103,8 +185,8 @@ def du_bao():
         if not crop or not season:
             raise ValueError("Chưa chọn loại cây hoặc mùa vụ")
 
-        # Tạo DataFrame với dữ liệu người dùng
-        user_df = pd.DataFrame([{
+        # Dự báo trực tiếp từ trọng số đã biên dịch, không tạo vector one-hot
+        record = {
             'Crop_Year': crop_year,
             'Area': area,
             'Temperature': temp,
@@ -112,28 +194,12 @@ def du_bao():
             'Wind_Speed': wind,
             'Crop': crop,
             'Season': season
-        }])
-
-        # Lấy danh sách giá trị độc nhất từ dữ liệu huấn luyện để mã hóa
-        all_seasons = df['Season'].unique()
-        all_crops = df['Crop'].unique()
-
-        # Tạo các cột one-hot dựa trên tất cả các giá trị có thể có
-        for s in all_seasons[1:]:  # Bỏ qua giá trị đầu tiên do drop_first=True
-            user_df[f'Season_{s}'] = (user_df['Season'] == s).astype(int)
-        for c in all_crops[1:]:  # Bỏ qua giá trị đầu tiên do drop_first=True
-            user_df[f'Crop_{c}'] = (user_df['Crop'] == c).astype(int)
-
-        # Loại bỏ cột gốc sau khi mã hóa
-        user_df = user_df.drop(columns=['Crop', 'Season'])
-
-        # Đảm bảo thứ tự cột khớp với encoded_columns
-        user_df_encoded = user_df.reindex(columns=encoded_columns, fill_value=0)
-
-        print(f"User input columns: {user_df_encoded.columns.tolist()}")
-
-        y_pred = model.predict(user_df_encoded)[0]
-        result_label.config(text=f"Sản lượng dự báo: {max(y_pred, 0):.2f} tấn")
+        }
+        y_pred = bo_du_bao.du_bao_mot(record)
+        # Khoảng dự báo: một phép nhân ma trận-vector trên các bản sao bootstrap đã lưu
+        thap, cao = khoang.khoang(record, y_pred)
+        result_label.config(text=f"Sản lượng dự báo: {max(y_pred, 0):.2f} tấn\n"
+                                 f"Khoảng dự báo {MUC:.0%}: {max(thap, 0):.2f} – {max(cao, 0):.2f} tấn")
     except Exception as e:
         messagebox.showerror("Lỗi", f"Lỗi dữ liệu đầu vào: {e}")
 
@@ -152,33 +218,60 @@ tk.Button(tab1, text="Xoá", command=xoa, bg="#f44336", fg="white").grid(row=7,
 
 # === TAB 2: Dự báo ===
 tk.Label(tab2, text="Mô hình: Hồi quy tuyến tính", font=("Segoe UI", 11)).pack(pady=10)
-tk.Label(tab2, text=f"Thời gian huấn luyện: {train_time} giây", font=("Segoe UI", 11)).pack(pady=10)
-tk.Label(tab2, text=f"Train R-squared: {train_r2:.4f}", font=("Segoe UI", 11)).pack(pady=10)
-tk.Label(tab2, text=f"Test R-squared: {test_r2:.4f}", font=("Segoe UI", 11)).pack(pady=10)
+train_time_label = tk.Label(tab2, text="Thời gian huấn luyện: ...", font=("Segoe UI", 11))
+train_time_label.pack(pady=10)
+train_r2_label = tk.Label(tab2, text="Train R-squared: ...", font=("Segoe UI", 11))
+train_r2_label.pack(pady=10)
+test_r2_label = tk.Label(tab2, text="Test R-squared: ...", font=("Segoe UI", 11))
+test_r2_label.pack(pady=10)
 
 # === TAB 3: Biểu đồ ===
 chart_frame = tk.Frame(tab3)
 chart_frame.pack()
 
-def ve_bieu_do(loai):
-    for widget in chart_frame.winfo_children():
-        widget.destroy()
-    fig = plt.Figure(figsize=(6, 4))
+# Vẽ trong luồng phụ ra ảnh PNG (Agg), luồng giao diện chỉ hiển thị ảnh
+@theo_doi()
+def tao_bieu_do(loai, token, tien_do):
+    import matplotlib
+    matplotlib.use("Agg")  # biểu đồ được vẽ ra ảnh trong luồng phụ, không dùng backend Tk của pyplot
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from vedulieulon import ve_phan_tan
+    fig = Figure(figsize=(6, 4))
+    FigureCanvasAgg(fig)
     ax = fig.add_subplot(111)
     if loai == "Sản lượng theo năm":
-        avg = df.groupby("Crop_Year")["Production"].mean()
+        avg = khoi.tong_hop("Crop_Year", "Production", "mean")
         avg.plot(kind="line", ax=ax)
         ax.set_title("Sản lượng trung bình theo năm")
     elif loai == "Top 3 cây trồng":
-        top = df.groupby("Crop")["Production"].sum().sort_values(ascending=False).head(3)
+        top = khoi.tong_hop("Crop", "Production", "sum").sort_values(ascending=False).head(3)
         top.plot(kind="bar", ax=ax)
         ax.set_title("Top 3 cây trồng có sản lượng cao nhất")
     elif loai == "Diện tích vs Sản lượng":
-        ax.scatter(df["Area"], df["Production"], alpha=0.3)
+        ve_phan_tan(ax, df["Area"], df["Production"], alpha=0.3)
         ax.set_title("Diện tích vs Sản lượng")
-    canvas = FigureCanvasTkAgg(fig, master=chart_frame)
-    canvas.draw()
-    canvas.get_tk_widget().pack()
+    tien_do(60, f"Đang vẽ: {loai}...")
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+@theo_doi()
+def hien_bieu_do(png):
+    for widget in chart_frame.winfo_children():
+        widget.destroy()
+    anh = tk.PhotoImage(data=base64.b64encode(png).decode("ascii"))
+    nhan_anh = tk.Label(chart_frame, image=anh)
+    nhan_anh.image = anh  # giữ tham chiếu để ảnh không bị thu hồi
+    nhan_anh.pack()
+    ket_thuc_tac_vu()
+
+def ve_bieu_do(loai):
+    if chua_san_sang():
+        return
+    bao_tien_do(0, f"Đang vẽ: {loai}...")
+    bo_chay.chay(tao_bieu_do, loai, ten="bieu_do", khi_xong=hien_bieu_do, khi_loi=bao_loi,
+                 khi_tien_do=bao_tien_do, khi_huy=ket_thuc_tac_vu)
 
 chart_options = ["Sản lượng theo năm", "Top 3 cây trồng", "Diện tích vs Sản lượng"]
 chart_cb = ttk.Combobox(tab3, values=chart_options, width=30)
@@ -189,38 +282,126 @@ tk.Button(tab3, text="Vẽ biểu đồ", command=lambda: ve_bieu_do(chart_cb.ge
 summary_text = tk.Text(tab4, wrap=tk.WORD, width=90, height=25)
 summary_text.pack(padx=10, pady=10)
 
-def hien_phan_tich():
-    year_avg = df.groupby("Crop_Year")["Production"].mean().round(2)
-    top_crop = df.groupby("Crop")["Production"].sum().sort_values(ascending=False).head(3)
+@theo_doi()
+def tao_phan_tich(token, tien_do):
+    year_avg = khoi.tong_hop("Crop_Year", "Production", "mean").round(2)
+    top_crop = khoi.tong_hop("Crop", "Production", "sum").sort_values(ascending=False).head(3)
     summary = "--- Trung bình sản lượng theo năm ---\n"
     summary += year_avg.to_string()
     summary += "\n\n--- Top 3 cây trồng có sản lượng cao nhất ---\n"
     summary += top_crop.to_string()
+    return summary
+
+@theo_doi()
+def hien_ket_qua_phan_tich(summary):
     summary_text.delete(1.0, tk.END)
     summary_text.insert(tk.END, summary)
+    ket_thuc_tac_vu()
+
+def hien_phan_tich():
+    if chua_san_sang():
+        return
+    bo_chay.chay(tao_phan_tich, ten="phan_tich", khi_xong=hien_ket_qua_phan_tich, khi_loi=bao_loi,
+                 khi_huy=ket_thuc_tac_vu)
 
 tk.Button(tab4, text="Xem phân tích", command=hien_phan_tich, bg="#795548", fg="white").pack(pady=10)
 
 # === TAB 5: Tra cứu ===
-tk.Label(tab5, text="Tìm theo loại cây hoặc năm:").pack(pady=10)
+tk.Label(tab5, text="Tìm theo loại cây hoặc năm (khoảng năm: 1995-2000):").pack(pady=10)
 search_entry = ttk.Entry(tab5, width=40)
 search_entry.pack()
 
-result_tree = ttk.Treeview(tab5, columns=("Crop", "Year", "Area", "Humidity", "Wind_Speed", "Temperature", "Production"), show='headings')
+search_count_label = tk.Label(tab5, text="")
+search_count_label.pack()
+
+result_frame = tk.Frame(tab5)
+result_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+result_tree = ttk.Treeview(result_frame, columns=("Crop", "Year", "Area", "Humidity", "Wind_Speed", "Temperature", "Production"), show='headings')
 for col in result_tree["columns"]:
     result_tree.heading(col, text=col)
     result_tree.column(col, width=130)
-result_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-def tim_kiem():
-    query = search_entry.get().strip().lower()
+result_scroll = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=result_tree.yview)
+result_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+result_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+# Kết quả được nạp vào bảng theo từng trang khi cuộn gần cuối, không chèn cả triệu dòng một lúc
+KICH_THUOC_TRANG = 200
+COT_TRA_CUU = ["Crop", "Crop_Year", "Area", "Humidity", "Wind_Speed", "Temperature", "Production"]
+ket_qua_tim = None
+so_dong_da_nap = 0
+
+@theo_doi()
+def nap_trang():
+    global so_dong_da_nap
+    if ket_qua_tim is None or so_dong_da_nap >= len(ket_qua_tim):
+        return
+    dong = ket_qua_tim.lay(so_dong_da_nap, so_dong_da_nap + KICH_THUOC_TRANG)
+    # Chỉ lấy các dòng của trang (cột Crop dạng category không bị đổi cả cột sang mảng object)
+    cot = [df[c].iloc[dong].to_numpy() for c in COT_TRA_CUU]
+    for values in zip(*cot):
+        result_tree.insert("", tk.END, values=values)
+    so_dong_da_nap += len(dong)
+
+def cuon_bang(first, last):
+    result_scroll.set(first, last)
+    if float(last) > 0.9:
+        nap_trang()
+
+result_tree.configure(yscrollcommand=cuon_bang)
+
+@theo_doi()
+def hien_ket_qua_tim(ket_qua):
+    global ket_qua_tim, so_dong_da_nap
     result_tree.delete(*result_tree.get_children())
-    filtered = df[df["Crop"].str.lower().str.contains(query) | df["Crop_Year"].astype(str).str.contains(query)]
-    for _, row in filtered.iterrows():
-        result_tree.insert("", tk.END, values=(row["Crop"], row["Crop_Year"], row["Area"],
-                                               row["Humidity"], row["Wind_Speed"], row["Temperature"], row["Production"]))
-
+    ket_qua_tim = ket_qua
+    so_dong_da_nap = 0
+    search_count_label.config(text=f"Tìm thấy {len(ket_qua_tim)} dòng")
+    nap_trang()
+    ket_thuc_tac_vu()
+
+@theo_doi()
+def tim(truy_van):
+    return chi_muc.tim(truy_van)
+
+def tim_kiem(event=None):
+    if df is None:
+        return
+    # Tên cây chứa chuỗi tìm hoặc năm chứa chuỗi tìm; "1995-2000" tìm theo khoảng năm.
+    # Gõ tiếp thì lần tìm trước (cùng tên tác vụ) bị huỷ.
+    truy_van = search_entry.get()
+    bo_chay.chay(lambda token, tien_do: tim(truy_van), ten="tim_kiem", khi_xong=hien_ket_qua_tim,
+                 khi_loi=bao_loi, khi_huy=ket_thuc_tac_vu)
+
+search_entry.bind("<KeyRelease>", tim_kiem)
 tk.Button(tab5, text="Tìm", command=tim_kiem, bg="#3F51B5", fg="white").pack(pady=10)
 
-# === Chạy ứng dụng ===
-root.mainloop()
\ No newline at end of file
+# === Nạp dữ liệu nền rồi chạy ứng dụng ===
+@theo_doi()
+def nap_xong(ket_qua):
+    global df, khoi, chi_muc, encoder, bo_du_bao, khoang
+    df, khoi, chi_muc, goi, khoang = ket_qua
+    encoder = goi.encoder()
+    bo_du_bao = BoDuBao.tu_goi(goi)
+    crop_cb.config(values=encoder.categories["Crop"])
+    season_cb.config(values=encoder.categories["Season"])
+    train_time_label.config(text=f"Thời gian huấn luyện: {goi.metrics['train_time']} giây")
+    train_r2_label.config(text=f"Train R-squared: {goi.metrics['train_r2']:.4f}")
+    test_r2_label.config(text=f"Test R-squared: {goi.metrics['test_r2']:.4f}")
+    ket_thuc_tac_vu()
+    su_kien("san_sang")
+
+def dong_ung_dung():
+    bo_chay.dong()
+    root.destroy()
+
+# Nạp dữ liệu nền và chạy vòng lặp sự kiện (python demosanpham.py hoặc python chay.py gui)
+def main():
+    bo_chay.chay(nap_du_lieu, ten="nap_du_lieu", khi_xong=nap_xong, khi_loi=bao_loi, khi_tien_do=bao_tien_do,
+                 khi_huy=lambda: ket_thuc_tac_vu("Đã huỷ nạp dữ liệu"))
+    root.protocol("WM_DELETE_WINDOW", dong_ung_dung)
+    root.after_idle(lambda: su_kien("cua_so_hien"))
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Dịch vụ dự báo độ trễ thấp: nạp mô hình tuyến tính một lần và "biên dịch" bố cục đặc trưng
+# thành trọng số của các cột số cộng với bảng đóng góp theo nhãn cho mỗi cột phân loại.
+# Dự báo một dòng = vài phép nhân + tra từ điển (không pandas, không tạo DataFrame);
+# dự báo theo lô = một phép nhân ma trận-vector + tra bảng theo mã nhãn.
+
+FILE_GOI = 'linear_regression_model.bundle.json'
+
+
+class BoDuBao:
+    # coef/intercept của mô hình và bố cục đặc trưng (CategoricalEncoder.to_dict())
+    def __init__(self, coef, intercept, bo_cuc):
+        coef = np.asarray(coef, dtype=np.float64)
+        self.cot_so = list(bo_cuc['cot_so'])
+        self.cot_phan_loai = list(bo_cuc['cot_phan_loai'])
+        self.unknown = bo_cuc.get('unknown', 'ignore')
+        self.intercept = float(intercept)
+        k = len(self.cot_so)
+        self.w_so = coef[:k]
+        self.nhan = {}
+        self.bang = {}
+        vi_tri = k
+        for c in self.cot_phan_loai:
+            nhan = list(bo_cuc['categories'][c])
+            m = len(nhan)
+            # Bảng đóng góp theo mã: mã 0 là nhóm gốc, phần tử cuối (mã -1) cho nhãn chưa gặp
+            self.bang[c] = np.concatenate([[0.0], coef[vi_tri:vi_tri + m - 1], [0.0]])
+            self.nhan[c] = {v: i for i, v in enumerate(nhan)}
+            vi_tri += m - 1
+        if vi_tri != coef.size:
+            raise ValueError(f"Bố cục có {vi_tri} đặc trưng nhưng mô hình có {coef.size} hệ số")
+        # Bản Python thuần cho dự báo từng dòng (tránh chi phí gọi numpy cho mảng rất nhỏ)
+        self._w_so_py = [float(w) for w in self.w_so]
+        self._bang_py = {c: {v: float(self.bang[c][i]) for v, i in self.nhan[c].items()} for c in self.cot_phan_loai}
+
+    @classmethod
+    def tu_mo_hinh(cls, model, bo_cuc):
+        if hasattr(bo_cuc, 'to_dict'):
+            bo_cuc = bo_cuc.to_dict()
+        return cls(model.coef_, model.intercept_, bo_cuc)
+
+    # Từ gói mô hình (goimohinh.GoiMoHinh hoặc đường dẫn file gói)
+    @classmethod
+    def tu_goi(cls, goi=FILE_GOI):
+        if isinstance(goi, str):
+            from goimohinh import GoiMoHinh
+            goi = GoiMoHinh.load(goi)
+        return cls(goi.coef, goi.intercept, goi.schema)
+
+    # Dự báo một bản ghi (dict: tên cột -> giá trị)
+    def du_bao_mot(self, record):
+        y = self.intercept
+        for c, w in zip(self.cot_so, self._w_so_py):
+            y += w * float(record[c])
+        for c in self.cot_phan_loai:
+            dong_gop = self._bang_py[c].get(str(record[c]).strip().title())
+            if dong_gop is None:
+                if self.unknown == 'error':
+                    raise ValueError(f"Cột {c} có nhãn chưa gặp khi huấn luyện: {record[c]!r}")
+                dong_gop = 0.0
+            y += dong_gop
+        return y
+
+    # Mã nhãn của cả một cột: chỉ tra từ điển trên các nhãn khác nhau rồi trải ra theo chỉ số
+    def _ma(self, c, values):
+        values = np.asarray(values)
+        if values.dtype.kind in 'iu':
+            return values.astype(np.int64)
+        nhan, vi_tri = np.unique(values.astype(str), return_inverse=True)
+        ma_nhan = np.array([self.nhan[c].get(v.strip().title(), -1) for v in nhan], dtype=np.int64)
+        if self.unknown == 'error' and (ma_nhan < 0).any():
+            raise ValueError(f"Cột {c} có nhãn chưa gặp khi huấn luyện: {list(nhan[ma_nhan < 0][:5])}")
+        return ma_nhan[vi_tri.ravel()]
+
+    # Dự báo theo lô: cot là dict tên cột -> mảng (cột phân loại là nhãn hoặc mã số nguyên)
+    def du_bao_lo(self, cot):
+        so = np.column_stack([np.asarray(cot[c], dtype=np.float64) for c in self.cot_so])
+        y = so @ self.w_so + self.intercept
+        for c in self.cot_phan_loai:
+            y += self.bang[c][self._ma(c, cot[c])]
+        return y
+
+    # Bảng hệ số [chặn, w...] trên các cột số cho các ô (tổ hợp mã nhãn ma: cột -> mảng mã, -1 là
+    # nhãn chưa gặp); với mô hình chung mọi ô chung hệ số góc, chỉ khác hệ số chặn
+    def he_so_o(self, ma):
+        n = len(next(iter(ma.values()))) if ma else 1
+        w = np.empty((n, len(self.cot_so) + 1))
+        w[:, 0] = self.intercept
+        for c in self.cot_phan_loai:
+            w[:, 0] += self.bang[c][ma[c]]
+        w[:, 1:] = self.w_so
+        return w
+
+    # Dự báo một file CSV theo từng khối dòng, trả về (generator) các mảng kết quả
+    def du_bao_csv(self, f, kich_thuoc_khoi=100_000):
+        reader = csv.reader(f)
+        header = next(reader)
+        vi_tri = {c: header.index(c) for c in self.cot_so + self.cot_phan_loai}
+        khoi = []
+        for dong in reader:
+            khoi.append(dong)
+            if len(khoi) == kich_thuoc_khoi:
+                yield self._du_bao_dong(khoi, vi_tri)
+                khoi = []
+        if khoi:
+            yield self._du_bao_dong(khoi, vi_tri)
+
+    def _du_bao_dong(self, khoi, vi_tri):
+        cot = list(zip(*khoi))
+        return self.du_bao_lo({c: cot[i] for c, i in vi_tri.items()})
+
+
+# Bộ dự báo từ file: gói mô hình JSON (một mô hình chung) hoặc họ mô hình theo nhóm (.npz, mohinhnhom)
+def nap_bo_du_bao(path=FILE_GOI):
+    if path.endswith('.npz'):
+        from mohinhnhom import HoMoHinh
+        return HoMoHinh.load(path)
+    return BoDuBao.tu_goi(path)
+
+
+# Bản ghi/lô ngẫu nhiên theo bố cục của mô hình, dùng để đo hiệu năng
+def _du_lieu_gia(bo_du_bao, n, seed=0):
+    rng = np.random.default_rng(seed)
+    cot = {c: rng.uniform(1, 100, n) for c in bo_du_bao.cot_so}
+    for c in bo_du_bao.cot_phan_loai:
+        nhan = np.array(list(bo_du_bao.nhan[c]))
+        cot[c] = nhan[rng.integers(len(nhan), size=n)]
+    return cot
+
+
+# Đo độ trễ p50/p99 khi dự báo từng dòng và số dòng/giây khi dự báo theo lô
+def do_hieu_nang(bo_du_bao, so_lan=100_000, kich_thuoc_lo=1_000_000):
+    cot = _du_lieu_gia(bo_du_bao, so_lan)
+    records = [{c: cot[c][i] for c in cot} for i in range(so_lan)]
+    thoi_gian = np.empty(so_lan)
+    dem_gio = time.perf_counter_ns
+    for i, r in enumerate(records):
+        t = dem_gio()
+        bo_du_bao.du_bao_mot(r)
+        thoi_gian[i] = dem_gio() - t
+    lo = _du_lieu_gia(bo_du_bao, kich_thuoc_lo, seed=1)
+    t = time.perf_counter()
+    bo_du_bao.du_bao_lo(lo)
+    t_lo = time.perf_counter() - t
+    return {'mot_dong_p50_us': float(np.percentile(thoi_gian, 50) / 1e3),
+            'mot_dong_p99_us': float(np.percentile(thoi_gian, 99) / 1e3),
+            'lo_so_dong': kich_thuoc_lo,
+            'lo_dong_moi_giay': kich_thuoc_lo / t_lo}
+
+
+def _tra_loi(bo_du_bao, yeu_cau):
+    if 'columns' in yeu_cau:
+        return {'predictions': bo_du_bao.du_bao_lo(yeu_cau['columns']).tolist()}
+    if 'records' in yeu_cau:
+        records = yeu_cau['records']
+        if not records:
+            return {'predictions': []}
+        cot = {c: [r[c] for r in records] for c in bo_du_bao.cot_so + bo_du_bao.cot_phan_loai}
+        return {'predictions': bo_du_bao.du_bao_lo(cot).tolist()}
+    return {'prediction': bo_du_bao.du_bao_mot(yeu_cau)}
+
+
+# Máy chủ HTTP cục bộ: POST /predict với JSON một bản ghi, {"records": [...]} hoặc {"columns": {...}}
+def chay_http(bo_du_bao, host='127.0.0.1', port=8000):
+    class XuLy(BaseHTTPRequestHandler):
+        def _gui(self, ma, noi_dung):
+            body = json.dumps(noi_dung, ensure_ascii=False).encode('utf-8')
+            self.send_response(ma)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._gui(200, {'status': 'ok'})
+            else:
+                self._gui(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._gui(404, {'error': 'not found'})
+                return
+            try:
+                yeu_cau = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                self._gui(200, _tra_loi(bo_du_bao, yeu_cau))
+            except (ValueError, KeyError, TypeError) as e:
+                self._gui(400, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), XuLy)
+    print(f"Đang phục vụ dự báo tại http://{host}:{port}/predict")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# Đọc mỗi dòng stdin là một yêu cầu JSON, ghi kết quả JSON ra stdout
+def chay_stdin(bo_du_bao, vao=sys.stdin, ra=sys.stdout):
+    for dong in vao:
+        if not dong.strip():
+            continue
+        try:
+            ket_qua = _tra_loi(bo_du_bao, json.loads(dong))
+        except (ValueError, KeyError, TypeError) as e:
+            ket_qua = {'error': str(e)}
+        ra.write(json.dumps(ket_qua, ensure_ascii=False) + '\n')
+        ra.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dịch vụ dự báo sản lượng cây trồng")
+    parser.add_argument('--model', default=FILE_GOI,
+                        help="file gói mô hình (JSON) hoặc họ mô hình theo nhóm (.npz, xem mohinhnhom.py)")
+    sub = parser.add_subparsers(dest='lenh', required=True)
+    p = sub.add_parser('serve', help="chạy máy chủ HTTP cục bộ")
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8000)
+    sub.add_parser('stdin', help="đọc yêu cầu JSON từ stdin, mỗi dòng một yêu cầu")
+    p = sub.add_parser('csv', help="dự báo cho một file CSV")
+    p.add_argument('file')
+    p.add_argument('-o', '--out', help="ghi kết quả ra file (mặc định: stdout)")
+    p = sub.add_parser('bench', help="đo độ trễ và thông lượng")
+    p.add_argument('--so-lan', type=int, default=100_000)
+    p.add_argument('--kich-thuoc-lo', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    bo_du_bao = nap_bo_du_bao(args.model)
+    if args.lenh == 'serve':
+        chay_http(bo_du_bao, args.host, args.port)
+    elif args.lenh == 'stdin':
+        chay_stdin(bo_du_bao)
+    elif args.lenh == 'csv':
+        ra = open(args.out, 'w', encoding='utf-8') if args.out else sys.stdout
+        with open(args.file, newline='', encoding='utf-8') as f:
+            ra.write('prediction\n')
+            for y in bo_du_bao.du_bao_csv(f):
+                np.savetxt(ra, y, fmt='%.6f')
+        if args.out:
+            ra.close()
+    else:
+        ket_qua = do_hieu_nang(bo_du_bao, args.so_lan, args.kich_thuoc_lo)
+        print(json.dumps(ket_qua, indent=2))
+
+
+if __name__ == "__main__":
+    main()
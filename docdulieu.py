@@ -0,0 +1,100 @@
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from bodem import KIEU_COT, COT_PHAN_LOAI, doc_bang, cache_moi
+from kiemtra import COT_SO
+from lamsach import mask_hop_le
+from theodoi import giai_doan
+
+# Module đọc dữ liệu dùng chung cho mọi script: kiểu dữ liệu khai báo trước, Crop/Season
+# dạng category, số thực được thu nhỏ (float32 cho Temperature/Humidity/Wind_Speed),
+# tất cả điều kiện lọc gộp thành một mặt nạ duy nhất nên chỉ sao chép bảng một lần.
+
+FILE_DU_LIEU = 'Crop_production_in_India_ok.csv'
+
+
+# Chuẩn hóa nhãn (bỏ khoảng trắng, viết hoa chữ đầu) trên danh sách category thay vì từng dòng
+def _chuan_hoa_nhan(s):
+    cat = s.cat
+    nhan_moi = cat.categories.astype(str).str.strip().str.title()
+    categories = pd.Index(nhan_moi).unique().sort_values()
+    doi_ma = np.append(categories.get_indexer(nhan_moi), -1)
+    return pd.Categorical.from_codes(doi_ma[cat.codes], categories=categories)
+
+
+def _doc_csv(file_path, columns):
+    kieu = {c: 'category' for c in COT_PHAN_LOAI}
+    kieu.update({c: 'float64' for c in COT_SO})
+    try:
+        return pd.read_csv(file_path, usecols=columns, dtype=kieu)
+    except ValueError:
+        # Có ô không phải số: đọc bình thường rồi ép kiểu, ô lỗi thành NaN và bị loại bởi mặt nạ
+        df = pd.read_csv(file_path, usecols=columns, dtype={c: 'category' for c in COT_PHAN_LOAI})
+        for col in COT_SO:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        return df
+
+
+# Bộ nhớ ước tính nếu bảng dùng kiểu cũ (chuỗi object, số int64/float64) để so sánh
+def _bo_nho_kieu_cu(df):
+    tong = 0
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            dem = df[col].value_counts()
+            tong += int(sum(sys.getsizeof(str(nhan)) * n for nhan, n in dem.items())) + 8 * len(df)
+        else:
+            tong += 8 * len(df)
+    return tong
+
+
+# Đọc và làm sạch dữ liệu: dùng bộ đệm dạng cột nếu còn khớp, nếu không thì đọc CSV với kiểu khai báo trước.
+# columns: chỉ đọc các cột cần dùng; bao_cao=True in thời gian đọc và bộ nhớ.
+# loc: chỉ đọc các dòng thỏa điều kiện lọc (như truyvan.truy_van: bỏ qua các vùng của bộ đệm hoặc các
+# phân vùng không chứa chúng), ví dụ {'Crop': 'Rice', 'Crop_Year': (1990, 1999)}.
+def load_and_clean_data(file_path=FILE_DU_LIEU, columns=None, bao_cao=False, loc=None):
+    # Nếu tracemalloc đã được bật (theodoi với THEODOI_PROFILE=tracemalloc) thì không tắt nó ở đây
+    tu_bat = bao_cao and not tracemalloc.is_tracing()
+    if tu_bat:
+        tracemalloc.start()
+    start = time.perf_counter()
+
+    with giai_doan('doc_du_lieu', file=file_path) as gd:
+        if loc:
+            from truyvan import truy_van
+            gd.dat(nguon='truy_van')
+            df = truy_van(file_path, loc, columns, tao_cache=False)
+            for col in COT_PHAN_LOAI:
+                if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                    df[col] = df[col].astype('category')
+        elif cache_moi(file_path):
+            gd.dat(nguon='cache')
+            df = doc_bang(file_path, columns)
+        else:
+            gd.dat(nguon='csv')
+            df = _doc_csv(file_path, columns)
+        so_dong_doc = len(df)
+        for col in COT_PHAN_LOAI:
+            if col in df.columns:
+                df[col] = _chuan_hoa_nhan(df[col])
+
+        df = df.loc[mask_hop_le(df)]
+        df = df.astype({c: k for c, k in KIEU_COT.items() if c in df.columns and df[c].dtype != k})
+        df.index = pd.RangeIndex(len(df))
+        gd.dat(so_dong=so_dong_doc, so_dong_hop_le=len(df))
+
+    if bao_cao:
+        thoi_gian = time.perf_counter() - start
+        _, dinh = tracemalloc.get_traced_memory()
+        if tu_bat:
+            tracemalloc.stop()
+        bo_nho = df.memory_usage(deep=True).sum()
+        kieu_cu = _bo_nho_kieu_cu(df)
+        print(f"Đọc {file_path}: {so_dong_doc} dòng -> {len(df)} dòng hợp lệ trong {thoi_gian:.3f} giây")
+        print(f"Bộ nhớ bảng: {bo_nho / 1e6:.2f} MB (kiểu object/float64: {kieu_cu / 1e6:.2f} MB, "
+              f"giảm {kieu_cu / max(bo_nho, 1):.1f} lần), đỉnh bộ nhớ khi đọc: {dinh / 1e6:.2f} MB")
+    return df
@@ -0,0 +1,310 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sinhdulieu import KICH_THUOC, hoc_ho_so, so_dong, tao_du_lieu
+from theodoi import giai_doan, rss_dinh_mb, rss_mb
+
+# Bộ đo hiệu năng: sinh dữ liệu tổng hợp ở các kích thước 10k/1m/10m/100m dòng (sinhdulieu.py) rồi
+# đo thời gian và bộ nhớ của từng giai đoạn: làm sạch, thống kê mô tả, mã hóa, huấn luyện, dự báo,
+# mô phỏng kịch bản, tổng hợp, truy vấn và vẽ biểu đồ. Mỗi lần đo chạy trong một tiến trình mới (spawn)
+# nên đỉnh RSS đo được chỉ là của giai đoạn đó; thư viện được import trước khi bấm giờ. Kết quả ghi ra
+# JSON (kèm phiên bản mã nguồn, thư viện, máy) để so sánh giữa các phiên bản: --so-sanh báo các giai
+# đoạn chậm hơn ngưỡng.
+
+PHIEN_BAN = 1
+KICH_THUOC_DOC = 1_000_000  # số dòng mỗi khối khi duyệt bộ đệm dạng cột
+GIOI_HAN_BIEU_DO = 10_000_000  # biểu đồ nạp cả bảng vào bộ nhớ, bỏ qua khi nhiều dòng hơn
+
+
+def _file_sach(ctx):
+    return os.path.join(ctx['thu_muc'], 'sach.csv')
+
+
+def _file_goi(ctx):
+    return os.path.join(ctx['thu_muc'], 'mo_hinh.bundle.json')
+
+
+# Duyệt bộ đệm dạng cột theo khối: (start, end, {cột: mảng}, schema)
+def _cac_khoi(file_path, columns):
+    from bodem import doc_cot
+    mang, schema = doc_cot(file_path, columns)
+    n = schema['so_dong']
+    for start in range(0, n, KICH_THUOC_DOC):
+        end = min(start + KICH_THUOC_DOC, n)
+        yield start, end, {c: mang[c][start:end] for c in mang}, schema
+
+
+def _bang_khoi(cot, schema):
+    import pandas as pd
+    nhan = {m['ten']: m['categories'] for m in schema['cot'] if 'categories' in m}
+    return pd.DataFrame({c: pd.Categorical.from_codes(a, categories=nhan[c]) if c in nhan else np.asarray(a)
+                         for c, a in cot.items()})
+
+
+# === Các giai đoạn: nhận ngữ cảnh, trả về số dòng đã xử lý ===
+
+def _gd_lam_sach(ctx):
+    from bodem import ghi_cache
+    from khoitonghop import file_khoi
+    from lamsach import chay_pipeline, gop_phan_vung
+    thu_muc_phan_vung = os.path.join(ctx['thu_muc'], 'parts')
+    ket_qua = chay_pipeline(ctx['file_tho'], thu_muc_phan_vung, so_tien_trinh=ctx['so_tien_trinh'])
+    gop_phan_vung(ket_qua.files, _file_sach(ctx))
+    schema = ghi_cache(_file_sach(ctx), so_dong=ket_qua.so_dong_ra)
+    ket_qua.khoi.save(file_khoi(_file_sach(ctx)), ma_bam=schema['nguon']['hash'])
+    shutil.rmtree(thu_muc_phan_vung, ignore_errors=True)
+    return ket_qua.so_dong_vao
+
+
+def _thong_ke_khoi(viec):
+    import pandas as pd
+    from bodem import COT_PHAN_LOAI, doc_cot
+    from thongke import StreamingStats
+    file_path, start, end = viec
+    mang, _ = doc_cot(file_path)
+    df = pd.DataFrame({c: np.asarray(mang[c][start:end]) for c in mang if c not in COT_PHAN_LOAI})
+    return StreamingStats().update(df)
+
+
+def _gd_thong_ke(ctx):
+    from bodem import doc_schema
+    from thongke import StreamingStats
+    n = doc_schema(_file_sach(ctx))['so_dong']
+    viec = [(_file_sach(ctx), s, min(s + KICH_THUOC_DOC, n)) for s in range(0, n, KICH_THUOC_DOC)]
+    stats = StreamingStats()
+    if ctx['so_tien_trinh'] == 1 or len(viec) <= 1:
+        phan = map(_thong_ke_khoi, viec)
+    else:
+        with ProcessPoolExecutor(max_workers=ctx['so_tien_trinh']) as pool:
+            phan = list(pool.map(_thong_ke_khoi, viec))
+    for p in phan:
+        stats.merge(p)
+    stats.descriptive()
+    return n
+
+
+def _gd_ma_hoa(ctx):
+    from bodem import doc_schema
+    from mahoa import CategoricalEncoder
+    schema = doc_schema(_file_sach(ctx))
+    categories = {m['ten']: m['categories'] for m in schema['cot'] if 'categories' in m}
+    cot_so = [m['ten'] for m in schema['cot'] if m['ten'] not in categories and m['ten'] != 'Production']
+    encoder = CategoricalEncoder.from_categories(cot_so, categories)
+    for _, _, cot, schema in _cac_khoi(_file_sach(ctx), cot_so + list(categories)):
+        encoder.transform(_bang_khoi(cot, schema))
+    return schema['so_dong']
+
+
+def _gd_huan_luyen(ctx):
+    from goimohinh import GoiMoHinh
+    from hoiquy_tangdan import huan_luyen_ngoai_bo_nho
+    model, train, test = huan_luyen_ngoai_bo_nho(_file_sach(ctx), so_tien_trinh=ctx['so_tien_trinh'])
+    GoiMoHinh.tu_mo_hinh(model, train.encoder, metrics={'test_r2': test.danh_gia(model)['r2']}).save(_file_goi(ctx))
+    return train.n + test.n
+
+
+def _gd_du_bao(ctx):
+    from dichvudubao import BoDuBao
+    bo_du_bao = BoDuBao.tu_goi(_file_goi(ctx))
+    n = 0
+    for start, end, cot, _ in _cac_khoi(_file_sach(ctx), bo_du_bao.cot_so + bo_du_bao.cot_phan_loai):
+        bo_du_bao.du_bao_lo(cot)
+        n += end - start
+    return n
+
+
+def _gd_kich_ban(ctx):
+    from dichvudubao import BoDuBao
+    from kichban import LuoiKichBan
+    from bodem import doc_schema
+    # Lưới cỡ 100 kịch bản cho mỗi dòng dữ liệu: mọi Crop x Season x Area x Temperature ±3°C, rút gọn
+    # thành mặt đáp ứng theo Crop x Temperature
+    bo_du_bao = BoDuBao.tu_goi(_file_goi(ctx))
+    so_o = int(np.prod([len(bo_du_bao.nhan[c]) for c in bo_du_bao.cot_phan_loai]))
+    so_diem = max(1, 100 * doc_schema(_file_sach(ctx))['so_dong'] // (so_o * 61))
+    truc = {'Crop_Year': 2000, 'Area': np.linspace(100, 10_000, so_diem), 'Temperature': 22 + 0.1 * np.arange(61),
+            'Humidity': 60, 'Wind_Speed': 10}
+    luoi = LuoiKichBan(bo_du_bao, {c: v for c, v in truc.items() if c in bo_du_bao.cot_so})
+    luoi.be_mat(['Crop', 'Temperature'], so_luong=ctx['so_tien_trinh'])
+    return luoi.so_kich_ban
+
+
+def _gd_tong_hop(ctx):
+    from khoitonghop import CHIEU, DAI_LUONG, KhoiTongHop
+    khoi = KhoiTongHop()
+    n = 0
+    for start, end, cot, schema in _cac_khoi(_file_sach(ctx), CHIEU + DAI_LUONG):
+        khoi.update(_bang_khoi(cot, schema))
+        n += end - start
+    khoi.tong_hop(['Season', 'Crop'], 'Production', 'mean')
+    khoi.tong_hop(['Crop_Year', 'Crop'], 'Production', 'mean')
+    khoi.tong_hop('Crop', 'Production', 'sum')
+    return n
+
+
+def _gd_truy_van(ctx):
+    from truyvan import truy_van
+    file_sach = _file_sach(ctx)
+    # Lọc một loại cây trong một thập kỷ, lấy dòng và tổng hợp theo vụ; rồi tổng hợp cả bảng theo năm
+    loc = {'Crop': 'Rice', 'Crop_Year': (2000, 2009)}
+    truy_van(file_sach, loc, ['Crop_Year', 'Season', 'Area', 'Production'])
+    truy_van(file_sach, loc, theo='Season', tong_hop={'Production': ['mean', 'sum']})
+    truy_van(file_sach, theo='Crop_Year', tong_hop={'Production': 'mean'})
+    from bodem import doc_schema
+    return doc_schema(file_sach)['so_dong']
+
+
+def _gd_bieu_do(ctx):
+    from baocaobieudo import tao_bao_cao
+    thu_muc_ra = os.path.join(ctx['thu_muc'], 'bieu_do')
+    shutil.rmtree(thu_muc_ra, ignore_errors=True)
+    tao_bao_cao(_file_sach(ctx), thu_muc_ra, ('png',), so_tien_trinh=ctx['so_tien_trinh'])
+    from bodem import doc_schema
+    return doc_schema(_file_sach(ctx))['so_dong']
+
+
+# Thứ tự chạy; các giai đoạn sau cần file đã làm sạch (và gói mô hình cho du_bao, kich_ban)
+GIAI_DOAN = {'lam_sach': _gd_lam_sach,
+             'thong_ke': _gd_thong_ke,
+             'ma_hoa': _gd_ma_hoa,
+             'huan_luyen': _gd_huan_luyen,
+             'du_bao': _gd_du_bao,
+             'kich_ban': _gd_kich_ban,
+             'tong_hop': _gd_tong_hop,
+             'truy_van': _gd_truy_van,
+             'bieu_do': _gd_bieu_do}
+THU_VIEN = ['pandas', 'scipy.stats', 'sklearn.linear_model', 'matplotlib', 'seaborn',
+            'bodem', 'lamsach', 'thongke', 'mahoa', 'hoiquy_tangdan', 'khoitonghop', 'dichvudubao', 'baocaobieudo',
+            'truyvan', 'kichban']
+
+
+# Chạy trong tiến trình mới: import trước, rồi bấm giờ một giai đoạn và lấy đỉnh RSS
+def _chay_giai_doan(ten, ctx):
+    import importlib
+    for m in THU_VIEN:
+        importlib.import_module(m)
+    rss_dau = rss_mb()
+    start = time.perf_counter()
+    with giai_doan(ten) as gd:
+        so_dong_xu_ly = GIAI_DOAN[ten](ctx)
+        gd.dat(so_dong=so_dong_xu_ly)
+    thoi_gian = time.perf_counter() - start
+    # Đỉnh RSS của cả tiến trình (mới tạo cho giai đoạn này) và của tiến trình con lớn nhất (pool của giai đoạn)
+    kq = {'thoi_gian': thoi_gian, 'so_dong': so_dong_xu_ly, 'rss_dau_mb': rss_dau,
+          'rss_dinh_mb': rss_dinh_mb(), 'rss_dinh_con_mb': rss_dinh_mb(con=True)}
+    return {k: float('nan') if v is None else v for k, v in kq.items()}
+
+
+def _do(ten, ctx):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(_chay_giai_doan, ten, ctx).result()
+
+
+def _thong_tin_may():
+    import pandas as pd
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'may': platform.platform(), 'so_cpu': os.cpu_count()}
+
+
+# Đo các giai đoạn trên từng kích thước dữ liệu; lap: số lần đo mỗi giai đoạn (lấy trung vị)
+def chay_do(kich_thuoc=('10k', '1m'), giai_doan=None, lap=1, thu_muc='du_lieu_do', seed=0, so_tien_trinh=None):
+    giai_doan = [g for g in GIAI_DOAN if giai_doan is None or g in giai_doan]
+    ho_so = hoc_ho_so()
+    bao_cao = {'phien_ban': PHIEN_BAN, 'thoi_diem': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'moi_truong': _thong_tin_may(), 'seed': seed, 'ket_qua': []}
+    for ten_kt in kich_thuoc:
+        n = so_dong(ten_kt)
+        ctx = {'thu_muc': os.path.join(thu_muc, ten_kt), 'file_tho': os.path.join(thu_muc, ten_kt, 'tho.csv'),
+               'so_tien_trinh': so_tien_trinh}
+        start = time.perf_counter()
+        if tao_du_lieu(n, ctx['file_tho'], seed, ho_so, so_tien_trinh):
+            print(f"[{ten_kt}] sinh {n} dòng: {time.perf_counter() - start:.1f} giây")
+        # Chuẩn bị (không tính giờ) những gì giai đoạn được chọn cần mà chưa có
+        from bodem import cache_moi
+        if 'lam_sach' not in giai_doan and not cache_moi(_file_sach(ctx)):
+            _do('lam_sach', ctx)
+        if 'du_bao' in giai_doan and 'huan_luyen' not in giai_doan and not os.path.exists(_file_goi(ctx)):
+            _do('huan_luyen', ctx)
+
+        for ten in giai_doan:
+            if ten == 'bieu_do' and n > GIOI_HAN_BIEU_DO:
+                bao_cao['ket_qua'].append({'kich_thuoc': ten_kt, 'giai_doan': ten, 'bo_qua':
+                                           f"nhiều hơn {GIOI_HAN_BIEU_DO} dòng"})
+                continue
+            lan = [_do(ten, ctx) for _ in range(lap)]
+            thoi_gian = [r['thoi_gian'] for r in lan]
+            muc = {'kich_thuoc': ten_kt, 'giai_doan': ten, 'so_dong': lan[0]['so_dong'],
+                   'thoi_gian': float(np.median(thoi_gian)), 'thoi_gian_min': min(thoi_gian),
+                   'thoi_gian_tung_lan': thoi_gian,
+                   'dong_moi_giay': lan[0]['so_dong'] / max(float(np.median(thoi_gian)), 1e-9),
+                   'rss_dau_mb': max(r['rss_dau_mb'] for r in lan),
+                   'rss_dinh_mb': max(r['rss_dinh_mb'] for r in lan),
+                   'rss_dinh_con_mb': max(r['rss_dinh_con_mb'] for r in lan)}
+            bao_cao['ket_qua'].append(muc)
+            print(f"[{ten_kt}] {ten:<11} {muc['thoi_gian']:>9.3f} s {muc['dong_moi_giay']:>14,.0f} dòng/s "
+                  f"RSS {muc['rss_dinh_mb']:>8.1f} MB (con {muc['rss_dinh_con_mb']:.1f} MB)")
+    return bao_cao
+
+
+# So với báo cáo cũ: danh sách (kích thước, giai đoạn, tỷ lệ thời gian mới/cũ) chậm hơn nguong lần
+def so_sanh(moi, cu, nguong=1.2):
+    truoc = {(r['kich_thuoc'], r['giai_doan']): r for r in cu['ket_qua'] if 'thoi_gian' in r}
+    cham = []
+    for r in moi['ket_qua']:
+        r_cu = truoc.get((r['kich_thuoc'], r['giai_doan']))
+        if r_cu is None or 'thoi_gian' not in r:
+            continue
+        ti_le = r['thoi_gian'] / max(r_cu['thoi_gian'], 1e-9)
+        r['so_voi_truoc'] = ti_le
+        if ti_le > nguong:
+            cham.append((r['kich_thuoc'], r['giai_doan'], ti_le))
+    return cham
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo hiệu năng các giai đoạn xử lý trên dữ liệu tổng hợp")
+    parser.add_argument('--kich-thuoc', nargs='+', default=['10k', '1m'],
+                        help=f"các kích thước dữ liệu: {list(KICH_THUOC)} hoặc số dòng")
+    parser.add_argument('--giai-doan', nargs='+', choices=list(GIAI_DOAN), help="chỉ đo các giai đoạn này")
+    parser.add_argument('--lap', type=int, default=1, help="số lần đo mỗi giai đoạn (lấy trung vị)")
+    parser.add_argument('--thu-muc', default='du_lieu_do', help="thư mục chứa dữ liệu sinh ra và kết quả trung gian")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="số tiến trình (mặc định: số lõi CPU)")
+    parser.add_argument('-o', '--out', default='ket_qua_do_hieu_nang.json', help="file JSON kết quả")
+    parser.add_argument('--so-sanh', help="file JSON kết quả của phiên bản trước để phát hiện chậm đi")
+    parser.add_argument('--nguong', type=float, default=1.2, help="tỷ lệ thời gian coi là chậm đi")
+    args = parser.parse_args(argv)
+
+    bao_cao = chay_do(args.kich_thuoc, args.giai_doan, args.lap, args.thu_muc, args.seed, args.workers)
+    cham = []
+    if args.so_sanh:
+        with open(args.so_sanh, encoding='utf-8') as f:
+            cham = so_sanh(bao_cao, json.load(f), args.nguong)
+        bao_cao['so_sanh'] = {'file': args.so_sanh, 'nguong': args.nguong,
+                              'cham_di': [{'kich_thuoc': k, 'giai_doan': g, 'ti_le': t} for k, g, t in cham]}
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(bao_cao, f, ensure_ascii=False, indent=2)
+    print(f"Đã ghi {args.out}")
+    for k, g, t in cham:
+        print(f"CHẬM ĐI: [{k}] {g} chậm hơn {t:.2f} lần so với {args.so_sanh}")
+    if cham:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+# Gói mô hình (model bundle) dạng JSON: hệ số, intercept, schema đặc trưng (cột số, cột phân loại,
+# danh sách nhãn, tên đặc trưng), mã băm dữ liệu huấn luyện, chỉ số đánh giá và thời điểm huấn luyện.
+# Nạp lại chỉ mất vài mili giây và không cần dữ liệu huấn luyện. Các script khởi động từ gói
+# (warm-start) và chỉ huấn luyện lại khi mã băm dữ liệu hoặc cấu hình huấn luyện thay đổi.
+# Không import pandas/sklearn ở đầu module để dịch vụ dự báo nạp gói thật nhẹ.
+
+PHIEN_BAN = 1
+
+
+# Tên đặc trưng theo đúng thứ tự của CategoricalEncoder, tính từ schema mà không cần pandas
+def _ten_dac_trung(schema):
+    ten = list(schema['cot_so'])
+    for c in schema['cot_phan_loai']:
+        ten += [f'{c}_{v}' for v in schema['categories'][c][1:]]
+    return ten
+
+
+# Mã băm file dữ liệu: lấy từ bộ đệm dạng cột nếu còn khớp (khỏi đọc lại file), None nếu không có file
+def ma_bam_du_lieu(file_path):
+    from bodem import bam_file, cache_moi, doc_schema
+    if not os.path.exists(file_path):
+        return None
+    if cache_moi(file_path):
+        return doc_schema(file_path)['nguon']['hash']
+    return bam_file(file_path)
+
+
+class GoiMoHinh:
+    # schema: CategoricalEncoder.to_dict(); metrics: dict chỉ số; cau_hinh: tham số huấn luyện
+    def __init__(self, coef, intercept, schema, ma_bam=None, metrics=None, cau_hinh=None, thoi_diem=None):
+        self.coef = [float(w) for w in coef]
+        self.intercept = float(intercept)
+        self.schema = schema
+        self.feature_names = _ten_dac_trung(schema)
+        if len(self.coef) != len(self.feature_names):
+            raise ValueError(f"Gói có {len(self.coef)} hệ số nhưng schema có {len(self.feature_names)} đặc trưng")
+        self.ma_bam = ma_bam
+        self.metrics = {k: float(v) for k, v in (metrics or {}).items()}
+        self.cau_hinh = cau_hinh or {}
+        self.thoi_diem = thoi_diem or time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    @classmethod
+    def tu_mo_hinh(cls, model, encoder, ma_bam=None, metrics=None, cau_hinh=None):
+        return cls(model.coef_, model.intercept_, encoder.to_dict(), ma_bam, metrics, cau_hinh)
+
+    # Mô hình MoHinhTuyenTinh (có predict/score) dựng lại từ hệ số
+    def mo_hinh(self):
+        from hoiquy_tangdan import MoHinhTuyenTinh
+        return MoHinhTuyenTinh(self.coef, self.intercept, self.feature_names)
+
+    def encoder(self):
+        from mahoa import CategoricalEncoder
+        return CategoricalEncoder.from_dict(self.schema)
+
+    # Gói còn dùng được cho dữ liệu/cấu hình hiện tại không (ma_bam=None: không có dữ liệu để so)
+    def con_khop(self, ma_bam, cau_hinh=None):
+        return (ma_bam is None or ma_bam == self.ma_bam) and (cau_hinh or {}) == self.cau_hinh
+
+    def to_dict(self):
+        return {'phien_ban': PHIEN_BAN,
+                'thoi_diem': self.thoi_diem,
+                'du_lieu': {'hash': self.ma_bam},
+                'cau_hinh': self.cau_hinh,
+                'schema': dict(self.schema, feature_names=self.feature_names),
+                'coef': self.coef,
+                'intercept': self.intercept,
+                'metrics': self.metrics}
+
+    @classmethod
+    def from_dict(cls, d):
+        if d.get('phien_ban') != PHIEN_BAN:
+            raise ValueError(f"Phiên bản gói {d.get('phien_ban')} không được hỗ trợ (cần {PHIEN_BAN})")
+        schema = {k: v for k, v in d['schema'].items() if k != 'feature_names'}
+        goi = cls(d['coef'], d['intercept'], schema, d['du_lieu']['hash'], d['metrics'], d['cau_hinh'],
+                  d['thoi_diem'])
+        if d['schema'].get('feature_names', goi.feature_names) != goi.feature_names:
+            raise ValueError("Tên đặc trưng trong gói không khớp với danh sách nhãn")
+        return goi
+
+    # Ghi ra file tạm rồi đổi tên để không bao giờ để lại gói ghi dở
+    def save(self, path):
+        tam = path + '.tmp'
+        with open(tam, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tam, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+# Nạp gói nếu có và hợp lệ, ngược lại trả về None
+def nap_goi(path):
+    try:
+        return GoiMoHinh.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+# Warm-start: dùng gói đã lưu nếu mã băm dữ liệu và cấu hình không đổi, nếu không thì gọi
+# huan_luyen() (trả về model, encoder, metrics) rồi lưu gói mới. Trả về (gói, có huấn luyện lại không).
+def nap_hoac_huan_luyen(path, file_du_lieu, huan_luyen, cau_hinh=None):
+    ma_bam = ma_bam_du_lieu(file_du_lieu)
+    goi = nap_goi(path)
+    if goi is not None and goi.con_khop(ma_bam, cau_hinh):
+        return goi, False
+    model, encoder, metrics = huan_luyen()
+    goi = GoiMoHinh.tu_mo_hinh(model, encoder, ma_bam, metrics, cau_hinh)
+    goi.save(path)
+    return goi, True
@@ -0,0 +1,424 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from bodem import COT_PHAN_LOAI, KIEU_COT, cache_moi, doc_cot, doc_schema, thu_muc_cache
+from lamsach import chia_khoang, doc_khoang, lam_sach_chunk
+from mahoa import CategoricalEncoder
+
+# Huấn luyện hồi quy tuyến tính ngoài bộ nhớ (out-of-core): đọc dữ liệu theo từng khối
+# và cộng dồn hệ phương trình chuẩn X^T X, X^T y. Cột one-hot của Crop/Season không được
+# tạo ra mà cộng thẳng bằng bincount trên mã category, nên bộ nhớ chỉ phụ thuộc số đặc
+# trưng (O(p²)), không phụ thuộc số dòng. Các bộ cộng dồn gộp được bằng phép cộng nên có
+# thể tính song song ở nhiều tiến trình rồi gộp lại.
+
+FILE_DU_LIEU = 'Crop_production_in_India_ok.csv'
+BIEN_MUC_TIEU = 'Production'
+KICH_THUOC_KHOI = 1_000_000
+PHIEN_BAN = 2  # định dạng file lưu hệ phương trình chuẩn
+
+
+# Giải hệ phương trình chuẩn trên dữ liệu đã trừ trung bình (như LinearRegression của sklearn),
+# lstsq cho nghiệm chuẩn nhỏ nhất khi ma trận suy biến. Trả về (coef, intercept).
+def _giai(n, tong_x, xtx, tong_y, xty):
+    mean_x = tong_x / n
+    mean_y = tong_y / n
+    c = xtx - n * np.outer(mean_x, mean_x)
+    d = xty - n * mean_x * mean_y
+    coef = np.linalg.lstsq(c, d, rcond=None)[0]
+    return coef, mean_y - mean_x @ coef
+
+
+# Hạ tọa độ (coordinate descent) cho ElasticNet theo đúng hàm mục tiêu của sklearn:
+# 1/(2n) ||y - Xw||² + alpha * l1_ratio * ||w||₁ + alpha * (1 - l1_ratio) / 2 * ||w||²
+def _ha_toa_do(c, d, n, alpha, l1_ratio, max_iter=10_000, tol=1e-8):
+    w = np.zeros(len(d))
+    nguong = n * alpha * l1_ratio
+    mau = np.diag(c) + n * alpha * (1 - l1_ratio)
+    # Dừng khi thay đổi lớn nhất của giá trị dự báo (|Δw_j| * độ lệch của cột j) đủ nhỏ so với y
+    co = np.diag(c) > 0
+    thang = np.max(np.abs(d[co]) / np.sqrt(np.diag(c)[co])) if co.any() else 0.0
+    for _ in range(max_iter):
+        thay_doi = 0.0
+        for j in range(len(d)):
+            if mau[j] <= 0:
+                continue
+            r = d[j] - c[j] @ w + c[j, j] * w[j]
+            moi = np.sign(r) * max(abs(r) - nguong, 0.0) / mau[j]
+            thay_doi = max(thay_doi, abs(moi - w[j]) * np.sqrt(c[j, j]))
+            w[j] = moi
+        if thay_doi <= tol * thang:
+            break
+    return w
+
+
+# Giải hồi quy có phạt trên hệ phương trình chuẩn (xtx, xty) có cột hằng số ở vị trí 0.
+# loai: 'ols', 'ridge' (alpha * ||w||², như sklearn.Ridge), 'lasso' hoặc 'elasticnet' (như sklearn).
+# chon: chỉ số các cột đặc trưng (tính từ 0, không kể hằng số) được dùng, các cột khác có hệ số 0.
+# Trả về beta = [intercept, coef...] cùng độ dài với xty.
+def giai_phat(xtx, xty, loai='ols', alpha=1.0, l1_ratio=0.5, chon=None):
+    chon = [0] + ([i + 1 for i in chon] if chon is not None else list(range(1, len(xty))))
+    a = xtx[np.ix_(chon, chon)]
+    b = xty[chon]
+    n = a[0, 0]
+    mean_x = a[0, 1:] / n
+    mean_y = b[0] / n
+    c = a[1:, 1:] - n * np.outer(mean_x, mean_x)
+    d = b[1:] - n * mean_x * mean_y
+    if loai == 'ols':
+        w = np.linalg.lstsq(c, d, rcond=None)[0]
+    elif loai == 'ridge':
+        w = np.linalg.lstsq(c + alpha * np.eye(len(d)), d, rcond=None)[0]
+    elif loai in ('lasso', 'elasticnet'):
+        w = _ha_toa_do(c, d, n, alpha, 1.0 if loai == 'lasso' else l1_ratio)
+    else:
+        raise ValueError(f"Không có loại mô hình {loai!r}")
+    beta = np.zeros(len(xty))
+    beta[chon] = np.concatenate([[mean_y - mean_x @ w], w])
+    return beta
+
+
+class NormalEquations:
+    # Cột và thứ tự đặc trưng lấy từ bộ mã hóa (mahoa.CategoricalEncoder). Ma trận có thêm
+    # cột hằng số ở vị trí 0.
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.cot_so = encoder.cot_so
+        self.categories = {c: encoder.categories[c] for c in encoder.cot_phan_loai}
+        self.feature_names = list(encoder.feature_names_)
+        p = len(self.feature_names) + 1
+        self.xtx = np.zeros((p, p))
+        self.xty = np.zeros(p)
+        self.yty = 0.0
+
+    # so: mảng (n, số cột số); ma: {cột phân loại: mã số nguyên (n,)}; y: (n,)
+    def update(self, so, ma, y):
+        so = np.asarray(so, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        n, k = so.shape
+        if n == 0:
+            return self
+        a, b = self.xtx, self.xty
+        a[0, 0] += n
+        a[0, 1:k + 1] += so.sum(axis=0)
+        a[1:k + 1, 1:k + 1] += so.T @ so
+        b[0] += y.sum()
+        b[1:k + 1] += so.T @ y
+        self.yty += y @ y
+
+        # Khối one-hot: đếm và tổng theo mã category, bỏ mã 0 (nhóm gốc)
+        vi_tri = k + 1
+        khoang = {}
+        for c, nhan in self.categories.items():
+            m = len(nhan)
+            codes = np.asarray(ma[c], dtype=np.int64)
+            if codes.size and (codes.min() < 0 or codes.max() >= m):
+                raise ValueError(f"Mã của cột {c} nằm ngoài danh sách nhãn")
+            dem = np.bincount(codes, minlength=m)[1:]
+            s = slice(vi_tri, vi_tri + m - 1)
+            a[0, s] += dem
+            a[s, s] += np.diag(dem)
+            for i in range(k):
+                a[1 + i, s] += np.bincount(codes, weights=so[:, i], minlength=m)[1:]
+            b[s] += np.bincount(codes, weights=y, minlength=m)[1:]
+            # Tích chéo với các cột phân loại đứng trước
+            for c2, (s2, m2, codes2) in khoang.items():
+                bang = np.bincount(codes2 * m + codes, minlength=m2 * m).reshape(m2, m)
+                a[s2, s] += bang[1:, 1:]
+            khoang[c] = (s, m, codes)
+            vi_tri += m - 1
+
+        # Chỉ cộng nửa trên, nửa dưới lấy đối xứng
+        iu = np.triu_indices_from(a, 1)
+        a[(iu[1], iu[0])] = a[iu]
+        return self
+
+    # Hệ phương trình tương đương theo bộ mã hóa mới có danh sách nhãn rộng hơn (nhãn mới xuất hiện
+    # khi nối thêm dữ liệu). Với các dòng đã cộng dồn, vector đặc trưng mới là ánh xạ tuyến tính T của
+    # vector cũ (kể cả khi nhóm gốc đổi: chỉ báo của nhóm gốc cũ = 1 - tổng các chỉ báo khác),
+    # nên X'^T X' = T X^T X T^T mà không cần đọc lại dữ liệu.
+    def doi_ma_hoa(self, encoder):
+        if list(encoder.cot_so) != list(self.cot_so) or list(encoder.cot_phan_loai) != list(self.categories):
+            raise ValueError("Bộ mã hóa mới phải có cùng các cột với bộ mã hóa cũ")
+        cu = self.encoder
+        t = np.zeros((encoder.so_dac_trung + 1, cu.so_dac_trung + 1))
+        t[np.arange(len(self.cot_so) + 1), np.arange(len(self.cot_so) + 1)] = 1.0
+        for c, nhan_cu in self.categories.items():
+            vi_tri_cu = {v: i for i, v in enumerate(nhan_cu)}
+            thua = set(nhan_cu) - set(encoder.categories[c])
+            if thua:
+                raise ValueError(f"Bộ mã hóa mới thiếu nhãn của cột {c}: {sorted(thua)}")
+            cot_cu = 1 + cu.vi_tri[c] + np.arange(len(nhan_cu) - 1)
+            for j, v in enumerate(encoder.categories[c][1:]):
+                dong = 1 + encoder.vi_tri[c] + j
+                i = vi_tri_cu.get(v)
+                if i is None:
+                    continue
+                if i > 0:
+                    t[dong, cot_cu[i - 1]] = 1.0
+                else:
+                    t[dong, 0] = 1.0
+                    t[dong, cot_cu] = -1.0
+        moi = NormalEquations(encoder)
+        moi.xtx = t @ self.xtx @ t.T
+        moi.xty = t @ self.xty
+        moi.yty = self.yty
+        return moi
+
+    def merge(self, other):
+        if other.feature_names != self.feature_names:
+            raise ValueError("Không gộp được hai hệ phương trình khác đặc trưng")
+        self.xtx += other.xtx
+        self.xty += other.xty
+        self.yty += other.yty
+        return self
+
+    def solve(self):
+        if self.n == 0:
+            raise ValueError("Chưa có dữ liệu để huấn luyện")
+        coef, intercept = _giai(self.n, self.xtx[0, 1:], self.xtx[1:, 1:], self.xty[0], self.xty[1:])
+        return MoHinhTuyenTinh(coef, intercept, self.feature_names)
+
+    # R² và MSE của một mô hình trên dữ liệu đã cộng dồn, không cần duyệt lại dữ liệu
+    def danh_gia(self, model):
+        n = self.n
+        beta = np.concatenate([[model.intercept_], model.coef_])
+        sse = self.yty - 2 * beta @ self.xty + beta @ self.xtx @ beta
+        sst = self.yty - self.xty[0] ** 2 / n
+        return {'r2': float(1 - sse / sst), 'mse': float(sse / n), 'n': n}
+
+    @property
+    def n(self):
+        return int(self.xtx[0, 0])
+
+
+# Hồi quy tuyến tính bình phương tối thiểu, dùng được cả với ma trận thưa: fit() tính X^T X
+# (kích thước p x p) rồi giải chính xác, thay vì lsqr lặp như LinearRegression khi X thưa.
+class MoHinhTuyenTinh:
+    def __init__(self, coef=None, intercept=0.0, feature_names=None):
+        self.coef_ = None if coef is None else np.asarray(coef, dtype=np.float64)
+        self.intercept_ = float(intercept)
+        self.feature_names_in_ = None if feature_names is None else np.array(feature_names, dtype=object)
+
+    def fit(self, X, y, feature_names=None):
+        if isinstance(X, pd.DataFrame):
+            feature_names = list(X.columns)
+            X = X.to_numpy(dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        xtx = X.T @ X
+        xtx = xtx.toarray() if sp.issparse(xtx) else np.asarray(xtx, dtype=np.float64)
+        self.coef_, self.intercept_ = _giai(len(y), np.asarray(X.sum(axis=0), dtype=np.float64).ravel(), xtx,
+                                            y.sum(), np.asarray(X.T @ y, dtype=np.float64).ravel())
+        self.intercept_ = float(self.intercept_)
+        if feature_names is not None:
+            self.feature_names_in_ = np.array(feature_names, dtype=object)
+        return self
+
+    def predict(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X[list(self.feature_names_in_)].to_numpy(dtype=np.float64)
+        elif not sp.issparse(X):
+            X = np.asarray(X, dtype=np.float64)
+        return np.asarray(X @ self.coef_).ravel() + self.intercept_
+
+    def score(self, X, y):
+        y = np.asarray(y, dtype=np.float64)
+        sai_so = y - self.predict(X)
+        return 1 - (sai_so @ sai_so) / ((y - y.mean()) @ (y - y.mean()))
+
+
+# Bước trộn của splitmix64 trên mảng uint64
+def _tron(x):
+    x = x ^ (x >> np.uint64(30))
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+# Khóa của từng dòng theo nội dung (băm các giá trị đã làm sạch), giống nhau dù dòng được đọc từ CSV,
+# bộ đệm dạng cột hay phân vùng và dù dữ liệu được chia khối thế nào. Cột số được đưa về kiểu lưu trong
+# bộ đệm (bodem.KIEU_COT) trước khi băm để CSV và bộ đệm cho cùng khóa; cột phân loại băm theo nhãn.
+def khoa_dong(so, ma, y, encoder):
+    cot = dict(zip(encoder.cot_so, np.asarray(so).T))
+    cot[BIEN_MUC_TIEU] = y
+    khoa = np.full(len(y), 0x9E3779B97F4A7C15, dtype=np.uint64)
+    for c in sorted(cot):
+        # + 0.0 để -0.0 và 0.0 cho cùng khóa
+        v = np.asarray(cot[c]).astype(KIEU_COT.get(c, np.float64)).astype(np.float64) + 0.0
+        khoa = _tron(khoa ^ v.view(np.uint64))
+    for c in sorted(encoder.cot_phan_loai):
+        bam_nhan = pd.util.hash_array(np.asarray(encoder.categories[c], dtype=object))
+        khoa = _tron(khoa ^ bam_nhan[np.asarray(ma[c], dtype=np.int64)])
+    return khoa
+
+
+# Số ngẫu nhiên trong [0, 1) cố định theo khóa dòng (khoa_dong), không phụ thuộc cách chia khối
+def so_ngau_nhien_dong(khoa, seed):
+    x = _tron(np.asarray(khoa, dtype=np.uint64) + np.uint64((seed * 0x9E3779B97F4A7C15) % (1 << 64)))
+    return (x >> np.uint64(11)) * (1.0 / (1 << 53))
+
+
+# Chia ngẫu nhiên train/test theo khóa dòng
+def _mask_kiem_tra(khoa, test_size, seed):
+    return so_ngau_nhien_dong(khoa, seed) < test_size
+
+
+def _tich_luy(so, ma, y, khoa, encoder, test_size, seed):
+    train = NormalEquations(encoder)
+    test = NormalEquations(encoder)
+    mask = _mask_kiem_tra(khoa, test_size, seed)
+    train.update(so[~mask], {c: m[~mask] for c, m in ma.items()}, y[~mask])
+    test.update(so[mask], {c: m[mask] for c, m in ma.items()}, y[mask])
+    return train, test
+
+
+# Đọc một khối dữ liệu (một phần tử của danh sách việc từ chuan_bi_doc) trong tiến trình con.
+# Trả về (khoa, mảng cột số (n, k), {cột phân loại: mã}, y); khoa là khóa nội dung của từng dòng
+# (khoa_dong), dùng để chia train/test.
+def doc_khoi(khoi, encoder):
+    if khoi[0] == 'loc':
+        # Khối gốc chỉ giữ các dòng thỏa điều kiện lọc
+        from truyvan import _chuan_hoa_loc, _mask
+        _, goc, loc = khoi
+        khoa, so, ma, y = doc_khoi(goc, encoder)
+        cot = dict(zip(encoder.cot_so, so.T))
+        cot.update(ma)
+        cot[BIEN_MUC_TIEU] = y
+        dieu_kien = _chuan_hoa_loc(loc, encoder.categories)
+        mask = _mask(cot, dieu_kien, encoder.categories)
+        return khoa[mask], so[mask], {c: m[mask] for c, m in ma.items()}, y[mask]
+    if khoi[0] == 'phan_vung':
+        # Một phân vùng kiểu Hive (phanvung.py)
+        from phanvung import doc_mot_phan_vung
+        _, thu_muc, p, cot = khoi
+        df = doc_mot_phan_vung(thu_muc, p, cot, encoder.cot_so + encoder.cot_phan_loai + [BIEN_MUC_TIEU])
+    elif khoi[0] == 'cache':
+        # Bộ đệm dạng cột: chỉ chạm vào các dòng [start, end)
+        _, file_path, start, end = khoi
+        mang, _ = doc_cot(file_path, encoder.cot_so + encoder.cot_phan_loai + [BIEN_MUC_TIEU])
+        so = np.column_stack([mang[c][start:end] for c in encoder.cot_so]).astype(np.float64)
+        ma = {c: np.asarray(mang[c][start:end]) for c in encoder.cot_phan_loai}
+        y = np.asarray(mang[BIEN_MUC_TIEU][start:end], dtype=np.float64)
+        return khoa_dong(so, ma, y, encoder), so, ma, y
+    else:
+        # CSV: parse khoảng byte [start, end) rồi làm sạch
+        _, file_path, start, end, header = khoi
+        df = lam_sach_chunk(doc_khoang(file_path, start, end, header))
+    so = df[encoder.cot_so].to_numpy(dtype=np.float64)
+    ma = {c: encoder.codes(c, df[c]) for c in encoder.cot_phan_loai}
+    y = df[BIEN_MUC_TIEU].to_numpy(dtype=np.float64)
+    return khoa_dong(so, ma, y, encoder), so, ma, y
+
+
+def _tich_luy_khoi(viec):
+    khoi, encoder, test_size, seed = viec
+    khoa, so, ma, y = doc_khoi(khoi, encoder)
+    return _tich_luy(so, ma, y, khoa, encoder, test_size, seed)
+
+
+# Danh sách nhãn của các cột phân loại khi không có bộ đệm: chỉ đọc hai cột Crop/Season
+def _quet_nhan(file_path, cot_pl, chunksize):
+    nhan = {c: set() for c in cot_pl}
+    for chunk in pd.read_csv(file_path, usecols=cot_pl, chunksize=chunksize, dtype=str):
+        for c in cot_pl:
+            nhan[c].update(chunk[c].dropna().str.strip().str.title().unique())
+    return {c: sorted(v) for c, v in nhan.items()}
+
+
+# Bộ mã hóa và danh sách khối cần đọc của một file dữ liệu: đọc từ bộ đệm dạng cột nếu còn mới,
+# nếu không thì chia file CSV thành các khoảng byte. Mỗi khối đọc bằng doc_khoi.
+# loc: chỉ học trên các dòng thỏa điều kiện lọc; chỉ đọc các vùng của bộ đệm hoặc các phân vùng
+# (phanvung.py) có thể chứa chúng, theo kế hoạch của truyvan.
+def chuan_bi_doc(file_path=FILE_DU_LIEU, kich_thuoc_khoi=KICH_THUOC_KHOI, loc=None):
+    if loc:
+        from truyvan import _lap_ke_hoach
+        kh = _lap_ke_hoach(file_path, loc, tao_cache=False)
+        if kh['nguon'] == 'phan_vung':
+            from phanvung import nhan_phan_vung
+            manifest = kh['manifest']
+            categories = nhan_phan_vung(manifest, kh['phan_vung'])
+            encoder = CategoricalEncoder.from_categories(
+                [c for c in manifest['cot'] if c not in categories and c != BIEN_MUC_TIEU], categories)
+            khoi = [('phan_vung', kh['thu_muc'], p, manifest['cot']) for p in kh['phan_vung']]
+        elif kh['nguon'] == 'bo_dem':
+            encoder, _ = chuan_bi_doc(file_path, kich_thuoc_khoi)
+            khoi = [('cache', file_path, s, min(s + kich_thuoc_khoi, e))
+                    for start, e in kh['doan'] for s in range(start, e, kich_thuoc_khoi)]
+        else:
+            encoder, khoi = chuan_bi_doc(file_path, kich_thuoc_khoi)
+        return encoder, [('loc', k, loc) for k in khoi]
+    if cache_moi(file_path):
+        schema = doc_schema(file_path)
+        cot = [m['ten'] for m in schema['cot']]
+        categories = {m['ten']: m['categories'] for m in schema['cot'] if 'categories' in m}
+        encoder = CategoricalEncoder.from_categories(
+            [c for c in cot if c not in categories and c != BIEN_MUC_TIEU], categories)
+        khoi = [('cache', file_path, start, min(start + kich_thuoc_khoi, schema['so_dong']))
+                for start in range(0, schema['so_dong'], kich_thuoc_khoi)]
+    else:
+        cot = list(pd.read_csv(file_path, nrows=0).columns)
+        cot_pl = [c for c in cot if c in COT_PHAN_LOAI]
+        categories = _quet_nhan(file_path, cot_pl, kich_thuoc_khoi)
+        encoder = CategoricalEncoder.from_categories(
+            [c for c in cot if c not in categories and c != BIEN_MUC_TIEU], categories)
+        # Khoảng 60 byte mỗi dòng CSV
+        header, khoang = chia_khoang(file_path, kich_thuoc_khoi * 60)
+        khoi = [('csv', file_path, start, end, header) for start, end in khoang]
+    return encoder, khoi
+
+
+# Huấn luyện từ file dữ liệu đã làm sạch mà không nạp cả bảng vào bộ nhớ.
+# Trả về (mô hình, hệ phương trình của tập train, hệ phương trình của tập test);
+# bộ mã hóa dùng khi huấn luyện nằm ở train.encoder. loc: chỉ học trên các dòng thỏa điều kiện (chuan_bi_doc).
+def huan_luyen_ngoai_bo_nho(file_path=FILE_DU_LIEU, test_size=0.2, seed=42, so_tien_trinh=None,
+                            kich_thuoc_khoi=KICH_THUOC_KHOI, loc=None):
+    encoder, khoi = chuan_bi_doc(file_path, kich_thuoc_khoi, loc)
+    viec = [(k, encoder, test_size, seed) for k in khoi]
+
+    train = NormalEquations(encoder)
+    test = NormalEquations(encoder)
+    if so_tien_trinh == 1 or len(viec) <= 1:
+        ket_qua = list(map(_tich_luy_khoi, viec))
+    else:
+        with ProcessPoolExecutor(max_workers=so_tien_trinh) as pool:
+            ket_qua = list(pool.map(_tich_luy_khoi, viec))
+    for tr, te in ket_qua:
+        train.merge(tr)
+        test.merge(te)
+    return train.solve(), train, test
+
+
+# Hệ phương trình chuẩn của tập train/test được lưu kèm bộ đệm để cập nhật khi nối thêm dữ liệu (capnhat.py)
+def file_phuong_trinh(csv_path):
+    return os.path.join(thu_muc_cache(csv_path), 'phuong_trinh_chuan.npz')
+
+
+def luu_phuong_trinh(path, train, test, ma_bam=None, cau_hinh=None):
+    meta = {'phien_ban': PHIEN_BAN, 'encoder': train.encoder.to_dict(), 'ma_bam': ma_bam, 'cau_hinh': cau_hinh or {}}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tam = path + '.tmp.npz'
+    np.savez(tam, meta=json.dumps(meta, ensure_ascii=False), xtx=np.stack([train.xtx, test.xtx]),
+             xty=np.stack([train.xty, test.xty]), yty=np.array([train.yty, test.yty]))
+    os.replace(tam, path)
+    return path
+
+
+# Trả về (train, test, meta); meta có mã băm dữ liệu và cấu hình chia train/test lúc lưu
+def nap_phuong_trinh(path):
+    with np.load(path) as f:
+        meta = json.loads(str(f['meta']))
+        if meta.get('phien_ban') != PHIEN_BAN:
+            raise ValueError(f"File hệ phương trình phiên bản {meta.get('phien_ban')}, cần phiên bản {PHIEN_BAN}")
+        encoder = CategoricalEncoder.from_dict(meta['encoder'])
+        ket_qua = []
+        for i in range(2):
+            eq = NormalEquations(encoder)
+            eq.xtx, eq.xty, eq.yty = f['xtx'][i], f['xty'][i], float(f['yty'][i])
+            ket_qua.append(eq)
+    return ket_qua[0], ket_qua[1], meta
@@ -0,0 +1,358 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Khoảng dự báo bằng bootstrap cho mô hình tuyến tính trong gói (goimohinh.py).
+# - Thống kê đủ: một lượt đọc dữ liệu (song song theo khối như huan_luyen_ngoai_bo_nho, chỉ các dòng
+#   của tập train) chia các dòng vào SO_NHOM nhóm ngẫu nhiên theo khóa dòng và cộng dồn hệ phương trình
+#   chuẩn X^T X, X^T y, y^T y của từng nhóm. Mỗi nhóm là một mẫu ngẫu nhiên các dòng nên lấy lại các nhóm
+#   có hoàn lại tương đương bootstrap theo dòng, mà không phải đọc hay mã hóa lại dữ liệu.
+# - Thống kê của mỗi nhóm lưu gọn như NormalEquations (khối số đặc, tổng theo nhãn cho khối one-hot,
+#   cặp nhãn one-hot x one-hot dạng thưa) nên bộ nhớ không tăng theo số nhóm x p².
+# - Mỗi bản sao: số lần chọn của các nhóm (đa thức) làm trọng số cộng các thống kê nhóm, giải hệ
+#   phương trình chuẩn như mô hình gốc; các loạt bản sao chạy song song ở nhiều tiến trình. Độ lệch chuẩn
+#   phần dư của bản sao cũng lấy từ các tổng (y^T y - 2 b^T X^T y + b^T X^T X b).
+# - Lưu ma trận độ lệch (B, p + 1): hệ số của mỗi bản sao trừ nghiệm trên toàn bộ thống kê, cột cuối là
+#   nhiễu sigma * z của bản sao (z chuẩn tắc, giả định phần dư phân phối chuẩn). Khoảng của một bản ghi là
+#   phân vị của lech @ [1, x, 1] (một phép nhân ma trận-vector nhỏ) cộng vào giá trị dự báo; bỏ cột nhiễu
+#   thì được khoảng tin cậy của giá trị trung bình.
+# Không import pandas/sklearn ở đầu module: nạp và dùng khoảng đã lưu chỉ cần NumPy.
+
+PHIEN_BAN = 2
+SO_BAN_SAO = 1000
+SO_NHOM = 1024
+MUC = 0.95
+BAN_SAO_MOI_VIEC = 50  # số bản sao mỗi việc của tiến trình con (cố định để kết quả không phụ thuộc số tiến trình)
+KICH_THUOC_DOAN = 1 << 14  # số dòng mỗi lần cộng dồn theo nhóm
+
+
+# File khoảng dự báo của một gói: <tên>.bootstrap.npz
+def file_khoang(goi_path):
+    goc = goi_path[:-len('.bundle.json')] if goi_path.endswith('.bundle.json') else os.path.splitext(goi_path)[0]
+    return goc + '.bootstrap.npz'
+
+
+class ThongKeNhom:
+    # Hệ phương trình chuẩn của từng nhóm dòng, lưu gọn như NormalEquations (không có ma trận p x p nào
+    # theo nhóm): z = [1, cột số]
+    # - so: (G, k + 1, k + 1) tích z^T z
+    # - so_ma[c]: (G, k + 1, m - 1) tổng z theo từng nhãn của cột phân loại c (bỏ nhóm gốc); hàng 0 là số
+    #   dòng, cũng là đường chéo của khối one-hot
+    # - cap[(c2, c)]: (khóa cặp nhãn, (G, số cặp)) số dòng của các cặp nhãn thực sự xuất hiện (thưa)
+    # - xty (G, p), yty (G,); cột 0 là hằng số, các cột sau theo thứ tự đặc trưng của bộ mã hóa
+    def __init__(self, encoder, so_nhom=SO_NHOM):
+        self.encoder = encoder
+        self.feature_names = list(encoder.feature_names_)
+        k = len(encoder.cot_so)
+        self.so = np.zeros((so_nhom, k + 1, k + 1))
+        self.so_ma = {c: np.zeros((so_nhom, k + 1, len(encoder.categories[c]) - 1)) for c in encoder.cot_phan_loai}
+        self.cap = {}
+        self.xty = np.zeros((so_nhom, len(self.feature_names) + 1))
+        self.yty = np.zeros(so_nhom)
+
+    @property
+    def so_nhom(self):
+        return len(self.yty)
+
+    # Cộng bảng đếm cặp nhãn (khoa, dem) vào cap[cap_cot], gộp theo hợp các khóa
+    def _cong_cap(self, cap_cot, khoa, dem):
+        if cap_cot not in self.cap:
+            self.cap[cap_cot] = (khoa, dem)
+            return
+        khoa_cu, dem_cu = self.cap[cap_cot]
+        hop = np.union1d(khoa_cu, khoa)
+        moi = np.zeros((self.so_nhom, len(hop)))
+        moi[:, np.searchsorted(hop, khoa_cu)] += dem_cu
+        moi[:, np.searchsorted(hop, khoa)] += dem
+        self.cap[cap_cot] = (hop, moi)
+
+    # so: (n, số cột số); ma: {cột phân loại: mã}; y: (n,); nhom: chỉ số nhóm của từng dòng
+    def update(self, so, ma, y, nhom):
+        for a in range(0, len(y), KICH_THUOC_DOAN):
+            s = slice(a, a + KICH_THUOC_DOAN)
+            o = np.asarray(nhom[s], dtype=np.int64)
+            z = np.column_stack([np.ones(len(o)), np.asarray(so[s], dtype=np.float64)])
+            yy = np.asarray(y[s], dtype=np.float64)
+            k1 = z.shape[1]
+            np.add.at(self.so, o, z[:, :, None] * z[:, None, :])
+            np.add.at(self.xty, (o[:, None], np.arange(k1)), z * yy[:, None])
+            self.yty += np.bincount(o, weights=yy * yy, minlength=self.so_nhom)
+
+            # Khối one-hot: cộng theo mã nhãn, bỏ mã 0 (nhóm gốc)
+            truoc = []
+            for c in self.encoder.cot_phan_loai:
+                codes = np.asarray(ma[c][s], dtype=np.int64)
+                co = codes >= 1
+                np.add.at(self.so_ma[c], (o[co], slice(None), codes[co] - 1), z[co])
+                np.add.at(self.xty, (o[co], self.encoder.vi_tri[c] + codes[co]), yy[co])
+                # Tích chéo với các cột phân loại đứng trước: chỉ các cặp nhãn có trong đoạn
+                m = len(self.encoder.categories[c]) - 1
+                for c2, codes2 in truoc:
+                    ca_hai = co & (codes2 >= 1)
+                    khoa, vi_tri = np.unique((codes2[ca_hai] - 1) * m + codes[ca_hai] - 1, return_inverse=True)
+                    dem = np.zeros((self.so_nhom, len(khoa)))
+                    np.add.at(dem, (o[ca_hai], vi_tri.ravel()), 1.0)
+                    self._cong_cap((c2, c), khoa, dem)
+                truoc.append((c, codes))
+        return self
+
+    def merge(self, other):
+        if other.feature_names != self.feature_names or other.so_nhom != self.so_nhom:
+            raise ValueError("Không gộp được hai bảng thống kê khác đặc trưng hoặc số nhóm")
+        self.so += other.so
+        for c in self.so_ma:
+            self.so_ma[c] += other.so_ma[c]
+        for cap_cot, (khoa, dem) in other.cap.items():
+            self._cong_cap(cap_cot, khoa, dem)
+        self.xty += other.xty
+        self.yty += other.yty
+        return self
+
+    # Chỉ số cột (tính cả hằng số ở cột 0) của một tập con đặc trưng (ví dụ mô hình chỉ dùng Area)
+    def chon(self, feature_names):
+        thieu = [f for f in feature_names if f not in self.feature_names]
+        if thieu:
+            raise ValueError(f"Dữ liệu không có các đặc trưng của mô hình: {thieu}")
+        return [0] + [1 + self.feature_names.index(f) for f in feature_names]
+
+    # Hệ phương trình chuẩn đặc (xtx, xty, yty) của tổng các nhóm với trọng số w (mặc định mỗi nhóm
+    # một lần), chỉ trên các cột cot (mặc định mọi cột)
+    def tong(self, w=None, cot=None):
+        w = np.ones(self.so_nhom) if w is None else np.asarray(w, dtype=np.float64)
+        k1 = self.so.shape[1]
+        p = self.xty.shape[1]
+        a = np.zeros((p, p))
+        a[:k1, :k1] = np.tensordot(w, self.so, axes=1)
+        vi_tri = {}
+        for c, khoi in self.so_ma.items():
+            t = np.tensordot(w, khoi, axes=1)
+            dau = self.encoder.vi_tri[c] + 1
+            vi_tri[c] = dau
+            a[:k1, dau:dau + t.shape[1]] = t
+            a[np.arange(dau, dau + t.shape[1]), np.arange(dau, dau + t.shape[1])] = t[0]
+        for (c2, c), (khoa, dem) in self.cap.items():
+            m = len(self.encoder.categories[c]) - 1
+            a[vi_tri[c2] + khoa // m, vi_tri[c] + khoa % m] = w @ dem
+        # Chỉ điền nửa trên, nửa dưới lấy đối xứng
+        a = np.triu(a) + np.triu(a, 1).T
+        b = w @ self.xty
+        if cot is not None:
+            a, b = a[np.ix_(cot, cot)], b[cot]
+        return a, b, float(w @ self.yty)
+
+
+# Việc của tiến trình con: thống kê theo nhóm của các dòng train trong một khối
+def _thong_ke_khoi(viec):
+    from hoiquy_tangdan import _mask_kiem_tra, doc_khoi, so_ngau_nhien_dong
+    khoi, encoder, test_size, seed, so_nhom = viec
+    khoa, so, ma, y = doc_khoi(khoi, encoder)
+    giu = ~_mask_kiem_tra(khoa, test_size, seed)
+    nhom = (so_ngau_nhien_dong(khoa, seed + 1) * so_nhom).astype(np.int64)
+    return ThongKeNhom(encoder, so_nhom).update(so[giu], {c: m[giu] for c, m in ma.items()}, y[giu], nhom[giu])
+
+
+# Thống kê theo nhóm của tập train (chia train/test theo khóa dòng như huan_luyen_ngoai_bo_nho)
+def thong_ke_nhom(file_path, test_size=0.2, seed=42, so_nhom=SO_NHOM, so_tien_trinh=None, kich_thuoc_khoi=None):
+    from hoiquy_tangdan import KICH_THUOC_KHOI, chuan_bi_doc
+    encoder, khoi = chuan_bi_doc(file_path, kich_thuoc_khoi or KICH_THUOC_KHOI)
+    viec = [(k, encoder, test_size, seed, so_nhom) for k in khoi]
+    if so_tien_trinh == 1 or len(viec) <= 1:
+        ket_qua = list(map(_thong_ke_khoi, viec))
+    else:
+        with ProcessPoolExecutor(max_workers=so_tien_trinh) as pool:
+            ket_qua = list(pool.map(_thong_ke_khoi, viec))
+    tong = ThongKeNhom(encoder, so_nhom)
+    for tk in ket_qua:
+        tong.merge(tk)
+    return tong
+
+
+# Việc của tiến trình con: một loạt bản sao bootstrap. Trả về (so, p + 1): hệ số [chặn, w...] và nhiễu.
+def _ban_sao(viec):
+    from hoiquy_tangdan import giai_phat
+    tk, cot, seed, dau, so = viec
+    g, p = tk.so_nhom, len(cot)
+    rng = np.random.default_rng([seed, dau])
+    dem = rng.multinomial(g, np.full(g, 1.0 / g), size=so).astype(np.float64)
+    z = rng.standard_normal(so)
+    ket_qua = np.empty((so, p + 1))
+    for i in range(so):
+        a, b, c = tk.tong(dem[i], cot)
+        beta = giai_phat(a, b)
+        sse = c - 2 * beta @ b + beta @ a @ beta
+        ket_qua[i, :p] = beta
+        ket_qua[i, p] = np.sqrt(max(sse, 0.0) / max(a[0, 0] - p, 1.0)) * z[i]
+    return ket_qua
+
+
+# B bản sao bootstrap từ thống kê theo nhóm tk (ThongKeNhom) trên các cột cot, chạy song song theo loạt
+def bootstrap(tk, cot, so_ban_sao=SO_BAN_SAO, seed=0, so_tien_trinh=None):
+    viec = [(tk, cot, seed, dau, min(BAN_SAO_MOI_VIEC, so_ban_sao - dau))
+            for dau in range(0, so_ban_sao, BAN_SAO_MOI_VIEC)]
+    if so_tien_trinh == 1 or len(viec) <= 1:
+        ket_qua = list(map(_ban_sao, viec))
+    else:
+        with ProcessPoolExecutor(max_workers=so_tien_trinh) as pool:
+            ket_qua = list(pool.map(_ban_sao, viec))
+    return np.concatenate(ket_qua)
+
+
+# Mã băm của một gói mô hình (hệ số, intercept và cấu hình huấn luyện): khoảng đã lưu chỉ dùng lại khi
+# gói không được huấn luyện lại, kể cả khi dữ liệu không đổi nhưng cấu hình/cách chia train/test khác
+def ma_bam_goi(goi):
+    noi_dung = json.dumps({'coef': goi.coef, 'intercept': goi.intercept, 'cau_hinh': goi.cau_hinh}, sort_keys=True)
+    return hashlib.sha256(noi_dung.encode('utf-8')).hexdigest()
+
+
+class KhoangDuBao:
+    # lech: (B, p + 1) độ lệch hệ số [chặn, w...] của các bản sao và cột nhiễu; schema: của gói mô hình;
+    # ma_goi: ma_bam_goi của gói lúc dựng
+    def __init__(self, lech, schema, ma_bam=None, cau_hinh=None, thoi_diem=None, ma_goi=None):
+        self.lech = np.ascontiguousarray(lech, dtype=np.float64)
+        self.schema = schema
+        self.cot_so = list(schema['cot_so'])
+        self.cot_phan_loai = list(schema['cot_phan_loai'])
+        # Vị trí cột one-hot (tính cả hằng số ở cột 0) của từng nhãn, bỏ nhóm gốc
+        self._cot = {}
+        vi_tri = 1 + len(self.cot_so)
+        for c in self.cot_phan_loai:
+            nhan = schema['categories'][c]
+            self._cot[c] = {v: vi_tri + i - 1 for i, v in enumerate(nhan) if i > 0}
+            vi_tri += len(nhan) - 1
+        if self.lech.shape[1] != vi_tri + 1:
+            raise ValueError(f"Ma trận bootstrap có {self.lech.shape[1]} cột, schema cần {vi_tri + 1}")
+        self.ma_bam = ma_bam
+        self.cau_hinh = cau_hinh or {}
+        self.thoi_diem = thoi_diem or time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.ma_goi = ma_goi
+
+    @property
+    def so_ban_sao(self):
+        return len(self.lech)
+
+    # Vector [1, cột số, one-hot, 1] của một bản ghi (nhãn lạ coi như nhóm gốc)
+    def vector(self, record):
+        v = np.zeros(self.lech.shape[1])
+        v[0] = v[-1] = 1.0
+        for i, c in enumerate(self.cot_so, 1):
+            v[i] = float(record[c])
+        for c in self.cot_phan_loai:
+            j = self._cot[c].get(str(record[c]).strip().title())
+            if j is not None:
+                v[j] = 1.0
+        return v
+
+    # Khoảng mức muc quanh giá trị dự báo y của một bản ghi (dict) hoặc vector đặc trưng x (như
+    # CategoricalEncoder.transform_one). nhieu=False: khoảng tin cậy của giá trị trung bình.
+    def khoang(self, x, y, muc=MUC, nhieu=True):
+        v = self.vector(x) if isinstance(x, dict) else np.concatenate([[1.0], np.asarray(x, dtype=np.float64), [1.0]])
+        if not nhieu:
+            v[-1] = 0.0
+        thap, cao = np.quantile(self.lech @ v, [(1 - muc) / 2, (1 + muc) / 2])
+        return y + thap, y + cao
+
+    def con_khop(self, goi, cau_hinh=None):
+        return (self.ma_bam == goi.ma_bam and self.schema == goi.schema and self.ma_goi == ma_bam_goi(goi)
+                and (cau_hinh or {}) == self.cau_hinh)
+
+    def save(self, path):
+        meta = {'phien_ban': PHIEN_BAN, 'schema': self.schema, 'ma_bam': self.ma_bam, 'cau_hinh': self.cau_hinh,
+                'thoi_diem': self.thoi_diem, 'ma_goi': self.ma_goi}
+        tam = path + '.tmp.npz'
+        np.savez(tam, meta=json.dumps(meta, ensure_ascii=False), lech=self.lech)
+        os.replace(tam, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            meta = json.loads(str(f['meta']))
+            if meta.get('phien_ban') != PHIEN_BAN:
+                raise ValueError(f"File bootstrap phiên bản {meta.get('phien_ban')}, cần phiên bản {PHIEN_BAN}")
+            return cls(f['lech'], meta['schema'], meta['ma_bam'], meta['cau_hinh'], meta['thoi_diem'],
+                       meta.get('ma_goi'))
+
+
+# Dựng khoảng dự báo cho gói mô hình goi (goimohinh.GoiMoHinh) từ file dữ liệu. Tập train luôn chia theo
+# khóa dòng (hoiquy_tangdan._mask_kiem_tra) với test_size và seed/random_state của gói: trùng đúng tập train
+# của gói huấn luyện ngoài bộ nhớ (--out-of-core), còn gói huấn luyện trong bộ nhớ (train_test_split của
+# sklearn) thì đây chỉ là một tập train khác cùng kích thước trên cùng dữ liệu, nên khoảng là xấp xỉ. Lệch
+# tính quanh nghiệm trên toàn bộ thống kê của chính tập train này (không phải hệ số của gói).
+def tao_khoang(goi, file_du_lieu, so_ban_sao=SO_BAN_SAO, seed=0, so_tien_trinh=None, so_nhom=SO_NHOM):
+    from hoiquy_tangdan import giai_phat
+    test_size = goi.cau_hinh.get('test_size', 0.2)
+    seed_chia = goi.cau_hinh.get('seed', goi.cau_hinh.get('random_state', 42))
+    tk = thong_ke_nhom(file_du_lieu, test_size, seed_chia, so_nhom, so_tien_trinh)
+    cot = tk.chon(goi.feature_names)
+    ban_sao = bootstrap(tk, cot, so_ban_sao, seed, so_tien_trinh)
+    xtx, xty, _ = tk.tong(cot=cot)
+    ban_sao[:, :-1] -= giai_phat(xtx, xty)
+    cau_hinh = {'so_ban_sao': so_ban_sao, 'seed': seed, 'so_nhom': so_nhom}
+    return KhoangDuBao(ban_sao, goi.schema, goi.ma_bam, cau_hinh, ma_goi=ma_bam_goi(goi))
+
+
+# Dùng khoảng đã lưu cạnh gói nếu còn khớp gói (mã băm dữ liệu, schema, hệ số và cấu hình huấn luyện)
+# và cấu hình bootstrap, nếu không thì dựng lại và lưu. Trả về (khoảng, có dựng lại không).
+def nap_hoac_tao(goi_path, file_du_lieu, goi=None, so_ban_sao=SO_BAN_SAO, seed=0, so_tien_trinh=None):
+    if goi is None:
+        from goimohinh import GoiMoHinh
+        goi = GoiMoHinh.load(goi_path)
+    path = file_khoang(goi_path)
+    cau_hinh = {'so_ban_sao': so_ban_sao, 'seed': seed, 'so_nhom': SO_NHOM}
+    try:
+        khoang = KhoangDuBao.load(path)
+        if khoang.con_khop(goi, cau_hinh):
+            return khoang, False
+    except (OSError, ValueError, KeyError):
+        pass
+    khoang = tao_khoang(goi, file_du_lieu, so_ban_sao, seed, so_tien_trinh)
+    khoang.save(path)
+    return khoang, True
+
+
+def _doc_gia_tri(s):
+    c, _, v = s.partition('=')
+    if not c or not v:
+        raise argparse.ArgumentTypeError(f"Giá trị phải có dạng cot=gia_tri, không phải {s!r}")
+    return c, v
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Khoảng dự báo bootstrap cho gói mô hình tuyến tính")
+    parser.add_argument('--goi', default='mo_hinh_da_bien.bundle.json', help="file gói mô hình (JSON)")
+    parser.add_argument('--file', default='Crop_production_in_India_ok.csv', help="file dữ liệu đã làm sạch")
+    parser.add_argument('-B', '--so-ban-sao', type=int, default=SO_BAN_SAO)
+    parser.add_argument('--muc', type=float, default=MUC, help="mức của khoảng (mặc định 0.95)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="số tiến trình (mặc định: số lõi CPU)")
+    parser.add_argument('--du-bao', type=_doc_gia_tri, nargs='+', metavar='COT=GIA_TRI',
+                        help="bản ghi cần dự báo, ví dụ Crop_Year=2000 Area=100 ... Crop=Rice Season=Kharif")
+    args = parser.parse_args(argv)
+
+    from goimohinh import GoiMoHinh
+    goi = GoiMoHinh.load(args.goi)
+    start = time.perf_counter()
+    khoang, da_tao = nap_hoac_tao(args.goi, args.file, goi, args.so_ban_sao, args.seed, args.workers)
+    thoi_gian = time.perf_counter() - start
+    print(f"{'Đã dựng' if da_tao else 'Đã nạp'} {khoang.so_ban_sao} bản sao bootstrap "
+          f"({file_khoang(args.goi)}) trong {thoi_gian:.3f} giây")
+    if not args.du_bao:
+        return
+    from dichvudubao import BoDuBao
+    record = dict(args.du_bao)
+    y = BoDuBao.tu_goi(goi).du_bao_mot(record)
+    start = time.perf_counter()
+    thap, cao = khoang.khoang(record, y, args.muc)
+    thoi_gian = time.perf_counter() - start
+    tb_thap, tb_cao = khoang.khoang(record, y, args.muc, nhieu=False)
+    print(f"Dự báo: {y:.2f} tấn")
+    print(f"Khoảng dự báo {args.muc:.0%}: {thap:.2f} .. {cao:.2f} tấn ({thoi_gian * 1e6:.0f} µs)")
+    print(f"Khoảng tin cậy {args.muc:.0%} của giá trị trung bình: {tb_thap:.2f} .. {tb_cao:.2f} tấn")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from bodem import thu_muc_cache
+
+# Khối tổng hợp (aggregate cube) theo Crop × Season × Crop_Year: mỗi ô giữ count và
+# sum/sumsq/min/max của từng đại lượng. Khối được tính một lần khi làm sạch dữ liệu và lưu
+# ra đĩa; biểu đồ và bảng phân tích chỉ cộng/so sánh trên các ô (vài trăm ô) thay vì groupby
+# trên toàn bộ dòng. Các khối gộp được với nhau (cộng ô, min/max theo ô) nên cập nhật được
+# khi thêm dòng mới, kể cả khi có nhãn/năm mới (danh sách nhãn tự mở rộng).
+
+PHIEN_BAN = 1
+CHIEU = ['Crop', 'Season', 'Crop_Year']
+DAI_LUONG = ['Production', 'Area', 'Temperature', 'Humidity', 'Wind_Speed']
+CHI_SO = ['count', 'sum', 'mean', 'min', 'max', 'var', 'std']
+
+
+def file_khoi(csv_path):
+    return os.path.join(thu_muc_cache(csv_path), 'khoi.npz')
+
+
+# Mã theo nhãn riêng của một cột: (danh sách nhãn đã sắp xếp, mã của từng dòng)
+def _ma_cot(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return list(values.cat.categories), values.cat.codes.to_numpy().astype(np.int64)
+    ma, nhan = pd.factorize(values, sort=True)
+    return list(nhan), ma.astype(np.int64)
+
+
+class KhoiTongHop:
+    def __init__(self, dai_luong=None):
+        self.dai_luong = list(dai_luong or DAI_LUONG)
+        self.nhan = {c: [] for c in CHIEU}
+        self.ma_bam = None
+        self._cap_phat((0, 0, 0))
+
+    def _cap_phat(self, shape):
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.sum = {m: np.zeros(shape) for m in self.dai_luong}
+        self.sumsq = {m: np.zeros(shape) for m in self.dai_luong}
+        self.min = {m: np.full(shape, np.inf) for m in self.dai_luong}
+        self.max = {m: np.full(shape, -np.inf) for m in self.dai_luong}
+
+    @property
+    def shape(self):
+        return self.count.shape
+
+    @property
+    def so_dong(self):
+        return int(self.count.sum())
+
+    # Mở rộng danh sách nhãn (giữ thứ tự sắp xếp) và chép các ô cũ sang vị trí mới.
+    # Trả về {chiều: mảng đổi mã từ danh sách `nhan_moi[chiều]` sang danh sách chung}.
+    def _mo_rong(self, nhan_moi):
+        gop = {c: sorted(set(self.nhan[c]) | set(nhan_moi[c])) for c in CHIEU}
+        if any(len(gop[c]) != len(self.nhan[c]) for c in CHIEU):
+            vi_tri = np.ix_(*[np.searchsorted(gop[c], self.nhan[c]).astype(np.int64) for c in CHIEU])
+            cu = (self.count, self.sum, self.sumsq, self.min, self.max)
+            self._cap_phat(tuple(len(gop[c]) for c in CHIEU))
+            self.count[vi_tri] = cu[0]
+            for moi, cu_m in zip((self.sum, self.sumsq, self.min, self.max), cu[1:]):
+                for m in self.dai_luong:
+                    moi[m][vi_tri] = cu_m[m]
+            self.nhan = gop
+        return {c: np.searchsorted(self.nhan[c], nhan_moi[c]).astype(np.int64) for c in CHIEU}
+
+    # Cộng thêm các dòng của một DataFrame (đã làm sạch) vào khối
+    def update(self, df):
+        if len(df) == 0:
+            return self
+        nhan_moi, ma = {}, {}
+        for c in CHIEU:
+            nhan_moi[c], ma[c] = _ma_cot(df[c])
+        doi_ma = self._mo_rong(nhan_moi)
+        o = np.ravel_multi_index(tuple(doi_ma[c][ma[c]] for c in CHIEU), self.shape)
+        so_o = self.count.size
+        self.count += np.bincount(o, minlength=so_o).reshape(self.shape)
+        for m in self.dai_luong:
+            v = df[m].to_numpy(dtype=np.float64)
+            self.sum[m] += np.bincount(o, weights=v, minlength=so_o).reshape(self.shape)
+            self.sumsq[m] += np.bincount(o, weights=v * v, minlength=so_o).reshape(self.shape)
+            np.minimum.at(self.min[m].reshape(-1), o, v)
+            np.maximum.at(self.max[m].reshape(-1), o, v)
+        return self
+
+    def merge(self, other):
+        if other.dai_luong != self.dai_luong:
+            raise ValueError("Không gộp được hai khối có đại lượng khác nhau")
+        doi_ma = self._mo_rong(other.nhan)
+        vi_tri = np.ix_(*[doi_ma[c] for c in CHIEU])
+        self.count[vi_tri] += other.count
+        for m in self.dai_luong:
+            self.sum[m][vi_tri] += other.sum[m]
+            self.sumsq[m][vi_tri] += other.sumsq[m]
+            self.min[m][vi_tri] = np.minimum(self.min[m][vi_tri], other.min[m])
+            self.max[m][vi_tri] = np.maximum(self.max[m][vi_tri], other.max[m])
+        return self
+
+    # Tổng hợp theo một hoặc hai chiều (các chiều còn lại được gộp hết).
+    # loc: {chiều: danh sách nhãn giữ lại}. Một chiều -> Series, hai chiều -> DataFrame
+    # (chiều đầu là index, chiều sau là cột), giống groupby(..., observed=True) và unstack().
+    def tong_hop(self, theo, dai_luong='Production', chi_so='mean', loc=None):
+        if isinstance(theo, str):
+            theo = [theo]
+        if len(theo) not in (1, 2) or any(c not in CHIEU for c in theo):
+            raise ValueError(f"theo phải gồm một hoặc hai chiều trong {CHIEU}")
+        if chi_so not in CHI_SO:
+            raise ValueError(f"chi_so phải là một trong {CHI_SO}, không phải {chi_so!r}")
+        chon = tuple(np.isin(self.nhan[c], list(loc[c])) if loc and c in loc else slice(None) for c in CHIEU)
+        gop = tuple(i for i, c in enumerate(CHIEU) if c not in theo)
+
+        def rut_gon(a, ham=np.sum):
+            # Chọn ô theo từng chiều lần lượt (tránh chỉ mục mảng bool kết hợp giữa các chiều)
+            for truc, s in enumerate(chon):
+                a = a[(slice(None),) * truc + (s,)]
+            a = ham(a, axis=gop)
+            return a if list(theo) == [c for c in CHIEU if c in theo] else a.T
+
+        count = rut_gon(self.count)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if chi_so == 'count':
+                ket_qua = count.astype(np.float64)
+            elif chi_so == 'sum':
+                ket_qua = rut_gon(self.sum[dai_luong])
+            elif chi_so == 'mean':
+                ket_qua = rut_gon(self.sum[dai_luong]) / count
+            elif chi_so == 'min':
+                ket_qua = rut_gon(self.min[dai_luong], np.min)
+            elif chi_so == 'max':
+                ket_qua = rut_gon(self.max[dai_luong], np.max)
+            else:
+                s, s2 = rut_gon(self.sum[dai_luong]), rut_gon(self.sumsq[dai_luong])
+                ket_qua = np.maximum(s2 - s * s / count, 0) / (count - 1)
+                ket_qua[count < 2] = np.nan
+                if chi_so == 'std':
+                    ket_qua = np.sqrt(ket_qua)
+        ket_qua = np.where(count > 0, ket_qua, np.nan)
+
+        nhan = [np.asarray(self.nhan[c])[chon[CHIEU.index(c)]] for c in theo]
+        index = [pd.Index(n, name=c) for n, c in zip(nhan, theo)]
+        if len(theo) == 1:
+            s = pd.Series(ket_qua, index=index[0], name=dai_luong)
+            s = s[count > 0]
+            return s.astype(np.int64) if chi_so == 'count' else s
+        bang = pd.DataFrame(ket_qua, index=index[0], columns=index[1])
+        return bang.loc[count.sum(axis=1) > 0, count.sum(axis=0) > 0]
+
+    def save(self, path, ma_bam=None):
+        if ma_bam is not None:
+            self.ma_bam = ma_bam
+        meta = {'phien_ban': PHIEN_BAN, 'nhan': {c: [v if isinstance(v, str) else int(v) for v in self.nhan[c]]
+                                                 for c in CHIEU},
+                'dai_luong': self.dai_luong, 'ma_bam': self.ma_bam}
+        mang = {'count': self.count}
+        for ten, bang in (('sum', self.sum), ('sumsq', self.sumsq), ('min', self.min), ('max', self.max)):
+            mang.update({f'{ten}__{m}': bang[m] for m in self.dai_luong})
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tam = path + '.tmp.npz'
+        np.savez(tam, meta=np.array(json.dumps(meta, ensure_ascii=False)), **mang)
+        os.replace(tam, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            meta = json.loads(str(f['meta']))
+            if meta.get('phien_ban') != PHIEN_BAN:
+                raise ValueError(f"Phiên bản khối {meta.get('phien_ban')} không được hỗ trợ (cần {PHIEN_BAN})")
+            khoi = cls(meta['dai_luong'])
+            khoi.nhan = meta['nhan']
+            khoi.ma_bam = meta['ma_bam']
+            khoi.count = f['count']
+            for ten in ('sum', 'sumsq', 'min', 'max'):
+                setattr(khoi, ten, {m: f[f'{ten}__{m}'] for m in khoi.dai_luong})
+        return khoi
+
+
+# Khối tổng hợp của file dữ liệu: nạp từ đĩa nếu khớp mã băm dữ liệu, nếu không thì tính lại
+# (từ df nếu đã có sẵn trong bộ nhớ) và lưu lại.
+def nap_khoi(csv_path, df=None):
+    from goimohinh import ma_bam_du_lieu
+    ma_bam = ma_bam_du_lieu(csv_path)
+    try:
+        khoi = KhoiTongHop.load(file_khoi(csv_path))
+        if ma_bam is None or khoi.ma_bam == ma_bam:
+            return khoi
+    except (OSError, ValueError, KeyError):
+        pass
+    if df is None:
+        from docdulieu import load_and_clean_data
+        df = load_and_clean_data(csv_path, columns=CHIEU + DAI_LUONG)
+    khoi = KhoiTongHop().update(df)
+    khoi.save(file_khoi(csv_path), ma_bam=ma_bam)
+    return khoi
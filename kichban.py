@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dichvudubao import nap_bo_du_bao
+
+# Mô phỏng kịch bản "nếu... thì" trên mô hình đã huấn luyện: cho mỗi cột một dãy giá trị (trục), dự báo
+# cho mọi tổ hợp (lưới kịch bản, ví dụ mọi Crop x Season x Area 100..10000 ha x Temperature ±3°C).
+# Mô hình tuyến tính nên ma trận thiết kế của lưới là tích Kronecker của các trục: trong một ô (tổ hợp
+# nhãn phân loại) dự báo = chặn + tổng theo từng cột số của w_cột * giá trị, nên không dựng ma trận thiết
+# kế. Bảng hệ số [chặn, w...] của các ô lấy một lần (he_so_o, dùng được cho cả mô hình chung lẫn họ mô
+# hình theo nhóm); dự báo của một khối là tổng broadcast các tích ngoài (hệ số của ô x giá trị của trục),
+# cộng từ trục cuối lên nên chỉ tốn cỡ một lượt ghi trên khối. Trục chỉ có một giá trị gộp vào hệ số chặn.
+# Các khối là đoạn liên tiếp của lưới (thứ tự C: cột phân loại trước, cột số sau, theo thứ tự của mô
+# hình), chia cho một nhóm luồng (NumPy nhả GIL khi tính). Kết quả ghi thẳng ra file .npy (memmap) hoặc
+# .csv, hoặc rút gọn dần thành mặt đáp ứng (mean/min/max theo các trục giữ lại) mà không giữ cả lưới.
+
+FILE_GOI = 'mo_hinh_da_bien.bundle.json'  # gói của Hoiquydabien.py
+KICH_THUOC_KHOI = 1 << 20  # số kịch bản tối đa mỗi khối
+THONG_KE = ('mean', 'min', 'max')
+
+
+class LuoiKichBan:
+    # bo_du_bao: BoDuBao hoặc HoMoHinh; truc: cột -> dãy giá trị. Cột phân loại không có trong truc lấy
+    # mọi nhãn đã gặp khi huấn luyện; cột số phải có đủ (một giá trị là giữ cố định).
+    def __init__(self, bo_du_bao, truc):
+        thua = [c for c in truc if c not in bo_du_bao.cot_so + bo_du_bao.cot_phan_loai]
+        if thua:
+            raise ValueError(f"Mô hình không có các cột: {thua}")
+        thieu = [c for c in bo_du_bao.cot_so if c not in truc]
+        if thieu:
+            raise ValueError(f"Thiếu giá trị cho các cột số: {thieu}")
+        self.cot_phan_loai = list(bo_du_bao.cot_phan_loai)
+        self.cot_so = list(bo_du_bao.cot_so)
+        self.ten = self.cot_phan_loai + self.cot_so
+        self.truc = {}
+        for c in self.cot_phan_loai:
+            v = truc.get(c)
+            self.truc[c] = np.array(list(bo_du_bao.nhan[c]) if v is None else np.atleast_1d(v).astype(str))
+        for c in self.cot_so:
+            self.truc[c] = np.atleast_1d(np.asarray(truc[c], dtype=np.float64))
+        self.shape = tuple(len(self.truc[c]) for c in self.ten)
+        if 0 in self.shape:
+            raise ValueError(f"Trục rỗng: {[c for c in self.ten if len(self.truc[c]) == 0]}")
+        self.so_kich_ban = int(np.prod(self.shape, dtype=np.int64))
+
+        # Bảng hệ số của các ô theo thứ tự lưới; lưới tính toán có hình (ô, trục số...)
+        ma = np.meshgrid(*[bo_du_bao._ma(c, self.truc[c]) for c in self.cot_phan_loai], indexing='ij')
+        self._w = bo_du_bao.he_so_o({c: m.ravel() for c, m in zip(self.cot_phan_loai, ma)})
+        self._hinh = (len(self._w),) + self.shape[len(self.cot_phan_loai):]
+        self._chan = self._w[:, 0].copy()
+        for j, c in enumerate(self.cot_so, 1):
+            if len(self.truc[c]) == 1:
+                self._chan += self._w[:, j] * self.truc[c][0]
+
+    # Các khối: giữ cố định các trục đầu, lấy một đoạn trên trục d, trọn các trục sau d. Mỗi khối là một
+    # đoạn liên tiếp của lưới phẳng, không quá kich_thuoc kịch bản.
+    def cac_khoi(self, kich_thuoc=KICH_THUOC_KHOI):
+        hinh = self._hinh
+        d, sau = len(hinh) - 1, 1
+        while d > 0 and sau * hinh[d] <= kich_thuoc:
+            sau *= hinh[d]
+            d -= 1
+        buoc = max(1, kich_thuoc // sau)
+        for dau in np.ndindex(*hinh[:d]):
+            for a in range(0, hinh[d], buoc):
+                yield dau + (slice(a, min(a + buoc, hinh[d])),)
+
+    # Lát cắt của khối trên từng trục của lưới tính toán
+    def _lat_cat(self, khoi):
+        d = len(khoi) - 1
+        return [slice(k, k + 1) for k in khoi[:d]] + [khoi[d]] + [slice(0, m) for m in self._hinh[d + 1:]]
+
+    # Vị trí [start, stop) của khối trong lưới phẳng
+    def vi_tri(self, khoi):
+        lat = self._lat_cat(khoi)
+        start = int(np.ravel_multi_index([s.start for s in lat], self._hinh))
+        return start, start + int(np.prod([s.stop - s.start for s in lat]))
+
+    # Dự báo của một khối, mảng có hình (ô, trục số...) của khối; out: mảng đích cùng hình (ví dụ một
+    # đoạn của memmap) để khỏi chép thêm lần nữa
+    def tinh_khoi(self, khoi, out=None):
+        lat = self._lat_cat(khoi)
+        w = self._w[lat[0]]
+        hinh = [s.stop - s.start for s in lat]
+        so_hang = []
+        for j, c in enumerate(self.cot_so, 1):
+            if len(self.truc[c]) > 1:
+                hinh_truc = [len(w)] + [1] * (len(hinh) - 1)
+                hinh_truc[j] = hinh[j]
+                so_hang.append(np.multiply.outer(w[:, j], self.truc[c][lat[j]]).reshape(hinh_truc))
+        chan = self._chan[lat[0]].reshape([len(w)] + [1] * (len(hinh) - 1))
+        if out is None:
+            out = np.empty(hinh)
+        if not so_hang:
+            np.copyto(out, chan)
+            return out
+        # Chặn gộp vào số hạng của trục số đầu; các trục sau cộng dồn trước (mảng nhỏ hơn khối), phép
+        # cộng cuối cùng mới trải ra cả khối và ghi thẳng vào out
+        tong = so_hang[-1]
+        for t in reversed(so_hang[1:-1]):
+            tong = t + tong
+        if len(so_hang) == 1:
+            np.add(so_hang[0], chan, out=out)
+        else:
+            np.add(so_hang[0] + chan, tong, out=out)
+        return out
+
+    # Chạy viec(khoi) trên mọi khối bằng nhóm luồng, trả kết quả theo thứ tự khối; số khối đang chờ có hạn
+    # để bộ nhớ không tăng theo kích thước lưới
+    def _chay(self, viec, so_luong=None, kich_thuoc=KICH_THUOC_KHOI):
+        cac_khoi = self.cac_khoi(kich_thuoc)
+        if so_luong == 1 or self.so_kich_ban <= kich_thuoc:
+            yield from map(viec, cac_khoi)
+            return
+        toi_da = 2 * (so_luong or os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=so_luong, thread_name_prefix='kichban') as pool:
+            cho = deque()
+            for khoi in cac_khoi:
+                cho.append(pool.submit(viec, khoi))
+                if len(cho) >= toi_da:
+                    yield cho.popleft().result()
+            while cho:
+                yield cho.popleft().result()
+
+    # Dự báo cả lưới trong bộ nhớ, mảng có hình self.shape (chỉ dùng cho lưới vừa bộ nhớ)
+    def du_bao(self, so_luong=None, kich_thuoc=KICH_THUOC_KHOI, dtype=np.float64):
+        y = np.empty(self.so_kich_ban, dtype=dtype)
+        self._ghi_vao(y, so_luong, kich_thuoc)
+        return y.reshape(self.shape)
+
+    def _ghi_vao(self, phang, so_luong, kich_thuoc):
+        def viec(khoi):
+            start, stop = self.vi_tri(khoi)
+            lat = self._lat_cat(khoi)
+            self.tinh_khoi(khoi, phang[start:stop].reshape([s.stop - s.start for s in lat]))
+        for _ in self._chay(viec, so_luong, kich_thuoc):
+            pass
+
+    # Giá trị các trục của các kịch bản [start, stop) trong lưới phẳng
+    def gia_tri(self, start, stop):
+        chi_so = np.unravel_index(np.arange(start, stop), self.shape)
+        return {c: self.truc[c][i] for c, i in zip(self.ten, chi_so)}
+
+    # Ghi cả lưới ra file: .npy (memmap hình self.shape, kèm <file>.json mô tả các trục) hoặc .csv (mỗi
+    # kịch bản một dòng gồm giá trị các trục và dự báo). Trả về số kịch bản đã ghi.
+    def ghi(self, path, so_luong=None, kich_thuoc=KICH_THUOC_KHOI, dtype=np.float64):
+        if path.endswith('.npy'):
+            tam = path + '.tmp.npy'
+            mang = np.lib.format.open_memmap(tam, mode='w+', dtype=dtype, shape=self.shape)
+            self._ghi_vao(mang.reshape(-1), so_luong, kich_thuoc)
+            mang.flush()
+            del mang
+            os.replace(tam, path)
+            with open(path + '.json', 'w', encoding='utf-8') as f:
+                json.dump({'truc': {c: self.truc[c].tolist() for c in self.ten}}, f, ensure_ascii=False)
+            return self.so_kich_ban
+
+        import pandas as pd
+
+        def viec(khoi):
+            start, stop = self.vi_tri(khoi)
+            bang = pd.DataFrame(self.gia_tri(start, stop))
+            bang['prediction'] = self.tinh_khoi(khoi).reshape(-1)
+            return bang.to_csv(index=False, header=start == 0, float_format='%.6g')
+        tam = path + '.tmp'
+        with open(tam, 'w', encoding='utf-8', newline='') as f:
+            for phan in self._chay(viec, so_luong, kich_thuoc):
+                f.write(phan)
+        os.replace(tam, path)
+        return self.so_kich_ban
+
+    # Mặt đáp ứng: thống kê của dự báo theo các trục giữ lại (giu), rút gọn mọi trục khác. Trả về
+    # DataFrame mỗi dòng một tổ hợp giá trị của các trục giữ lại (theo thứ tự cột của mô hình).
+    def be_mat(self, giu=(), thong_ke=THONG_KE, so_luong=None, kich_thuoc=KICH_THUOC_KHOI):
+        if isinstance(giu, str):
+            giu = [giu]
+        if isinstance(thong_ke, str):
+            thong_ke = [thong_ke]
+        sai = [c for c in giu if c not in self.ten] + [t for t in thong_ke if t not in THONG_KE]
+        if sai:
+            raise ValueError(f"Không có trục/thống kê: {sai} (trục: {self.ten}; thống kê: {list(THONG_KE)})")
+        giu_so = [j for j, c in enumerate(self.cot_so, 1) if c in giu]
+        rut = tuple(j for j in range(1, len(self._hinh)) if j not in giu_so)
+        hinh = (self._hinh[0],) + tuple(self._hinh[j] for j in giu_so)
+        ham = {'mean': np.sum, 'min': np.min, 'max': np.max}
+        tich = {'mean': np.zeros(hinh), 'min': np.full(hinh, np.inf), 'max': np.full(hinh, -np.inf)}
+        tich = {t: tich[t] for t in thong_ke}
+
+        def viec(khoi):
+            y = self.tinh_khoi(khoi)
+            return khoi, {t: ham[t](y, axis=rut) for t in tich}
+        for khoi, phan in self._chay(viec, so_luong, kich_thuoc):
+            lat = self._lat_cat(khoi)
+            dich = (lat[0],) + tuple(lat[j] for j in giu_so)
+            for t, p in phan.items():
+                a = tich[t][dich]
+                if t == 'mean':
+                    a += p
+                elif t == 'min':
+                    np.minimum(a, p, out=a)
+                else:
+                    np.maximum(a, p, out=a)
+
+        # Tách trục ô thành các cột phân loại rồi rút gọn các cột phân loại không giữ lại
+        k = len(self.cot_phan_loai)
+        rut_pl = tuple(i for i, c in enumerate(self.cot_phan_loai) if c not in giu)
+        ten_giu = [c for c in self.ten if c in giu]
+        so_o = int(np.prod([len(self.truc[c]) for c in ten_giu], dtype=np.int64))
+        ket_qua = {}
+        for t, a in tich.items():
+            a = a.reshape(self.shape[:k] + hinh[1:])
+            a = ham[t](a, axis=rut_pl)
+            ket_qua[t] = (a / (self.so_kich_ban // so_o) if t == 'mean' else a).reshape(-1)
+
+        import pandas as pd
+        luoi = np.meshgrid(*[self.truc[c] for c in ten_giu], indexing='ij')
+        bang = pd.DataFrame({c: g.reshape(-1) for c, g in zip(ten_giu, luoi)})
+        for t in thong_ke:
+            bang[t] = ket_qua[t]
+        return bang
+
+
+# Trục từ dòng lệnh: Crop=Rice,Wheat; Crop=* (mọi nhãn); Area=100..10000:100 (bước, mặc định 1);
+# Area=100..10000/50 (50 điểm cách đều); Temperature=25+-3:0.5 (25 ± 3, bước 0.5); Humidity=60
+def _doc_truc(s):
+    c, _, v = s.partition('=')
+    if not c or not v:
+        raise argparse.ArgumentTypeError(f"Trục phải có dạng cot=gia_tri, không phải {s!r}")
+    try:
+        if v == '*':
+            return c, None
+        v, _, buoc = v.partition(':')
+        v, _, so_diem = v.partition('/')
+        if '+-' in v or '±' in v:
+            giua, _, lech = v.replace('±', '+-').partition('+-')
+            thap, cao = float(giua) - float(lech), float(giua) + float(lech)
+        elif '..' in v:
+            thap, _, cao = v.partition('..')
+            thap, cao = float(thap), float(cao)
+        else:
+            gia_tri = v.split(',')
+            try:
+                return c, [float(x) for x in gia_tri]
+            except ValueError:
+                return c, gia_tri
+        if so_diem:
+            return c, np.linspace(thap, cao, int(so_diem))
+        buoc = float(buoc) if buoc else 1.0
+        return c, thap + buoc * np.arange(int(np.floor((cao - thap) / buoc + 1e-9)) + 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Không đọc được trục {s!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mô phỏng kịch bản: dự báo cho mọi tổ hợp giá trị của các trục")
+    parser.add_argument('--model', default=FILE_GOI,
+                        help="file gói mô hình (JSON) hoặc họ mô hình theo nhóm (.npz, xem mohinhnhom.py)")
+    parser.add_argument('--truc', type=_doc_truc, action='append', default=[], metavar='COT=GIA_TRI',
+                        help="lặp lại được: Crop=Rice,Wheat | Area=100..10000:100 | Area=100..10000/50 | "
+                             "Temperature=25+-3:0.5 | Humidity=60; cột phân loại bỏ trống lấy mọi nhãn")
+    parser.add_argument('-o', '--out', help="ghi mọi kịch bản ra file .npy (nhanh) hoặc .csv")
+    parser.add_argument('--be-mat', nargs='*', metavar='COT',
+                        help="in mặt đáp ứng theo các trục này (mặc định khi không có -o: các cột phân loại)")
+    parser.add_argument('--thong-ke', nargs='+', default=list(THONG_KE), choices=THONG_KE)
+    parser.add_argument('--be-mat-out', help="ghi mặt đáp ứng ra file CSV")
+    parser.add_argument('--float32', action='store_true', help="ghi dự báo dạng float32 (file .npy)")
+    parser.add_argument('--workers', type=int, default=None, help="số luồng (mặc định: số lõi CPU)")
+    parser.add_argument('-n', type=int, default=20, help="số dòng mặt đáp ứng in ra")
+    args = parser.parse_args(argv)
+
+    luoi = LuoiKichBan(nap_bo_du_bao(args.model), dict(args.truc))
+    print(f"{luoi.so_kich_ban:,} kịch bản: " + ' x '.join(f"{c} ({len(luoi.truc[c])})" for c in luoi.ten))
+    be_mat = args.be_mat
+    if be_mat is None and not args.out:
+        be_mat = luoi.cot_phan_loai
+    if args.out:
+        start = time.perf_counter()
+        luoi.ghi(args.out, args.workers, dtype=np.float32 if args.float32 else np.float64)
+        thoi_gian = time.perf_counter() - start
+        print(f"Đã ghi {args.out} trong {thoi_gian:.3f} giây ({luoi.so_kich_ban / thoi_gian:,.0f} kịch bản/giây)")
+    if be_mat is not None:
+        start = time.perf_counter()
+        bang = luoi.be_mat(be_mat, args.thong_ke, args.workers)
+        thoi_gian = time.perf_counter() - start
+        print(bang.head(args.n).to_string(index=False) if len(bang) > args.n else bang.to_string(index=False))
+        print(f"\nMặt đáp ứng {len(bang)} dòng trong {thoi_gian:.3f} giây "
+              f"({luoi.so_kich_ban / thoi_gian:,.0f} kịch bản/giây)")
+        if args.be_mat_out:
+            bang.to_csv(args.be_mat_out, index=False)
+
+
+if __name__ == '__main__':
+    main()
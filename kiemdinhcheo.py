@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bodem import thu_muc_cache
+from goimohinh import ma_bam_du_lieu
+from hoiquy_tangdan import FILE_DU_LIEU, KICH_THUOC_KHOI, chuan_bi_doc, doc_khoi, giai_phat, so_ngau_nhien_dong
+from mahoa import CategoricalEncoder
+from mohinhnhom import NGUONG_NHOM, TongTheoO, cong_don_theo_o, he_so_theo_o
+
+# Kiểm định chéo (cross-validation) cho các mô hình hồi quy tuyến tính, thay cho đánh giá trên một
+# lần train_test_split. Dữ liệu chỉ được duyệt MỘT lần (song song theo khối): mỗi dòng thuộc một
+# nhóm (fold theo khóa nội dung dòng, hoặc năm Crop_Year khi chia theo thời gian) và một ô (tổ hợp
+# Crop, Season); với mỗi cặp (nhóm, ô) ta cộng dồn X^T X, X^T y, y^T y trên các cột số
+# (mohinhnhom.TongTheoO). Hệ phương trình chuẩn của mô hình chung, mô hình riêng theo Crop hay
+# theo (Crop, Season) trên bất kỳ tập nhóm nào đều dựng lại chính xác từ các tổng này, nên mọi ứng
+# viên (OLS, Ridge, Lasso, ElasticNet, họ mô hình theo nhóm) và mọi lần chia đều giải trên ma trận
+# p x p: không tạo lại ma trận thiết kế, không lưu chỉ số fold. Các tổng được lưu đệm theo mã băm
+# dữ liệu.
+
+PHIEN_BAN = 2
+
+
+class ThongKeCheo:
+    # cach_chia: 'kfold' (k nhóm ngẫu nhiên theo khóa dòng) hoặc 'thoi_gian' (mỗi năm một nhóm)
+    def __init__(self, encoder, cach_chia='kfold', k=5, seed=42):
+        if cach_chia not in ('kfold', 'thoi_gian'):
+            raise ValueError(f"cach_chia phải là 'kfold' hoặc 'thoi_gian', không phải {cach_chia!r}")
+        self.encoder = encoder
+        self.cach_chia = cach_chia
+        self.k = k
+        self.seed = seed
+        # Khóa nhóm (fold hoặc năm) -> TongTheoO
+        self.nhom = {}
+        self.ma_bam = None
+
+    # Khóa nhóm của từng dòng trong một khối
+    def _khoa_nhom(self, khoa, so):
+        if self.cach_chia == 'kfold':
+            u = so_ngau_nhien_dong(khoa, self.seed)
+            return np.minimum((u * self.k).astype(np.int64), self.k - 1)
+        return so[:, self.encoder.cot_so.index('Crop_Year')].astype(np.int64)
+
+    def update(self, khoa, so, ma, y):
+        if len(y) == 0:
+            return self
+        mau = TongTheoO(self.encoder)
+        khoa, ma_nhom = np.unique(self._khoa_nhom(khoa, so), return_inverse=True)
+        # Một lượt bincount cho mọi cặp (nhóm, ô)
+        k = mau.so_o
+        xtx, xty, yty = cong_don_theo_o(so, y, ma_nhom.ravel() * k + mau.ma_o(ma, len(y)), len(khoa) * k)
+        for i, g in enumerate(khoa.tolist()):
+            phan = TongTheoO(self.encoder, xtx[i * k:(i + 1) * k], xty[i * k:(i + 1) * k], yty[i * k:(i + 1) * k])
+            if g in self.nhom:
+                self.nhom[g].merge(phan)
+            else:
+                self.nhom[g] = phan
+        return self
+
+    def merge(self, other):
+        for g, tong in other.nhom.items():
+            if g in self.nhom:
+                self.nhom[g].merge(tong)
+            else:
+                self.nhom[g] = tong.copy()
+        return self
+
+    # Các lần chia: danh sách (khóa nhóm train, khóa nhóm test)
+    def cac_lan_chia(self):
+        khoa = sorted(self.nhom)
+        if self.cach_chia == 'kfold':
+            return [([g for g in khoa if g != f], [f]) for f in khoa]
+        # Theo thời gian (cửa sổ mở rộng): chia các năm thành k + 1 đoạn liên tiếp, lần thứ i
+        # huấn luyện trên các đoạn 0..i và kiểm tra trên đoạn i + 1 (không dùng tương lai dự báo quá khứ)
+        doan = [list(d) for d in np.array_split(np.array(khoa), min(self.k + 1, len(khoa)))]
+        return [(sum(doan[:i + 1], []), doan[i + 1]) for i in range(len(doan) - 1)]
+
+    # Tổng theo ô của một tập nhóm
+    def tong(self, khoa):
+        tong = TongTheoO(self.encoder)
+        for g in khoa:
+            tong.merge(self.nhom[g])
+        return tong
+
+    @property
+    def n(self):
+        return sum(t.n for t in self.nhom.values())
+
+    def save(self, path, ma_bam=None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        khoa = sorted(self.nhom)
+        meta = {'phien_ban': PHIEN_BAN, 'encoder': self.encoder.to_dict(), 'cach_chia': self.cach_chia,
+                'k': self.k, 'seed': self.seed, 'ma_bam': ma_bam}
+        tam = path + '.tmp.npz'
+        np.savez(tam, meta=json.dumps(meta, ensure_ascii=False), khoa=np.array(khoa, dtype=np.int64),
+                 xtx=np.array([self.nhom[g].xtx for g in khoa]), xty=np.array([self.nhom[g].xty for g in khoa]),
+                 yty=np.array([self.nhom[g].yty for g in khoa]))
+        os.replace(tam, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            meta = json.loads(str(f['meta']))
+            if meta.get('phien_ban') != PHIEN_BAN:
+                raise ValueError(f"Bộ đệm kiểm định phiên bản {meta.get('phien_ban')}, cần phiên bản {PHIEN_BAN}")
+            encoder = CategoricalEncoder.from_dict(meta['encoder'])
+            tk = cls(encoder, meta['cach_chia'], meta['k'], meta['seed'])
+            xtx, xty, yty = f['xtx'], f['xty'], f['yty']
+            for i, g in enumerate(f['khoa'].tolist()):
+                tk.nhom[g] = TongTheoO(encoder, xtx[i], xty[i], yty[i])
+        tk.ma_bam = meta['ma_bam']
+        return tk
+
+
+def file_thong_ke(csv_path, cach_chia, k, seed):
+    ten = 'kiem_dinh_thoi_gian.npz' if cach_chia == 'thoi_gian' else f'kiem_dinh_kfold_k{k}_s{seed}.npz'
+    return os.path.join(thu_muc_cache(csv_path), ten)
+
+
+def _tich_luy_nhom(viec):
+    khoi, encoder, cach_chia, k, seed = viec
+    khoa, so, ma, y = doc_khoi(khoi, encoder)
+    return ThongKeCheo(encoder, cach_chia, k, seed).update(khoa, so, ma, y)
+
+
+# Tổng theo (nhóm, ô) của file dữ liệu: dùng bản đã lưu nếu dữ liệu không đổi, nếu không
+# thì duyệt dữ liệu song song theo khối và lưu lại
+def nap_thong_ke(file_path=FILE_DU_LIEU, cach_chia='kfold', k=5, seed=42, so_tien_trinh=None,
+                 kich_thuoc_khoi=KICH_THUOC_KHOI):
+    path = file_thong_ke(file_path, cach_chia, k, seed)
+    ma_bam = ma_bam_du_lieu(file_path)
+    try:
+        tk = ThongKeCheo.load(path)
+        if ma_bam is not None and tk.ma_bam == ma_bam:
+            return tk
+    except (OSError, ValueError, KeyError):
+        pass
+
+    encoder, khoi = chuan_bi_doc(file_path, kich_thuoc_khoi)
+    viec = [(kh, encoder, cach_chia, k, seed) for kh in khoi]
+    if so_tien_trinh == 1 or len(viec) <= 1:
+        ket_qua = list(map(_tich_luy_nhom, viec))
+    else:
+        with ProcessPoolExecutor(max_workers=so_tien_trinh) as pool:
+            ket_qua = list(pool.map(_tich_luy_nhom, viec))
+    tk = ThongKeCheo(encoder, cach_chia, k, seed)
+    for phan in ket_qua:
+        tk.merge(phan)
+    tk.save(path, ma_bam)
+    tk.ma_bam = ma_bam
+    return tk
+
+
+# Hệ số [chặn, w...] của ứng viên trên hệ (xtx, xty); ten_cot: tên đặc trưng ứng với các cột 1..
+def giai(xtx, xty, ung_vien, ten_cot):
+    chon = None
+    if ung_vien.get('cot') is not None:
+        chon = [i for i, t in enumerate(ten_cot) if t in ung_vien['cot']]
+    return giai_phat(xtx, xty, ung_vien['loai'], ung_vien.get('alpha', 1.0), ung_vien.get('l1_ratio', 0.5), chon)
+
+
+# Đánh giá một ứng viên trên một lần chia: (r2, mse, số ô có dữ liệu test dùng mô hình chung).
+# ung_vien['theo']: các cột chia nhóm của họ mô hình (mặc định: một mô hình chung).
+def _danh_gia_lan_chia(tk, ung_vien, train, test):
+    theo = ung_vien.get('theo', ())
+    w, _, rieng = he_so_theo_o(tk.tong(train), theo, lambda a, b, ten: giai(a, b, ung_vien, ten),
+                               ung_vien.get('nguong', NGUONG_NHOM))
+    tong_test = tk.tong(test)
+    ket_qua = tong_test.danh_gia(w)
+    dung_chung = int(((tong_test.so_dong > 0) & ~rieng).sum()) if theo else 0
+    return ket_qua['r2'], ket_qua['mse'], dung_chung
+
+
+# Danh sách ứng viên mặc định: mô hình đang dùng (OLS đủ đặc trưng, OLS một biến Area), lưới
+# siêu tham số của Ridge/Lasso/ElasticNet và họ mô hình theo Crop, theo (Crop, Season)
+def ung_vien_mac_dinh():
+    ds = [{'ten': 'LinearRegression', 'loai': 'ols'},
+          {'ten': 'LinearRegression[Area]', 'loai': 'ols', 'cot': ['Area']}]
+    ds += [{'ten': f'Ridge(alpha={a:g})', 'loai': 'ridge', 'alpha': a} for a in (0.1, 1, 10, 100, 1000)]
+    ds += [{'ten': f'Lasso(alpha={a:g})', 'loai': 'lasso', 'alpha': a} for a in (0.1, 1, 10, 100)]
+    ds += [{'ten': f'ElasticNet(alpha={a:g}, l1_ratio={r:g})', 'loai': 'elasticnet', 'alpha': a, 'l1_ratio': r}
+           for a in (0.1, 1, 10) for r in (0.2, 0.5, 0.8)]
+    ds += [{'ten': 'LinearRegression theo Crop', 'loai': 'ols', 'theo': ['Crop']},
+           {'ten': 'Ridge(alpha=10) theo Crop', 'loai': 'ridge', 'alpha': 10, 'theo': ['Crop']},
+           {'ten': 'LinearRegression theo Crop×Season', 'loai': 'ols', 'theo': ['Crop', 'Season']},
+           {'ten': 'Ridge(alpha=10) theo Crop×Season', 'loai': 'ridge', 'alpha': 10, 'theo': ['Crop', 'Season']}]
+    return ds
+
+
+_TK = None
+
+
+def _khoi_tao_tien_trinh(tk):
+    global _TK
+    _TK = tk
+
+
+def _khoang_tin_cay(gia_tri, muc=0.95):
+    from scipy.stats import t
+    gia_tri = np.asarray(gia_tri, dtype=np.float64)
+    k = len(gia_tri)
+    tb = float(gia_tri.mean())
+    if k < 2:
+        return tb, float('nan')
+    return tb, float(t.ppf((1 + muc) / 2, k - 1) * gia_tri.std(ddof=1) / np.sqrt(k))
+
+
+# Việc của tiến trình con: mọi lần chia của một ứng viên
+def _danh_gia_ung_vien(ung_vien):
+    start = time.perf_counter()
+    r2, mse, dung_chung = [], [], []
+    for train, test in _TK.cac_lan_chia():
+        a, b, c = _danh_gia_lan_chia(_TK, ung_vien, train, test)
+        r2.append(float(a))
+        mse.append(float(b))
+        dung_chung.append(c)
+    thoi_gian = time.perf_counter() - start
+    r2_tb, r2_ci = _khoang_tin_cay(r2)
+    mse_tb, mse_ci = _khoang_tin_cay(mse)
+    return {'ten': ung_vien['ten'], 'r2': r2_tb, 'r2_ci95': r2_ci, 'mse': mse_tb, 'mse_ci95': mse_ci,
+            'r2_tung_lan': r2, 'mse_tung_lan': mse, 'so_o_dung_mo_hinh_chung': max(dung_chung),
+            'thoi_gian': thoi_gian}
+
+
+# Kiểm định chéo các ứng viên trên file dữ liệu. Trả về báo cáo (dict), kết quả sắp theo MSE tăng dần.
+def kiem_dinh_cheo(file_path=FILE_DU_LIEU, ung_vien=None, cach_chia='kfold', k=5, seed=42, so_tien_trinh=None):
+    ung_vien = ung_vien or ung_vien_mac_dinh()
+    start = time.perf_counter()
+    tk = nap_thong_ke(file_path, cach_chia, k, seed, so_tien_trinh)
+    thoi_gian_du_lieu = time.perf_counter() - start
+
+    if so_tien_trinh == 1:
+        _khoi_tao_tien_trinh(tk)
+        ket_qua = list(map(_danh_gia_ung_vien, ung_vien))
+    else:
+        with ProcessPoolExecutor(max_workers=so_tien_trinh, initializer=_khoi_tao_tien_trinh, initargs=(tk,)) as pool:
+            ket_qua = list(pool.map(_danh_gia_ung_vien, ung_vien))
+    ket_qua.sort(key=lambda r: r['mse'])
+    return {'file': file_path, 'cach_chia': cach_chia, 'so_lan_chia': len(tk.cac_lan_chia()), 'so_dong': tk.n,
+            'thoi_gian_du_lieu': thoi_gian_du_lieu, 'thoi_gian': time.perf_counter() - start,
+            'ket_qua': ket_qua}
+
+
+def in_bao_cao(bao_cao):
+    print(f"=== Kiểm định chéo ({bao_cao['cach_chia']}, {bao_cao['so_lan_chia']} lần chia, "
+          f"{bao_cao['so_dong']} dòng) ===")
+    print(f"{'Mô hình':<36} {'R² (±CI95)':>20} {'MSE (±CI95)':>28} {'ms':>8}")
+    for r in bao_cao['ket_qua']:
+        print(f"{r['ten']:<36} {r['r2']:>10.4f} ± {r['r2_ci95']:<7.4f} {r['mse']:>14.2f} ± {r['mse_ci95']:<11.2f}"
+              f" {r['thoi_gian'] * 1000:>8.2f}")
+    print(f"Tốt nhất: {bao_cao['ket_qua'][0]['ten']} — duyệt dữ liệu {bao_cao['thoi_gian_du_lieu']:.2f} giây, "
+          f"tổng {bao_cao['thoi_gian']:.2f} giây")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kiểm định chéo và dò siêu tham số cho các mô hình hồi quy")
+    parser.add_argument('file', nargs='?', default=FILE_DU_LIEU)
+    parser.add_argument('--chia', choices=['kfold', 'thoi_gian'], default='kfold',
+                        help="kfold: ngẫu nhiên theo dòng; thoi_gian: cửa sổ mở rộng theo Crop_Year")
+    parser.add_argument('-k', type=int, default=5, help="số fold (hoặc số lần chia theo thời gian)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=None, help="số tiến trình (mặc định: số lõi CPU)")
+    parser.add_argument('--json', help="ghi báo cáo đầy đủ ra file JSON")
+    args = parser.parse_args(argv)
+
+    bao_cao = kiem_dinh_cheo(args.file, cach_chia=args.chia, k=args.k, seed=args.seed, so_tien_trinh=args.workers)
+    in_bao_cao(bao_cao)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(bao_cao, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
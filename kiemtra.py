@@ -0,0 +1,189 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from bodem import thu_muc_cache
+
+# Kiểm tra chất lượng dữ liệu theo luật: mỗi luật là một mặt nạ NumPy tính trên cả khối (không lặp
+# theo dòng), kết quả là mã lý do dạng bit cho từng dòng (0 = hợp lệ). Dòng có lý do khác 0 không bị
+# bỏ im lặng mà được cách ly ra file riêng kèm mã lý do và chi tiết cột vi phạm.
+# - THIEU: thiếu giá trị; KIEU: cột số có giá trị không phải số; MIEN: ngoài miền giá trị hợp lý
+# - TRUNG: trùng khóa (mọi cột sau chuẩn hóa) với một dòng hợp lệ đứng trước
+# - NGOAI_LAI: ngoài hàng rào Q1 - k*IQR .. Q3 + k*IQR (hoặc |z| > ngưỡng) của cả tập dữ liệu. Hàng rào
+#   lấy từ StreamingStats (cùng Q1/Q3/IQR mà lamsachdulieu.py in ra) nên chỉ có sau lượt làm sạch;
+#   lamsach.chay_pipeline áp dụng nó cho các phân vùng có min/max vượt hàng rào.
+
+THIEU, KIEU, MIEN, TRUNG, NGOAI_LAI = 1, 2, 4, 8, 16
+TEN_LY_DO = {THIEU: 'thieu', KIEU: 'kieu', MIEN: 'mien', TRUNG: 'trung', NGOAI_LAI: 'ngoai_lai'}
+COT_CHUOI = ['Crop', 'Season']
+# Miền giá trị hợp lệ (thấp, cao]: > thấp và <= cao, None là không giới hạn
+MIEN_GIA_TRI = {'Crop_Year': (1900, 2100), 'Area': (0, None), 'Temperature': (0, 60),
+                'Humidity': (0, 100), 'Wind_Speed': (0, 150), 'Production': (0, None)}
+COT_SO = list(MIEN_GIA_TRI)
+COT_NGOAI_LAI = ['Area', 'Temperature', 'Humidity', 'Wind_Speed', 'Production']
+HE_SO_IQR = 3.0  # hàng rào "rất xa" của Tukey, chỉ bắt giá trị bất thường rõ rệt
+NGUONG_Z = 4.0
+
+
+# File cách ly của một file dữ liệu đã làm sạch: <tên>_cach_ly.csv
+def file_cach_ly(csv_sach):
+    goc, duoi = os.path.splitext(csv_sach)
+    return f'{goc}_cach_ly{duoi or ".csv"}'
+
+
+# File mã băm (bam_dong) của mọi dòng đã qua các luật theo dòng của một file dữ liệu đã làm sạch, lưu
+# cạnh bộ đệm: nạp thêm dữ liệu (capnhat.py) dùng nó để bỏ dòng trùng với dữ liệu đã có
+def file_bam_dong(csv_sach):
+    return os.path.join(thu_muc_cache(csv_sach), 'bam_dong.npz')
+
+
+def luu_bam_dong(csv_sach, bam, ma_bam=None):
+    path = file_bam_dong(csv_sach)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tam = path + '.tmp.npz'
+    np.savez(tam, bam=np.unique(np.asarray(bam, dtype=np.uint64)), ma_bam=np.array(ma_bam or ''))
+    os.replace(tam, path)
+    return path
+
+
+# Mã băm đã lưu (mảng uint64 đã sắp xếp) nếu khớp mã băm dữ liệu ma_bam, ngược lại None
+def nap_bam_dong(csv_sach, ma_bam):
+    try:
+        with np.load(file_bam_dong(csv_sach)) as f:
+            return f['bam'] if str(f['ma_bam']) == ma_bam else None
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _mask_mien(values, mien):
+    thap, cao = mien
+    mask = np.zeros(len(values), dtype=bool)
+    if thap is not None:
+        mask |= values <= thap
+    if cao is not None:
+        mask |= values > cao
+    return mask
+
+
+# Mặt nạ các dòng có mọi cột số trong miền hợp lệ (giá trị khuyết không bị tính là ngoài miền)
+def mask_trong_mien(df):
+    mask = np.ones(len(df), dtype=bool)
+    for c, mien in MIEN_GIA_TRI.items():
+        if c in df.columns:
+            mask &= ~_mask_mien(df[c].to_numpy(dtype=np.float64, na_value=np.nan), mien)
+    return mask
+
+
+class KetQuaKiemTra:
+    def __init__(self, n):
+        self.ly_do = np.zeros(n, dtype=np.uint8)
+        self.vi_pham = {}  # (mã lý do, cột) -> mặt nạ dòng
+        self.bam = None  # mã băm các dòng hợp lệ (kiem_tra_khoi), để tìm trùng giữa các khối
+
+    def danh_dau(self, ma, cot, mask):
+        if mask.any():
+            self.vi_pham[(ma, cot)] = mask
+            self.ly_do[mask] |= ma
+
+    @property
+    def hop_le(self):
+        return self.ly_do == 0
+
+    # Số dòng theo từng lý do (một dòng có thể có nhiều lý do)
+    def dem(self):
+        return {ten: int(np.count_nonzero(self.ly_do & ma)) for ma, ten in TEN_LY_DO.items()}
+
+    # Chi tiết vi phạm của các dòng được chọn, dạng "mien:Humidity;trung"
+    def chi_tiet(self, chon):
+        ket_qua = np.full(int(np.count_nonzero(chon)), '', dtype=object)
+        for (ma, cot), mask in self.vi_pham.items():
+            nhan = TEN_LY_DO[ma] + (f':{cot};' if cot else ';')
+            ket_qua = np.where(mask[chon], ket_qua + nhan, ket_qua)
+        return [s[:-1] for s in ket_qua]
+
+    # Các dòng bị cách ly của df (cùng thứ tự dòng với lúc kiểm tra) kèm mã và chi tiết lý do
+    def bang_cach_ly(self, df):
+        chon = ~self.hop_le
+        bang = df[chon].copy()
+        bang['ly_do'] = self.ly_do[chon]
+        bang['chi_tiet'] = self.chi_tiet(chon)
+        return bang
+
+
+# Mã băm 64 bit của từng dòng theo mọi cột, dùng làm khóa phát hiện trùng lặp giữa các khối
+# (cột số đưa về float64 để cùng giá trị luôn cùng mã dù khối này đọc ra int, khối kia ra float)
+def bam_dong(df):
+    df = df.astype({c: np.float64 for c in COT_SO if c in df.columns})
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+# Kiểm tra một khối dữ liệu thô. Trả về (khối đã chuẩn hóa chỉ gồm dòng hợp lệ, KetQuaKiemTra)
+def kiem_tra_khoi(df):
+    kq = KetQuaKiemTra(len(df))
+    thieu = df.isna().to_numpy()
+    for j, c in enumerate(df.columns):
+        kq.danh_dau(THIEU, c, thieu[:, j])
+
+    cot = {}
+    for j, c in enumerate(df.columns):
+        s = df[c]
+        if c in COT_CHUOI:
+            s = s.astype(str).str.strip().str.title()
+        elif c in COT_SO:
+            if not pd.api.types.is_numeric_dtype(s):
+                s = pd.to_numeric(s, errors='coerce')
+                kq.danh_dau(KIEU, c, s.isna().to_numpy() & ~thieu[:, j])
+            kq.danh_dau(MIEN, c, _mask_mien(s.to_numpy(dtype=np.float64, na_value=np.nan), MIEN_GIA_TRI[c]))
+        cot[c] = s
+    chuan = pd.DataFrame(cot, index=df.index)
+
+    # Trùng lặp chỉ xét giữa các dòng đã qua các luật khác
+    hop_le = np.flatnonzero(kq.hop_le)
+    trung = np.zeros(len(df), dtype=bool)
+    bam = bam_dong(chuan.iloc[hop_le])
+    trung_hop_le = pd.Series(bam).duplicated().to_numpy()
+    trung[hop_le] = trung_hop_le
+    kq.danh_dau(TRUNG, '', trung)
+    kq.bam = bam[~trung_hop_le]
+
+    sach = chuan[kq.hop_le]
+    for c in COT_SO:
+        # Cột số đọc thành chuỗi vì có giá trị lỗi: parse lại phần hợp lệ để giữ kiểu nguyên nếu có
+        if c in df.columns and not pd.api.types.is_numeric_dtype(df[c]):
+            sach[c] = pd.to_numeric(df[c][kq.hop_le])
+    return sach, kq
+
+
+# Hàng rào ngoại lai {cột: (thấp, cao)} từ thống kê của cả tập (StreamingStats)
+def hang_rao(stats, phuong_phap='iqr', he_so=None, cot=COT_NGOAI_LAI):
+    cot = [c for c in cot if c in stats.columns]
+    if phuong_phap == 'iqr':
+        k = HE_SO_IQR if he_so is None else he_so
+        q1, q3 = stats.quantile(0.25), stats.quantile(0.75)
+        return {c: (float(q1[c] - k * (q3[c] - q1[c])), float(q3[c] + k * (q3[c] - q1[c]))) for c in cot}
+    if phuong_phap == 'z':
+        k = NGUONG_Z if he_so is None else he_so
+        mean, std = stats.means(), stats.std_devs()
+        return {c: (float(mean[c] - k * std[c]), float(mean[c] + k * std[c])) for c in cot}
+    raise ValueError(f"Phương pháp ngoại lai không hợp lệ: {phuong_phap!r} (cần 'iqr' hoặc 'z')")
+
+
+# Khối/phân vùng có giá trị nào vượt hàng rào không, chỉ dựa vào min/max trong thống kê của nó
+def co_ngoai_lai(stats, rao):
+    mins, maxs = stats.mins(), stats.maxs()
+    return any(mins[c] < thap or maxs[c] > cao for c, (thap, cao) in rao.items() if c in mins.index)
+
+
+# Đánh dấu ngoại lai (và các dòng trùng đã biết theo vị trí) trên một khối đã làm sạch
+def kiem_tra_ngoai_lai(df, rao, dong_trung=None):
+    kq = KetQuaKiemTra(len(df))
+    for c, (thap, cao) in rao.items():
+        if c in df.columns:
+            v = df[c].to_numpy(dtype=np.float64)
+            kq.danh_dau(NGOAI_LAI, c, (v < thap) | (v > cao))
+    if dong_trung is not None and len(dong_trung):
+        trung = np.zeros(len(df), dtype=bool)
+        trung[dong_trung] = True
+        kq.danh_dau(TRUNG, '', trung)
+    return kq
@@ -0,0 +1,282 @@
+import argparse
+import copy
+import glob
+import io
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bodem import ghi_cache
+from khoitonghop import KhoiTongHop, file_khoi
+from kiemtra import (TEN_LY_DO, co_ngoai_lai, file_cach_ly, hang_rao, kiem_tra_khoi, kiem_tra_ngoai_lai,
+                     luu_bam_dong, mask_trong_mien)
+from thongke import StreamingStats
+
+# Pipeline làm sạch dữ liệu dùng lại được: nhận một thư mục/glob/danh sách file CSV,
+# chia mỗi file thành các khoảng byte (căn theo đầu dòng) và giao cho các tiến trình
+# con. Mỗi tiến trình tự đọc, làm sạch và ghi khoảng của mình ra một file phân vùng,
+# nên tiến trình chính không phải parse văn bản và tốc độ tăng gần tuyến tính theo số lõi.
+# Giả định file CSV không có ký tự xuống dòng nằm trong ô dữ liệu.
+# Dòng không qua kiểm tra chất lượng (kiemtra.py) được ghi ra các file cach_ly-*.csv kèm mã lý do.
+# Sau lượt làm sạch có thêm một lượt lọc: dòng trùng với phân vùng đứng trước và ngoại lai theo
+# hàng rào IQR của cả tập; lượt này chỉ đọc lại các phân vùng thực sự có dòng cần bỏ.
+
+KICH_THUOC_KHOI_MB = 64
+
+
+# Mặt nạ các dòng hợp lệ (không khuyết, các cột số trong miền kiemtra.MIEN_GIA_TRI), dùng chung cho
+# mọi script đọc dữ liệu đã làm sạch
+def mask_hop_le(df):
+    return df.notna().all(axis=1).to_numpy() & mask_trong_mien(df)
+
+
+# Làm sạch một khối: chuẩn hóa chuỗi, ép kiểu số, bỏ dòng khuyết/sai kiểu/ngoài miền/trùng trong khối
+def lam_sach_chunk(df):
+    return kiem_tra_khoi(df)[0]
+
+
+# Trả về danh sách file CSV từ một thư mục, một mẫu glob, một file hoặc một danh sách các thứ đó
+def liet_ke_file(nguon):
+    if isinstance(nguon, (list, tuple)):
+        return [f for n in nguon for f in liet_ke_file(n)]
+    if os.path.isdir(nguon):
+        return sorted(glob.glob(os.path.join(nguon, '*.csv')))
+    if os.path.isfile(nguon):
+        return [nguon]
+    files = sorted(glob.glob(nguon))
+    if not files:
+        raise FileNotFoundError(f"Không tìm thấy file dữ liệu: {nguon}")
+    return files
+
+
+# Chia file thành các khoảng byte [start, end) khoảng kich_thuoc byte, luôn bắt đầu ở đầu một dòng.
+# tu/den: chỉ chia đoạn byte [tu, den) của file (cả hai phải ở ranh giới dòng), mặc định cả file sau tiêu đề.
+def chia_khoang(path, kich_thuoc, tu=None, den=None):
+    size = os.path.getsize(path) if den is None else den
+    with open(path, 'rb') as f:
+        header = f.readline()
+        khoang = []
+        start = f.tell() if tu is None else tu
+        while start < size:
+            f.seek(min(start + kich_thuoc, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            khoang.append((start, end))
+            start = end
+    return header, khoang
+
+
+# Đọc khoảng byte [start, end) của file thành DataFrame (dùng lại dòng tiêu đề của file)
+def doc_khoang(path, start, end, header, **kwargs):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        buf = f.read(end - start)
+    return pd.read_csv(io.BytesIO(header + buf), **kwargs)
+
+
+# File cách ly tương ứng với một file phân vùng (part-i-j.csv -> cach_ly-i-j.csv)
+def _file_cach_ly_phan_vung(out_path):
+    thu_muc, ten = os.path.split(out_path)
+    return os.path.join(thu_muc, 'cach_ly-' + ten[len('part-'):])
+
+
+# Việc của một tiến trình con: đọc, kiểm tra và làm sạch, ghi phân vùng (và dòng bị cách ly),
+# thống kê khoảng được giao
+def _xu_ly_khoang(viec):
+    path, start, end, header, out_path = viec
+    df = doc_khoang(path, start, end, header)
+    missing = df.isnull().sum()
+    df_clean, kiem_tra = kiem_tra_khoi(df)
+    df_clean.to_csv(out_path, index=False)
+    cach_ly = None
+    if len(df_clean) < len(df):
+        cach_ly = _file_cach_ly_phan_vung(out_path)
+        kiem_tra.bang_cach_ly(df).to_csv(cach_ly, index=False)
+    return {'file': out_path,
+            'cach_ly': cach_ly,
+            'so_dong_vao': len(df),
+            'so_dong_ra': len(df_clean),
+            'missing': missing,
+            'ly_do': kiem_tra.dem(),
+            'bam': kiem_tra.bam,
+            'stats': StreamingStats().update(df_clean),
+            'khoi': KhoiTongHop().update(df_clean)}
+
+
+# Lượt lọc thứ hai của một phân vùng: bỏ ngoại lai và các dòng (theo vị trí) trùng phân vùng trước,
+# ghi lại phân vùng và nối các dòng bị bỏ vào file cách ly của nó
+def _loc_phan_vung(viec):
+    out_path, rao, dong_trung = viec
+    df = pd.read_csv(out_path)
+    kiem_tra = kiem_tra_ngoai_lai(df, rao, dong_trung)
+    df_clean = df[kiem_tra.hop_le]
+    df_clean.to_csv(out_path, index=False)
+    cach_ly = _file_cach_ly_phan_vung(out_path)
+    co_san = os.path.exists(cach_ly)
+    kiem_tra.bang_cach_ly(df).to_csv(cach_ly, mode='a' if co_san else 'w', header=not co_san, index=False)
+    return {'cach_ly': cach_ly,
+            'so_dong_ra': len(df_clean),
+            'ly_do': kiem_tra.dem(),
+            'stats': StreamingStats().update(df_clean),
+            'khoi': KhoiTongHop().update(df_clean)}
+
+
+class KetQuaLamSach:
+    def __init__(self):
+        self.files = []
+        self.files_cach_ly = []
+        self.so_dong_vao = 0
+        self.so_dong_ra = 0
+        self.ly_do = dict.fromkeys(TEN_LY_DO.values(), 0)  # số dòng bị cách ly theo lý do
+        self.rao = None  # hàng rào ngoại lai đã dùng
+        self.bam = None  # mã băm (đã sắp xếp) của mọi dòng qua các luật theo dòng, kể cả của bam_cu
+        self.missing_values = None
+        self.phan_vung = []  # kết quả từng phân vùng, giữ lại để lọc lượt hai rồi gộp
+        self.stats = StreamingStats()
+        self.khoi = KhoiTongHop()
+
+    @property
+    def so_dong_cach_ly(self):
+        return self.so_dong_vao - self.so_dong_ra
+
+    def _them(self, kq):
+        self.files.append(kq['file'])
+        self.so_dong_vao += kq['so_dong_vao']
+        self.so_dong_ra += kq['so_dong_ra']
+        self.missing_values = kq['missing'] if self.missing_values is None else self.missing_values.add(kq['missing'], fill_value=0)
+        for ten, dem in kq['ly_do'].items():
+            self.ly_do[ten] += dem
+        self.phan_vung.append(kq)
+
+    # Tóm tắt số dòng bị cách ly theo lý do (một dòng có thể có nhiều lý do)
+    def tom_tat_cach_ly(self):
+        chi_tiet = ', '.join(f'{ten}: {dem}' for ten, dem in self.ly_do.items() if dem)
+        return f"{self.so_dong_cach_ly} dòng bị cách ly" + (f" ({chi_tiet})" if chi_tiet else "")
+
+    def _gop(self):
+        self.stats, self.khoi = StreamingStats(), KhoiTongHop()
+        for kq in self.phan_vung:
+            self.stats.merge(kq['stats'])
+            self.khoi.merge(kq['khoi'])
+        self.files_cach_ly = [kq['cach_ly'] for kq in self.phan_vung if kq['cach_ly']]
+
+
+# Lượt lọc thứ hai trên các phân vùng đã ghi: tìm dòng trùng giữa các phân vùng qua mã băm dòng
+# (giữ lần xuất hiện đầu tiên theo thứ tự file/khối) hoặc trùng dữ liệu đã có (bam_cu), và chỉ đọc lại
+# phân vùng có dòng trùng hoặc có min/max vượt hàng rào ngoại lai
+def _loc_toan_cuc(ket_qua, rao, so_tien_trinh=None, bam_cu=None):
+    bam = [kq.pop('bam') for kq in ket_qua.phan_vung]
+    tat_ca = np.concatenate(bam) if bam else np.empty(0, dtype=np.uint64)
+    trung = np.ones(len(tat_ca), dtype=bool)
+    trung[np.unique(tat_ca, return_index=True)[1]] = False
+    if bam_cu is not None:
+        trung |= np.isin(tat_ca, bam_cu)
+        tat_ca = np.concatenate([bam_cu, tat_ca])
+    ket_qua.bam = np.unique(tat_ca)
+    viec, vi_tri = [], 0
+    for i, (kq, b) in enumerate(zip(ket_qua.phan_vung, bam)):
+        dong_trung = np.flatnonzero(trung[vi_tri:vi_tri + len(b)])
+        vi_tri += len(b)
+        if len(dong_trung) or (rao and kq['so_dong_ra'] and co_ngoai_lai(kq['stats'], rao)):
+            viec.append((i, (kq['file'], rao or {}, dong_trung)))
+
+    if so_tien_trinh == 1 or len(viec) <= 1:
+        ket_qua_moi = [_loc_phan_vung(v) for _, v in viec]
+    else:
+        with ProcessPoolExecutor(max_workers=so_tien_trinh) as pool:
+            ket_qua_moi = list(pool.map(_loc_phan_vung, [v for _, v in viec]))
+    for (i, _), moi in zip(viec, ket_qua_moi):
+        kq = ket_qua.phan_vung[i]
+        ket_qua.so_dong_ra -= kq['so_dong_ra'] - moi['so_dong_ra']
+        for ten, dem in moi.pop('ly_do').items():
+            ket_qua.ly_do[ten] += dem
+        kq.update(moi)
+
+
+# Chạy pipeline: làm sạch tất cả file đầu vào song song, ghi ra thu_muc_ra/part-<file>-<khối>.csv
+# (dòng bị cách ly ra thu_muc_ra/cach_ly-<file>-<khối>.csv).
+# doan: {đường dẫn: (tu, den)} để chỉ làm sạch một đoạn byte của file (phần mới nối thêm).
+# ngoai_lai: 'iqr', 'z' hoặc None (không lọc ngoại lai); rao: hàng rào {cột: (thấp, cao)} cho sẵn thay vì
+# tính từ chính dữ liệu đang làm sạch.
+# Khi nạp thêm: bam_cu là mã băm các dòng đã có (kiemtra.nap_bam_dong), dòng mới trùng chúng bị cách ly;
+# stats_nen là thống kê của dữ liệu đã có, gộp với dữ liệu mới để tính hàng rào trên cả tập.
+def chay_pipeline(nguon, thu_muc_ra, kich_thuoc_khoi_mb=KICH_THUOC_KHOI_MB, so_tien_trinh=None, doan=None,
+                  ngoai_lai='iqr', rao=None, bam_cu=None, stats_nen=None):
+    os.makedirs(thu_muc_ra, exist_ok=True)
+    for cu in glob.glob(os.path.join(thu_muc_ra, 'part-*.csv')) + glob.glob(os.path.join(thu_muc_ra, 'cach_ly-*.csv')):
+        os.remove(cu)
+
+    viec = []
+    for i, path in enumerate(liet_ke_file(nguon)):
+        header, khoang = chia_khoang(path, int(kich_thuoc_khoi_mb * 1024 * 1024), *(doan or {}).get(path, ()))
+        for j, (start, end) in enumerate(khoang):
+            viec.append((path, start, end, header, os.path.join(thu_muc_ra, f'part-{i:05d}-{j:05d}.csv')))
+
+    ket_qua = KetQuaLamSach()
+    if so_tien_trinh == 1 or len(viec) <= 1:
+        for v in viec:
+            ket_qua._them(_xu_ly_khoang(v))
+    else:
+        with ProcessPoolExecutor(max_workers=so_tien_trinh) as pool:
+            for kq in pool.map(_xu_ly_khoang, viec):
+                ket_qua._them(kq)
+    ket_qua._gop()
+
+    if rao is None and ngoai_lai and ket_qua.so_dong_ra:
+        stats = ket_qua.stats if stats_nen is None else copy.deepcopy(stats_nen).merge(ket_qua.stats)
+        rao = hang_rao(stats, ngoai_lai)
+    ket_qua.rao = rao
+    so_dong_ra = ket_qua.so_dong_ra
+    _loc_toan_cuc(ket_qua, rao, so_tien_trinh, bam_cu)
+    if ket_qua.so_dong_ra != so_dong_ra:
+        ket_qua._gop()
+    return ket_qua
+
+
+# Gộp các file phân vùng thành một file CSV duy nhất (chép byte, bỏ dòng tiêu đề lặp lại)
+def gop_phan_vung(files, dich):
+    header = None
+    with open(dich, 'wb') as out:
+        for path in files:
+            with open(path, 'rb') as f:
+                dong_dau = f.readline()
+                if header is None:
+                    header = dong_dau
+                    out.write(header)
+                elif dong_dau != header:
+                    raise ValueError(f"File {path} có tiêu đề khác: {dong_dau!r} != {header!r}")
+                shutil.copyfileobj(f, out)
+    return dich
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Làm sạch song song các file dữ liệu sản lượng cây trồng")
+    parser.add_argument('nguon', nargs='+', help="file, thư mục hoặc mẫu glob của các file CSV")
+    parser.add_argument('-o', '--out', required=True, help="thư mục ghi các file phân vùng")
+    parser.add_argument('--chunk-mb', type=float, default=KICH_THUOC_KHOI_MB, help="kích thước mỗi khối (MB)")
+    parser.add_argument('--workers', type=int, default=None, help="số tiến trình (mặc định: số lõi CPU)")
+    parser.add_argument('--merge', help="gộp kết quả thành một file CSV (kèm bộ đệm dạng cột)")
+    parser.add_argument('--ngoai-lai', choices=['iqr', 'z', 'none'], default='iqr',
+                        help="cách phát hiện ngoại lai (mặc định: hàng rào IQR)")
+    args = parser.parse_args()
+
+    ket_qua = chay_pipeline(args.nguon, args.out, args.chunk_mb, args.workers,
+                            ngoai_lai=None if args.ngoai_lai == 'none' else args.ngoai_lai)
+    print(f"Đã làm sạch {ket_qua.so_dong_vao} dòng -> {ket_qua.so_dong_ra} dòng, {len(ket_qua.files)} phân vùng; "
+          f"{ket_qua.tom_tat_cach_ly()}")
+    if args.merge:
+        gop_phan_vung(ket_qua.files, args.merge)
+        if ket_qua.files_cach_ly:
+            gop_phan_vung(ket_qua.files_cach_ly, file_cach_ly(args.merge))
+        schema = ghi_cache(args.merge, so_dong=ket_qua.so_dong_ra)
+        ket_qua.khoi.save(file_khoi(args.merge), ma_bam=schema['nguon']['hash'])
+        luu_bam_dong(args.merge, ket_qua.bam, schema['nguon']['hash'])
+        print(f"Đã gộp vào: {args.merge}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,115 +1,133 @@
-import pandas as pd
-
-# Đọc dữ liệu
-df = pd.read_csv("Crop_production_in_India.csv")
-df_count=df.count()
-# print(df_count)
-# Thống kê số lượng giá trị khuyết theo từng cột
-missing_values = df.isnull().sum()
-
-# Hiển thị kết quả
-print("Thống kê số lượng giá trị khuyết:")
-print(missing_values)
-df_clean = df.dropna()
-print(df_clean)
-# Chuẩn hóa chuỗi (loại khoảng trắng thừa)
-for col in ["Crop", "Season"]:
-    df_clean.loc[:, col] = df_clean[col].str.strip()
- # Hiển thị số lượng giá trị khuyết sau khi xử lý
-print("\n📌 Số lượng giá trị khuyết sau khi xử lý:")
-print(df_clean.isnull().sum())
-# Lưu kết quả ra file csv mới với tên Crop_production_in_India_ok.csv
-df_clean.to_csv('Crop_production_in_India_ok.csv ', index=False)  
-df_numeric = df_clean.select_dtypes(include=['number'])
-print(df_numeric)
-# đếm các dữ liệu không bị khuyết
-data_count = df_numeric.count()
-print(data_count)
-# # Tính và in ra trung bình cộng theo hàng (axis=1)
-# row_means = df_numeric.mean(axis=1)
-# print("Trung bình cộng theo hàng:")
-# print(row_means)
-
-# Tính và in ra trung bình cộng theo cột (axis=0)
-column_means = df_numeric.mean(axis=0)
-print("Trung bình cộng theo cột:")
-print(column_means)
-
-# Tính median của từng cột
-column_medians = df_numeric.median()
-
-print("Median của từng cột:")
-print(column_medians)
-
-# Tính mode của từng cột
-column_modes = df_numeric.mode()
-
-print("Mode của từng cột:")
-print(column_modes)
-
-# Tính giá trị max của từng cột
-column_max = df_numeric.max()
-print("Giá trị max của từng cột:")
-print(column_max)
-
-# Tính giá trị min của từng cột
-column_min = df_numeric.min()
-print("\nGiá trị min của từng cột:")
-print(column_min)
-
-# Tính Q1, Q2 , Q3 cho từng cột
-column_q1 = df_numeric.quantile(0.25)
-column_q2 = df_numeric.median()
-column_q3 = df_numeric.quantile(0.75)
-column_IQR = column_q3 - column_q1
-print("Q1 của từng cột:")
-print(column_q1)
-
-print("\nMedian của từng cột:")
-print(column_q2)
-
-print("\nQ3 của từng cột:")
-print(column_q3)
-
-print("\nIQR của từng cột:")
-print(column_IQR)
-
-# Tính phương sai của từng cột
-column_variances = df_numeric.var()
-print("Phương sai của từng cột:")
-print(column_variances)
-
-# Tính độ lệch chuẩn của từng cột
-column_std_devs = df_numeric.std()
-print("\nĐộ lệch chuẩn của từng cột:")
-print(column_std_devs)
-
-# Tạo bảng thống kê 
-def descriptive(data_count,column_min,column_max,column_medians,column_modes,column_q1,column_q2,column_q3,column_IQR,column_variances,column_std_devs):
-        data = {'Count': [i for i in data_count ],
-                'min': [i for i in column_min ],
-                'max': [i for i in column_max ],
-                'median': [i for i in column_medians ],
-                'mode': [i for i in column_modes.values[0]],
-                'Q1': [i for i in column_q1 ],
-                'Q2': [i for i in column_q2 ],
-                'Q3': [i for i in column_q3 ],
-                'IQR': [i for i in column_IQR ],
-                'Variance': [i for i in column_variances ],
-                'stdev': [i for i in column_std_devs ],
-                } # dữ liệu đang ở dạng dic
-        df1 = pd.DataFrame(data) # convert về dạng pandas
-        df1.index=df_numeric.keys() # keys sẽ trả về tên của các cột( features)
-        data_complete = df1.transpose() # transpose để chuyển hàng về cột, cột về hàng
-
-        # Thêm một cột mới vào đầu DataFrame
-        new_column_data = ['count','min','max','median','mode','Q1','Q2','Q3','IQR','Variance','stdev']
-        column_name = ' '
-        data_complete.insert(loc=0, column=column_name, value=new_column_data)
-        print(data_complete)
-descriptive(data_count,column_min,column_max,column_medians,column_modes,column_q1,column_q2,column_q3,column_IQR,column_variances,column_std_devs)
-print('---------------------------------------------------------------------------------------------------------------------------------------------')
-# # Tạo bảng thống kê (dùng hàm có sẵn)
-# data_complete = df_numeric.describe(include='all')
-# print(data_complete)
-
+import argparse
+import os
+
+from bodem import ghi_cache
+from capnhat import ghi_moc
+from khoitonghop import file_khoi
+from kiemtra import file_cach_ly, luu_bam_dong
+from lamsach import chay_pipeline, gop_phan_vung
+from phanvung import THEO_MAC_DINH, doc_manifest, ghi_phan_vung, thu_muc_phan_vung
+from thongke import file_thong_ke_mo_ta
+from theodoi import giai_doan
+
+# Thư mục chứa các file phân vùng đã làm sạch
+THU_MUC_PHAN_VUNG = "Crop_production_in_India_ok_parts"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Làm sạch Crop_production_in_India.csv và thống kê mô tả")
+    parser.add_argument('--phan-vung', nargs='*', metavar='COT',
+                        help="ghi thêm các phân vùng kiểu Hive theo các cột này (mặc định: Crop_Year)")
+    args = parser.parse_args(argv)
+
+    # Đọc, kiểm tra và làm sạch (bỏ dòng khuyết, sai kiểu, ngoài miền, trùng, ngoại lai; chuẩn hóa chuỗi,
+    # ép kiểu số) và thống kê song song
+    with giai_doan('lam_sach') as gd:
+        ket_qua = chay_pipeline("Crop_production_in_India.csv", THU_MUC_PHAN_VUNG)
+        gd.dat(so_dong=ket_qua.so_dong_vao, so_dong_ra=ket_qua.so_dong_ra, so_phan_vung=len(ket_qua.files),
+               **{f'cach_ly_{ten}': dem for ten, dem in ket_qua.ly_do.items()})
+    stats = ket_qua.stats
+
+    # Hiển thị kết quả
+    print("Thống kê số lượng giá trị khuyết:")
+    print(ket_qua.missing_values)
+    print(f"Số dòng: {ket_qua.so_dong_vao} -> {ket_qua.so_dong_ra} sau khi làm sạch, {ket_qua.tom_tat_cach_ly()}")
+    # Các dòng bị loại được giữ lại kèm mã lý do trong file cách ly để xem lại
+    if ket_qua.files_cach_ly:
+        gop_phan_vung(ket_qua.files_cach_ly, file_cach_ly('Crop_production_in_India_ok.csv'))
+        print(f"Các dòng bị cách ly: {file_cach_ly('Crop_production_in_India_ok.csv')}")
+    elif os.path.exists(file_cach_ly('Crop_production_in_India_ok.csv')):
+        os.remove(file_cach_ly('Crop_production_in_India_ok.csv'))
+    # Lưu kết quả ra file csv mới với tên Crop_production_in_India_ok.csv
+    with giai_doan('gop_phan_vung', so_dong=ket_qua.so_dong_ra):
+        gop_phan_vung(ket_qua.files, 'Crop_production_in_India_ok.csv')
+    # Ghi thêm bộ đệm dạng cột để các script phía sau khỏi phải parse lại CSV
+    with giai_doan('ghi_cache', so_dong=ket_qua.so_dong_ra):
+        schema = ghi_cache('Crop_production_in_India_ok.csv', so_dong=ket_qua.so_dong_ra)
+    # Lưu khối tổng hợp Crop × Season × Crop_Year (đã tính trong lúc làm sạch) cho biểu đồ/phân tích
+    with giai_doan('luu_khoi'):
+        ket_qua.khoi.save(file_khoi('Crop_production_in_India_ok.csv'), ma_bam=schema['nguon']['hash'])
+        stats.save(file_thong_ke_mo_ta('Crop_production_in_India_ok.csv'), ma_bam=schema['nguon']['hash'])
+        # Mã băm các dòng đã nhận, để capnhat.py bỏ dòng nạp thêm trùng với dữ liệu đã có
+        luu_bam_dong('Crop_production_in_India_ok.csv', ket_qua.bam, schema['nguon']['hash'])
+    # Ghi mốc file nguồn đã xử lý, lần sau capnhat.py chỉ làm sạch phần nối thêm
+    ghi_moc('Crop_production_in_India_ok.csv', "Crop_production_in_India.csv")
+    # Phân vùng theo năm/loại cây cho các truy vấn có lọc: ghi khi có --phan-vung, hoặc ghi lại theo
+    # cách chia của lần trước nếu đã có
+    thu_muc = thu_muc_phan_vung('Crop_production_in_India_ok.csv')
+    manifest_cu = doc_manifest(thu_muc)
+    theo = (args.phan_vung or THEO_MAC_DINH) if args.phan_vung is not None else manifest_cu and manifest_cu['theo']
+    if theo:
+        with giai_doan('ghi_phan_vung', so_dong=ket_qua.so_dong_ra):
+            manifest = ghi_phan_vung('Crop_production_in_India_ok.csv', theo)
+        print(f"Đã ghi {len(manifest['phan_vung'])} phân vùng theo {', '.join(theo)} vào {thu_muc}")
+    # đếm các dữ liệu không bị khuyết
+    data_count = stats.count()
+    print(data_count)
+
+    # Tính và in ra trung bình cộng theo cột (axis=0)
+    column_means = stats.means()
+    print("Trung bình cộng theo cột:")
+    print(column_means)
+
+    # Tính median của từng cột
+    column_medians = stats.quantile(0.5)
+
+    print("Median của từng cột:")
+    print(column_medians)
+
+    # Tính mode của từng cột
+    column_modes = stats.modes()
+
+    print("Mode của từng cột:")
+    print(column_modes)
+
+    # Tính giá trị max của từng cột
+    column_max = stats.maxs()
+    print("Giá trị max của từng cột:")
+    print(column_max)
+
+    # Tính giá trị min của từng cột
+    column_min = stats.mins()
+    print("\nGiá trị min của từng cột:")
+    print(column_min)
+
+    # Tính Q1, Q2 , Q3 cho từng cột
+    column_q1 = stats.quantile(0.25)
+    column_q2 = column_medians
+    column_q3 = stats.quantile(0.75)
+    column_IQR = column_q3 - column_q1
+    print("Q1 của từng cột:")
+    print(column_q1)
+
+    print("\nMedian của từng cột:")
+    print(column_q2)
+
+    print("\nQ3 của từng cột:")
+    print(column_q3)
+
+    print("\nIQR của từng cột:")
+    print(column_IQR)
+
+    # Tính phương sai của từng cột
+    column_variances = stats.variances()
+    print("Phương sai của từng cột:")
+    print(column_variances)
+
+    # Tính độ lệch chuẩn của từng cột
+    column_std_devs = stats.std_devs()
+    print("\nĐộ lệch chuẩn của từng cột:")
+    print(column_std_devs)
+
+    # Tạo bảng thống kê (cùng dạng với bảng descriptive() trước đây)
+    with giai_doan('thong_ke_mo_ta'):
+        data_complete = stats.descriptive()
+    print(data_complete)
+    print('---------------------------------------------------------------------------------------------------------------------------------------------')
+    # # Tạo bảng thống kê (dùng hàm có sẵn)
+    # data_complete = df_numeric.describe(include='all')
+    # print(data_complete)
+
+
+if __name__ == "__main__":
+    main()
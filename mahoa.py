@@ -0,0 +1,114 @@
+import json
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# Bộ mã hóa phân loại dùng chung: học danh sách nhãn (vocabulary) một lần, mã hóa bằng mã số
+# nguyên và tạo ma trận thiết kế thưa (scipy.sparse) thay cho get_dummies dạng đặc. Mỗi dòng chỉ
+# có một phần tử khác 0 cho mỗi cột phân loại nên bộ nhớ không tăng theo số nhãn.
+# Nhãn đầu tiên của mỗi cột là nhóm gốc (giống get_dummies(drop_first=True)).
+# unknown='ignore': nhãn chưa gặp được coi như nhóm gốc (mọi cột one-hot bằng 0);
+# unknown='error': báo lỗi khi gặp nhãn chưa gặp.
+
+
+class CategoricalEncoder:
+    def __init__(self, cot_so, cot_phan_loai, unknown='ignore'):
+        if unknown not in ('ignore', 'error'):
+            raise ValueError(f"unknown phải là 'ignore' hoặc 'error', không phải {unknown!r}")
+        self.cot_so = list(cot_so)
+        self.cot_phan_loai = list(cot_phan_loai)
+        self.unknown = unknown
+        self.categories = None
+
+    @classmethod
+    def from_categories(cls, cot_so, categories, unknown='ignore'):
+        encoder = cls(cot_so, list(categories), unknown)
+        encoder.categories = {c: [str(v) for v in nhan] for c, nhan in categories.items()}
+        encoder._khoi_tao()
+        return encoder
+
+    # Học danh sách nhãn (đã sắp xếp) của từng cột phân loại
+    def fit(self, df):
+        self.categories = {}
+        for c in self.cot_phan_loai:
+            s = df[c]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                nhan = s.cat.remove_unused_categories().cat.categories
+            else:
+                nhan = s.dropna().unique()
+            self.categories[c] = sorted(str(v) for v in nhan)
+        self._khoi_tao()
+        return self
+
+    def _khoi_tao(self):
+        self.vi_tri = {}
+        self.feature_names_ = list(self.cot_so)
+        for c in self.cot_phan_loai:
+            self.vi_tri[c] = len(self.feature_names_)
+            self.feature_names_ += [f'{c}_{v}' for v in self.categories[c][1:]]
+        self._tra_cuu = {c: {v: i for i, v in enumerate(nhan)} for c, nhan in self.categories.items()}
+
+    @property
+    def so_dac_trung(self):
+        return len(self.feature_names_)
+
+    # Mã số nguyên của một cột (-1 là nhãn chưa gặp)
+    def codes(self, c, values):
+        nhan = self.categories[c]
+        if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype) and list(values.cat.categories) == nhan:
+            codes = values.cat.codes.to_numpy()
+        else:
+            codes = pd.Categorical(np.asarray(values, dtype=object), categories=nhan).codes
+        codes = codes.astype(np.int64)
+        if self.unknown == 'error' and (codes < 0).any():
+            la = pd.unique(np.asarray(values, dtype=object)[codes < 0])[:5]
+            raise ValueError(f"Cột {c} có nhãn chưa gặp khi huấn luyện: {list(la)}")
+        return codes
+
+    # Ma trận thiết kế thưa (CSR) kích thước (số dòng, số đặc trưng)
+    def transform(self, df):
+        n, k = len(df), len(self.cot_so)
+        data = [df[self.cot_so].to_numpy(dtype=np.float64).ravel()]
+        rows = [np.repeat(np.arange(n), k)]
+        cols = [np.tile(np.arange(k), n)]
+        for c in self.cot_phan_loai:
+            codes = self.codes(c, df[c])
+            co = codes >= 1
+            rows.append(np.flatnonzero(co))
+            cols.append(self.vi_tri[c] + codes[co] - 1)
+            data.append(np.ones(int(co.sum())))
+        return sp.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(n, self.so_dac_trung))
+
+    # Mã hóa một bản ghi (dict) thành vector đặc, không qua pandas — dùng cho dự báo từng dòng
+    def transform_one(self, record):
+        x = np.zeros(self.so_dac_trung)
+        for i, c in enumerate(self.cot_so):
+            x[i] = float(record[c])
+        for c in self.cot_phan_loai:
+            ma = self._tra_cuu[c].get(str(record[c]), -1)
+            if ma < 0 and self.unknown == 'error':
+                raise ValueError(f"Cột {c} có nhãn chưa gặp khi huấn luyện: {record[c]!r}")
+            if ma >= 1:
+                x[self.vi_tri[c] + ma - 1] = 1.0
+        return x
+
+    def to_dict(self):
+        return {'cot_so': self.cot_so,
+                'cot_phan_loai': self.cot_phan_loai,
+                'unknown': self.unknown,
+                'categories': self.categories}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls.from_categories(d['cot_so'], {c: d['categories'][c] for c in d['cot_phan_loai']}, d['unknown'])
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
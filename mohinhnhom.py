@@ -0,0 +1,354 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dichvudubao import BoDuBao
+
+# Họ mô hình theo nhóm (Crop, Season): mỗi nhóm một mô hình tuyến tính nhỏ trên các cột số (hệ số
+# góc của Area... khác nhau theo loại cây), nhóm ít dữ liệu dùng mô hình chung (Crop/Season chỉ dịch
+# hệ số chặn). Huấn luyện: một lượt đọc dữ liệu song song theo khối, cộng dồn X^T X, X^T y, y^T y
+# cho từng ô (tổ hợp nhãn của các cột phân loại) trên các cột số; mô hình chung và mô hình của mọi
+# nhóm đều giải từ các tổng này (trong một ô, cột one-hot là hằng số nên hệ đầy đủ dựng lại chính
+# xác bằng ma trận nhúng). Mọi mô hình cuối cùng được quy về bảng hệ số theo ô W[ô] = [chặn, w...],
+# nên dự báo chỉ là tra ô rồi nhân vector; dự báo theo lô gom các dòng cùng ô và nhân ma trận.
+# Cả họ mô hình lưu thành một file .npz nhỏ.
+
+FILE_HO = 'mo_hinh_nhom.npz'
+THEO = ('Crop', 'Season')
+NGUONG_NHOM = 50  # nhóm có ít dòng huấn luyện hơn thì dùng mô hình chung
+PHIEN_BAN = 2
+
+
+# Mã nhãn của mọi ô theo thứ tự hỗn cơ số (cột cuối thay đổi nhanh nhất); co_an: thêm mã -1
+# (nhãn chưa gặp) cho mỗi cột. Trả về mảng (số ô, số cột).
+def cac_o(so_nhan, co_an=False):
+    truc = [np.arange(-1 if co_an else 0, m) for m in so_nhan]
+    if not truc:
+        return np.zeros((1, 0), dtype=np.int64)
+    return np.stack(np.meshgrid(*truc, indexing='ij'), axis=-1).reshape(-1, len(so_nhan))
+
+
+# Bộ mã hóa bỏ các cột phân loại trong bo (không gian đặc trưng của mô hình riêng theo các cột đó)
+def khong_gian(encoder, bo=()):
+    from mahoa import CategoricalEncoder
+    return CategoricalEncoder.from_categories(
+        encoder.cot_so, {c: encoder.categories[c] for c in encoder.cot_phan_loai if c not in bo})
+
+
+# Ma trận nhúng M (số ô, 1 + số đặc trưng của encoder_dich, 1 + số cột số): trong ô có mã nhãn
+# ma_o, vector [1, đặc trưng của encoder_dich] = M[ô] @ [1, cột số]. Mã -1 không có cột one-hot.
+def ma_tran_nhung(cot_phan_loai, encoder_dich, ma_o):
+    k = len(encoder_dich.cot_so)
+    m = np.zeros((len(ma_o), encoder_dich.so_dac_trung + 1, k + 1))
+    m[:, np.arange(k + 1), np.arange(k + 1)] = 1.0
+    for j, c in enumerate(cot_phan_loai):
+        if c not in encoder_dich.cot_phan_loai:
+            continue
+        ma = ma_o[:, j]
+        co = ma >= 1
+        m[np.flatnonzero(co), 1 + encoder_dich.vi_tri[c] + ma[co] - 1, 0] = 1.0
+    return m
+
+
+# Cộng dồn [1, so] ⊗ [1, so], [1, so] * y, y² theo ô o (bincount, một lượt mỗi phần tử tam giác trên)
+def cong_don_theo_o(so, y, o, so_o):
+    x = np.column_stack([np.ones(len(y)), np.asarray(so, dtype=np.float64)])
+    y = np.asarray(y, dtype=np.float64)
+    q = x.shape[1]
+    xtx = np.empty((so_o, q, q))
+    for i in range(q):
+        for j in range(i, q):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(o, weights=x[:, i] * x[:, j], minlength=so_o)
+    xty = np.column_stack([np.bincount(o, weights=x[:, i] * y, minlength=so_o) for i in range(q)])
+    return xtx, xty, np.bincount(o, weights=y * y, minlength=so_o)
+
+
+class TongTheoO:
+    # Tổng X^T X, X^T y, y^T y của từng ô (tổ hợp nhãn các cột phân loại) trên [1, cột số]
+    def __init__(self, encoder, xtx=None, xty=None, yty=None):
+        self.encoder = encoder
+        self.cot_phan_loai = list(encoder.cot_phan_loai)
+        self.so_nhan = [len(encoder.categories[c]) for c in self.cot_phan_loai]
+        self.ma = cac_o(self.so_nhan)
+        q = len(encoder.cot_so) + 1
+        so_o = len(self.ma)
+        self.xtx = np.zeros((so_o, q, q)) if xtx is None else xtx
+        self.xty = np.zeros((so_o, q)) if xty is None else xty
+        self.yty = np.zeros(so_o) if yty is None else yty
+
+    @property
+    def so_o(self):
+        return len(self.ma)
+
+    # Chỉ số ô của từng dòng từ mã nhãn các cột phân loại
+    def ma_o(self, ma, n):
+        o = np.zeros(n, dtype=np.int64)
+        for c, m in zip(self.cot_phan_loai, self.so_nhan):
+            codes = np.asarray(ma[c], dtype=np.int64)
+            if codes.size and (codes.min() < 0 or codes.max() >= m):
+                raise ValueError(f"Mã của cột {c} nằm ngoài danh sách nhãn")
+            o = o * m + codes
+        return o
+
+    def update(self, so, ma, y):
+        if len(y):
+            xtx, xty, yty = cong_don_theo_o(so, y, self.ma_o(ma, len(y)), self.so_o)
+            self.xtx += xtx
+            self.xty += xty
+            self.yty += yty
+        return self
+
+    def merge(self, other):
+        self.xtx += other.xtx
+        self.xty += other.xty
+        self.yty += other.yty
+        return self
+
+    def copy(self):
+        return TongTheoO(self.encoder, self.xtx.copy(), self.xty.copy(), self.yty.copy())
+
+    @property
+    def so_dong(self):
+        return self.xtx[:, 0, 0]
+
+    @property
+    def n(self):
+        return int(self.so_dong.sum())
+
+    # Hệ phương trình chuẩn trong không gian của encoder_dich, cộng trên các ô được chọn
+    def he_phuong_trinh(self, encoder_dich, chon=None):
+        chon = np.arange(self.so_o) if chon is None else chon
+        m = ma_tran_nhung(self.cot_phan_loai, encoder_dich, self.ma[chon])
+        return (np.einsum('kpq,kqr,ksr->ps', m, self.xtx[chon], m),
+                np.einsum('kpq,kq->p', m, self.xty[chon]))
+
+    # Tổng bình phương sai số của từng ô với bảng hệ số W (số ô, 1 + số cột số)
+    def sse(self, w):
+        return self.yty - 2 * np.einsum('kq,kq->k', w, self.xty) + np.einsum('kq,kqr,kr->k', w, self.xtx, w)
+
+    # R² và MSE của bảng hệ số W trên dữ liệu đã cộng dồn
+    def danh_gia(self, w):
+        n = self.xtx[:, 0, 0].sum()
+        sst = self.yty.sum() - self.xty[:, 0].sum() ** 2 / n
+        sse = float(self.sse(w).sum())
+        return {'r2': float(1 - sse / sst), 'mse': sse / n, 'n': int(n)}
+
+
+# Bảng hệ số theo ô của họ mô hình: mô hình chung cho mọi ô, rồi mô hình riêng cho từng nhóm (tổ hợp
+# nhãn của các cột trong theo) có ít nhất nguong dòng. giai(xtx, xty, ten_dac_trung) -> beta.
+# Trả về (W (số ô, 1 + số cột số), beta của mô hình chung, mặt nạ ô dùng mô hình riêng).
+def he_so_theo_o(tong, theo=THEO, giai=None, nguong=NGUONG_NHOM):
+    if giai is None:
+        from hoiquy_tangdan import giai_phat
+
+        def giai(xtx, xty, ten):
+            return giai_phat(xtx, xty)
+    encoder = tong.encoder
+    beta_chung = giai(*tong.he_phuong_trinh(encoder), encoder.feature_names_)
+    w = np.einsum('kpq,p->kq', ma_tran_nhung(tong.cot_phan_loai, encoder, tong.ma), beta_chung)
+    rieng = np.zeros(tong.so_o, dtype=bool)
+    theo = [c for c in tong.cot_phan_loai if c in theo]
+    if theo:
+        encoder_nhom = khong_gian(encoder, theo)
+        m = ma_tran_nhung(tong.cot_phan_loai, encoder_nhom, tong.ma)
+        vi_tri = [tong.cot_phan_loai.index(c) for c in theo]
+        _, nhom = np.unique(tong.ma[:, vi_tri], axis=0, return_inverse=True)
+        nhom = nhom.ravel()
+        so_dong = np.bincount(nhom, weights=tong.so_dong)
+        for g in np.flatnonzero(so_dong >= nguong):
+            chon = np.flatnonzero(nhom == g)
+            beta = giai(*tong.he_phuong_trinh(encoder_nhom, chon), encoder_nhom.feature_names_)
+            w[chon] = np.einsum('kpq,p->kq', m[chon], beta)
+            rieng[chon] = True
+    return w, beta_chung, rieng
+
+
+class HoMoHinh(BoDuBao):
+    # schema: CategoricalEncoder.to_dict(); w: hệ số theo ô mở rộng (mỗi cột phân loại có thêm mã -1
+    # cho nhãn chưa gặp, đứng đầu), rieng: ô dùng mô hình riêng, so_dong: số dòng huấn luyện của ô
+    def __init__(self, w, rieng, so_dong, schema, theo=THEO, ma_bam=None, metrics=None, cau_hinh=None,
+                 thoi_diem=None):
+        self.schema = schema
+        self.cot_so = list(schema['cot_so'])
+        self.cot_phan_loai = list(schema['cot_phan_loai'])
+        self.unknown = schema.get('unknown', 'ignore')
+        self.theo = [c for c in theo if c in self.cot_phan_loai]
+        self.nhan = {c: {v: i for i, v in enumerate(schema['categories'][c])} for c in self.cot_phan_loai}
+        self.so_nhan = [len(self.nhan[c]) for c in self.cot_phan_loai]
+        self.w = np.asarray(w, dtype=np.float64)
+        self.rieng = np.asarray(rieng, dtype=bool)
+        self.so_dong = np.asarray(so_dong, dtype=np.int64)
+        if self.w.shape != (int(np.prod([m + 1 for m in self.so_nhan])), len(self.cot_so) + 1):
+            raise ValueError(f"Bảng hệ số {self.w.shape} không khớp schema")
+        self.ma_bam = ma_bam
+        self.metrics = {k: float(v) for k, v in (metrics or {}).items()}
+        self.cau_hinh = cau_hinh or {}
+        self.thoi_diem = thoi_diem or time.strftime('%Y-%m-%dT%H:%M:%S')
+        # Bản Python thuần cho dự báo từng dòng
+        self._w_py = self.w.tolist()
+        self._nhan_py = {c: {v: i + 1 for v, i in self.nhan[c].items()} for c in self.cot_phan_loai}
+
+    # Từ tổng theo ô đã cộng dồn: ô có nhãn chưa gặp dùng mô hình chung (như nhóm gốc)
+    @classmethod
+    def tu_tong(cls, tong, theo=THEO, giai=None, nguong=NGUONG_NHOM, **kwargs):
+        w, beta_chung, rieng = he_so_theo_o(tong, theo, giai, nguong)
+        ma_mo_rong = cac_o(tong.so_nhan, co_an=True)
+        w_mo_rong = np.einsum('kpq,p->kq', ma_tran_nhung(tong.cot_phan_loai, tong.encoder, ma_mo_rong), beta_chung)
+        rieng_mo_rong = np.zeros(len(ma_mo_rong), dtype=bool)
+        so_dong = np.zeros(len(ma_mo_rong), dtype=np.int64)
+        da_gap = (ma_mo_rong >= 0).all(axis=1)
+        w_mo_rong[da_gap] = w
+        rieng_mo_rong[da_gap] = rieng
+        so_dong[da_gap] = tong.so_dong
+        return cls(w_mo_rong, rieng_mo_rong, so_dong, tong.encoder.to_dict(), theo, **kwargs)
+
+    # Chỉ số ô (mở rộng) từ mã nhãn; mã -1 là nhãn chưa gặp
+    def _o(self, ma, n):
+        o = np.zeros(n, dtype=np.int64)
+        for c, m in zip(self.cot_phan_loai, self.so_nhan):
+            o = o * (m + 1) + (ma[c] + 1)
+        return o
+
+    def du_bao_mot(self, record):
+        o = 0
+        for c, m in zip(self.cot_phan_loai, self.so_nhan):
+            ma = self._nhan_py[c].get(str(record[c]).strip().title())
+            if ma is None:
+                if self.unknown == 'error':
+                    raise ValueError(f"Cột {c} có nhãn chưa gặp khi huấn luyện: {record[c]!r}")
+                ma = 0
+            o = o * (m + 1) + ma
+        w = self._w_py[o]
+        y = w[0]
+        for i, c in enumerate(self.cot_so, 1):
+            y += w[i] * float(record[c])
+        return y
+
+    # Dự báo theo lô: gom các dòng cùng ô (sắp xếp ổn định theo chỉ số ô) rồi mỗi ô một phép nhân
+    # ma trận-vector trên đoạn dòng liên tiếp của nó
+    def du_bao_lo(self, cot):
+        so = np.column_stack([np.asarray(cot[c], dtype=np.float64) for c in self.cot_so])
+        o = self._o({c: self._ma(c, cot[c]) for c in self.cot_phan_loai}, len(so))
+        thu_tu = np.argsort(o, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(o, minlength=len(self.w)))])
+        y = np.empty(len(so))
+        for k in np.flatnonzero(offsets[1:] > offsets[:-1]):
+            chon = thu_tu[offsets[k]:offsets[k + 1]]
+            y[chon] = so[chon] @ self.w[k, 1:] + self.w[k, 0]
+        return y
+
+    def he_so_o(self, ma):
+        return self.w[self._o(ma, len(next(iter(ma.values()))) if ma else 1)]
+
+    # Bảng tóm tắt các nhóm (chỉ các ô có dữ liệu huấn luyện)
+    def tom_tat(self):
+        from pandas import DataFrame
+        ma = cac_o(self.so_nhan, co_an=True)
+        co = self.so_dong > 0
+        bang = DataFrame({c: [list(self.nhan[c])[m] for m in ma[co, j]] for j, c in enumerate(self.cot_phan_loai)})
+        bang['so_dong'] = self.so_dong[co]
+        bang['mo_hinh'] = np.where(self.rieng[co], 'riêng', 'chung')
+        bang['intercept'] = self.w[co, 0]
+        for i, c in enumerate(self.cot_so, 1):
+            bang[c] = self.w[co, i]
+        return bang
+
+    def con_khop(self, ma_bam, cau_hinh=None):
+        return (ma_bam is None or self.ma_bam == ma_bam) and (cau_hinh is None or self.cau_hinh == cau_hinh)
+
+    def save(self, path=FILE_HO):
+        meta = {'phien_ban': PHIEN_BAN, 'schema': self.schema, 'theo': self.theo, 'ma_bam': self.ma_bam,
+                'metrics': self.metrics, 'cau_hinh': self.cau_hinh, 'thoi_diem': self.thoi_diem}
+        tam = path + '.tmp.npz'
+        np.savez(tam, meta=json.dumps(meta, ensure_ascii=False), w=self.w, rieng=self.rieng, so_dong=self.so_dong)
+        os.replace(tam, path)
+
+    @classmethod
+    def load(cls, path=FILE_HO):
+        with np.load(path) as f:
+            meta = json.loads(str(f['meta']))
+            if meta.get('phien_ban') != PHIEN_BAN:
+                raise ValueError(f"Họ mô hình phiên bản {meta.get('phien_ban')}, cần phiên bản {PHIEN_BAN}")
+            return cls(f['w'], f['rieng'], f['so_dong'], meta['schema'], meta['theo'], meta['ma_bam'],
+                       meta['metrics'], meta['cau_hinh'], meta['thoi_diem'])
+
+
+# Việc của tiến trình con: cộng dồn một khối vào tổng theo ô của tập train và tập test
+def _tich_luy_khoi(viec):
+    from hoiquy_tangdan import _mask_kiem_tra, doc_khoi
+    khoi, encoder, test_size, seed = viec
+    khoa, so, ma, y = doc_khoi(khoi, encoder)
+    mask = _mask_kiem_tra(khoa, test_size, seed)
+    train = TongTheoO(encoder).update(so[~mask], {c: m[~mask] for c, m in ma.items()}, y[~mask])
+    test = TongTheoO(encoder).update(so[mask], {c: m[mask] for c, m in ma.items()}, y[mask])
+    return train, test
+
+
+# Huấn luyện họ mô hình từ file dữ liệu (không nạp cả bảng vào bộ nhớ): đọc song song theo khối,
+# chia train/test theo khóa dòng như huan_luyen_ngoai_bo_nho (loc: chỉ học trên các dòng thỏa điều kiện).
+# Trả về HoMoHinh.
+def huan_luyen_ho(file_path='Crop_production_in_India_ok.csv', theo=THEO, nguong=NGUONG_NHOM, test_size=0.2,
+                  seed=42, so_tien_trinh=None, kich_thuoc_khoi=None, loc=None):
+    from goimohinh import ma_bam_du_lieu
+    from hoiquy_tangdan import KICH_THUOC_KHOI, chuan_bi_doc
+    encoder, khoi = chuan_bi_doc(file_path, kich_thuoc_khoi or KICH_THUOC_KHOI, loc)
+    viec = [(k, encoder, test_size, seed) for k in khoi]
+    if so_tien_trinh == 1 or len(viec) <= 1:
+        ket_qua = list(map(_tich_luy_khoi, viec))
+    else:
+        with ProcessPoolExecutor(max_workers=so_tien_trinh) as pool:
+            ket_qua = list(pool.map(_tich_luy_khoi, viec))
+    train, test = TongTheoO(encoder), TongTheoO(encoder)
+    for tr, te in ket_qua:
+        train.merge(tr)
+        test.merge(te)
+
+    w, _, _ = he_so_theo_o(train, theo, nguong=nguong)
+    ket_qua_train, ket_qua_test = train.danh_gia(w), test.danh_gia(w)
+    metrics = {'train_r2': ket_qua_train['r2'], 'train_mse': ket_qua_train['mse'],
+               'test_r2': ket_qua_test['r2'], 'test_mse': ket_qua_test['mse']}
+    cau_hinh = {'theo': list(theo), 'nguong': nguong, 'test_size': test_size, 'seed': seed}
+    if loc:
+        cau_hinh['loc'] = loc
+    return HoMoHinh.tu_tong(train, theo, nguong=nguong, ma_bam=ma_bam_du_lieu(file_path), metrics=metrics,
+                            cau_hinh=cau_hinh)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Huấn luyện họ mô hình theo nhóm (Crop, Season)")
+    parser.add_argument('file', nargs='?', default='Crop_production_in_India_ok.csv')
+    parser.add_argument('-o', '--out', default=FILE_HO, help="file lưu họ mô hình (.npz)")
+    parser.add_argument('--theo', nargs='+', default=list(THEO), help="các cột phân loại dùng để chia nhóm")
+    parser.add_argument('--nguong', type=int, default=NGUONG_NHOM,
+                        help="số dòng tối thiểu để nhóm có mô hình riêng")
+    parser.add_argument('--workers', type=int, default=None, help="số tiến trình (mặc định: số lõi CPU)")
+    args = parser.parse_args(argv)
+
+    from goimohinh import ma_bam_du_lieu
+    cau_hinh = {'theo': args.theo, 'nguong': args.nguong, 'test_size': 0.2, 'seed': 42}
+    ho = None
+    try:
+        ho = HoMoHinh.load(args.out)
+        if not ho.con_khop(ma_bam_du_lieu(args.file), cau_hinh):
+            ho = None
+        else:
+            print(f"Dùng họ mô hình đã lưu trong {args.out} ({ho.thoi_diem})")
+    except (OSError, ValueError, KeyError):
+        pass
+    if ho is None:
+        start = time.perf_counter()
+        ho = huan_luyen_ho(args.file, args.theo, args.nguong, so_tien_trinh=args.workers)
+        ho.save(args.out)
+        print(f"Đã huấn luyện trong {time.perf_counter() - start:.2f} giây, lưu vào {args.out}")
+
+    print(ho.tom_tat().to_string(index=False, float_format=lambda v: f'{v:.4f}'))
+    print(f"Train R²: {ho.metrics['train_r2']:.4f}  Test R²: {ho.metrics['test_r2']:.4f}  "
+          f"Test MSE: {ho.metrics['test_mse']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
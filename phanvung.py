@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from bodem import COT_PHAN_LOAI
+from truyvan import _chuan_hoa_loc, _doc_dieu_kien, _mask
+
+# Lưu bảng đã làm sạch thành các phân vùng kiểu Hive theo Crop_Year (và tùy chọn Crop):
+#   <tên>_phan_vung/Crop_Year=1990/Crop=Rice/part.csv
+# Cột dùng để phân vùng không ghi trong file mà nằm trong tên thư mục. _manifest.json ghi mã băm dữ liệu
+# nguồn và với mỗi phân vùng: số dòng, số byte, min/max từng cột số, các nhãn của cột phân loại.
+# Khi đọc có điều kiện lọc (loc), phân vùng bị loại theo giá trị phân vùng hoặc min/max/nhãn trong
+# manifest mà không mở file; chỉ các dòng trong các phân vùng còn lại mới được đọc và lọc.
+# (Khác với các phân vùng tạm của lamsach.chay_pipeline: đó là các đoạn của file nguồn, bị gộp rồi xóa.)
+
+PHIEN_BAN = 1
+FILE_MANIFEST = '_manifest.json'
+FILE_PHAN = 'part.csv'
+THEO_MAC_DINH = ['Crop_Year']
+KICH_THUOC_KHOI = 1_000_000
+
+
+def thu_muc_phan_vung(csv_sach):
+    return f'{os.path.splitext(csv_sach)[0]}_phan_vung'
+
+
+# Đường dẫn tương đối của phân vùng: "Crop_Year=1990/Crop=Rice" (giá trị được mã hóa %XX như Hive)
+def _duong_dan(gia_tri):
+    return '/'.join(f'{c}={quote(str(v), safe="")}' for c, v in gia_tri.items())
+
+
+def doc_manifest(thu_muc):
+    try:
+        with open(os.path.join(thu_muc, FILE_MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('phien_ban') == PHIEN_BAN else None
+
+
+def _ghi_manifest(thu_muc, manifest):
+    tam = os.path.join(thu_muc, FILE_MANIFEST + '.tmp')
+    with open(tam, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tam, os.path.join(thu_muc, FILE_MANIFEST))
+
+
+# Manifest của các phân vùng của csv_sach nếu còn khớp dữ liệu (cùng mã băm), nếu không thì None
+def manifest_moi(csv_sach, thu_muc=None):
+    from goimohinh import ma_bam_du_lieu
+    manifest = doc_manifest(thu_muc or thu_muc_phan_vung(csv_sach))
+    if manifest is None or manifest['nguon']['ma_bam'] != ma_bam_du_lieu(csv_sach):
+        return None
+    return manifest
+
+
+# Ghi thêm các dòng của df vào các phân vùng (tạo phân vùng mới nếu cần) và cộng thống kê vào manifest
+def _ghi_khoi(thu_muc, manifest, df):
+    theo = manifest['theo']
+    cot = [c for c in manifest['cot'] if c not in theo]
+    chi_muc = {p['duong_dan']: p for p in manifest['phan_vung']}
+    for khoa, nhom in df.groupby(theo, sort=False):
+        gia_tri = dict(zip(theo, khoa if isinstance(khoa, tuple) else (khoa,)))
+        gia_tri = {c: v if c in COT_PHAN_LOAI else v.item() if hasattr(v, 'item') else v for c, v in gia_tri.items()}
+        duong_dan = _duong_dan(gia_tri)
+        path = os.path.join(thu_muc, duong_dan, FILE_PHAN)
+        p = chi_muc.get(duong_dan)
+        if p is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            p = chi_muc[duong_dan] = {'duong_dan': duong_dan, 'gia_tri': gia_tri, 'so_dong': 0, 'so_byte': 0,
+                                      'min': {}, 'max': {}, 'nhan': {}}
+            manifest['phan_vung'].append(p)
+        nhom[cot].to_csv(path, mode='a', header=p['so_dong'] == 0, index=False)
+        p['so_dong'] += len(nhom)
+        p['so_byte'] = os.path.getsize(path)
+        for c in cot:
+            if c in COT_PHAN_LOAI:
+                p['nhan'][c] = sorted(set(p['nhan'].get(c, [])) | set(nhom[c].unique().tolist()))
+            else:
+                mn, mx = nhom[c].min().item(), nhom[c].max().item()
+                p['min'][c] = min(p['min'].get(c, mn), mn)
+                p['max'][c] = max(p['max'].get(c, mx), mx)
+    manifest['so_dong'] += len(df)
+    manifest['phan_vung'].sort(key=lambda p: tuple(p['gia_tri'][c] for c in theo))
+
+
+# Ghi lại toàn bộ các phân vùng của file dữ liệu đã làm sạch (đọc CSV theo khối để giữ nguyên giá trị số).
+# Ghi vào thư mục tạm rồi đổi tên nên người đọc không bao giờ thấy bộ phân vùng dở dang. Trả về manifest.
+def ghi_phan_vung(csv_sach, theo=THEO_MAC_DINH, thu_muc=None, kich_thuoc_khoi=KICH_THUOC_KHOI):
+    from goimohinh import ma_bam_du_lieu
+    thu_muc = thu_muc or thu_muc_phan_vung(csv_sach)
+    cot = list(pd.read_csv(csv_sach, nrows=0).columns)
+    theo = list(theo)
+    for c in theo:
+        if c not in cot:
+            raise ValueError(f"Không có cột {c} trong {csv_sach} để phân vùng")
+    tam = thu_muc + '.tmp'
+    shutil.rmtree(tam, ignore_errors=True)
+    os.makedirs(tam)
+    manifest = {'phien_ban': PHIEN_BAN, 'theo': theo, 'cot': cot, 'so_dong': 0,
+                'nguon': {'file': os.path.basename(csv_sach), 'ma_bam': ma_bam_du_lieu(csv_sach)}, 'phan_vung': []}
+    for chunk in pd.read_csv(csv_sach, chunksize=kich_thuoc_khoi, dtype={c: str for c in COT_PHAN_LOAI if c in cot}):
+        _ghi_khoi(tam, manifest, chunk)
+    _ghi_manifest(tam, manifest)
+    cu = thu_muc + '.old'
+    shutil.rmtree(cu, ignore_errors=True)
+    if os.path.exists(thu_muc):
+        os.replace(thu_muc, cu)
+    os.replace(tam, thu_muc)
+    shutil.rmtree(cu, ignore_errors=True)
+    return manifest
+
+
+# Nối các dòng mới (df, đã nối vào cuối csv_sach) vào các phân vùng, nếu phân vùng đang khớp dữ liệu cũ
+# (ma_bam_cu). Trả về True nếu đã cập nhật, False nếu không khớp, None nếu chưa có phân vùng.
+def noi_phan_vung(csv_sach, df, ma_bam_cu, ma_bam_moi, thu_muc=None):
+    thu_muc = thu_muc or thu_muc_phan_vung(csv_sach)
+    manifest = doc_manifest(thu_muc)
+    if manifest is None:
+        return None
+    if manifest['nguon']['ma_bam'] != ma_bam_cu:
+        return False
+    # Manifest cũ bị vô hiệu trước khi ghi: nếu dừng giữa chừng, bộ phân vùng không được dùng nhầm
+    manifest['nguon']['ma_bam'] = None
+    _ghi_manifest(thu_muc, manifest)
+    _ghi_khoi(thu_muc, manifest, df.astype({c: str for c in COT_PHAN_LOAI if c in df.columns}))
+    manifest['nguon']['ma_bam'] = ma_bam_moi
+    _ghi_manifest(thu_muc, manifest)
+    return True
+
+
+# Phân vùng có thể chứa dòng thỏa điều kiện (dieu_kien dạng truyvan._chuan_hoa_loc, chưa đổi mã nhãn)
+def _co_the_thoa(p, dieu_kien):
+    for c, (loai, gia_tri) in dieu_kien.items():
+        if c in p['gia_tri']:
+            v = p['gia_tri'][c]
+            ok = gia_tri[0] <= v <= gia_tri[1] if loai == 'khoang' else v in gia_tri
+        elif c in p['nhan']:
+            ok = loai == 'thuoc' and bool(set(p['nhan'][c]) & set(gia_tri))
+        elif c in p['min']:
+            mn, mx = p['min'][c], p['max'][c]
+            ok = mx >= gia_tri[0] and mn <= gia_tri[1] if loai == 'khoang' else any(mn <= g <= mx for g in gia_tri)
+        else:
+            ok = True
+        if not ok:
+            return False
+    return True
+
+
+# Các phân vùng cần đọc cho điều kiện lọc loc (xem truyvan.truy_van)
+def chon_phan_vung(manifest, loc=None):
+    dieu_kien = _chuan_hoa_loc(loc)
+    for c in dieu_kien:
+        if c not in manifest['cot']:
+            raise KeyError(f"Cột {c} không có trong dữ liệu phân vùng")
+    return [p for p in manifest['phan_vung'] if _co_the_thoa(p, dieu_kien)]
+
+
+# Nhãn của từng cột phân loại trên các phân vùng (theo thứ tự chữ cái)
+def nhan_phan_vung(manifest, phan_vung=None):
+    nhan = {}
+    for p in manifest['phan_vung'] if phan_vung is None else phan_vung:
+        for c, v in p['gia_tri'].items():
+            if c in COT_PHAN_LOAI:
+                nhan.setdefault(c, set()).add(v)
+        for c, v in p['nhan'].items():
+            nhan.setdefault(c, set()).update(v)
+    return {c: sorted(v) for c, v in nhan.items()}
+
+
+# Đọc một phân vùng p (một mục của manifest, cot là các cột của bảng): các cột cần (cột phân vùng thêm
+# lại từ tên thư mục), lọc theo dieu_kien nếu có. nhan: cột phân loại trả về dạng Categorical với các nhãn này.
+def doc_mot_phan_vung(thu_muc, p, cot, columns=None, dieu_kien=None, nhan=None):
+    columns = list(columns or cot)
+    doc = [c for c in cot if c not in p['gia_tri'] and (c in columns or c in (dieu_kien or {}))]
+    df = pd.read_csv(os.path.join(thu_muc, p['duong_dan'], FILE_PHAN), usecols=doc,
+                     dtype={c: str for c in COT_PHAN_LOAI if c in doc})
+    for c, v in p['gia_tri'].items():
+        if c in columns or c in (dieu_kien or {}):
+            df[c] = v
+    if dieu_kien:
+        mask = _mask({c: df[c].to_numpy() for c in dieu_kien}, dieu_kien)
+        df = df[mask]
+    df = df[columns]
+    for c in columns:
+        if nhan and c in nhan:
+            df[c] = pd.Categorical(df[c], categories=nhan[c])
+    return df
+
+
+# Đọc các dòng thỏa loc từ bộ phân vùng (chỉ mở các phân vùng có thể chứa chúng). Trả về DataFrame
+# với Crop/Season dạng category, theo thứ tự phân vùng.
+def doc_phan_vung(thu_muc, loc=None, columns=None, manifest=None):
+    manifest = manifest or doc_manifest(thu_muc)
+    if manifest is None:
+        raise ValueError(f"{thu_muc} không có manifest phân vùng hợp lệ")
+    chon = chon_phan_vung(manifest, loc)
+    columns = list(columns or manifest['cot'])
+    nhan = nhan_phan_vung(manifest, chon)
+    dieu_kien = _chuan_hoa_loc(loc)
+    phan = [doc_mot_phan_vung(thu_muc, p, manifest['cot'], columns, dieu_kien, nhan) for p in chon]
+    if not phan:
+        return pd.DataFrame({c: pd.Categorical([], categories=nhan.get(c, [])) if c in COT_PHAN_LOAI
+                             else np.empty(0) for c in columns})
+    return pd.concat(phan, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ghi bảng đã làm sạch thành các phân vùng kiểu Hive, "
+                                                 "hoặc xem các phân vùng một điều kiện lọc cần đọc")
+    parser.add_argument('file', nargs='?', default='Crop_production_in_India_ok.csv')
+    parser.add_argument('--theo', nargs='+', default=THEO_MAC_DINH, help="các cột phân vùng (mặc định: Crop_Year)")
+    parser.add_argument('--loc', type=_doc_dieu_kien, action='append', default=[],
+                        help="chỉ xem phân vùng cần đọc: Crop=Rice hoặc Crop_Year=1990..1999")
+    args = parser.parse_args(argv)
+
+    thu_muc = thu_muc_phan_vung(args.file)
+    manifest = manifest_moi(args.file)
+    if args.loc and manifest is not None:
+        chon = chon_phan_vung(manifest, dict(args.loc))
+    else:
+        start = time.perf_counter()
+        manifest = ghi_phan_vung(args.file, args.theo)
+        print(f"Đã ghi {len(manifest['phan_vung'])} phân vùng ({manifest['so_dong']} dòng) vào {thu_muc} "
+              f"trong {time.perf_counter() - start:.2f} giây")
+        if not args.loc:
+            return
+        chon = chon_phan_vung(manifest, dict(args.loc))
+    tong_byte = sum(p['so_byte'] for p in manifest['phan_vung'])
+    byte_doc = sum(p['so_byte'] for p in chon)
+    print(f"Cần đọc {len(chon)}/{len(manifest['phan_vung'])} phân vùng, "
+          f"{sum(p['so_dong'] for p in chon)}/{manifest['so_dong']} dòng, "
+          f"{byte_doc / 1e6:.2f}/{tong_byte / 1e6:.2f} MB ({byte_doc / max(tong_byte, 1):.1%})")
+
+
+if __name__ == '__main__':
+    main()
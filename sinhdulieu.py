@@ -0,0 +1,149 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from lamsach import lam_sach_chunk
+
+# Sinh dữ liệu tổng hợp cùng schema và phân phối với Crop_production_in_India.csv để đo hiệu năng
+# ở nhiều kích thước. Hồ sơ dữ liệu (học một lần từ file gốc) gồm: tần suất năm, tần suất tổ hợp
+# (Crop, Season), hàm phân vị của từng cột số (lấy mẫu bằng nghịch đảo hàm phân phối), hồi quy
+# Production theo các cột số trong từng nhóm (Crop, Season) kèm độ lệch chuẩn phần dư, và tỷ lệ
+# giá trị khuyết của từng cột (để bước làm sạch có việc như dữ liệu thật).
+# Dữ liệu sinh theo khối độc lập (seed của khối = (seed, số thứ tự khối)) ở nhiều tiến trình, ghi
+# thẳng ra CSV nên kích thước không bị giới hạn bởi bộ nhớ; cùng seed luôn cho cùng một file.
+
+FILE_NGUON = 'Crop_production_in_India.csv'
+COT = ['Crop_Year', 'Season', 'Crop', 'Area', 'Temperature', 'Humidity', 'Wind_Speed', 'Production']
+DAC_TRUNG = ['Area', 'Temperature', 'Humidity', 'Wind_Speed']
+KICH_THUOC = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000, '100m': 100_000_000}
+SO_PHAN_VI = 1001
+KICH_THUOC_KHOI = 1_000_000
+
+
+# Số dòng từ tên kích thước ('10k', '1m'...) hoặc số nguyên
+def so_dong(kich_thuoc):
+    if isinstance(kich_thuoc, str) and kich_thuoc.lower() in KICH_THUOC:
+        return KICH_THUOC[kich_thuoc.lower()]
+    return int(kich_thuoc)
+
+
+# Học hồ sơ dữ liệu từ file gốc (chưa làm sạch)
+def hoc_ho_so(file_path=FILE_NGUON):
+    tho = pd.read_csv(file_path)
+    sach = lam_sach_chunk(tho.copy())
+    nam, dem_nam = np.unique(sach['Crop_Year'].to_numpy(), return_counts=True)
+    nhom = sach.groupby(['Crop', 'Season']).size()
+    p = np.linspace(0, 1, SO_PHAN_VI)
+    hoi_quy = []
+    for crop, season in nhom.index:
+        g = sach[(sach['Crop'] == crop) & (sach['Season'] == season)]
+        x = np.column_stack([np.ones(len(g)), g[DAC_TRUNG].to_numpy(dtype=np.float64)])
+        y = g['Production'].to_numpy(dtype=np.float64)
+        beta = np.linalg.lstsq(x, y, rcond=None)[0]
+        sai_so = y - x @ beta
+        hoi_quy.append({'beta': beta.tolist(), 'sigma': float(np.sqrt(sai_so @ sai_so / max(len(y) - x.shape[1], 1)))})
+    return {'nguon': os.path.basename(file_path),
+            'nam': nam.tolist(), 'p_nam': (dem_nam / dem_nam.sum()).tolist(),
+            'nhom': [list(k) for k in nhom.index], 'p_nhom': (nhom / nhom.sum()).tolist(),
+            'phan_vi': {c: np.quantile(sach[c].to_numpy(dtype=np.float64), p).tolist() for c in DAC_TRUNG},
+            'hoi_quy': hoi_quy,
+            'khuyet': {c: float(tho[c].isna().mean()) for c in COT}}
+
+
+def ma_bam_ho_so(ho_so):
+    return hashlib.blake2b(json.dumps(ho_so, sort_keys=True).encode('utf-8'), digest_size=8).hexdigest()
+
+
+# Sinh một khối n dòng (DataFrame theo thứ tự cột của file gốc)
+def sinh_khoi(ho_so, n, seed=0, so_thu_tu=0):
+    rng = np.random.default_rng([seed, so_thu_tu])
+    nhom = rng.choice(len(ho_so['nhom']), size=n, p=ho_so['p_nhom'])
+    nhan = np.array(ho_so['nhom'], dtype=object)
+    cot = {'Crop_Year': rng.choice(np.array(ho_so['nam']), size=n, p=ho_so['p_nam']),
+           'Season': nhan[nhom, 1], 'Crop': nhan[nhom, 0]}
+    p = np.linspace(0, 1, SO_PHAN_VI)
+    for c in DAC_TRUNG:
+        cot[c] = np.interp(rng.random(n), p, ho_so['phan_vi'][c])
+    beta = np.array([h['beta'] for h in ho_so['hoi_quy']])
+    sigma = np.array([h['sigma'] for h in ho_so['hoi_quy']])
+    x = np.column_stack([cot[c] for c in DAC_TRUNG])
+    cot['Production'] = beta[nhom, 0] + np.einsum('ij,ij->i', x, beta[nhom, 1:]) + sigma[nhom] * rng.standard_normal(n)
+    df = pd.DataFrame({c: cot[c] for c in COT})
+    for c, ti_le in ho_so['khuyet'].items():
+        if ti_le > 0:
+            df.loc[rng.random(n) < ti_le, c] = np.nan
+    return df
+
+
+def _sinh_csv(viec):
+    ho_so, n, seed, so_thu_tu, header = viec
+    return sinh_khoi(ho_so, n, seed, so_thu_tu).to_csv(index=False, header=header, float_format='%.6f')
+
+
+def _file_meta(path):
+    return path + '.meta.json'
+
+
+# Sinh file CSV n dòng. Giữ lại file đã có nếu cùng số dòng, seed và hồ sơ (trả về False khi dùng lại).
+def tao_du_lieu(n, path, seed=0, ho_so=None, so_tien_trinh=None, kich_thuoc_khoi=KICH_THUOC_KHOI):
+    ho_so = ho_so or hoc_ho_so()
+    meta = {'so_dong': n, 'seed': seed, 'ho_so': ma_bam_ho_so(ho_so)}
+    try:
+        with open(_file_meta(path), encoding='utf-8') as f:
+            if json.load(f) == meta and os.path.exists(path):
+                return False
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    viec = [(ho_so, min(kich_thuoc_khoi, n - start), seed, i, i == 0)
+            for i, start in enumerate(range(0, n, kich_thuoc_khoi))]
+    tam = path + '.tmp'
+    with open(tam, 'w', encoding='utf-8', newline='') as out:
+        if so_tien_trinh == 1 or len(viec) <= 1:
+            for v in viec:
+                out.write(_sinh_csv(v))
+        else:
+            # Giữ số khối đang chờ ghi có hạn để bộ nhớ không tăng theo kích thước file
+            toi_da = 2 * (so_tien_trinh or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=so_tien_trinh) as pool:
+                cho = deque()
+                for v in viec:
+                    cho.append(pool.submit(_sinh_csv, v))
+                    if len(cho) >= toi_da:
+                        out.write(cho.popleft().result())
+                while cho:
+                    out.write(cho.popleft().result())
+    os.replace(tam, path)
+    with open(_file_meta(path), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu tổng hợp theo phân phối của file gốc")
+    parser.add_argument('-n', '--so-dong', default='1m', help=f"số dòng hoặc một trong {list(KICH_THUOC)}")
+    parser.add_argument('-o', '--out', help="file CSV đầu ra (mặc định: synthetic_<n>.csv)")
+    parser.add_argument('--nguon', default=FILE_NGUON, help="file gốc để học phân phối")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="số tiến trình (mặc định: số lõi CPU)")
+    args = parser.parse_args(argv)
+
+    n = so_dong(args.so_dong)
+    out = args.out or f'synthetic_{args.so_dong}.csv'
+    start = time.perf_counter()
+    if tao_du_lieu(n, out, args.seed, hoc_ho_so(args.nguon), args.workers):
+        print(f"Đã sinh {n} dòng vào {out} trong {time.perf_counter() - start:.2f} giây")
+    else:
+        print(f"{out} đã có ({n} dòng, seed {args.seed}), không sinh lại")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Lớp chạy tác vụ nền cho giao diện Tkinter: công việc nặng (đọc dữ liệu, huấn luyện, vẽ biểu đồ,
+# tìm kiếm) chạy trong luồng phụ, kết quả đưa vào hàng đợi và được luồng giao diện lấy
+# ra định kỳ bằng root.after. Tkinter không an toàn đa luồng nên các hàm khi_xong/khi_loi/khi_tien_do
+# /khi_huy luôn được gọi trên luồng giao diện; hàm chạy nền không được chạm vào widget.
+# Mỗi tác vụ có token hủy: hàm nền gọi token.kiem_tra() (hoặc tien_do()) giữa các bước để dừng sớm,
+# kết quả của tác vụ đã hủy bị bỏ qua. Tác vụ cùng tên chạy sau sẽ hủy tác vụ trước (hữu ích khi
+# người dùng gõ tìm kiếm hoặc bấm vẽ liên tục).
+
+
+class DaHuy(Exception):
+    pass
+
+
+class TokenHuy:
+    def __init__(self):
+        self._su_kien = threading.Event()
+
+    def huy(self):
+        self._su_kien.set()
+
+    @property
+    def da_huy(self):
+        return self._su_kien.is_set()
+
+    def kiem_tra(self):
+        if self._su_kien.is_set():
+            raise DaHuy()
+
+
+class TacVu:
+    def __init__(self, ten, khi_xong=None, khi_loi=None, khi_tien_do=None, khi_huy=None):
+        self.ten = ten
+        self.token = TokenHuy()
+        self.trang_thai = 'dang_chay'
+        self.future = None
+        self.khi_xong = khi_xong
+        self.khi_loi = khi_loi
+        self.khi_tien_do = khi_tien_do
+        self.khi_huy = khi_huy
+
+    def huy(self):
+        self.token.huy()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def da_xong(self):
+        return self.trang_thai != 'dang_chay'
+
+
+class BoChayTacVu:
+    # root: cửa sổ Tk; chu_ky_ms: chu kỳ lấy kết quả từ hàng đợi
+    def __init__(self, root, so_luong=None, chu_ky_ms=50):
+        self.root = root
+        self.chu_ky_ms = chu_ky_ms
+        self._luong = ThreadPoolExecutor(max_workers=so_luong, thread_name_prefix='tacvu')
+        self._hang_doi = queue.Queue()
+        self._theo_ten = {}
+        self._dang_chay = set()
+        self._dong = False
+        self._hen_gio = root.after(chu_ky_ms, self._lay_ket_qua)
+
+    def _dang_ky(self, ham_tao_tac_vu, ten):
+        cu = self._theo_ten.get(ten) if ten is not None else None
+        if cu is not None and not cu.da_xong:
+            cu.huy()
+        tac_vu = ham_tao_tac_vu()
+        if ten is not None:
+            self._theo_ten[ten] = tac_vu
+        self._dang_chay.add(tac_vu)
+        return tac_vu
+
+    # Chạy ham(*args, token=..., tien_do=..., **kwargs) trong luồng phụ.
+    # tien_do(phan_tram, thong_diep='') báo tiến độ về giao diện và dừng nếu tác vụ đã bị hủy.
+    def chay(self, ham, *args, ten=None, khi_xong=None, khi_loi=None, khi_tien_do=None, khi_huy=None, **kwargs):
+        tac_vu = self._dang_ky(lambda: TacVu(ten, khi_xong, khi_loi, khi_tien_do, khi_huy), ten)
+
+        def tien_do(phan_tram, thong_diep=''):
+            tac_vu.token.kiem_tra()
+            self._hang_doi.put((tac_vu, 'tien_do', (phan_tram, thong_diep)))
+
+        def chay_nen():
+            try:
+                ket_qua = ham(*args, token=tac_vu.token, tien_do=tien_do, **kwargs)
+                self._hang_doi.put((tac_vu, 'xong', ket_qua))
+            except DaHuy:
+                self._hang_doi.put((tac_vu, 'huy', None))
+            except Exception as e:
+                self._hang_doi.put((tac_vu, 'loi', e))
+
+        def bi_huy_truoc_khi_chay(future):
+            if future.cancelled():
+                self._hang_doi.put((tac_vu, 'huy', None))
+
+        tac_vu.future = self._luong.submit(chay_nen)
+        tac_vu.future.add_done_callback(bi_huy_truoc_khi_chay)
+        return tac_vu
+
+    def huy(self, ten):
+        tac_vu = self._theo_ten.get(ten)
+        if tac_vu is not None:
+            tac_vu.huy()
+
+    def huy_tat_ca(self):
+        for tac_vu in list(self._dang_chay):
+            tac_vu.huy()
+
+    @property
+    def so_dang_chay(self):
+        return len(self._dang_chay)
+
+    # Chạy trên luồng giao diện: lấy hết kết quả đang chờ rồi hẹn lần kiểm tra tiếp theo
+    def _lay_ket_qua(self):
+        while True:
+            try:
+                tac_vu, loai, gia_tri = self._hang_doi.get_nowait()
+            except queue.Empty:
+                break
+            if loai == 'tien_do':
+                if not tac_vu.token.da_huy and tac_vu.khi_tien_do is not None:
+                    tac_vu.khi_tien_do(*gia_tri)
+                continue
+            self._dang_chay.discard(tac_vu)
+            if self._theo_ten.get(tac_vu.ten) is tac_vu:
+                del self._theo_ten[tac_vu.ten]
+            if tac_vu.token.da_huy or loai == 'huy':
+                tac_vu.trang_thai = 'da_huy'
+                if tac_vu.khi_huy is not None:
+                    tac_vu.khi_huy()
+            elif loai == 'loi':
+                tac_vu.trang_thai = 'loi'
+                if tac_vu.khi_loi is not None:
+                    tac_vu.khi_loi(gia_tri)
+            else:
+                tac_vu.trang_thai = 'xong'
+                if tac_vu.khi_xong is not None:
+                    tac_vu.khi_xong(gia_tri)
+        if not self._dong:
+            self._hen_gio = self.root.after(self.chu_ky_ms, self._lay_ket_qua)
+
+    # Gọi khi đóng cửa sổ: hủy mọi tác vụ, không chờ các luồng đang chạy
+    def dong(self):
+        self._dong = True
+        self.huy_tat_ca()
+        self.root.after_cancel(self._hen_gio)
+        self._luong.shutdown(wait=False, cancel_futures=True)
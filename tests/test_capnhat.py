@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import capnhat  # noqa: E402
+import lamsachdulieu  # noqa: E402
+from goimohinh import GoiMoHinh  # noqa: E402
+from hoiquy_tangdan import huan_luyen_ngoai_bo_nho  # noqa: E402
+from khoitonghop import KhoiTongHop, file_khoi  # noqa: E402
+
+FILE_GOC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Crop_production_in_India.csv')
+N = 6000
+
+
+# Làm sạch từ đầu file nguồn trong thư mục thu_muc (lamsachdulieu.py đọc/ghi theo tên file cố định)
+def _lam_sach(thu_muc, monkeypatch, df):
+    monkeypatch.chdir(thu_muc)
+    df.to_csv(capnhat.FILE_NGUON, index=False)
+    lamsachdulieu.main([])
+
+
+# Nạp thêm k dòng (có 3 dòng trùng dữ liệu cũ) phải cho cùng kết quả với làm sạch lại N + k dòng
+def test_nap_them_trung_voi_lam_sach_lai(tmp_path, monkeypatch):
+    goc = pd.read_csv(FILE_GOC)
+    them = pd.concat([goc.iloc[[10, 20, 30]], goc.iloc[N:N + 300]])
+    (tmp_path / 'tung_phan').mkdir()
+    (tmp_path / 'tu_dau').mkdir()
+
+    _lam_sach(tmp_path / 'tung_phan', monkeypatch, goc.iloc[:N])
+    them.to_csv(capnhat.FILE_NGUON, mode='a', header=False, index=False)
+    tom_tat = capnhat.cap_nhat(so_tien_trinh=1)
+    goi = GoiMoHinh.load(capnhat.FILE_GOI)
+    khoi = KhoiTongHop.load(file_khoi(capnhat.FILE_SACH))
+    sach = pd.read_csv(capnhat.FILE_SACH)
+
+    _lam_sach(tmp_path / 'tu_dau', monkeypatch, pd.concat([goc.iloc[:N], them]))
+    model, _, _ = huan_luyen_ngoai_bo_nho(capnhat.FILE_SACH, so_tien_trinh=1)
+    khoi_goc = KhoiTongHop.load(file_khoi(capnhat.FILE_SACH))
+    sach_goc = pd.read_csv(capnhat.FILE_SACH)
+
+    assert tom_tat['so_dong'] == len(sach) == len(sach_goc)
+    pd.testing.assert_frame_equal(sach, sach_goc)
+    assert khoi.nhan == khoi_goc.nhan
+    np.testing.assert_array_equal(khoi.count, khoi_goc.count)
+    for m in khoi.dai_luong:
+        np.testing.assert_allclose(khoi.sum[m], khoi_goc.sum[m])
+    np.testing.assert_allclose(goi.coef, model.coef_, rtol=1e-8)
+    np.testing.assert_allclose(goi.intercept, model.intercept_, rtol=1e-8)
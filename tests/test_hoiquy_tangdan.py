@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bodem import ghi_cache  # noqa: E402
+from hoiquy_tangdan import huan_luyen_ngoai_bo_nho  # noqa: E402
+from lamsach import lam_sach_chunk  # noqa: E402
+
+FILE_GOC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Crop_production_in_India.csv')
+
+
+def _file_sach(tmp_path):
+    df = lam_sach_chunk(pd.read_csv(FILE_GOC, nrows=6000)).drop_duplicates()
+    path = str(tmp_path / 'sach.csv')
+    df.to_csv(path, index=False)
+    return path
+
+
+# Chia train/test và hệ số không được phụ thuộc kích thước khối hay nguồn đọc (CSV hoặc bộ đệm dạng cột)
+def test_chia_train_test_khong_phu_thuoc_cach_doc(tmp_path):
+    path = _file_sach(tmp_path)
+    ket_qua = [huan_luyen_ngoai_bo_nho(path, so_tien_trinh=1, kich_thuoc_khoi=k) for k in (1000, 3000)]
+    ghi_cache(path)
+    ket_qua += [huan_luyen_ngoai_bo_nho(path, so_tien_trinh=1, kich_thuoc_khoi=k) for k in (1000, 3000)]
+
+    model0, train0, test0 = ket_qua[0]
+    for model, train, test in ket_qua[1:]:
+        assert (train.n, test.n) == (train0.n, test0.n)
+        # Số dòng theo từng nhãn Crop/Season của tập test trùng khớp
+        k = len(test.cot_so)
+        np.testing.assert_array_equal(test.xtx[0, k + 1:], test0.xtx[0, k + 1:])
+        np.testing.assert_allclose(model.coef_, model0.coef_, rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(model.intercept_, model0.intercept_, rtol=1e-4)
+    # Cùng nguồn đọc thì kết quả trùng khớp (chỉ khác thứ tự cộng)
+    np.testing.assert_allclose(ket_qua[1][0].coef_, model0.coef_, rtol=1e-9)
+    np.testing.assert_allclose(ket_qua[3][0].coef_, ket_qua[2][0].coef_, rtol=1e-9)
@@ -0,0 +1,437 @@
+import argparse
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# Đo đạc các giai đoạn xử lý: bấm giờ, bộ nhớ (RSS lúc đầu/cuối và đỉnh RSS lấy mẫu trong lúc chạy),
+# số dòng và thuộc tính tùy ý của từng giai đoạn, ghi ra file vết để xem lại sau khi chạy.
+# Bật bằng biến môi trường (không cần sửa lệnh chạy của từng script):
+#   THEODOI=vet.jsonl      mỗi dòng một bản ghi JSON, ghi ngay khi giai đoạn kết thúc
+#   THEODOI=vet.json       như trên, khi thoát đổi sang định dạng Chrome trace (chrome://tracing, Perfetto)
+#   THEODOI_PROFILE=cprofile,tracemalloc
+#                          cprofile: ghi thêm <vet>.prof (xem bằng pstats/snakeviz);
+#                          tracemalloc: đỉnh bộ nhớ Python của từng giai đoạn và các vị trí cấp phát lớn nhất
+# Khi không bật, giai_doan() trả về một đối tượng rỗng dùng chung nên chi phí gần như bằng không.
+# Tiến trình con (pool) thừa hưởng biến môi trường và ghi nối vào cùng file vết.
+# Xem tóm tắt: python theodoi.py vet.jsonl
+
+BIEN_FILE = 'THEODOI'
+BIEN_PROFILE = 'THEODOI_PROFILE'
+CHU_KY_LAY_MAU = 0.02  # giây giữa hai lần đọc RSS
+SO_VI_TRI_CAP_PHAT = 20
+
+
+# RSS hiện tại (MB): /proc trên Linux, psutil nếu có, nếu không thì None
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / 2 ** 20
+
+
+# Đỉnh RSS từ đầu tiến trình (MB); con=True: tiến trình con lớn nhất đã kết thúc
+def rss_dinh_mb(con=False):
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return None if con else getattr(psutil.Process().memory_info(), 'peak_wset', 0) / 2 ** 20 or None
+    r = resource.getrusage(resource.RUSAGE_CHILDREN if con else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss tính bằng byte trên macOS, KB trên Linux
+    return r / 2 ** 20 if sys.platform == 'darwin' else r / 1024
+
+
+class GiaiDoan:
+    def __init__(self, bo_theo_doi, ten, thuoc_tinh):
+        self.bo_theo_doi = bo_theo_doi
+        self.ten = ten
+        self.thuoc_tinh = thuoc_tinh
+        self.cha = None
+        self.muc = 0
+        self.rss_dinh = None
+        self.py_dinh = 0
+
+    def bat_dau(self):
+        self.bo_theo_doi._mo(self)
+        self.thoi_diem = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    # Gắn thêm thuộc tính (so_dong=..., file=...) vào bản ghi của giai đoạn
+    def dat(self, **thuoc_tinh):
+        self.thuoc_tinh.update(thuoc_tinh)
+        return self
+
+    def ket_thuc(self, **thuoc_tinh):
+        self.thuoc_tinh.update(thuoc_tinh)
+        self.bo_theo_doi._dong(self, time.perf_counter() - self._start)
+
+    def __enter__(self):
+        return self.bat_dau()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.thuoc_tinh['loi'] = exc_type.__name__
+        self.ket_thuc()
+        return False
+
+
+# Dùng khi không bật theo dõi: mọi thao tác đều không làm gì
+class _GiaiDoanRong:
+    def bat_dau(self):
+        return self
+
+    def dat(self, **thuoc_tinh):
+        return self
+
+    def ket_thuc(self, **thuoc_tinh):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_RONG = _GiaiDoanRong()
+
+
+class BoTheoDoi:
+    def __init__(self, duong_dan, cprofile=False, tracemalloc=False):
+        self.chrome = duong_dan.endswith('.json')
+        self.duong_dan = duong_dan
+        # Vết luôn được ghi dạng JSON lines; bản Chrome trace tạo ra từ đó khi tiến trình gốc thoát
+        self.file_dong = duong_dan + 'l' if self.chrome else duong_dan
+        self.cprofile = cprofile
+        self.tracemalloc = tracemalloc
+        # Tiến trình gốc là tiến trình đầu tiên bật theo dõi; tiến trình con nhận pid gốc qua biến môi trường
+        os.environ.setdefault('_THEODOI_GOC', str(os.getpid()))
+        self._khoa = threading.RLock()
+        self._cuc_bo = threading.local()
+        self._dang_mo = []
+        self._file = None
+        self._luong_mau = None
+        self._dung = threading.Event()
+        self._profile = []
+        self._anh_bo_nho = None
+        self._anh_lon_nhat = 0
+        if self.goc and os.path.exists(self.file_dong):
+            os.remove(self.file_dong)
+        if tracemalloc:
+            import tracemalloc as tm
+            tm.start()
+        if cprofile:
+            self._bat_profile()
+        atexit.register(self.dong)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._sau_fork)
+
+    # Tiến trình con tạo bằng fork: khóa có thể đang bị giữ bởi luồng không còn tồn tại, bắt đầu lại
+    def _sau_fork(self):
+        self._khoa = threading.RLock()
+        self._cuc_bo = threading.local()
+        self._dang_mo = []
+        self._file = None
+        self._luong_mau = None
+        self._dung = threading.Event()
+        self._profile = []
+        self._anh_bo_nho = None
+        self._anh_lon_nhat = 0
+
+    @property
+    def goc(self):
+        return os.environ.get('_THEODOI_GOC') == str(os.getpid())
+
+    def _ghi(self, ban_ghi):
+        with self._khoa:
+            if self._file is None:
+                self._file = open(self.file_dong, 'a', encoding='utf-8')
+                self._file.write(json.dumps({'loai': 'bat_dau', 'pid': os.getpid(), 'thoi_diem': time.time(),
+                                             'lenh': sys.argv, 'python': sys.version.split()[0]},
+                                            ensure_ascii=False) + '\n')
+            self._file.write(json.dumps(ban_ghi, ensure_ascii=False, default=str) + '\n')
+            self._file.flush()
+
+    # Mỗi luồng có một Profile riêng (cProfile chỉ đo luồng đã bật nó)
+    def _bat_profile(self):
+        if getattr(self._cuc_bo, 'profile', None) is not None:
+            return
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: chỉ một công cụ profile được bật cùng lúc
+            return
+        self._cuc_bo.profile = profile
+        with self._khoa:
+            self._profile.append(profile)
+
+    def _ngan_xep(self):
+        ngan_xep = getattr(self._cuc_bo, 'ngan_xep', None)
+        if ngan_xep is None:
+            ngan_xep = self._cuc_bo.ngan_xep = []
+        return ngan_xep
+
+    # Đỉnh bộ nhớ Python từ lần đặt lại trước được tính cho mọi giai đoạn đang mở, rồi đặt lại
+    def _cap_nhat_dinh_py(self):
+        import tracemalloc as tm
+        _, dinh = tm.get_traced_memory()
+        for gd in self._dang_mo:
+            gd.py_dinh = max(gd.py_dinh, dinh)
+        tm.reset_peak()
+
+    def _mo(self, gd):
+        if self.cprofile:
+            self._bat_profile()
+        ngan_xep = self._ngan_xep()
+        gd.cha = ngan_xep[-1].ten if ngan_xep else None
+        gd.muc = len(ngan_xep)
+        ngan_xep.append(gd)
+        gd.rss_dau = gd.rss_dinh = rss_mb()
+        with self._khoa:
+            if self.tracemalloc:
+                self._cap_nhat_dinh_py()
+            self._dang_mo.append(gd)
+            if self._luong_mau is None:
+                self._luong_mau = threading.Thread(target=self._lay_mau, name='theodoi', daemon=True)
+                self._luong_mau.start()
+
+    def _dong(self, gd, thoi_gian):
+        rss = rss_mb()
+        with self._khoa:
+            if self.tracemalloc:
+                self._cap_nhat_dinh_py()
+            if gd in self._dang_mo:
+                self._dang_mo.remove(gd)
+        ngan_xep = self._ngan_xep()
+        if gd in ngan_xep:
+            ngan_xep.remove(gd)
+        if self.tracemalloc and gd.muc == 0:
+            self._chup_bo_nho(gd.ten)
+        ban_ghi = {'loai': 'giai_doan', 'ten': gd.ten, 'thoi_diem': gd.thoi_diem, 'thoi_gian': thoi_gian,
+                   'pid': os.getpid(), 'tid': threading.get_native_id(), 'luong': threading.current_thread().name,
+                   'cha': gd.cha, 'muc': gd.muc, 'rss_dau_mb': gd.rss_dau, 'rss_mb': rss,
+                   'rss_dinh_mb': max(v for v in (gd.rss_dinh, rss, 0) if v is not None)}
+        if self.tracemalloc:
+            ban_ghi['py_dinh_mb'] = gd.py_dinh / 2 ** 20
+        so_dong = gd.thuoc_tinh.get('so_dong')
+        if so_dong and thoi_gian > 0:
+            ban_ghi['dong_moi_giay'] = so_dong / thoi_gian
+        ban_ghi.update(gd.thuoc_tinh)
+        self._ghi(ban_ghi)
+
+    # Luồng nền đọc RSS định kỳ: cập nhật đỉnh của các giai đoạn đang mở, ghi mẫu khi RSS đổi >= 1 MB
+    def _lay_mau(self):
+        truoc = None
+        while not self._dung.wait(CHU_KY_LAY_MAU):
+            rss = rss_mb()
+            if rss is None:
+                return
+            with self._khoa:
+                for gd in self._dang_mo:
+                    if gd.rss_dinh is None or rss > gd.rss_dinh:
+                        gd.rss_dinh = rss
+                co_mo = bool(self._dang_mo)
+            if co_mo and (truoc is None or abs(rss - truoc) >= 1):
+                self._ghi({'loai': 'bo_nho', 'thoi_diem': time.time(), 'pid': os.getpid(), 'rss_mb': rss})
+                truoc = rss
+
+    def su_kien(self, ten, **thuoc_tinh):
+        ban_ghi = {'loai': 'su_kien', 'ten': ten, 'thoi_diem': time.time(), 'pid': os.getpid(),
+                   'tid': threading.get_native_id(), 'rss_mb': rss_mb()}
+        ban_ghi.update(thuoc_tinh)
+        self._ghi(ban_ghi)
+
+    def _ghi_profile(self):
+        import pstats
+        with self._khoa:
+            profile = list(self._profile)
+        for p in profile:
+            p.disable()
+        stats = pstats.Stats(profile[0])
+        for p in profile[1:]:
+            stats.add(p)
+        duoi = '.prof' if self.goc else f'.{os.getpid()}.prof'
+        stats.dump_stats(os.path.splitext(self.duong_dan)[0] + duoi)
+
+    # Chụp các vị trí cấp phát khi một giai đoạn ngoài cùng kết thúc với bộ nhớ Python lớn hơn mọi lần trước
+    def _chup_bo_nho(self, ten):
+        import tracemalloc as tm
+        hien_tai, _ = tm.get_traced_memory()
+        if hien_tai <= self._anh_lon_nhat:
+            return
+        self._anh_lon_nhat = hien_tai
+        self._anh_bo_nho = (ten, tm.take_snapshot().filter_traces([
+            tm.Filter(False, tm.__file__), tm.Filter(False, __file__), tm.Filter(False, '<frozen importlib.*>'),
+            tm.Filter(False, os.path.join(os.path.dirname(os.__file__), 'cProfile.py'))]))
+
+    def _ghi_cap_phat(self):
+        if self._anh_bo_nho is None:
+            self._chup_bo_nho(None)
+        sau_giai_doan, anh = self._anh_bo_nho
+        for thong_ke in anh.statistics('lineno')[:SO_VI_TRI_CAP_PHAT]:
+            khung = thong_ke.traceback[0]
+            self._ghi({'loai': 'cap_phat', 'pid': os.getpid(), 'sau_giai_doan': sau_giai_doan,
+                       'vi_tri': f'{khung.filename}:{khung.lineno}',
+                       'kich_thuoc_mb': thong_ke.size / 2 ** 20, 'so_khoi': thong_ke.count})
+
+    def dong(self):
+        self._dung.set()
+        if self._profile:
+            self._ghi_profile()
+        if self.tracemalloc and self._file is not None:
+            self._ghi_cap_phat()
+        with self._khoa:
+            if self._file is None:
+                return
+            self._file.write(json.dumps({'loai': 'ket_thuc', 'pid': os.getpid(), 'thoi_diem': time.time(),
+                                         'rss_dinh_mb': rss_dinh_mb(), 'rss_dinh_con_mb': rss_dinh_mb(con=True)})
+                             + '\n')
+            self._file.close()
+            self._file = None
+        if self.chrome and self.goc:
+            with open(self.duong_dan, 'w', encoding='utf-8') as f:
+                json.dump(sang_chrome(doc_vet(self.file_dong)), f, ensure_ascii=False)
+
+
+_bo_theo_doi = None
+
+
+# Bật theo dõi trong mã (thay cho biến môi trường)
+def bat_theo_doi(duong_dan, cprofile=False, tracemalloc=False):
+    global _bo_theo_doi
+    if _bo_theo_doi is None:
+        _bo_theo_doi = BoTheoDoi(duong_dan, cprofile, tracemalloc)
+    return _bo_theo_doi
+
+
+def dang_bat():
+    return _bo_theo_doi is not None
+
+
+# Giai đoạn dùng với with: with giai_doan('doc_du_lieu') as gd: ...; gd.dat(so_dong=len(df))
+def giai_doan(ten, **thuoc_tinh):
+    if _bo_theo_doi is None:
+        return _RONG
+    return GiaiDoan(_bo_theo_doi, ten, thuoc_tinh)
+
+
+# Giai đoạn không gói trong with (script dạng tuần tự): gd = bat_dau('ve'); ...; gd.ket_thuc()
+def bat_dau(ten, **thuoc_tinh):
+    return giai_doan(ten, **thuoc_tinh).bat_dau()
+
+
+def su_kien(ten, **thuoc_tinh):
+    if _bo_theo_doi is not None:
+        _bo_theo_doi.su_kien(ten, **thuoc_tinh)
+
+
+# Decorator: mỗi lần gọi hàm là một giai đoạn (mặc định lấy tên hàm)
+def theo_doi(ten=None):
+    def boc(ham):
+        ten_gd = ten or ham.__name__
+
+        @functools.wraps(ham)
+        def ham_moi(*args, **kwargs):
+            if _bo_theo_doi is None:
+                return ham(*args, **kwargs)
+            with giai_doan(ten_gd):
+                return ham(*args, **kwargs)
+        return ham_moi
+    return boc
+
+
+def doc_vet(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(dong) for dong in f if dong.strip()]
+
+
+# Đổi các bản ghi JSON lines sang định dạng Chrome trace (thời gian tính bằng micro giây)
+def sang_chrome(ban_ghi):
+    su_kien_ = []
+    luong = set()
+    for r in ban_ghi:
+        ts = r.get('thoi_diem', 0) * 1e6
+        if r['loai'] == 'giai_doan':
+            args = {k: v for k, v in r.items() if k not in ('loai', 'ten', 'thoi_diem', 'thoi_gian', 'pid', 'tid')}
+            su_kien_.append({'name': r['ten'], 'cat': 'giai_doan', 'ph': 'X', 'ts': ts, 'dur': r['thoi_gian'] * 1e6,
+                             'pid': r['pid'], 'tid': r['tid'], 'args': args})
+            luong.add((r['pid'], r['tid'], r.get('luong')))
+        elif r['loai'] == 'su_kien':
+            args = {k: v for k, v in r.items() if k not in ('loai', 'ten', 'thoi_diem', 'pid', 'tid')}
+            su_kien_.append({'name': r['ten'], 'cat': 'su_kien', 'ph': 'i', 's': 'p', 'ts': ts,
+                             'pid': r['pid'], 'tid': r['tid'], 'args': args})
+        elif r['loai'] == 'bo_nho':
+            su_kien_.append({'name': 'rss_mb', 'ph': 'C', 'ts': ts, 'pid': r['pid'], 'args': {'rss': r['rss_mb']}})
+        elif r['loai'] == 'bat_dau':
+            su_kien_.append({'name': 'process_name', 'ph': 'M', 'pid': r['pid'],
+                             'args': {'name': ' '.join(os.path.basename(a) for a in r['lenh'][:1]) or 'python'}})
+    for pid, tid, ten in luong:
+        if ten:
+            su_kien_.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': ten}})
+    return {'traceEvents': su_kien_, 'displayTimeUnit': 'ms'}
+
+
+# Bảng tóm tắt theo tên giai đoạn: số lần, tổng/trung bình/lớn nhất thời gian, đỉnh RSS, số dòng/giây
+def tom_tat(ban_ghi):
+    import pandas as pd
+    gd = pd.DataFrame([r for r in ban_ghi if r['loai'] == 'giai_doan'])
+    if gd.empty:
+        return gd
+    if 'so_dong' not in gd.columns:
+        gd['so_dong'] = float('nan')
+    bang = gd.groupby('ten', sort=False).agg(so_lan=('thoi_gian', 'size'), tong_s=('thoi_gian', 'sum'),
+                                             tb_s=('thoi_gian', 'mean'), max_s=('thoi_gian', 'max'),
+                                             rss_dinh_mb=('rss_dinh_mb', 'max'), so_dong=('so_dong', 'sum'))
+    bang['dong_moi_giay'] = (bang['so_dong'] / bang['tong_s']).where(bang['so_dong'] > 0)
+    return bang.sort_values('tong_s', ascending=False)
+
+
+def _khoi_tao_tu_moi_truong():
+    duong_dan = os.environ.get(BIEN_FILE)
+    if duong_dan:
+        profile = {p.strip().lower() for p in os.environ.get(BIEN_PROFILE, '').split(',')}
+        bat_theo_doi(duong_dan, 'cprofile' in profile, 'tracemalloc' in profile)
+
+
+_khoi_tao_tu_moi_truong()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tóm tắt file vết của theodoi (JSON lines)")
+    parser.add_argument('vet', help="file vết .jsonl")
+    parser.add_argument('--chrome', help="ghi thêm bản Chrome trace ra file này")
+    parser.add_argument('--cap-phat', action='store_true', help="in các vị trí cấp phát bộ nhớ lớn nhất")
+    args = parser.parse_args(argv)
+
+    ban_ghi = doc_vet(args.vet)
+    import pandas as pd
+    with pd.option_context('display.width', 160, 'display.max_columns', 20, 'display.float_format', '{:,.3f}'.format):
+        print(tom_tat(ban_ghi))
+        if args.cap_phat:
+            cap_phat = pd.DataFrame([r for r in ban_ghi if r['loai'] == 'cap_phat'])
+            print(cap_phat.drop(columns='loai') if not cap_phat.empty else "Không có dữ liệu cấp phát "
+                  f"(chạy với {BIEN_PROFILE}=tracemalloc)")
+    if args.chrome:
+        with open(args.chrome, 'w', encoding='utf-8') as f:
+            json.dump(sang_chrome(ban_ghi), f, ensure_ascii=False)
+        print(f"Đã ghi {args.chrome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# Thống kê mô tả dạng luồng (streaming): dữ liệu được đưa vào theo từng khối,
+# mỗi khối chỉ được duyệt một lần. count/min/max/mean/variance tính chính xác
+# (gộp kiểu Welford/Chan), còn Q1/Q2/Q3/IQR/mode là xấp xỉ với bộ nhớ giới hạn.
+# Mọi đối tượng đều gộp (merge) được, nên có thể tính riêng từng khối/từng file
+# rồi gộp lại. Trạng thái thống kê của file dữ liệu được lưu kèm bộ đệm (theo mã băm dữ liệu)
+# để cập nhật khi nối thêm dòng mới mà không duyệt lại dữ liệu cũ.
+
+# Thứ tự các dòng của bảng thống kê, giống hàm descriptive() cũ
+CHI_SO = ['Count', 'min', 'max', 'median', 'mode', 'Q1', 'Q2', 'Q3', 'IQR', 'Variance', 'stdev']
+
+
+# Phác thảo phân vị kiểu KLL: tầng h giữ tối đa k phần tử, mỗi phần tử có trọng số 2^h.
+# Khi một tầng vượt quá k phần tử thì sắp xếp lại và chỉ giữ một nửa (lấy xen kẽ,
+# vị trí bắt đầu ngẫu nhiên) đẩy lên tầng trên.
+class KLLSketch:
+    def __init__(self, k=4096, seed=None):
+        self.k = k
+        self.n = 0
+        self.tang = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.n += values.size
+        self.tang[0] = np.concatenate([self.tang[0], values])
+        self._nen()
+        return self
+
+    def merge(self, other):
+        self.n += other.n
+        for h, du_lieu in enumerate(other.tang):
+            if h == len(self.tang):
+                self.tang.append(np.empty(0))
+            self.tang[h] = np.concatenate([self.tang[h], du_lieu])
+        self._nen()
+        return self
+
+    def _nen(self):
+        h = 0
+        while h < len(self.tang):
+            if self.tang[h].size > self.k:
+                du_lieu = np.sort(self.tang[h])
+                # Số phần tử lẻ thì giữ lại phần tử cuối ở tầng hiện tại
+                giu = du_lieu[du_lieu.size - du_lieu.size % 2:]
+                du_lieu = du_lieu[:du_lieu.size - du_lieu.size % 2]
+                if h + 1 == len(self.tang):
+                    self.tang.append(np.empty(0))
+                self.tang[h] = giu
+                self.tang[h + 1] = np.concatenate([self.tang[h + 1], du_lieu[self._rng.integers(2)::2]])
+            h += 1
+
+    def quantile(self, q):
+        if self.n == 0:
+            return np.nan
+        # Chỉ có tầng 0 nghĩa là chưa nén lần nào -> kết quả chính xác như pandas
+        if all(t.size == 0 for t in self.tang[1:]):
+            return float(np.quantile(self.tang[0], q))
+        values = np.concatenate(self.tang)
+        weights = np.concatenate([np.full(t.size, 2.0 ** h) for h, t in enumerate(self.tang)])
+        thu_tu = np.argsort(values, kind='stable')
+        values, weights = values[thu_tu], weights[thu_tu]
+        # Vị trí (hạng, tính từ 0) ở tâm khối trọng số của mỗi phần tử, nội suy tuyến tính như pandas
+        vi_tri = np.cumsum(weights) - weights / 2 - 0.5
+        return float(np.interp(q * (weights.sum() - 1), vi_tri, values))
+
+
+# Đếm tần suất xấp xỉ kiểu Misra-Gries (gộp được): giữ tối đa k giá trị,
+# khi vượt quá thì trừ tất cả bộ đếm đi bộ đếm lớn thứ k+1.
+class HeavyHitters:
+    def __init__(self, k=1024):
+        self.k = k
+        self.gia_tri = np.empty(0)
+        self.dem = np.empty(0, dtype=np.int64)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size:
+            self._gop(*np.unique(values, return_counts=True))
+        return self
+
+    def merge(self, other):
+        self._gop(other.gia_tri, other.dem)
+        return self
+
+    def _gop(self, gia_tri, dem):
+        gia_tri, vi_tri = np.unique(np.concatenate([self.gia_tri, gia_tri]), return_inverse=True)
+        dem = np.bincount(vi_tri, weights=np.concatenate([self.dem, dem])).astype(np.int64)
+        if gia_tri.size > self.k:
+            dem = dem - np.partition(dem, -(self.k + 1))[-(self.k + 1)]
+            gia_tri, dem = gia_tri[dem > 0], dem[dem > 0]
+        self.gia_tri, self.dem = gia_tri, dem
+
+    # Giá trị xuất hiện nhiều nhất; hoà thì lấy giá trị nhỏ nhất (giống df.mode().values[0]).
+    # Nếu không thấy giá trị nào lặp lại (ví dụ dữ liệu liên tục) thì mode chính là min.
+    def mode(self, mac_dinh=np.nan):
+        if self.dem.size == 0 or self.dem.max() <= 1:
+            return mac_dinh
+        return float(self.gia_tri[np.argmax(self.dem)])
+
+
+class StreamingStats:
+    def __init__(self, columns=None, k=4096, k_mode=1024):
+        self.k = k
+        self.k_mode = k_mode
+        self.columns = None
+        if columns is not None:
+            self._khoi_tao(columns)
+
+    def _khoi_tao(self, columns):
+        self.columns = list(columns)
+        p = len(self.columns)
+        self.n = np.zeros(p, dtype=np.int64)
+        self.mean = np.zeros(p)
+        self.m2 = np.zeros(p)
+        self.min = np.full(p, np.inf)
+        self.max = np.full(p, -np.inf)
+        self.sketch = [KLLSketch(self.k) for _ in range(p)]
+        self.tan_suat = [HeavyHitters(self.k_mode) for _ in range(p)]
+
+    # Cập nhật với một khối dữ liệu (DataFrame); mặc định lấy các cột số của khối đầu tiên
+    def update(self, df):
+        if self.columns is None:
+            self._khoi_tao(df.select_dtypes(include=['number']).columns)
+        a = df[self.columns].to_numpy(dtype=np.float64)
+        co_gia_tri = ~np.isnan(a)
+        n = co_gia_tri.sum(axis=0)
+        tong = np.where(co_gia_tri, a, 0).sum(axis=0)
+        mean = np.divide(tong, n, out=np.zeros(len(n)), where=n > 0)
+        m2 = np.where(co_gia_tri, (a - mean) ** 2, 0).sum(axis=0)
+        self._gop_moment(n, mean, m2,
+                         np.where(co_gia_tri, a, np.inf).min(axis=0, initial=np.inf),
+                         np.where(co_gia_tri, a, -np.inf).max(axis=0, initial=-np.inf))
+        for j in range(len(self.columns)):
+            self.sketch[j].update(a[:, j])
+            self.tan_suat[j].update(a[:, j])
+        return self
+
+    # Gộp với một StreamingStats khác (tính trên khối/file khác) có cùng danh sách cột
+    def merge(self, other):
+        if other.columns is None:
+            return self
+        if self.columns is None:
+            self._khoi_tao(other.columns)
+        if other.columns != self.columns:
+            raise ValueError(f"Không gộp được thống kê khác cột: {self.columns} != {other.columns}")
+        self._gop_moment(other.n, other.mean, other.m2, other.min, other.max)
+        for j in range(len(self.columns)):
+            self.sketch[j].merge(other.sketch[j])
+            self.tan_suat[j].merge(other.tan_suat[j])
+        return self
+
+    # Công thức gộp của Chan et al. cho trung bình và tổng bình phương độ lệch
+    def _gop_moment(self, n, mean, m2, min_, max_):
+        tong_n = self.n + n
+        delta = mean - self.mean
+        ti_le = np.divide(n, tong_n, out=np.zeros(len(n)), where=tong_n > 0)
+        self.mean = self.mean + delta * ti_le
+        self.m2 = self.m2 + m2 + delta ** 2 * self.n * ti_le
+        self.n = tong_n
+        self.min = np.minimum(self.min, min_)
+        self.max = np.maximum(self.max, max_)
+
+    def _series(self, values):
+        return pd.Series(values, index=self.columns, dtype=np.float64)
+
+    def count(self):
+        return pd.Series(self.n, index=self.columns)
+
+    def means(self):
+        return self._series(np.where(self.n > 0, self.mean, np.nan))
+
+    def variances(self):
+        return self._series(np.divide(self.m2, self.n - 1, out=np.full(len(self.n), np.nan), where=self.n > 1))
+
+    def std_devs(self):
+        return np.sqrt(self.variances())
+
+    def mins(self):
+        return self._series(np.where(self.n > 0, self.min, np.nan))
+
+    def maxs(self):
+        return self._series(np.where(self.n > 0, self.max, np.nan))
+
+    def quantile(self, q):
+        return self._series([s.quantile(q) for s in self.sketch])
+
+    def modes(self):
+        return self._series([h.mode(m) for h, m in zip(self.tan_suat, self.mins())])
+
+    # Bảng thống kê cùng dạng với descriptive(): mỗi dòng là một chỉ số, mỗi cột là một biến
+    def descriptive(self):
+        q1, q2, q3 = self.quantile(0.25), self.quantile(0.5), self.quantile(0.75)
+        data = {'Count': self.count(),
+                'min': self.mins(),
+                'max': self.maxs(),
+                'median': q2,
+                'mode': self.modes(),
+                'Q1': q1,
+                'Q2': q2,
+                'Q3': q3,
+                'IQR': q3 - q1,
+                'Variance': self.variances(),
+                'stdev': self.std_devs(),
+                }
+        data_complete = pd.DataFrame(data).transpose()
+        data_complete.insert(loc=0, column=' ', value=['count'] + CHI_SO[1:])
+        return data_complete
+
+    def save(self, path, ma_bam=None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tam = path + '.tmp'
+        with open(tam, 'wb') as f:
+            pickle.dump({'ma_bam': ma_bam, 'stats': self}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tam, path)
+        return path
+
+    # Trả về (StreamingStats, mã băm dữ liệu lúc lưu)
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            trang_thai = pickle.load(f)
+        return trang_thai['stats'], trang_thai['ma_bam']
+
+
+def file_thong_ke_mo_ta(csv_path):
+    from bodem import thu_muc_cache
+    return os.path.join(thu_muc_cache(csv_path), 'thong_ke.pkl')
+
+
+# Thống kê các cột số của file dữ liệu (đã làm sạch): nạp trạng thái đã lưu nếu khớp mã băm dữ liệu,
+# nếu không thì duyệt bộ đệm dạng cột theo khối rồi lưu lại
+def nap_thong_ke_mo_ta(csv_path, kich_thuoc_khoi=1_000_000):
+    from bodem import COT_PHAN_LOAI, doc_cot
+    from goimohinh import ma_bam_du_lieu
+    ma_bam = ma_bam_du_lieu(csv_path)
+    try:
+        stats, ma_bam_luu = StreamingStats.load(file_thong_ke_mo_ta(csv_path))
+        if ma_bam_luu == ma_bam:
+            return stats
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError):
+        pass
+    stats = StreamingStats()
+    mang, schema = doc_cot(csv_path)
+    if mang is None:
+        for chunk in pd.read_csv(csv_path, chunksize=kich_thuoc_khoi):
+            stats.update(chunk.drop(columns=[c for c in COT_PHAN_LOAI if c in chunk.columns]))
+    else:
+        cot = [c for c in mang if c not in COT_PHAN_LOAI]
+        for start in range(0, schema['so_dong'], kich_thuoc_khoi):
+            stats.update(pd.DataFrame({c: np.asarray(mang[c][start:start + kich_thuoc_khoi]) for c in cot}))
+    stats.save(file_thong_ke_mo_ta(csv_path), ma_bam)
+    return stats
@@ -0,0 +1,427 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from bodem import doc_cot, ghi_cache, thu_muc_cache
+from khoitonghop import CHI_SO
+from theodoi import giai_doan
+
+# Truy vấn bảng dữ liệu đã làm sạch mà không nạp cả bảng: lọc (loc), chọn cột (cot) và tổng hợp theo
+# nhóm (theo, tong_hop) được đẩy xuống lượt đọc bộ đệm dạng cột.
+# - Bản đồ vùng (zone map): bảng chia thành các vùng SO_DONG_VUNG dòng liên tiếp, mỗi vùng lưu min/max
+#   của từng cột số và các nhãn Crop/Season có mặt. Vùng nào chắc chắn không có dòng thỏa điều kiện thì
+#   bỏ qua, không đọc (dữ liệu sắp theo năm như file gốc thì lọc theo khoảng năm chỉ đọc vài vùng).
+# - Trong các vùng còn lại chỉ đọc các cột của điều kiện lọc trước; các cột khác chỉ được đọc ở những
+#   dòng thỏa điều kiện, và chỉ khi đoạn đó có dòng thỏa.
+# - Tổng hợp tính từng phần trên mỗi đoạn (count/sum/tổng bình phương/min/max) rồi gộp các phần, nên
+#   bộ nhớ chỉ tỷ lệ với kích thước đoạn và số nhóm.
+# Nếu có các phân vùng kiểu Hive (phanvung.py) còn khớp dữ liệu thì chỉ đọc các phân vùng thỏa điều kiện
+# khi số dòng phải đọc ít hơn nhiều so với bộ đệm. Không có cả hai thì đọc CSV theo khối: vẫn chỉ đọc
+# các cột cần, không bỏ qua được phần nào.
+
+PHIEN_BAN = 1
+SO_DONG_VUNG = 8192
+KICH_THUOC_DOAN = 1 << 20  # số dòng tối đa mỗi lần đọc (bội của SO_DONG_VUNG)
+HE_SO_CSV = 40  # một dòng CSV tốn thời gian cỡ 40 dòng đọc từ bộ đệm dạng cột (đo trên 1 triệu dòng)
+
+
+def file_ban_do_vung(csv_path):
+    return os.path.join(thu_muc_cache(csv_path), 'ban_do_vung.npz')
+
+
+class BanDoVung:
+    def __init__(self, so_dong, kich_thuoc_vung=SO_DONG_VUNG):
+        self.so_dong = so_dong
+        self.kich_thuoc_vung = kich_thuoc_vung
+        self.min, self.max = {}, {}
+        self.co_nhan = {}  # cột phân loại -> mảng bool (số vùng, số nhãn)
+        self.ma_bam = None
+
+    @property
+    def so_vung(self):
+        return -(-self.so_dong // self.kich_thuoc_vung)
+
+    # Tính từ các cột của bộ đệm (ánh xạ bộ nhớ), đọc từng đoạn KICH_THUOC_DOAN dòng
+    @classmethod
+    def tu_bo_dem(cls, mang, schema, kich_thuoc_vung=SO_DONG_VUNG):
+        ban_do = cls(schema['so_dong'], kich_thuoc_vung)
+        ban_do.ma_bam = schema['nguon']['hash']
+        buoc = max(KICH_THUOC_DOAN // kich_thuoc_vung, 1) * kich_thuoc_vung
+        for muc in schema['cot']:
+            c, a = muc['ten'], mang[muc['ten']]
+            phan = []
+            for start in range(0, ban_do.so_dong, buoc):
+                doan = np.asarray(a[start:start + buoc])
+                dau = np.arange(0, len(doan), kich_thuoc_vung)
+                if 'categories' in muc:
+                    so_nhan = len(muc['categories'])
+                    vung = np.arange(len(doan)) // kich_thuoc_vung
+                    dem = np.bincount(vung * so_nhan + doan, minlength=len(dau) * so_nhan)
+                    phan.append(dem.reshape(len(dau), so_nhan) > 0)
+                else:
+                    phan.append((np.minimum.reduceat(doan, dau), np.maximum.reduceat(doan, dau)))
+            if 'categories' in muc:
+                ban_do.co_nhan[c] = (np.concatenate(phan) if phan
+                                     else np.zeros((0, len(muc['categories'])), dtype=bool))
+            else:
+                ban_do.min[c] = np.concatenate([p[0] for p in phan]) if phan else np.empty(0, dtype=a.dtype)
+                ban_do.max[c] = np.concatenate([p[1] for p in phan]) if phan else np.empty(0, dtype=a.dtype)
+        return ban_do
+
+    # Mặt nạ các vùng có thể chứa dòng thỏa điều kiện (dieu_kien đã chuẩn hóa, xem _chuan_hoa_loc)
+    def chon_vung(self, dieu_kien):
+        giu = np.ones(self.so_vung, dtype=bool)
+        for c, (loai, gia_tri) in dieu_kien.items():
+            if c in self.co_nhan:
+                giu &= self.co_nhan[c][:, gia_tri].any(axis=1)
+            elif loai == 'khoang':
+                thap, cao = gia_tri
+                giu &= (self.max[c] >= thap) & (self.min[c] <= cao)
+            else:
+                v = np.asarray(gia_tri, dtype=np.float64)
+                giu &= ((self.min[c][:, None] <= v) & (self.max[c][:, None] >= v)).any(axis=1)
+        return giu
+
+    def save(self, path):
+        meta = {'phien_ban': PHIEN_BAN, 'so_dong': self.so_dong, 'kich_thuoc_vung': self.kich_thuoc_vung,
+                'ma_bam': self.ma_bam, 'cot_so': list(self.min), 'cot_nhan': list(self.co_nhan)}
+        mang = {f'min__{c}': v for c, v in self.min.items()}
+        mang.update({f'max__{c}': v for c, v in self.max.items()})
+        mang.update({f'nhan__{c}': v for c, v in self.co_nhan.items()})
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tam = path + '.tmp.npz'
+        np.savez(tam, meta=np.array(json.dumps(meta)), **mang)
+        os.replace(tam, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            meta = json.loads(str(f['meta']))
+            if meta.get('phien_ban') != PHIEN_BAN:
+                raise ValueError(f"Phiên bản bản đồ vùng {meta.get('phien_ban')} không được hỗ trợ (cần {PHIEN_BAN})")
+            ban_do = cls(meta['so_dong'], meta['kich_thuoc_vung'])
+            ban_do.ma_bam = meta['ma_bam']
+            ban_do.min = {c: f[f'min__{c}'] for c in meta['cot_so']}
+            ban_do.max = {c: f[f'max__{c}'] for c in meta['cot_so']}
+            ban_do.co_nhan = {c: f[f'nhan__{c}'] for c in meta['cot_nhan']}
+        return ban_do
+
+
+# Bản đồ vùng của bộ đệm: nạp từ đĩa nếu khớp mã băm và số dòng, nếu không thì tính lại và lưu
+def nap_ban_do_vung(csv_path, mang, schema):
+    try:
+        ban_do = BanDoVung.load(file_ban_do_vung(csv_path))
+        if ban_do.ma_bam == schema['nguon']['hash'] and ban_do.so_dong == schema['so_dong']:
+            return ban_do
+    except (OSError, ValueError, KeyError):
+        pass
+    ban_do = BanDoVung.tu_bo_dem(mang, schema)
+    ban_do.save(file_ban_do_vung(csv_path))
+    return ban_do
+
+
+# loc: {cột: giá trị | danh sách giá trị | (thấp, cao)}; khoảng gồm cả hai đầu, None là không giới hạn.
+# Trả về {cột: ('khoang', (thấp, cao)) | ('thuoc', giá trị)}; với cột phân loại của bộ đệm (nhan),
+# giá trị được đổi sang mã nhãn (nhãn không có trong dữ liệu bị bỏ).
+def _chuan_hoa_loc(loc, nhan=None):
+    dieu_kien = {}
+    for c, v in (loc or {}).items():
+        if isinstance(v, tuple):
+            if len(v) != 2:
+                raise ValueError(f"Khoảng lọc của {c} phải là (thấp, cao), không phải {v!r}")
+            if nhan and c in nhan:
+                raise ValueError(f"Cột phân loại {c} chỉ lọc theo danh sách nhãn, không theo khoảng")
+            thap, cao = v
+            dieu_kien[c] = ('khoang', (-np.inf if thap is None else thap, np.inf if cao is None else cao))
+        else:
+            gia_tri = list(v) if isinstance(v, (list, set, frozenset, np.ndarray, pd.Index)) else [v]
+            if nhan and c in nhan:
+                ma = {n: i for i, n in enumerate(nhan[c])}
+                gia_tri = np.array(sorted(ma[g] for g in set(gia_tri) if g in ma), dtype=np.int64)
+            dieu_kien[c] = ('thuoc', gia_tri)
+    return dieu_kien
+
+
+# Mặt nạ dòng thỏa mọi điều kiện trên các cột (mảng numpy; cột phân loại là mã nhãn hoặc chuỗi)
+def _mask(cot, dieu_kien, nhan=None):
+    mask = None
+    for c, (loai, gia_tri) in dieu_kien.items():
+        a = cot[c]
+        if nhan and c in nhan:
+            bang = np.zeros(len(nhan[c]), dtype=bool)
+            bang[gia_tri] = True
+            m = bang[a]
+        elif loai == 'khoang':
+            m = (a >= gia_tri[0]) & (a <= gia_tri[1])
+        else:
+            m = np.isin(a, gia_tri)
+        mask = m if mask is None else mask & m
+    return mask
+
+
+# Các đoạn [start, end) cần đọc: các vùng liên tiếp được giữ, mỗi đoạn tối đa KICH_THUOC_DOAN dòng
+def _cac_doan(giu, kich_thuoc_vung, so_dong):
+    bien = np.flatnonzero(np.diff(np.concatenate([[0], giu.astype(np.int8), [0]])))
+    buoc = max(KICH_THUOC_DOAN // kich_thuoc_vung, 1) * kich_thuoc_vung
+    for dau, cuoi in zip(bien[::2], bien[1::2]):
+        start, end = int(dau) * kich_thuoc_vung, min(int(cuoi) * kich_thuoc_vung, so_dong)
+        for s in range(start, end, buoc):
+            yield s, min(s + buoc, end)
+
+
+# Chọn nguồn đọc cho điều kiện lọc: bộ đệm dạng cột (bỏ các vùng không thỏa theo bản đồ vùng), các phân vùng
+# của phanvung.py (nếu còn khớp dữ liệu và đọc ít hơn tính theo HE_SO_CSV) hoặc CSV. Trả về dict kế hoạch:
+# nguon, so_dong, dong_doc, dieu_kien và 'doan' (bộ đệm) hoặc 'phan_vung' (phân vùng) cần đọc.
+def _lap_ke_hoach(csv_path, loc=None, tao_cache=True):
+    mang, schema = doc_cot(csv_path)
+    if mang is None and tao_cache:
+        ghi_cache(csv_path)
+        mang, schema = doc_cot(csv_path)
+    kh = {'nguon': 'csv', 'mang': mang, 'schema': schema, 'so_dong': None, 'dong_doc': None,
+          'dieu_kien': _chuan_hoa_loc(loc)}
+    if mang is not None:
+        schema['nhan'] = {m['ten']: m['categories'] for m in schema['cot'] if 'categories' in m}
+        for c in loc or {}:
+            if c not in mang:
+                raise KeyError(f"Cột {c} không có trong {csv_path}")
+        ban_do = nap_ban_do_vung(csv_path, mang, schema)
+        dieu_kien = _chuan_hoa_loc(loc, schema['nhan'])
+        giu = ban_do.chon_vung(dieu_kien) if dieu_kien else np.ones(ban_do.so_vung, dtype=bool)
+        doan = list(_cac_doan(giu, ban_do.kich_thuoc_vung, ban_do.so_dong))
+        kh.update(nguon='bo_dem', so_dong=ban_do.so_dong, dong_doc=sum(e - s for s, e in doan), doan=doan,
+                  vung=ban_do.so_vung, vung_doc=int(giu.sum()), dieu_kien=dieu_kien)
+    if loc:
+        from phanvung import chon_phan_vung, manifest_moi, thu_muc_phan_vung
+        manifest = manifest_moi(csv_path)
+        if manifest is not None:
+            chon = chon_phan_vung(manifest, loc)
+            dong = sum(p['so_dong'] for p in chon)
+            if mang is None or dong * HE_SO_CSV < kh['dong_doc']:
+                kh.update(nguon='phan_vung', so_dong=manifest['so_dong'], dong_doc=dong, dieu_kien=_chuan_hoa_loc(loc),
+                          manifest=manifest, thu_muc=thu_muc_phan_vung(csv_path), phan_vung=chon)
+    return kh
+
+
+# Duyệt các đoạn dòng thỏa điều kiện từ bộ đệm: {cột: mảng} (cột phân loại là mã nhãn).
+# thong_ke được cộng dồn số dòng và số byte đã đọc.
+def _doc_bo_dem(kh, can_doc, thong_ke):
+    mang, dieu_kien = kh['mang'], kh['dieu_kien']
+    con_lai = [c for c in can_doc if c not in dieu_kien]
+    for start, end in kh['doan']:
+        cot = {c: np.asarray(mang[c][start:end]) for c in dieu_kien}
+        thong_ke['dong_doc'] += end - start
+        thong_ke['byte_doc'] += sum(a.nbytes for a in cot.values())
+        mask = _mask(cot, dieu_kien, kh['schema']['nhan'])
+        if mask is not None:
+            chon = np.flatnonzero(mask)
+            if not len(chon):
+                continue
+            cot = {c: a[chon] for c, a in cot.items()}
+            for c in con_lai:
+                cot[c] = mang[c][start:end][chon]
+                thong_ke['byte_doc'] += cot[c].nbytes
+        else:
+            for c in con_lai:
+                cot[c] = np.asarray(mang[c][start:end])
+                thong_ke['byte_doc'] += cot[c].nbytes
+        yield {c: cot[c] for c in can_doc}
+
+
+# Như _doc_bo_dem nhưng từ các phân vùng đã chọn; cột phân loại là mã theo nhan (nhãn của mọi phân vùng)
+def _doc_phan_vung(kh, can_doc, nhan, thong_ke):
+    from phanvung import doc_mot_phan_vung
+    for p in kh['phan_vung']:
+        df = doc_mot_phan_vung(kh['thu_muc'], p, kh['manifest']['cot'], can_doc, kh['dieu_kien'], nhan)
+        thong_ke['dong_doc'] += p['so_dong']
+        thong_ke['byte_doc'] += p['so_byte']
+        yield {c: df[c].cat.codes.to_numpy() if c in nhan else df[c].to_numpy() for c in can_doc}
+
+
+def _doc_csv(csv_path, dieu_kien, can_doc, thong_ke):
+    cot_doc = list(dict.fromkeys(list(dieu_kien) + can_doc))
+    for chunk in pd.read_csv(csv_path, usecols=cot_doc, chunksize=KICH_THUOC_DOAN):
+        thong_ke['dong_doc'] += len(chunk)
+        cot = {c: chunk[c].to_numpy() for c in cot_doc}
+        mask = _mask(cot, dieu_kien)
+        yield {c: cot[c] if mask is None else cot[c][mask] for c in can_doc}
+
+
+# tong_hop: {cột: chỉ số | danh sách chỉ số}, chỉ số trong khoitonghop.CHI_SO
+def _chuan_hoa_tong_hop(tong_hop):
+    chuan = {}
+    for c, chi_so in tong_hop.items():
+        for cs in [chi_so] if isinstance(chi_so, str) else chi_so:
+            if cs not in CHI_SO:
+                raise ValueError(f"Chỉ số {cs!r} của {c} không hợp lệ; có: {CHI_SO}")
+        chuan[c] = chi_so
+    return chuan
+
+
+# Tổng hợp từng phần của một đoạn: DataFrame theo nhóm với các cột (cột, count|sum|sumsq|min|max)
+def _tong_hop_doan(cot, theo, tong_hop):
+    bang = pd.DataFrame({c: cot[c] for c in theo})
+    phan = {}
+    for c in tong_hop:
+        x = cot[c].astype(np.float64)
+        bang[f'{c}__x'], bang[f'{c}__x2'] = x, x * x
+        phan[(c, 'count')] = (f'{c}__x', 'count')
+        phan[(c, 'sum')] = (f'{c}__x', 'sum')
+        phan[(c, 'sumsq')] = (f'{c}__x2', 'sum')
+        phan[(c, 'min')] = (f'{c}__x', 'min')
+        phan[(c, 'max')] = (f'{c}__x', 'max')
+    nhom = bang.groupby(theo, sort=False) if theo else bang.groupby(np.zeros(len(bang), dtype=np.int8))
+    return pd.DataFrame({k: nhom[cot_vao].agg(ham) for k, (cot_vao, ham) in phan.items()})
+
+
+def _gop_tong_hop(cac_phan, theo, tong_hop):
+    if cac_phan:
+        gop = pd.concat(cac_phan)
+        nhom = gop.groupby(level=list(range(gop.index.nlevels)), sort=True)
+        gop = nhom.agg({k: k[1] if k[1] in ('min', 'max') else 'sum' for k in gop.columns})
+    else:
+        gop = pd.DataFrame(np.empty((0, 5 * len(tong_hop))),
+                           index=pd.MultiIndex.from_arrays([[] for _ in theo or [0]]),
+                           columns=pd.MultiIndex.from_product([list(tong_hop), ['count', 'sum', 'sumsq', 'min', 'max']]))
+    ket_qua = {}
+    for c, chi_so in tong_hop.items():
+        n, s, s2 = gop[(c, 'count')].astype(np.float64), gop[(c, 'sum')], gop[(c, 'sumsq')]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            gia_tri = {'count': gop[(c, 'count')].astype(np.int64), 'sum': s, 'mean': s / n,
+                       'min': gop[(c, 'min')], 'max': gop[(c, 'max')],
+                       'var': (np.maximum(s2 - s * s / n, 0) / (n - 1)).where(n >= 2)}
+        gia_tri['std'] = np.sqrt(gia_tri['var'])
+        for cs in [chi_so] if isinstance(chi_so, str) else chi_so:
+            ket_qua[c if isinstance(chi_so, str) else (c, cs)] = gia_tri[cs]
+    return pd.DataFrame(ket_qua, index=gop.index)
+
+
+# Truy vấn file dữ liệu đã làm sạch.
+#   loc: {cột: giá trị | danh sách | (thấp, cao)}, ví dụ {'Crop': 'Rice', 'Crop_Year': (1995, 2000)}
+#   cot: các cột cần lấy (mặc định mọi cột); theo + tong_hop: tổng hợp theo nhóm như
+#   df.groupby(theo).agg(tong_hop) với tong_hop {cột: chỉ số | danh sách chỉ số} (khoitonghop.CHI_SO).
+# Trả về DataFrame các dòng thỏa điều kiện, hoặc bảng tổng hợp (theo=None: một Series trên cả tập lọc).
+# tao_cache=False: không tạo bộ đệm dạng cột nếu chưa có, đọc CSV theo khối.
+def truy_van(csv_path, loc=None, cot=None, theo=None, tong_hop=None, tao_cache=True):
+    theo = [theo] if isinstance(theo, str) else list(theo or [])
+    if theo and not tong_hop:
+        raise ValueError("Cần tong_hop khi có theo")
+    tong_hop = _chuan_hoa_tong_hop(tong_hop) if tong_hop else None
+    can_doc = list(dict.fromkeys(theo + list(tong_hop))) if tong_hop else cot
+    with giai_doan('truy_van', loc=repr(loc), theo=theo) as gd:
+        kh = _lap_ke_hoach(csv_path, loc, tao_cache)
+        mang = kh['mang']
+        thong_ke = {'nguon': kh['nguon'], 'dong_doc': 0, 'byte_doc': 0}
+        if kh['nguon'] == 'phan_vung':
+            from phanvung import nhan_phan_vung
+            nhan = nhan_phan_vung(kh['manifest'])
+            cot_co = kh['manifest']['cot']
+        elif kh['nguon'] == 'bo_dem':
+            nhan = kh['schema']['nhan']
+            cot_co = list(mang)
+        else:
+            nhan = {}
+            cot_co = list(pd.read_csv(csv_path, nrows=0).columns)
+        for c in can_doc or []:
+            if c not in cot_co:
+                raise KeyError(f"Cột {c} không có trong {csv_path}")
+        can_doc = can_doc or cot_co
+        if kh['nguon'] == 'phan_vung':
+            cac_doan = _doc_phan_vung(kh, can_doc, nhan, thong_ke)
+        elif kh['nguon'] == 'bo_dem':
+            cac_doan = _doc_bo_dem(kh, can_doc, thong_ke)
+        else:
+            cac_doan = _doc_csv(csv_path, kh['dieu_kien'], can_doc, thong_ke)
+
+        if tong_hop:
+            ket_qua = _gop_tong_hop([_tong_hop_doan(d, theo, tong_hop) for d in cac_doan], theo, tong_hop)
+            # Nhóm theo cột phân loại: đổi mã nhãn về nhãn (mã theo thứ tự chữ cái nên thứ tự nhóm giữ nguyên)
+            if theo:
+                cap = [pd.Index(np.asarray(nhan[c], dtype=object)[ket_qua.index.get_level_values(i).astype(np.int64)]
+                                if c in nhan else ket_qua.index.get_level_values(i), name=c)
+                       for i, c in enumerate(theo)]
+                ket_qua.index = cap[0] if len(cap) == 1 else pd.MultiIndex.from_arrays(cap)
+            else:
+                ket_qua = ket_qua.iloc[0] if len(ket_qua) else pd.Series(np.nan, index=ket_qua.columns)
+                ket_qua.name = None
+        else:
+            phan = list(cac_doan)
+            du_lieu = {c: np.concatenate([p[c] for p in phan]) if phan
+                       else np.empty(0, dtype=object if mang is None else mang[c].dtype) for c in can_doc}
+            ket_qua = pd.DataFrame({c: pd.Categorical.from_codes(a, categories=nhan[c]) if c in nhan else a
+                                    for c, a in du_lieu.items()})
+        gd.dat(so_dong=len(ket_qua), **thong_ke)
+    return ket_qua
+
+
+# Kế hoạch đọc của một điều kiện lọc (không đọc dữ liệu): nguồn đọc, số dòng phải đọc / tổng số dòng,
+# số vùng (bộ đệm) hoặc số phân vùng phải đọc
+def ke_hoach(csv_path, loc=None):
+    kh = _lap_ke_hoach(csv_path, loc, tao_cache=False)
+    ket_qua = {k: kh[k] for k in ('nguon', 'so_dong', 'dong_doc', 'vung', 'vung_doc') if k in kh}
+    if kh['nguon'] == 'phan_vung':
+        ket_qua.update(phan_vung=len(kh['manifest']['phan_vung']), phan_vung_doc=len(kh['phan_vung']))
+    return ket_qua
+
+
+def _gia_tri(s):
+    for kieu in (int, float):
+        try:
+            return kieu(s)
+        except ValueError:
+            pass
+    return s
+
+
+# "Crop=Rice,Wheat" -> ('Crop', ['Rice', 'Wheat']); "Crop_Year=1995..2000" (hoặc "..2000") -> khoảng
+def _doc_dieu_kien(s):
+    c, _, v = s.partition('=')
+    if not c or not v:
+        raise argparse.ArgumentTypeError(f"Điều kiện phải có dạng cot=gia_tri, không phải {s!r}")
+    if '..' in v:
+        thap, _, cao = v.partition('..')
+        return c, (_gia_tri(thap) if thap else None, _gia_tri(cao) if cao else None)
+    return c, [_gia_tri(x) for x in v.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Truy vấn bảng dữ liệu đã làm sạch (lọc, chọn cột, tổng hợp) "
+                                                 "chỉ đọc các vùng và cột cần thiết")
+    parser.add_argument('file', nargs='?', default='Crop_production_in_India_ok.csv')
+    parser.add_argument('--loc', type=_doc_dieu_kien, action='append', default=[],
+                        help="điều kiện lọc, lặp lại được: Crop=Rice,Wheat hoặc Crop_Year=1995..2000")
+    parser.add_argument('--cot', nargs='+', help="các cột cần lấy")
+    parser.add_argument('--theo', nargs='+', help="tổng hợp theo các cột này")
+    parser.add_argument('--tong-hop', nargs='+', default=[], metavar='COT:CHI_SO',
+                        help=f"ví dụ Production:mean Area:sum; chỉ số: {', '.join(CHI_SO)}")
+    parser.add_argument('-n', type=int, default=20, help="số dòng kết quả in ra")
+    args = parser.parse_args(argv)
+
+    tong_hop = {}
+    for muc in args.tong_hop:
+        c, _, cs = muc.partition(':')
+        tong_hop.setdefault(c, []).append(cs or 'mean')
+    tong_hop = {c: cs[0] if len(cs) == 1 else cs for c, cs in tong_hop.items()}
+    loc = dict(args.loc)
+
+    start = time.perf_counter()
+    ket_qua = truy_van(args.file, loc, args.cot, args.theo, tong_hop or None)
+    thoi_gian = time.perf_counter() - start
+    kh = ke_hoach(args.file, loc)
+    print(ket_qua.head(args.n).to_string() if len(ket_qua) > args.n else ket_qua.to_string())
+    if kh['nguon'] == 'phan_vung':
+        doc = f"{kh['phan_vung_doc']}/{kh['phan_vung']} phân vùng"
+    elif kh['nguon'] == 'bo_dem':
+        doc = f"{kh['vung_doc']}/{kh['vung']} vùng của bộ đệm"
+    else:
+        doc = "cả file CSV"
+    so_dong = f" ({kh['dong_doc']}/{kh['so_dong']} dòng)" if kh['so_dong'] is not None else ''
+    print(f"\n{len(ket_qua)} dòng kết quả; đọc {doc}{so_dong} trong {thoi_gian:.3f} giây")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from bodem import thu_muc_cache
+from khoitonghop import CHIEU, _ma_cot
+
+# Bảng tương quan theo nhóm: với mỗi ô Crop × Season × Crop_Year, giữ số dòng, trung bình và ma trận
+# đồng mômen (co-moment) đã trừ trung bình của các biến số, cập nhật theo từng khối dữ liệu trong một
+# lượt và gộp kiểu Chan như StreamingStats (ổn định số học hơn cộng tổng bình phương thô). Mọi nhóm
+# (toàn bộ, theo cây, theo mùa, theo khoảng năm, hay tổ hợp) chỉ là gộp các ô, nên hệ số tương quan
+# Pearson và đường hồi quy đơn (hệ số góc, hệ số chặn, dải tin cậy) của mọi nhóm tính được từ bảng
+# mà không duyệt lại dữ liệu. Spearman cần thứ hạng nên tính trên một mẫu đều k dòng (bottom-k theo
+# mã băm dòng: gộp được và không phụ thuộc thứ tự khối). Bảng được lưu kèm bộ đệm theo mã băm dữ liệu.
+
+PHIEN_BAN = 1
+BIEN = ['Production', 'Area', 'Temperature', 'Humidity', 'Wind_Speed']
+SO_MAU = 10_000
+
+
+def file_tuong_quan(csv_path):
+    return os.path.join(thu_muc_cache(csv_path), 'tuong_quan.npz')
+
+
+# Nhãn khoảng năm của từng năm, ví dụ khoang_nam=5: 1993 -> '1990-1994'
+def nhan_khoang_nam(nam, khoang_nam):
+    dau = np.asarray(nam, dtype=np.int64) // khoang_nam * khoang_nam
+    return np.array([f'{a}-{a + khoang_nam - 1}' for a in dau], dtype=object)
+
+
+# Index (nhóm..., biến) cho kết quả theo nhóm, cùng dạng với groupby(...).corr()
+def _index_nhom(index, bien):
+    return pd.MultiIndex.from_tuples([k + (b,) for k in index for b in bien], names=list(index.names) + [None])
+
+
+class BangTuongQuan:
+    def __init__(self, bien=None, so_mau=SO_MAU):
+        self.bien = list(bien or BIEN)
+        self.so_mau = so_mau
+        self.nhan = {c: [] for c in CHIEU}
+        self.ma_bam = None
+        self._cap_phat((0, 0, 0))
+        p = len(self.bien)
+        self.mau_khoa = np.empty(0, dtype=np.uint64)
+        self.mau_ma = np.empty((0, len(CHIEU)), dtype=np.int64)
+        self.mau_x = np.empty((0, p))
+
+    def _cap_phat(self, shape):
+        p = len(self.bien)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape + (p,))
+        self.m2 = np.zeros(shape + (p, p))
+
+    @property
+    def shape(self):
+        return self.count.shape
+
+    @property
+    def so_dong(self):
+        return int(self.count.sum())
+
+    # Mở rộng danh sách nhãn như KhoiTongHop._mo_rong (kể cả mã nhãn của các dòng mẫu)
+    def _mo_rong(self, nhan_moi):
+        gop = {c: sorted(set(self.nhan[c]) | set(nhan_moi[c])) for c in CHIEU}
+        if any(len(gop[c]) != len(self.nhan[c]) for c in CHIEU):
+            doi = [np.searchsorted(gop[c], self.nhan[c]).astype(np.int64) for c in CHIEU]
+            vi_tri = np.ix_(*doi)
+            cu = (self.count, self.mean, self.m2)
+            self._cap_phat(tuple(len(gop[c]) for c in CHIEU))
+            self.count[vi_tri], self.mean[vi_tri], self.m2[vi_tri] = cu
+            self.mau_ma = np.column_stack([d[self.mau_ma[:, j]] for j, d in enumerate(doi)]).reshape(-1, len(CHIEU))
+            self.nhan = gop
+        return {c: np.searchsorted(self.nhan[c], nhan_moi[c]).astype(np.int64) for c in CHIEU}
+
+    # Gộp (n, trung bình, đồng mômen) của các ô o (chỉ số phẳng) vào bảng theo công thức Chan
+    def _cong(self, o, n, mean, m2):
+        count = self.count.reshape(-1)
+        mean_o = self.mean.reshape(-1, len(self.bien))
+        m2_o = self.m2.reshape(-1, len(self.bien), len(self.bien))
+        n_cu = count[o].astype(np.float64)
+        tong = n_cu + n
+        delta = mean - mean_o[o]
+        mean_o[o] += delta * (n / tong)[:, None]
+        m2_o[o] += m2 + (n_cu * n / tong)[:, None, None] * delta[:, :, None] * delta[:, None, :]
+        count[o] += n.astype(np.int64)
+
+    def _cap_nhat_mau(self, khoa, ma, x):
+        khoa = np.concatenate([self.mau_khoa, khoa])
+        ma = np.concatenate([self.mau_ma, ma])
+        x = np.concatenate([self.mau_x, x])
+        if len(khoa) > self.so_mau:
+            chon = np.argpartition(khoa, self.so_mau - 1)[:self.so_mau]
+            khoa, ma, x = khoa[chon], ma[chon], x[chon]
+        self.mau_khoa, self.mau_ma, self.mau_x = khoa, ma, x
+
+    # Cộng thêm các dòng của một DataFrame (đã làm sạch) vào bảng
+    def update(self, df):
+        if len(df) == 0:
+            return self
+        nhan_moi, ma = {}, {}
+        for c in CHIEU:
+            nhan_moi[c], ma[c] = _ma_cot(df[c])
+        doi_ma = self._mo_rong(nhan_moi)
+        ma = np.column_stack([doi_ma[c][ma[c]] for c in CHIEU])
+        o_dong = np.ravel_multi_index(tuple(ma.T), self.shape)
+        x = df[self.bien].to_numpy(dtype=np.float64)
+
+        # Trung bình và đồng mômen của khối theo từng ô có dữ liệu
+        o, vi_tri = np.unique(o_dong, return_inverse=True)
+        n = np.bincount(vi_tri).astype(np.float64)
+        mean = np.column_stack([np.bincount(vi_tri, weights=x[:, j]) for j in range(len(self.bien))]) / n[:, None]
+        d = x - mean[vi_tri]
+        m2 = np.empty((len(o), len(self.bien), len(self.bien)))
+        for a in range(len(self.bien)):
+            for b in range(a, len(self.bien)):
+                m2[:, a, b] = m2[:, b, a] = np.bincount(vi_tri, weights=d[:, a] * d[:, b], minlength=len(o))
+        self._cong(o, n, mean, m2)
+
+        if self.so_mau:
+            from kiemtra import bam_dong
+            # Khóa mẫu băm theo độ chính xác float32 để dòng đọc từ CSV hay từ bộ đệm dạng cột
+            # (float32) có cùng khóa, mẫu không phụ thuộc nguồn đọc
+            khoa = bam_dong(df[CHIEU + self.bien].astype({b: np.float32 for b in self.bien}))
+            self._cap_nhat_mau(khoa, ma, x)
+        return self
+
+    def merge(self, other):
+        if other.bien != self.bien:
+            raise ValueError("Không gộp được hai bảng tương quan có biến khác nhau")
+        doi_ma = self._mo_rong(other.nhan)
+        co = other.count.reshape(-1) > 0
+        o = np.ravel_multi_index(np.meshgrid(*[doi_ma[c] for c in CHIEU], indexing='ij'), self.shape).reshape(-1)
+        self._cong(o[co], other.count.reshape(-1)[co].astype(np.float64),
+                   other.mean.reshape(-1, len(self.bien))[co], other.m2.reshape(-1, len(self.bien), len(self.bien))[co])
+        if self.so_mau and len(other.mau_khoa):
+            ma = np.column_stack([doi_ma[c][other.mau_ma[:, j]] for j, c in enumerate(CHIEU)])
+            self._cap_nhat_mau(other.mau_khoa, ma, other.mau_x)
+        return self
+
+    # Nhãn nhóm của các ô (hoặc các dòng mẫu) có mã ma (mảng (m, 3)): DataFrame một cột mỗi chiều của theo
+    def _nhan_nhom(self, ma, theo, khoang_nam):
+        nhan = {}
+        for c in theo:
+            v = np.asarray(self.nhan[c], dtype=object)[ma[:, CHIEU.index(c)]]
+            nhan[c] = nhan_khoang_nam(v, khoang_nam) if c == 'Crop_Year' and khoang_nam else v
+        return pd.DataFrame(nhan)
+
+    def _chon(self, ma, loc):
+        chon = np.ones(len(ma), dtype=bool)
+        for c, giu in (loc or {}).items():
+            chon &= np.isin(np.asarray(self.nhan[c], dtype=object)[ma[:, CHIEU.index(c)]], list(giu))
+        return chon
+
+    # Gộp các ô theo nhóm: trả về (MultiIndex các nhóm hoặc None nếu không nhóm, n, trung bình, đồng mômen)
+    def _gop(self, theo=None, loc=None, khoang_nam=None):
+        theo = [theo] if isinstance(theo, str) else list(theo or [])
+        if any(c not in CHIEU for c in theo):
+            raise ValueError(f"theo phải gồm các chiều trong {CHIEU}")
+        o = np.flatnonzero(self.count.reshape(-1) > 0)
+        ma = np.column_stack(np.unravel_index(o, self.shape)).reshape(-1, len(CHIEU))
+        chon = self._chon(ma, loc)
+        o, ma = o[chon], ma[chon]
+        n_o = self.count.reshape(-1)[o].astype(np.float64)
+        mean_o = self.mean.reshape(-1, len(self.bien))[o]
+        m2_o = self.m2.reshape(-1, len(self.bien), len(self.bien))[o]
+        if theo:
+            nhom = self._nhan_nhom(ma, theo, khoang_nam)
+            g, index = pd.MultiIndex.from_frame(nhom).factorize(sort=True)
+        else:
+            g, index = np.zeros(len(o), dtype=np.int64), None
+        so_nhom = 1 if index is None else len(index)
+        n = np.bincount(g, weights=n_o, minlength=so_nhom)
+        mean = np.zeros((so_nhom, len(self.bien)))
+        np.add.at(mean, g, n_o[:, None] * mean_o)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean /= n[:, None]
+        lech = mean_o - mean[g]
+        m2 = np.zeros((so_nhom, len(self.bien), len(self.bien)))
+        np.add.at(m2, g, m2_o + n_o[:, None, None] * lech[:, :, None] * lech[:, None, :])
+        return index, n, mean, m2
+
+    # Các dòng mẫu (để tính Spearman) dạng DataFrame, lọc theo loc
+    def mau(self, loc=None, khoang_nam=None):
+        chon = self._chon(self.mau_ma, loc)
+        df = self._nhan_nhom(self.mau_ma[chon], CHIEU, khoang_nam)
+        for j, b in enumerate(self.bien):
+            df[b] = self.mau_x[chon, j]
+        return df
+
+    # Ma trận tương quan. theo=None: DataFrame biến × biến như df.corr(); có theo: index nhiều tầng
+    # (nhóm..., biến) như df.groupby(theo).corr(). khoang_nam: gộp Crop_Year thành các khoảng năm.
+    # phuong_phap='spearman' tính trên mẫu so_mau dòng.
+    def tuong_quan(self, theo=None, loc=None, khoang_nam=None, phuong_phap='pearson'):
+        if phuong_phap == 'spearman':
+            if not len(self.mau_khoa):
+                raise ValueError("Bảng tương quan không có mẫu để tính Spearman (so_mau=0)")
+            df = self.mau(loc, khoang_nam)
+            if not theo:
+                return df[self.bien].corr(method='spearman')
+            return df.groupby(theo, sort=True)[self.bien].corr(method='spearman')
+        if phuong_phap != 'pearson':
+            raise ValueError(f"phuong_phap phải là 'pearson' hoặc 'spearman', không phải {phuong_phap!r}")
+        index, n, _, m2 = self._gop(theo, loc, khoang_nam)
+        sd = np.sqrt(np.einsum('gii->gi', m2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = m2 / (sd[:, :, None] * sd[:, None, :])
+        r[n < 2] = np.nan
+        r = np.clip(r, -1.0, 1.0)
+        if index is None:
+            return pd.DataFrame(r[0], index=self.bien, columns=self.bien)
+        return pd.DataFrame(r.reshape(-1, len(self.bien)), index=_index_nhom(index, self.bien), columns=self.bien)
+
+    # Hồi quy đơn y theo từng biến x của mỗi nhóm: DataFrame (nhóm..., x) với các cột
+    # n, he_so, chan, r, x_tb, sxx, s2 (phương sai phần dư); đủ để vẽ đường và dải tin cậy
+    def hoi_quy(self, y='Production', x=None, theo=None, loc=None, khoang_nam=None):
+        x = [x] if isinstance(x, str) else list(x or self.bien)
+        x = [b for b in x if b != y]
+        index, n, mean, m2 = self._gop(theo, loc, khoang_nam)
+        iy = self.bien.index(y)
+        dong = []
+        for g in range(len(n)):
+            for b in x:
+                ix = self.bien.index(b)
+                sxx, syy, sxy = m2[g, ix, ix], m2[g, iy, iy], m2[g, ix, iy]
+                he_so = sxy / sxx if sxx > 0 else 0.0
+                r = sxy / np.sqrt(sxx * syy) if sxx > 0 and syy > 0 else np.nan
+                dong.append({'n': int(n[g]), 'he_so': he_so, 'chan': mean[g, iy] - he_so * mean[g, ix], 'r': r,
+                             'x_tb': mean[g, ix], 'sxx': sxx,
+                             's2': max(syy - he_so * sxy, 0.0) / max(n[g] - 2, 1)})
+        return pd.DataFrame(dong, index=pd.Index(x) if index is None else _index_nhom(index, x))
+
+    def save(self, path, ma_bam=None):
+        if ma_bam is not None:
+            self.ma_bam = ma_bam
+        meta = {'phien_ban': PHIEN_BAN, 'bien': self.bien, 'so_mau': self.so_mau, 'ma_bam': self.ma_bam,
+                'nhan': {c: [v if isinstance(v, str) else int(v) for v in self.nhan[c]] for c in CHIEU}}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tam = path + '.tmp.npz'
+        np.savez(tam, meta=np.array(json.dumps(meta, ensure_ascii=False)), count=self.count, mean=self.mean,
+                 m2=self.m2, mau_khoa=self.mau_khoa, mau_ma=self.mau_ma, mau_x=self.mau_x)
+        os.replace(tam, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            meta = json.loads(str(f['meta']))
+            if meta.get('phien_ban') != PHIEN_BAN:
+                raise ValueError(f"Phiên bản bảng tương quan {meta.get('phien_ban')} không được hỗ trợ (cần {PHIEN_BAN})")
+            bang = cls(meta['bien'], meta['so_mau'])
+            bang.nhan = meta['nhan']
+            bang.ma_bam = meta['ma_bam']
+            bang.count, bang.mean, bang.m2 = f['count'], f['mean'], f['m2']
+            bang.mau_khoa, bang.mau_ma, bang.mau_x = f['mau_khoa'], f['mau_ma'], f['mau_x']
+        return bang
+
+
+# Bảng tương quan của file dữ liệu: nạp từ đĩa nếu khớp mã băm dữ liệu, nếu không thì tính trong một
+# lượt theo khối (từ df nếu đã có trong bộ nhớ, từ bộ đệm dạng cột hoặc CSV nếu không) rồi lưu lại.
+def nap_tuong_quan(csv_path, df=None, kich_thuoc_khoi=1_000_000):
+    from goimohinh import ma_bam_du_lieu
+    ma_bam = ma_bam_du_lieu(csv_path)
+    try:
+        bang = BangTuongQuan.load(file_tuong_quan(csv_path))
+        if ma_bam is None or bang.ma_bam == ma_bam:
+            return bang
+    except (OSError, ValueError, KeyError):
+        pass
+    bang = BangTuongQuan()
+    if df is not None:
+        for start in range(0, len(df), kich_thuoc_khoi):
+            bang.update(df.iloc[start:start + kich_thuoc_khoi])
+    else:
+        from bodem import doc_cot
+        mang, schema = doc_cot(csv_path, CHIEU + bang.bien)
+        if mang is None:
+            from lamsach import mask_hop_le
+            for chunk in pd.read_csv(csv_path, usecols=CHIEU + bang.bien, chunksize=kich_thuoc_khoi):
+                bang.update(chunk[mask_hop_le(chunk)])
+        else:
+            nhan = {m['ten']: m['categories'] for m in schema['cot'] if 'categories' in m}
+            for start in range(0, schema['so_dong'], kich_thuoc_khoi):
+                khoi = {c: np.asarray(mang[c][start:start + kich_thuoc_khoi]) for c in mang}
+                bang.update(pd.DataFrame({c: pd.Categorical.from_codes(v, categories=nhan[c]) if c in nhan else v
+                                          for c, v in khoi.items()}))
+    bang.save(file_tuong_quan(csv_path), ma_bam=ma_bam)
+    return bang
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tương quan và hồi quy đơn theo nhóm từ bảng đồng mômen")
+    parser.add_argument('file', nargs='?', default='Crop_production_in_India_ok.csv')
+    parser.add_argument('--theo', nargs='*', default=[], choices=CHIEU, help="nhóm theo các chiều")
+    parser.add_argument('--khoang-nam', type=int, default=None, help="gộp Crop_Year thành các khoảng n năm")
+    parser.add_argument('--spearman', action='store_true', help="tương quan Spearman (trên mẫu)")
+    parser.add_argument('--hoi-quy', action='store_true', help="in hệ số hồi quy Production theo từng biến")
+    args = parser.parse_args(argv)
+
+    bang = nap_tuong_quan(args.file)
+    pd.set_option('display.width', 200)
+    if args.hoi_quy:
+        print(bang.hoi_quy(theo=args.theo, khoang_nam=args.khoang_nam))
+    else:
+        print(bang.tuong_quan(args.theo, khoang_nam=args.khoang_nam,
+                              phuong_phap='spearman' if args.spearman else 'pearson').round(4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import numpy as np
+from matplotlib.colors import LinearSegmentedColormap, LogNorm, to_rgb
+
+# Vẽ biểu đồ phân tán cho dữ liệu lớn: dưới NGUONG_DIEM dòng thì vẽ từng điểm như bình thường,
+# trên ngưỡng thì raster hóa (kiểu datashader) các điểm vào một lưới cố định bằng bincount và
+# hiển thị mật độ bằng imshow. Thời gian vẽ và kích thước hình gần như không đổi theo số dòng:
+# chỉ có một lượt O(n) qua dữ liệu, còn phần vẽ chỉ phụ thuộc kích thước lưới.
+# Đường hồi quy tính chính xác từ các tổng (không lấy mẫu); khoảng tin cậy 95% tính theo công
+# thức của bình phương tối thiểu; điểm minh họa được lấy mẫu phân tầng theo trục x.
+
+NGUONG_DIEM = 50_000
+KICH_THUOC_LUOI = (480, 360)
+SO_MAU = 2000
+
+
+# Đếm số điểm trong từng ô của lưới nx x ny. Trả về (lưới (nx, ny), (x0, x1, y0, y1)).
+def luoi_mat_do(x, y, kich_thuoc=KICH_THUOC_LUOI, khoang=None):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    nx, ny = kich_thuoc
+    if khoang is None:
+        khoang = (x.min(), x.max(), y.min(), y.max())
+    x0, x1, y0, y1 = khoang
+    # Tránh khoảng rỗng khi mọi giá trị bằng nhau
+    x1 = x1 if x1 > x0 else x0 + 1
+    y1 = y1 if y1 > y0 else y0 + 1
+    ix = np.clip(((x - x0) * (nx / (x1 - x0))).astype(np.int64), 0, nx - 1)
+    iy = np.clip(((y - y0) * (ny / (y1 - y0))).astype(np.int64), 0, ny - 1)
+    luoi = np.bincount(ix * ny + iy, minlength=nx * ny).reshape(nx, ny)
+    return luoi, (x0, x1, y0, y1)
+
+
+# Chỉ số của khoảng so_mau dòng lấy mẫu phân tầng theo x (các tầng cùng độ rộng): mỗi tầng có
+# cùng hạn mức nên phần đuôi thưa vẫn có điểm. Một lượt O(n), không sắp xếp.
+def mau_phan_tang(x, so_mau=SO_MAU, so_tang=20, seed=0):
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    if n <= so_mau:
+        return np.arange(n)
+    x0, x1 = x.min(), x.max()
+    tang = np.clip(((x - x0) * (so_tang / (x1 - x0 if x1 > x0 else 1))).astype(np.int64), 0, so_tang - 1)
+    dem = np.bincount(tang, minlength=so_tang)
+    co = dem > 0
+    han_muc = np.zeros(so_tang)
+    han_muc[co] = so_mau / co.sum()
+    xac_suat = np.minimum(1.0, han_muc / np.maximum(dem, 1))
+    rng = np.random.default_rng(seed)
+    return np.flatnonzero(rng.random(n) < xac_suat[tang])
+
+
+# Hồi quy y theo x từ các tổng: trả về (hệ số góc, hệ số chặn, hàm sai số chuẩn của đường tại x)
+def duong_hoi_quy(x, y):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    mx, my = x.mean(), y.mean()
+    sxx = ((x - mx) ** 2).sum()
+    sxy = ((x - mx) * (y - my)).sum()
+    he_so = sxy / sxx if sxx > 0 else 0.0
+    chan = my - he_so * mx
+    sai_so = y - (chan + he_so * x)
+    s2 = (sai_so @ sai_so) / max(n - 2, 1)
+
+    def sai_so_chuan(x0):
+        return np.sqrt(s2 * (1.0 / n + (np.asarray(x0) - mx) ** 2 / (sxx if sxx > 0 else 1)))
+    return he_so, chan, sai_so_chuan
+
+
+# Bảng màu một sắc độ, ô ít điểm gần như trong suốt (nhiều lớp chồng lên nhau vẫn đọc được)
+def _bang_mau(mau):
+    r, g, b = to_rgb(mau)
+    return LinearSegmentedColormap.from_list(f'mat_do_{mau}', [(r, g, b, 0.25), (r, g, b, 1.0)])
+
+
+# Vẽ một lưới mật độ đã tính sẵn (kết quả của luoi_mat_do) lên ax. Trả về đối tượng ảnh.
+def ve_luoi(ax, luoi, khoang, color='C0', label=None):
+    x0, x1, y0, y1 = khoang
+    anh = ax.imshow(np.ma.masked_equal(luoi.T, 0), origin='lower', extent=(x0, x1, y0, y1), aspect='auto',
+                    cmap=_bang_mau(color), norm=LogNorm(vmin=1, vmax=max(luoi.max(), 2)), interpolation='nearest')
+    if label is not None:
+        # Ảnh không có mục chú giải: thêm một tập điểm rỗng cùng màu để legend() hiển thị được
+        ax.scatter([], [], color=color, marker='s', label=label)
+    return anh
+
+
+# Vẽ mật độ đã raster hóa của các điểm (x, y) lên ax
+def ve_mat_do(ax, x, y, color='C0', label=None, kich_thuoc=KICH_THUOC_LUOI, khoang=None):
+    luoi, khoang = luoi_mat_do(x, y, kich_thuoc, khoang)
+    return ve_luoi(ax, luoi, khoang, color, label)
+
+
+# Thay cho ax.scatter(x, y, ...): tự chuyển sang vẽ mật độ khi số điểm vượt ngưỡng
+def ve_phan_tan(ax, x, y, nguong=NGUONG_DIEM, color=None, label=None, khoang=None, **kwargs):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(x) <= nguong:
+        return ax.scatter(x, y, color=color, label=label, **kwargs)
+    return ve_mat_do(ax, x, y, color=color or 'C0', label=None if label is None else f'{label} (mật độ)',
+                     khoang=khoang)
+
+
+# Thay cho seaborn.regplot khi dữ liệu lớn: mật độ + điểm lấy mẫu phân tầng + đường hồi quy
+# chính xác và dải tin cậy 95%. hoi_quy: hệ số đã tính sẵn (một dòng của BangTuongQuan.hoi_quy)
+# để khỏi tính lại từ dữ liệu.
+def ve_hoi_quy(ax, x, y, color='C0', line_color='C1', so_mau=SO_MAU, alpha=0.5, hoi_quy=None):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    ve_mat_do(ax, x, y, color=color)
+    chon = mau_phan_tang(x, so_mau)
+    ax.scatter(x[chon], y[chon], s=4, color=color, alpha=alpha)
+    dai = dai_hoi_quy(x, y) if hoi_quy is None else dai_tu_hoi_quy(hoi_quy, x.min(), x.max())
+    ve_dai_hoi_quy(ax, dai, line_color)
+
+
+# Đường hồi quy và dải tin cậy 95% tại so_diem điểm trên khoảng của x: (xs, ys, dưới, trên)
+def dai_hoi_quy(x, y, so_diem=100):
+    he_so, chan, sai_so_chuan = duong_hoi_quy(x, y)
+    xs = np.linspace(np.min(x), np.max(x), so_diem)
+    ys = chan + he_so * xs
+    return xs, ys, ys - 1.96 * sai_so_chuan(xs), ys + 1.96 * sai_so_chuan(xs)
+
+
+# Như dai_hoi_quy nhưng từ hệ số và các tổng đã tính sẵn (một dòng của tuongquan.BangTuongQuan.hoi_quy:
+# he_so, chan, n, x_tb, sxx, s2), không cần dữ liệu; đường vẽ trên khoảng [x0, x1]
+def dai_tu_hoi_quy(hoi_quy, x0, x1, so_diem=100):
+    xs = np.linspace(x0, x1, so_diem)
+    ys = hoi_quy['chan'] + hoi_quy['he_so'] * xs
+    sxx = hoi_quy['sxx'] if hoi_quy['sxx'] > 0 else 1
+    sai_so_chuan = np.sqrt(hoi_quy['s2'] * (1.0 / hoi_quy['n'] + (xs - hoi_quy['x_tb']) ** 2 / sxx))
+    return xs, ys, ys - 1.96 * sai_so_chuan, ys + 1.96 * sai_so_chuan
+
+
+def ve_dai_hoi_quy(ax, dai, line_color='C1'):
+    xs, ys, duoi, tren = dai
+    ax.plot(xs, ys, color=line_color)
+    ax.fill_between(xs, duoi, tren, color=line_color, alpha=0.15)